@@ -1,8 +1,90 @@
+import argparse
+import cProfile
+import os
+import socket
+import src.profiling as profiling
+import src.flight as flight
 from src.engine import play_game
+from src.net import HEARTBEAT_INTERVAL, PEER_TIMEOUT
+from src.protocol import ExternalEngine
+from src.opening_book import OpeningBook, default_book
+from src.value_table import ValueTable, default_values
+from src.puzzles import PuzzleBook
+from src.screen import CursesScreen
+from src.trace import RecordingScreen
+from src.variants import VARIANTS
 from curses import wrapper
 
-def main(stdscr) -> None:
-    play_game(stdscr)
+def main(stdscr, args: argparse.Namespace) -> None:
+    engine = None
+    if args.engine:
+        engine = ExternalEngine(args.engine)
+        engine.start()
+    book = OpeningBook(args.book) if args.book else default_book()
+    if book is not None and args.book_depth is not None:
+        book.max_ply = args.book_depth
+    try:
+        values = ValueTable(args.values) if args.values else default_values()
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Can't load the value table {args.values}: {e}")
+    puzzles = PuzzleBook(args.puzzles) if args.puzzles else None
+    if puzzles is not None and (puzzles.variant.rows, puzzles.variant.cols) != (3, 3):
+        puzzles.close()
+        raise SystemExit(f"{args.puzzles} holds {puzzles.variant.rows}x{puzzles.variant.cols} puzzles; "
+                         "the puzzle mode plays 3x3 boards only")
+    screen = CursesScreen(stdscr)
+    sockets = socket.socket
+    if args.trace:
+        screen = RecordingScreen(screen)
+        sockets = screen.socket
+    recorder = screen
+    if args.profile or args.profile_overlay:
+        screen = profiling.ProfilingScreen(screen, profiling.enable(), overlay=args.profile_overlay)
+    session = cProfile.Profile() if args.cprofile else None
+    try:
+        if session is not None:
+            session.runcall(play_game, screen, engine, book, sockets, args.heartbeat, args.peer_timeout,
+                            args.analysis, args.variant, values, not args.no_discovery, puzzles)
+        else:
+            play_game(screen, engine, book, sockets, args.heartbeat, args.peer_timeout, args.analysis,
+                      args.variant, values, not args.no_discovery, puzzles)
+    finally:
+        if session is not None:
+            session.dump_stats(args.cprofile)
+        if args.trace:
+            recorder.trace.save(args.trace)
+        if engine is not None:
+            engine.close()
+        if book is not None:
+            book.close()
+        if puzzles is not None:
+            puzzles.close()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tic Tac Toe in the terminal.")
+    parser.add_argument("--engine", help="command starting an external engine for the CPU mode, e.g. 'python -m src.protocol'")
+    parser.add_argument("--book", help="opening book for the CPU mode (default: ~/.tic-tac-toe/book.ttob if present)")
+    parser.add_argument("--book-depth", type=int, help="only use the book for this many plies")
+    parser.add_argument("--values", help="learned value table for the CPU mode (default: ~/.tic-tac-toe/values.ttvt if present)")
+    parser.add_argument("--puzzles", help="puzzle file for the puzzle mode (default: ~/.tic-tac-toe/puzzles.ttpz, generated on first use)")
+    parser.add_argument("--heartbeat", type=float, default=HEARTBEAT_INTERVAL, metavar="SECONDS",
+                        help=f"seconds between pings in online games, 0 for none (default {HEARTBEAT_INTERVAL:g})")
+    parser.add_argument("--peer-timeout", type=float, default=PEER_TIMEOUT, metavar="SECONDS",
+                        help=f"end an online game after this long without hearing from the opponent (default {PEER_TIMEOUT:g})")
+    parser.add_argument("--no-discovery", action="store_true",
+                        help="don't announce hosted games on the local network, list hosts when joining or remember joined hosts")
+    parser.add_argument("--analysis", action="store_true",
+                        help="colour empty cells by their value to the side to move (local, CPU and ultimate games)")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="standard",
+                        help="rules of local and CPU games: standard, misere (three in a row loses), wild (place X or O) or notakto")
+    parser.add_argument("--trace", help="record the session's input and network traffic to this file for replay")
+    parser.add_argument("--profile", action="store_true", default=bool(os.environ.get("TICTACTOE_PROFILE")),
+                        help="time the game loop and print latency percentiles on exit (or set TICTACTOE_PROFILE=1)")
+    parser.add_argument("--profile-overlay", action="store_true", help="also show live timings beside the footer")
+    parser.add_argument("--cprofile", metavar="PATH", help="run the session under cProfile and write the stats here, e.g. for snakeviz")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    wrapper(main)
\ No newline at end of file
+    args = parse_args()
+    flight.install()
+    wrapper(main, args)
@@ -0,0 +1,193 @@
+"""
+Analysis overlay: colour every empty cell by what playing there is worth to the side to move.
+
+On the 3x3 board the values are exact and instant, read from the solved table (src.solver), or solved by
+the compiled rules of a variant (src.variants). Larger
+boards have no table, so `PlayoutAnalysis` estimates them in a background thread, pass after pass, and
+the overlay fills in as estimates arrive; a new position cancels the search of the old one. Either
+way the overlay repaints only the cells whose evaluation changed, around the cell's symbol.
+"""
+import curses
+import threading
+from queue import Empty, SimpleQueue
+from typing import Dict, List, Tuple, Union
+
+from src.board import Board
+from src.screen import Screen
+from src.solver import POWERS, solved_table
+from src.ultimate import UltimateBoard, UltimateState
+
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+# (value, plies to the end or None if unknown)
+Evaluation = Tuple[int, Union[int, None]]
+
+
+def label(evaluation: Evaluation) -> str:
+    value, distance = evaluation
+    word = {WIN: "win", DRAW: "draw", LOSS: "loss"}[value]
+    return word if distance is None or value == DRAW else f"{word} {distance}"
+
+
+class TableAnalysis:
+    """
+    Exact values of every move on a 3x3 board.
+    """
+    def evaluate(self, board: Board, to_move: str) -> Dict[tuple, Evaluation]:
+        """
+        Get the value and distance to the end of every empty cell for `to_move`. Boards playing a rule
+        variant are solved by its compiled rules instead, taking the better symbol where there is a choice.
+
+        Returns:
+            dict: An Evaluation per (row, col); empty if the game is over.
+        """
+        rules = board.rules
+        if rules is not None:
+            evaluations = rules.evaluate(*rules.encode(board._board), rules.symbols_for(to_move))
+            return {divmod(cell, rules.cols): (value, distance) for cell, (value, distance, _) in evaluations.items()}
+        cells = [cell for line in board._board for cell in line]
+        other = 'O' if to_move == 'X' else 'X'
+        # The table assumes X moved first, so name the players by who did
+        first = to_move if cells.count(to_move) == cells.count(other) else other
+        code = 0
+        for cell, symbol in enumerate(cells):
+            if symbol != ' ':
+                code += (1 if symbol == first else 2) * POWERS[cell]
+        table = solved_table()
+        if code not in table or table[code].best < 0:
+            return {}
+        turn = 1 if to_move == first else 2
+        evaluations = {}
+        for cell, symbol in enumerate(cells):
+            if symbol == ' ':
+                child = table[code + turn * POWERS[cell]]
+                evaluations[divmod(cell, 3)] = (-child.value, child.distance + 1)
+        return evaluations
+
+
+class PlayoutAnalysis:
+    """
+    Monte Carlo estimates for ultimate tic-tac-toe, computed in a background thread.
+
+    Every pass plays `batch` random games after each legal move and reports the updated estimates; the
+    search stops after `passes` passes or when a new position is analysed.
+
+    Args:
+        batch (int, optional): Playouts per move per pass. Defaults to 20.
+        passes (int, optional): Passes before the estimates count as final. Defaults to 25.
+    """
+    def __init__(self, batch: int=20, passes: int=25) -> None:
+        self.batch: int = batch
+        self.passes: int = passes
+        self.results: SimpleQueue = SimpleQueue()
+        self.estimates: Dict[tuple, Evaluation] = {}
+        self._key: Union[tuple, None] = None
+        self._cancel: threading.Event = threading.Event()
+        self._generation: int = 0
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        self._key = None
+
+    def evaluate(self, board: UltimateBoard, to_move: str) -> Dict[tuple, Evaluation]:
+        """
+        Get the estimates that have arrived for the current position, starting its search if it is new.
+        """
+        state = board.state
+        key = (tuple(state.boards[0]), tuple(state.boards[1]), state.next_board, state.turn)
+        if key != self._key:
+            self.cancel()
+            self._key = key
+            self._cancel = threading.Event()
+            self._generation += 1
+            self.estimates = {}
+            threading.Thread(target=self._search, args=(state.copy(), self._generation, self._cancel),
+                             daemon=True).start()
+        while True:
+            try:
+                generation, estimates = self.results.get_nowait()
+            except Empty:
+                break
+            if generation == self._generation:
+                self.estimates = estimates
+        return self.estimates
+
+    def _search(self, state: UltimateState, generation: int, cancel: threading.Event) -> None:
+        moves = state.legal_moves()
+        scores: List[float] = [0.0] * len(moves)
+        played = 0
+        for _ in range(self.passes):
+            for i, move in enumerate(moves):
+                if cancel.is_set():
+                    return
+                after = state.copy()
+                after.play(move)
+                for _ in range(self.batch):
+                    winner = after.copy().playout()
+                    scores[i] += 1.0 if winner == state.turn else 0.5 if winner == 2 else 0.0
+            played += self.batch
+            estimates = {}
+            for move, score in zip(moves, scores):
+                rate = score / played
+                value = WIN if rate >= 0.6 else LOSS if rate <= 0.4 else DRAW
+                estimates[UltimateBoard.to_cell(move)] = (value, None)
+            self.results.put((generation, estimates))
+
+
+class AnalysisOverlay:
+    """
+    Keep a board's empty cells coloured by their evaluation.
+
+    Args:
+        stdscr (Screen): The screen the board is drawn on.
+        board (Board): The board to analyse; an UltimateBoard gets playout estimates, any other the table.
+    """
+    def __init__(self, stdscr: Screen, board: Board) -> None:
+        self.stdscr: Screen = stdscr
+        self.board: Board = board
+        self.analysis: Union[TableAnalysis, PlayoutAnalysis] = \
+            PlayoutAnalysis() if isinstance(board, UltimateBoard) else TableAnalysis()
+        # Colour pairs where the terminal has them, otherwise attributes that show on blank cells
+        self.attrs: Dict[int, int] = {
+            WIN: stdscr.color(curses.COLOR_BLACK, curses.COLOR_GREEN) or curses.A_REVERSE,
+            DRAW: stdscr.color(curses.COLOR_BLACK, curses.COLOR_YELLOW) or curses.A_UNDERLINE,
+            LOSS: stdscr.color(curses.COLOR_BLACK, curses.COLOR_RED) or curses.A_NORMAL,
+        }
+        self.shown: Dict[tuple, Evaluation] = {}
+
+    def update(self, to_move: str) -> int:
+        """
+        Repaint the cells whose evaluation changed since the last update.
+
+        Args:
+            to_move (str): The symbol of the side to move.
+
+        Returns:
+            int: The number of cells repainted.
+        """
+        return self._show(self.analysis.evaluate(self.board, to_move))
+
+    def clear(self) -> int:
+        """
+        Stop any search and uncolour every cell.
+        """
+        if isinstance(self.analysis, PlayoutAnalysis):
+            self.analysis.cancel()
+        return self._show({})
+
+    def _show(self, evaluations: Dict[tuple, Evaluation]) -> int:
+        changed = 0
+        for cell in list(self.shown):
+            if cell not in evaluations:
+                self.board.paint_cell(*cell, curses.A_NORMAL)
+                del self.shown[cell]
+                changed += 1
+        for cell, evaluation in evaluations.items():
+            if self.shown.get(cell) != evaluation:
+                self.board.paint_cell(*cell, self.attrs[evaluation[0]], label(evaluation))
+                self.shown[cell] = evaluation
+                changed += 1
+        if changed:
+            self.stdscr.refresh()
+        return changed
@@ -0,0 +1,213 @@
+"""
+Struct-of-arrays storage for many concurrent 3x3 games.
+
+A `GameArena` preallocates one slot per game in flat numpy arrays, so a game costs 19 bytes rather than
+a `Board` with its row lists and render strings. Games are addressed by integer handles; freed slots go
+on an intrusive free list (`next_free`), so allocation and release are O(1). Boards use the bitboard
+layout of src.batch (X's cells in bits 0-8, O's in bits 9-17), so `arena.boards[...]` can be passed
+straight to `batch.evaluate` or `batch.best_moves`.
+
+Usage:
+    python -m src.arena bench --games 1000000
+"""
+import argparse
+from time import monotonic, perf_counter
+from typing import Dict, List, Union
+
+import numpy as np
+
+from src.batch import NO_RESULT, O_WINS, TIE, X_WINS
+from src.board import WIN_MASKS
+
+
+# Status of a slot: FREE, or a game in progress (NO_RESULT) or over (X_WINS, O_WINS, TIE)
+FREE: int = -1
+STATUSES: Dict[int, str] = {FREE: "free", NO_RESULT: "playing", X_WINS: "x wins", O_WINS: "o wins", TIE: "tie"}
+
+_FULL: int = (1 << 9) - 1
+
+
+class ArenaFull(Exception):
+    pass
+
+
+class GameArena:
+    """
+    Preallocated state for up to `capacity` games.
+
+    Args:
+        capacity (int): The most games held at once.
+    """
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self.boards: np.ndarray = np.zeros(capacity, dtype=np.uint32)
+        self.to_move: np.ndarray = np.zeros(capacity, dtype=np.int8)      # 0 for X, 1 for O
+        self.moves: np.ndarray = np.zeros(capacity, dtype=np.uint8)
+        self.status: np.ndarray = np.full(capacity, FREE, dtype=np.int8)
+        self.last_active: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        # Slot i's successor on the free list, or -1 at the end
+        self.next_free: np.ndarray = np.arange(1, capacity + 1, dtype=np.int32)
+        if capacity:
+            self.next_free[-1] = -1
+        self.free_head: int = 0 if capacity else -1
+        self.live: int = 0
+        # Single-game operations go through memoryviews, which read and write plain Python numbers far
+        # faster than indexing numpy arrays one element at a time
+        self._boards = memoryview(self.boards)
+        self._to_move = memoryview(self.to_move)
+        self._moves = memoryview(self.moves)
+        self._status = memoryview(self.status)
+        self._last_active = memoryview(self.last_active)
+        self._next_free = memoryview(self.next_free)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.boards, self.to_move, self.moves, self.status,
+                                              self.last_active, self.next_free))
+
+    def allocate(self, now: Union[float, None]=None) -> int:
+        """
+        Start a game on an empty board, X to move.
+
+        Args:
+            now (float, optional): The time of the game's creation. Defaults to `time.monotonic()`.
+
+        Returns:
+            int: The game's handle.
+
+        Raises:
+            ArenaFull: If every slot is in use.
+        """
+        handle = self.free_head
+        if handle < 0:
+            raise ArenaFull(f"All {self.capacity} games are in use")
+        self.free_head = self._next_free[handle]
+        self._boards[handle] = 0
+        self._to_move[handle] = 0
+        self._moves[handle] = 0
+        self._status[handle] = NO_RESULT
+        self._last_active[handle] = monotonic() if now is None else now
+        self.live += 1
+        return handle
+
+    def release(self, handle: int) -> None:
+        """
+        Free a game's slot for reuse.
+
+        Raises:
+            ValueError: If the slot is already free.
+        """
+        if self._status[handle] == FREE:
+            raise ValueError(f"Game {handle} is not allocated")
+        self._status[handle] = FREE
+        self._next_free[handle] = self.free_head
+        self.free_head = handle
+        self.live -= 1
+
+    def play(self, handle: int, row: int, col: int, now: Union[float, None]=None) -> int:
+        """
+        Make a move for the side to move.
+
+        Returns:
+            int: The game's status afterwards: NO_RESULT, X_WINS, O_WINS or TIE.
+
+        Raises:
+            ValueError: If the game is over or free, or the cell is off the board or taken.
+        """
+        if self._status[handle] != NO_RESULT:
+            raise ValueError(f"Game {handle} is not in progress")
+        if not (0 <= row < 3 and 0 <= col < 3):
+            raise ValueError(f"({row}, {col}) is off the board")
+        board = self._boards[handle]
+        cell = row * 3 + col
+        if (board | board >> 9) >> cell & 1:
+            raise ValueError(f"({row}, {col}) is taken")
+        side = self._to_move[handle]
+        board |= 1 << (cell + 9 * side)
+        self._boards[handle] = board
+        self._to_move[handle] = 1 - side
+        self._moves[handle] += 1
+        self._last_active[handle] = monotonic() if now is None else now
+        mine = board >> 9 * side & _FULL
+        if any(mine & mask == mask for mask in WIN_MASKS):
+            status = X_WINS if side == 0 else O_WINS
+        elif (board | board >> 9) & _FULL == _FULL:
+            status = TIE
+        else:
+            return NO_RESULT
+        self._status[handle] = status
+        return status
+
+    def cells(self, handle: int) -> List[List[str]]:
+        """
+        Get a game's board in Board's layout, e.g. for `Board(screen, cells=arena.cells(handle))`.
+        """
+        board = self._boards[handle]
+        return [['X' if board >> (row * 3 + col) & 1 else 'O' if board >> (row * 3 + col + 9) & 1 else ' '
+                 for col in range(3)] for row in range(3)]
+
+    def expire(self, idle: float, now: Union[float, None]=None) -> np.ndarray:
+        """
+        Free every allocated game, finished or not, with no activity for more than `idle` seconds.
+
+        Returns:
+            np.ndarray: The handles freed.
+        """
+        cutoff = (monotonic() if now is None else now) - idle
+        handles = np.flatnonzero((self.status != FREE) & (self.last_active < cutoff)).astype(np.int32)
+        if len(handles):
+            self.status[handles] = FREE
+            # Chain the expired slots together and put the chain in front of the free list
+            self.next_free[handles[:-1]] = handles[1:]
+            self.next_free[handles[-1]] = self.free_head
+            self.free_head = int(handles[0])
+            self.live -= len(handles)
+        return handles
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts = np.bincount(self.status.astype(np.intp) - FREE, minlength=len(STATUSES))
+        return {name: int(counts[status - FREE]) for status, name in STATUSES.items()}
+
+
+def bench(games: int=1_000_000) -> dict:
+    """
+    Fill an arena, play a move in every game, and time the bulk operations.
+
+    Returns:
+        dict: Bytes per game and timings.
+    """
+    arena = GameArena(games)
+    start = perf_counter()
+    for i in range(games):
+        arena.allocate(now=float(i))
+    allocate = perf_counter() - start
+    start = perf_counter()
+    for handle in range(games):
+        arena.play(handle, 1, 1, now=float(handle))
+    play = perf_counter() - start
+    start = perf_counter()
+    counts = arena.count_by_status()
+    count = perf_counter() - start
+    start = perf_counter()
+    expired = arena.expire(games / 2, now=float(games))
+    expire = perf_counter() - start
+    return {"games": games, "bytes_per_game": arena.nbytes / games, "allocate_ns": allocate / games * 1e9,
+            "play_ns": play / games * 1e9, "count_ms": count * 1e3, "expire_ms": expire * 1e3,
+            "expired": len(expired), "playing": counts["playing"]}
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Measure the game arena.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--games", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    result = bench(args.games)
+    print(f"{result['games']:,} games, {result['bytes_per_game']:.0f} bytes each")
+    print(f"allocate {result['allocate_ns']:.0f} ns, play {result['play_ns']:.0f} ns per game")
+    print(f"count by status {result['count_ms']:.2f} ms, expire {result['expired']:,} idle games "
+          f"{result['expire_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Vectorized evaluation of many 3x3 positions per call.
+
+Positions are passed either as an int8 array of shape (n, 9), row-major cells with 0 for empty, 1 for X
+and 2 for O, or as a 1-D integer array of bitboards with X's cells in bits 0-8 and O's in bits 9-17.
+
+Usage:
+    python -m src.batch --positions 1000000
+"""
+import argparse
+from functools import lru_cache
+from time import perf_counter
+from typing import List
+
+import numpy as np
+
+from src.board import WIN_MASKS
+from src.solver import CODES, POWERS, solved_table
+
+
+_POWERS = np.array(POWERS, dtype=np.int32)
+_LINES = np.array([[cell for cell in range(9) if mask >> cell & 1] for mask in WIN_MASKS], dtype=np.intp)
+
+UNREACHABLE: int = -2
+NO_RESULT, X_WINS, O_WINS, TIE = 0, 1, 2, 3
+
+
+@lru_cache(maxsize=None)
+def _tables() -> tuple:
+    """
+    Build the solved table as flat arrays indexed by position code.
+
+    Returns:
+        tuple: Arrays of values (UNREACHABLE for positions that cannot arise), distances and best moves.
+    """
+    values = np.full(CODES, UNREACHABLE, dtype=np.int8)
+    distances = np.zeros(CODES, dtype=np.int8)
+    moves = np.full(CODES, -1, dtype=np.int8)
+    for code, solution in solved_table().items():
+        values[code] = solution.value
+        distances[code] = solution.distance
+        moves[code] = solution.best
+    return values, distances, moves
+
+
+def pack_bitboards(positions: np.ndarray) -> np.ndarray:
+    """
+    Convert an (n, 9) cell array to bitboards.
+    """
+    cells = np.asarray(positions, dtype=np.int8)
+    weights = np.left_shift(1, np.arange(9, dtype=np.int64))
+    return ((cells == 1) @ weights) | (((cells == 2) @ weights) << 9)
+
+
+def as_cells(positions: np.ndarray) -> np.ndarray:
+    """
+    Normalise a batch of positions to an (n, 9) int8 cell array.
+
+    Raises:
+        ValueError: If the array has neither accepted layout.
+    """
+    positions = np.asarray(positions)
+    if positions.ndim == 2 and positions.shape[1] == 9:
+        return positions.astype(np.int8, copy=False)
+    if positions.ndim == 1 and np.issubdtype(positions.dtype, np.integer):
+        bits = positions.astype(np.int64)[:, None] >> np.arange(18, dtype=np.int64) & 1
+        return (bits[:, :9] + 2 * bits[:, 9:]).astype(np.int8)
+    raise ValueError(f"Expected an (n, 9) cell array or a 1-D bitboard array, got shape {positions.shape}")
+
+
+def codes(positions: np.ndarray) -> np.ndarray:
+    """
+    Get the base-3 position code of every position in a batch.
+    """
+    return as_cells(positions).astype(np.int32) @ _POWERS
+
+
+def winners(positions: np.ndarray) -> np.ndarray:
+    """
+    Apply the Board.get_winner rules to a whole batch at once.
+
+    Returns:
+        np.ndarray: One of NO_RESULT, X_WINS, O_WINS or TIE per position.
+    """
+    cells = as_cells(positions)
+    lines = cells[:, _LINES]
+    complete = (lines[:, :, 0] != 0) & (lines[:, :, 0] == lines[:, :, 1]) & (lines[:, :, 1] == lines[:, :, 2])
+    # Like Board.get_winner, the first complete line decides the result
+    first = complete.argmax(axis=1)
+    result = np.where(complete.any(axis=1), lines[np.arange(len(cells)), first, 0], NO_RESULT)
+    full = (cells != 0).all(axis=1)
+    return np.where((result == NO_RESULT) & full, TIE, result).astype(np.int8)
+
+
+def _lookup(positions: np.ndarray, table: np.ndarray) -> np.ndarray:
+    # Look each distinct position up once and scatter the answers back over the batch
+    unique, inverse = np.unique(codes(positions), return_inverse=True)
+    return table[unique][inverse.reshape(-1)]
+
+
+def evaluate(positions: np.ndarray) -> tuple:
+    """
+    Get the game-theoretic value of every position in a batch, for the side to move.
+
+    Args:
+        positions (np.ndarray): The positions, as cells or bitboards.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: int8 values (1 win, 0 draw, -1 loss, UNREACHABLE for positions
+            that cannot arise in a legal game) and the number of plies to the end with best play.
+    """
+    values, distances, _ = _tables()
+    unique, inverse = np.unique(codes(positions), return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return values[unique][inverse], distances[unique][inverse]
+
+
+def best_moves(positions: np.ndarray) -> np.ndarray:
+    """
+    Get a perfect move for every position in a batch.
+
+    Args:
+        positions (np.ndarray): The positions, as cells or bitboards.
+
+    Returns:
+        np.ndarray: int8 cell indices (row * 3 + col), or -1 if the game is over or the position is
+            unreachable.
+    """
+    return _lookup(positions, _tables()[2])
+
+
+def random_positions(count: int, seed: int=None) -> np.ndarray:
+    """
+    Draw positions uniformly from the reachable positions, as an (n, 9) int8 cell array.
+    """
+    rng = np.random.default_rng(seed)
+    reachable = np.fromiter(solved_table().keys(), dtype=np.int32)
+    picked = rng.choice(reachable, size=count)
+    return (picked[:, None] // _POWERS % 3).astype(np.int8)
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Measure batched evaluation throughput.")
+    parser.add_argument("--positions", type=int, default=1_000_000, help="positions per batch")
+    args = parser.parse_args(argv)
+
+    _tables()
+    positions = random_positions(args.positions, seed=0)
+    for name, function in (("winners", winners), ("evaluate", evaluate), ("best_moves", best_moves)):
+        start = perf_counter()
+        function(positions)
+        elapsed = perf_counter() - start
+        print(f"{name:<12}{args.positions / elapsed:>14,.0f} positions/sec")
+
+
+if __name__ == "__main__":
+    main()
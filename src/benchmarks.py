@@ -0,0 +1,324 @@
+"""
+Benchmark suite with a stored baseline.
+
+Every benchmark is a setup function, registered with `@benchmark`, that returns the operation to time and
+how many operations one call performs. Results are nanoseconds per operation, the best of several
+repeats, and are compared against the baseline; anything slower by more than the threshold is a
+regression and makes the command exit with status 1.
+
+Usage:
+    python -m src.benchmarks                         # run all, compare with benchmarks/baseline.json
+    python -m src.benchmarks --filter cpu --out results.json
+    python -m src.benchmarks --save-baseline         # accept the current numbers
+"""
+import argparse
+import io
+import os
+import platform
+import sys
+import timeit
+from contextlib import redirect_stdout
+from json import dumps, loads
+from random import Random
+from typing import Callable, Dict, List, Union
+
+from src.board import Board
+from src.button import Button
+from src.cpu import computer_move, try_to_block, try_to_win, winning_move
+from src.net import MessageReader, decode, encode
+from src.screen import VirtualScreen, local_game_driver
+from src.tournament import play_match_game
+
+
+# A setup function returns the operation to time and the number of operations per call
+Setup = Callable[[], tuple]
+
+BENCHMARKS: Dict[str, Setup] = {}
+
+DEFAULT_BASELINE: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     "benchmarks", "baseline.json")
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    """
+    Register a setup function under a name.
+    """
+    def decorator(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def _positions(count: int, seed: int=0) -> List[List[List[str]]]:
+    # Unfinished positions reached by random play, in Board's layout
+    rng = Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        for ply in range(rng.randrange(1, 8)):
+            board.update_board("XO"[ply % 2], *rng.choice(board.get_empty_cells()))
+            if board.get_winner() is not None:
+                break
+        else:
+            positions.append(board._board)
+    return positions
+
+
+@benchmark("board.get_winner")
+def _get_winner() -> tuple:
+    boards = [Board(None, x=0, y=0, cells=cells) for cells in _positions(64)]
+
+    def run() -> None:
+        for board in boards:
+            board.get_winner()
+    return run, len(boards)
+
+
+@benchmark("board.churn")
+def _churn() -> tuple:
+    board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+    cells = [(row, col) for row in range(3) for col in range(3)]
+
+    def run() -> None:
+        for row, col in cells:
+            if board.is_empty(row, col):
+                board.update_board('X', row, col)
+        for row, col in cells:
+            board.clear_cell(row, col)
+    return run, len(cells)
+
+
+@benchmark("cpu.winning_move")
+def _winning_move() -> tuple:
+    boards = [Board(None, x=0, y=0, cells=cells) for cells in _positions(64)]
+
+    def run() -> None:
+        for board in boards:
+            winning_move(board, 'O')
+    return run, len(boards)
+
+
+@benchmark("cpu.try_to_win_block")
+def _try_to_win_block() -> tuple:
+    positions = _positions(64)
+    boards = [Board(None, x=0, y=0, cells=cells) for cells in positions]
+
+    def run() -> None:
+        for board, cells in zip(boards, positions):
+            if not try_to_win(board, 'O'):
+                try_to_block(board, 'O', 'X')
+            board._board = [list(row) for row in cells]
+    return run, len(boards)
+
+
+@benchmark("cpu.computer_turn")
+def _computer_turn() -> tuple:
+    # The CPU's move pipeline as cpu_game runs it, without the pause before moving
+    positions = _positions(64)
+    boards = [Board(None, x=0, y=0, cells=cells) for cells in positions]
+
+    def run() -> None:
+        for board, cells in zip(boards, positions):
+            computer_move(board, 'O', 'X')
+            board._board = [list(row) for row in cells]
+    return run, len(boards)
+
+
+@benchmark("button.in_bounds")
+def _in_bounds() -> tuple:
+    button = Button(VirtualScreen(), "Local", 35, 12)
+    points = [(x, y) for x in range(30, 46) for y in range(10, 17)]
+
+    def run() -> None:
+        for x, y in points:
+            button.in_bounds(x, y)
+    return run, len(points)
+
+
+@benchmark("render.board")
+def _render_board() -> tuple:
+    screen = VirtualScreen()
+    board = Board(screen, y=7, cells=_positions(1)[0])
+
+    def run() -> None:
+        screen.clear()
+        board.draw_board()
+        board.draw_values()
+        board.highlight_cell(*board.get_empty_cells()[0])
+    return run, 1
+
+
+@benchmark("render.buttons")
+def _render_buttons() -> tuple:
+    screen = VirtualScreen()
+    buttons = [Button(screen, label, 35, 6 + 3 * i) for i, label in enumerate(["Host ", "Join ", "Local", "CPU  "])]
+
+    def run() -> None:
+        for button in buttons:
+            button.draw()
+    return run, len(buttons)
+
+
+@benchmark("net.encode_decode")
+def _encode_decode() -> tuple:
+    moves = [(row, col) for row in range(3) for col in range(3)]
+
+    def run() -> None:
+        for move in moves:
+            decode(encode(move)[:-1])
+    return run, len(moves)
+
+
+@benchmark("net.reader")
+def _reader() -> tuple:
+    class Stream:
+        # Hands out the same chunk of several messages, as a socket might
+        chunk = b"".join(encode((row, col)) for row in range(3) for col in range(3))
+
+        def recv(self, size: int) -> bytes:
+            return self.chunk
+
+    def run() -> None:
+        reader = MessageReader(Stream())
+        for _ in range(9):
+            reader.read()
+    return run, 9
+
+
+@benchmark("game.headless_local")
+def _headless_local() -> tuple:
+    from src.engine import play_game
+
+    seeds = iter(range(1 << 30))
+
+    def run() -> None:
+        # Quitting prints a farewell and exits
+        try:
+            with redirect_stdout(io.StringIO()):
+                play_game(VirtualScreen(driver=local_game_driver(1, next(seeds))))
+        except SystemExit:
+            pass
+    return run, 1
+
+
+@benchmark("game.cpu_vs_cpu")
+def _cpu_vs_cpu() -> tuple:
+    rng = Random(0)
+
+    def run() -> None:
+        play_match_game("heuristic", "heuristic", rng)
+    return run, 1
+
+
+def measure(setup: Setup, repeat: int=5, min_time: float=0.2) -> dict:
+    """
+    Time a benchmark.
+
+    Args:
+        setup (callable): The benchmark's setup function.
+        repeat (int, optional): Timed rounds; the fastest counts. Defaults to 5.
+        min_time (float, optional): The least seconds a round takes. Defaults to 0.2.
+
+    Returns:
+        dict: Nanoseconds per operation, operations timed, and the median's excess over the best.
+    """
+    run, ops = setup()
+    timer = timeit.Timer(run)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    times = sorted(timer.repeat(repeat, number))
+    best = times[0]
+    return {"ns_per_op": round(best / number / ops * 1e9, 1), "ops": number * ops * repeat,
+            "spread": round((times[len(times) // 2] - best) / best, 3)}
+
+
+def run_all(pattern: str="", repeat: int=5, min_time: float=0.2) -> dict:
+    """
+    Run the benchmarks whose names contain `pattern`.
+
+    Returns:
+        dict: The environment and a result per benchmark.
+    """
+    results = {}
+    for name in sorted(BENCHMARKS):
+        if pattern in name:
+            results[name] = measure(BENCHMARKS[name], repeat, min_time)
+    return {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+
+
+def compare(results: dict, baseline: dict, threshold: float=0.2) -> List[tuple]:
+    """
+    Compare results with a baseline.
+
+    A benchmark only counts as changed beyond the noise its rounds showed: its threshold is raised to the
+    sum of the baseline's and the current spread where that is larger.
+
+    Returns:
+        list[tuple]: (name, baseline ns, current ns, relative change, status) per benchmark, where status
+            is 'regression', 'improvement', 'ok' or 'new'.
+    """
+    rows = []
+    for name, result in results["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            rows.append((name, None, result["ns_per_op"], None, "new"))
+            continue
+        change = result["ns_per_op"] / before["ns_per_op"] - 1
+        limit = max(threshold, before.get("spread", 0.0) + result.get("spread", 0.0))
+        status = "regression" if change > limit else "improvement" if change < -limit else "ok"
+        rows.append((name, before["ns_per_op"], result["ns_per_op"], change, status))
+    return rows
+
+
+def report(rows: List[tuple]) -> str:
+    lines = [f"{'benchmark':<24}{'baseline':>18}{'current':>18}{'change':>10}  status"]
+    for name, before, now, change, status in rows:
+        before_text = f"{before:,.1f} ns" if before is not None else "-"
+        change_text = f"{change:+.1%}" if change is not None else "-"
+        lines.append(f"{name:<24}{before_text:>18}{f'{now:,.1f} ns':>18}{change_text:>10}  {status}")
+    return "\n".join(lines)
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare with the baseline.")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose names contain this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(sorted(BENCHMARKS)))
+        return
+    # Keep benchmark games out of the session archive
+    os.environ["TICTACTOE_ARCHIVE"] = ""
+    results = run_all(args.filter, args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(dumps(results, indent=2) + "\n")
+
+    baseline: Union[dict, None] = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = loads(f.read())
+    rows = compare(results, baseline or {}, args.threshold)
+    print(report(rows))
+
+    if args.save_baseline:
+        merged = baseline or {}
+        merged.update({key: value for key, value in results.items() if key != "results"})
+        merged.setdefault("results", {}).update(results["results"])
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            f.write(dumps(merged, indent=2, sort_keys=True) + "\n")
+        print(f"\nbaseline saved to {args.baseline}")
+    elif any(status == "regression" for *_, status in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
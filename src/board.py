@@ -1,43 +1,91 @@
-from typing import List, Union
-from curses import window, A_REVERSE
-from src.utils import center
+from typing import Dict, List, Union
+from curses import A_REVERSE
+from src.screen import Screen
+from src.utils import center, clear_y, middle
+from src.variants import TIE, Rules
+
+
+# The eight winning lines of a 3x3 board as (row, col) triples
+WIN_LINES: List[tuple] = [tuple((row, col) for col in range(3)) for row in range(3)] + \
+    [tuple((row, col) for row in range(3)) for col in range(3)] + \
+    [((0, 0), (1, 1), (2, 2)), ((0, 2), (1, 1), (2, 0))]
+
+# The same lines as 9-bit masks over cells indexed row * 3 + col
+WIN_MASKS: List[int] = [sum(1 << (row * 3 + col) for row, col in line) for line in WIN_LINES]
 
 
 class Board:
+    _size: int = 3
+    _block: int = 1
     _board_width: int = 23
     _board_height: int = 11
     _cell_width: int = 8
     _cell_height: int = 4
     _board: List[List[str]] = [[' ']*3 for _ in range(3)]
 
-    def __init__(self, stdscr: window, x: int=None, y: int=None) -> None:
+    def __init__(self, stdscr: Screen, x: int=None, y: int=None, cells: List[List[str]]=None,
+                 rules: Union[Rules, None]=None) -> None:
         """
         Initialize a Board object.
 
         Args:
             x (int, optional): The x-coordinate of the top-left corner of the board. Defaults to None.
             y (int, optional): The y-coordinate of the top-left corner of the board. Defaults to None.
+            cells (list, optional): Initial cell values. If given, the board keeps its own copy instead of
+                sharing the class-wide board. Defaults to None.
+            rules (Rules, optional): The compiled tables of a rule variant (src.variants) deciding the game.
+                Defaults to None, which plays standard tic-tac-toe.
+
+        Raises:
+            ValueError: If the rules are for a board of another size.
         """
-        self.stdscr: window = stdscr
+        if rules is not None and (rules.rows, rules.cols) != (self._size, self._size):
+            raise ValueError(f"{rules.variant} doesn't fit a {self._size}x{self._size} board")
+        self.stdscr: Screen = stdscr
+        self.rules: Union[Rules, None] = rules
+        if cells is not None:
+            self._board = [list(row) for row in cells]
         # Set the coordinates of the top-left corner of the board
         self.x: int = center(stdscr, self._board_width) if x is None else x
-        self.y: int = center(stdscr, self._board_height) if y is None else y
+        self.y: int = middle(stdscr, self._board_height) if y is None else y
         # Generate the initial representation of the board
         self._lines: List[str] = self._generate_board()
+        # The attribute and label of each painted cell, restored when a highlight is undone
+        self._paint: Dict[tuple, tuple] = {}
 
     def _generate_board(self) -> list:
         """
         Generate the Unicode representation of the game board.
 
+        Separators between blocks of `_block` cells are drawn with double lines, all others with single
+        lines. The plain 3x3 board has a block size of 1, so every separator is a double line.
+
         Returns:
             list: The lines representing the game board.
         """
-        cross: chr = chr(0x256c)
-        horizontal: chr = chr(0x2550)
-        vertical: chr = chr(0x2551)
-        h_line: str = (horizontal * 7 + cross) * 2 + horizontal * 7
-        blank_line: str = (" " * 7 + vertical) * 2
-        return [blank_line] * 3 + [h_line] + [blank_line] * 3 + [h_line] + [blank_line] * 3
+        inner_width: int = self._cell_width - 1
+        inner_height: int = self._cell_height - 1
+        heavy: List[bool] = [(i + 1) % self._block == 0 for i in range(self._size - 1)]
+
+        def h_line(double: bool) -> str:
+            horizontal: chr = chr(0x2550) if double else chr(0x2500)
+            line: str = ""
+            for i in range(self._size - 1):
+                if double:
+                    cross: chr = chr(0x256c) if heavy[i] else chr(0x256a)
+                else:
+                    cross: chr = chr(0x256b) if heavy[i] else chr(0x253c)
+                line += horizontal * inner_width + cross
+            return line + horizontal * inner_width
+
+        blank_line: str = "".join(" " * inner_width + (chr(0x2551) if heavy[i] else chr(0x2502))
+                                  for i in range(self._size - 1))
+        lines: list = []
+        for i in range(self._size):
+            lines += [blank_line] * inner_height
+            if i < self._size - 1:
+                lines.append(h_line(heavy[i]))
+        return lines
 
     def is_empty(self, row: int, col: int) -> bool:
         """
@@ -52,6 +100,28 @@ class Board:
         """
         return self._board[row][col] == " "
 
+    def is_playable(self, row: int, col: int) -> bool:
+        """
+        Check if the current player may place a symbol in a cell.
+
+        Args:
+            row (int): The row index of the cell.
+            col (int): The column index of the cell.
+
+        Returns:
+            bool: True if the move is legal, False otherwise.
+        """
+        return self.is_empty(row, col)
+
+    def get_empty_cells(self) -> List[tuple]:
+        """
+        Get the empty cells of the board in row-major order.
+
+        Returns:
+            list[tuple[int, int]]: The row and column indices of every empty cell.
+        """
+        return [(row, col) for row in range(self._size) for col in range(self._size) if self.is_empty(row, col)]
+
     def clear_cell(self, row: int, col: int) -> None:
         self._board[row][col] = " "
 
@@ -68,15 +138,56 @@ class Board:
             bool: True if the cell is empty, False otherwise.
         """
         if self.is_empty(row, col):
-            y_offset: int = self.y + row * 4
-            x_offset: int = self.x + col * 8
-            for i in range(3):
+            y_offset, x_offset = self._cell_origin(row, col)
+            blank: str = " " * (self._cell_width - 1)
+            for i in range(self._cell_height - 1):
                 if undo:
-                    self.stdscr.addstr(y_offset + i, x_offset, "       ")
+                    self.stdscr.addstr(y_offset + i, x_offset, blank)
                 else:
-                    self.stdscr.addstr(y_offset + i, x_offset, "       ", A_REVERSE)
+                    self.stdscr.addstr(y_offset + i, x_offset, blank, A_REVERSE)
+            if undo and (row, col) in self._paint:
+                self.paint_cell(row, col, *self._paint[row, col])
             self.stdscr.refresh()
 
+    def paint_cell(self, row: int, col: int, attr: int, label: str="") -> None:
+        """
+        Fill a cell with an attribute, leaving the position of its symbol alone, and write a label on its
+        bottom line if the cell is tall enough. Call `refresh` afterwards.
+
+        Args:
+            row (int): The row index of the cell.
+            col (int): The column index of the cell.
+            attr (int): The attribute to fill with; 0 with no label unpaints the cell.
+            label (str, optional): Text centred on the bottom line. Defaults to "".
+        """
+        y_offset, x_offset = self._cell_origin(row, col)
+        width = self._cell_width - 1
+        symbol_y, symbol_x = (self._cell_height - 1) // 2, (self._cell_width - 1) // 2
+        for i in range(self._cell_height - 1):
+            line = label[:width].center(width) if label and i == self._cell_height - 2 != symbol_y else " " * width
+            if i == symbol_y:
+                self.stdscr.addstr(y_offset + i, x_offset, line[:symbol_x], attr)
+                self.stdscr.addstr(y_offset + i, x_offset + symbol_x + 1, line[symbol_x + 1:], attr)
+            else:
+                self.stdscr.addstr(y_offset + i, x_offset, line, attr)
+        if attr or label:
+            self._paint[row, col] = (attr, label)
+        else:
+            self._paint.pop((row, col), None)
+
+    def _cell_origin(self, row: int, col: int) -> tuple:
+        """
+        Get the screen coordinates of the top-left character inside a cell.
+
+        Args:
+            row (int): The row index of the cell.
+            col (int): The column index of the cell.
+
+        Returns:
+            tuple: The y and x coordinates of the cell's top-left corner.
+        """
+        return self.y + row * self._cell_height, self.x + col * self._cell_width
+
     def in_bounds(self, x: int, y: int) -> bool:
         """
         Check if the given coordinates are within the boundaries of the board.
@@ -128,6 +239,14 @@ class Board:
         """
         self._board[row][col] = player
 
+    def show_status(self, text: str) -> None:
+        """
+        Show a status message, such as whose turn it is, on the line below the board.
+        """
+        y = self.get_board_height() + self.y + 2
+        clear_y(self.stdscr, y)
+        self.stdscr.addstr(y, center(self.stdscr, len(text)), text)
+
     def draw_board(self) -> None:
         """
         Draw the game board on the screen.
@@ -142,7 +261,8 @@ class Board:
         """
         for i, row in enumerate(self._board):
             for j, val in enumerate(row):
-                self.stdscr.addstr(self.y + 1 + self._cell_height * i, self.x + 3 + self._cell_width * j, val)
+                y_offset, x_offset = self._cell_origin(i, j)
+                self.stdscr.addstr(y_offset + (self._cell_height - 1) // 2, x_offset + (self._cell_width - 1) // 2, val)
         self.stdscr.refresh()
 
     def get_winner(self) -> Union[str, None]:
@@ -151,22 +271,18 @@ class Board:
 
         Returns:
             str | None: The symbol of the winning player or 'tie' if there's a tie, or None if no winner.
+                Under rules whose players share symbols, the winner is named by `rules.players`.
         """
-        # Check rows
-        for row in self._board:
-            if len(set(row)) == 1 and row[0] != ' ':
-                return row[0]
-
-        # Check columns
-        for col in range(3):
-            if len(set([self._board[row][col] for row in range(3)])) == 1 and self._board[0][col] != ' ':
-                return self._board[0][col]
+        if self.rules is not None:
+            result = self.rules.outcome(*self.rules.encode(self._board))
+            if result is None:
+                return None
+            return "tie" if result == TIE else self.rules.players[result]
 
-        # Check diagonals
-        if self._board[0][0] == self._board[1][1] == self._board[2][2] != ' ':
-            return self._board[0][0]
-        if self._board[0][2] == self._board[1][1] == self._board[2][0] != ' ':
-            return self._board[0][2]
+        # Check rows, columns and diagonals
+        for (r1, c1), (r2, c2), (r3, c3) in WIN_LINES:
+            if self._board[r1][c1] == self._board[r2][c2] == self._board[r3][c3] != ' ':
+                return self._board[r1][c1]
 
         # Check for tie
         if all(self._board[i][j] != ' ' for i in range(3) for j in range(3)):
@@ -174,25 +290,25 @@ class Board:
 
         return None
 
-    @staticmethod
-    def get_board_width() -> int:
+    @classmethod
+    def get_board_width(cls) -> int:
         """
         Get the width of the game board.
 
         Returns:
             int: The width of the game board.
         """
-        return Board._board_width
+        return cls._board_width
 
-    @staticmethod
-    def get_board_height() -> int:
+    @classmethod
+    def get_board_height(cls) -> int:
         """
         Get the height of the game board.
 
         Returns:
             int: The height of the game board.
         """
-        return Board._board_height
+        return cls._board_height
 
     @staticmethod
     def clear_board() -> None:
@@ -1,11 +1,12 @@
-from curses import window, A_REVERSE
-from time import sleep
+from curses import A_REVERSE
 from typing import Union
 
+from src.screen import Screen
+
 class Button:
     _sleep_time: float = 0.1
 
-    def __init__(self, stdscr: window, label: str, x: int, y: int, parameter: Union[str, None]=None) -> None:
+    def __init__(self, stdscr: Screen, label: str, x: int, y: int, parameter: Union[str, None]=None) -> None:
         """
         Initialize a Button object.
 
@@ -15,7 +16,7 @@ class Button:
             y (int): The y-coordinate of the top-left corner of the button.
             parameter (str, optional): The parameter associated with the button. Defaults to None.
         """
-        self.stdscr: window = stdscr
+        self.stdscr: Screen = stdscr
         self.parameter: str = parameter if parameter is not None else label
         self.label: str = label
         self.x: int = x
@@ -71,10 +72,10 @@ class Button:
         for _ in range(2):
             self.draw(hl=True)  # Highlight the button
             self.stdscr.refresh()
-            sleep(self._sleep_time)
+            self.stdscr.nap(self._sleep_time)
             self.draw(hl=False)  # Unhighlight the button
             self.stdscr.refresh()
-            sleep(self._sleep_time)
+            self.stdscr.nap(self._sleep_time)
 
     def in_bounds(self, x: int, y: int) -> bool:
         """
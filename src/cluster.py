@@ -0,0 +1,433 @@
+"""
+Run the match server on several cores: a supervisor forks worker processes that share the listening
+port through SO_REUSEPORT, so the kernel spreads incoming connections across them.
+
+Pairing is the one thing workers can't do alone, since the two players of a match may arrive at
+different workers. Each worker hands an unpaired connection's descriptor to the supervisor over a Unix
+socket (SCM_RIGHTS); the supervisor keeps the lobby and passes each pair back to the worker that sent the
+second player, so a match lives entirely in one worker. The supervisor restarts workers that die.
+
+Usage:
+    python -m src.cluster serve --workers 4 --pin
+    python -m src.cluster scale --workers 1,2,4,8 --clients 2000 --out scaling.json
+"""
+import argparse
+import asyncio
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from json import dumps
+from typing import Dict, List, Union
+
+from src.match_server import MatchServer, load
+from src.net import decode, encode
+
+
+READY: bytes = b"ready"
+LOBBY: bytes = b"lobby"
+MATCH: bytes = b"match"
+
+
+class Lobby:
+    """
+    Pairs connections in arrival order, across all workers.
+    """
+    def __init__(self) -> None:
+        self.waiting: Union[socket.socket, None] = None
+        self.paired: int = 0
+
+    def arrive(self, sock: socket.socket) -> Union[tuple, None]:
+        """
+        Add a player.
+
+        Returns:
+            tuple | None: The two sockets of a new match, or None if the player has to wait.
+        """
+        self.serve_waiting()
+        if self.waiting is None:
+            self.waiting = sock
+            return None
+        pair, self.waiting = (self.waiting, sock), None
+        self.paired += 1
+        return pair
+
+    def serve_waiting(self) -> None:
+        """
+        Answer the waiting player's pings, and forget the player if they hung up.
+
+        Only whole lines are taken off the socket, so whatever follows is left for the match.
+        """
+        while self.waiting is not None:
+            try:
+                data = self.waiting.recv(4096, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self.waiting.close()
+                self.waiting = None
+                return
+            end = data.find(b"\n")
+            if end < 0:
+                return
+            line = self.waiting.recv(end + 1, socket.MSG_DONTWAIT)
+            try:
+                message = decode(line)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and "ping" in message:
+                try:
+                    self.waiting.send(encode({"pong": message["ping"]}), socket.MSG_DONTWAIT)
+                except OSError:
+                    pass
+
+
+async def _serve_worker(host: str, port: int, channel: socket.socket, options: dict) -> None:
+    match_server = MatchServer(**options)
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+    matches = set()
+
+    sending = asyncio.Lock()
+
+    async def send_to_lobby(fd: int, timeout: float=5.0) -> None:
+        # Wait for room on the channel without stalling the matches this worker is running
+        deadline = loop.time() + timeout
+        async with sending:
+            while True:
+                try:
+                    socket.send_fds(channel, [LOBBY], [fd])
+                    return
+                except BlockingIOError:
+                    pass
+                writable = loop.create_future()
+                loop.add_writer(channel.fileno(), lambda: writable.done() or writable.set_result(None))
+                try:
+                    await asyncio.wait_for(writable, deadline - loop.time())
+                finally:
+                    loop.remove_writer(channel.fileno())
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        match_server.connections += 1
+        try:
+            # The supervisor holds its own descriptor once this returns, so ours can go
+            await send_to_lobby(writer.get_extra_info("socket").fileno())
+        except (OSError, asyncio.TimeoutError):
+            # A supervisor too busy or gone to take the player
+            match_server.rejected += 1
+        writer.close()
+
+    async def play(socks: List[socket.socket]) -> None:
+        players = [await asyncio.open_connection(sock=sock) for sock in socks]
+        await match_server.play_match(players)
+
+    def on_channel() -> None:
+        try:
+            message, fds, _, _ = socket.recv_fds(channel, 64, 2)
+        except (BlockingIOError, socket.timeout):
+            return
+        if not message:
+            # The supervisor is gone
+            if not stopped.done():
+                stopped.set_result(None)
+            return
+        task = loop.create_task(play([socket.socket(fileno=fd) for fd in fds]))
+        matches.add(task)
+        task.add_done_callback(matches.discard)
+
+    loop.add_reader(channel.fileno(), on_channel)
+    server = await asyncio.start_server(handle, host, port, reuse_port=True, backlog=4096)
+    channel.send(READY)
+    async with server:
+        await stopped
+
+
+def _worker(index: int, host: str, port: int, channel: socket.socket, pin: bool, options: dict) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # The supervisor stops its workers itself on Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if pin and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+    # The event loop waits on the channel, so neither sends nor receives may block it
+    channel.setblocking(False)
+    asyncio.run(_serve_worker(host, port, channel, options))
+
+
+class Supervisor:
+    """
+    Forks and restarts the workers, and runs the lobby.
+
+    Args:
+        workers (int): Worker processes.
+        host (str, optional): The address to listen on. Defaults to "0.0.0.0".
+        port (int, optional): The port; 0 picks a free one. Defaults to 12345.
+        pin (bool, optional): Pin worker i to the i-th CPU this process may run on. Defaults to False.
+        **options: Passed to each worker's MatchServer.
+    """
+    def __init__(self, workers: int, host: str="0.0.0.0", port: int=12345, pin: bool=False, **options) -> None:
+        self.workers: int = workers
+        self.host: str = host
+        self.pin: bool = pin
+        self.options: dict = options
+        self.lobby: Lobby = Lobby()
+        self.restarts: int = 0
+        self.pids: Dict[int, int] = {}
+        self.channels: Dict[int, socket.socket] = {}
+        # Matches waiting to be handed to each worker
+        self.outboxes: Dict[int, deque] = {}
+        self.selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self.running: bool = False
+        # Bound but never listening: it claims the port (and picks one for port 0) so workers can join it
+        self.reservation: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.reservation.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.reservation.bind((host, port))
+        self.port: int = self.reservation.getsockname()[1]
+
+    def _spawn(self, index: int) -> None:
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pid = os.fork()
+        if pid == 0:
+            ours.close()
+            # Descriptors the worker mustn't keep alive: other channels, the port, players in the lobby
+            for channel in self.channels.values():
+                channel.close()
+            self.reservation.close()
+            if self.lobby.waiting is not None:
+                self.lobby.waiting.close()
+            for outbox in self.outboxes.values():
+                for pair in outbox:
+                    for sock in pair:
+                        sock.close()
+            try:
+                _worker(index, self.host, self.port, theirs, self.pin, self.options)
+            finally:
+                os._exit(0)
+        theirs.close()
+        # Wait until the worker listens, so no connection meets the port with nobody accepting
+        ours.settimeout(10.0)
+        try:
+            ours.recv(len(READY))
+        except socket.timeout:
+            pass
+        ours.setblocking(False)
+        self.pids[pid] = index
+        self.channels[index] = ours
+        self.outboxes[index] = deque()
+        self.selector.register(ours, selectors.EVENT_READ, index)
+
+    def _on_channel(self, index: int, events: int) -> None:
+        channel = self.channels[index]
+        if events & selectors.EVENT_WRITE:
+            self._flush(index)
+        if not events & selectors.EVENT_READ:
+            return
+        while index in self.channels:
+            try:
+                message, fds, _, _ = socket.recv_fds(channel, 64, 2)
+            except BlockingIOError:
+                return
+            except OSError:
+                message, fds = b"", []
+            if not message:
+                # The worker died; waitpid restarts it
+                self.selector.unregister(channel)
+                return
+            for fd in fds:
+                waiting = self.lobby.waiting
+                pair = self.lobby.arrive(socket.socket(fileno=fd))
+                self._watch_lobby(waiting)
+                if pair is not None:
+                    self.outboxes[index].append(pair)
+                    self._flush(index)
+
+    def _watch_lobby(self, previous: Union[socket.socket, None]) -> None:
+        # Listen to whoever waits in the lobby, so their pings are answered and a hang-up is noticed
+        if previous is self.lobby.waiting:
+            return
+        if previous is not None:
+            try:
+                self.selector.unregister(previous)
+            except (KeyError, ValueError):
+                pass
+        if self.lobby.waiting is not None:
+            self.selector.register(self.lobby.waiting, selectors.EVENT_READ, None)
+
+    def _flush(self, index: int) -> None:
+        # Never block on a worker: it may itself be blocked handing us a player
+        channel, outbox = self.channels[index], self.outboxes[index]
+        while outbox:
+            try:
+                socket.send_fds(channel, [MATCH], [sock.fileno() for sock in outbox[0]])
+            except BlockingIOError:
+                break
+            except OSError:
+                pass
+            for sock in outbox.popleft():
+                sock.close()
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if outbox else 0)
+        if self.selector.get_key(channel).events != events:
+            self.selector.modify(channel, events, index)
+
+    def _reap(self) -> None:
+        while self.pids:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            index = self.pids.pop(pid, None)
+            if index is None:
+                continue
+            channel = self.channels.pop(index)
+            try:
+                self.selector.unregister(channel)
+            except KeyError:
+                pass
+            channel.close()
+            for pair in self.outboxes.pop(index):
+                for sock in pair:
+                    sock.close()
+            if self.running:
+                print(f"worker {index} (pid {pid}) exited, restarting", file=sys.stderr, flush=True)
+                self.restarts += 1
+                self._spawn(index)
+
+    def run(self) -> None:
+        """
+        Start the workers, unless `start` already has, and supervise them until `stop` is called or a
+        SIGTERM or SIGINT arrives.
+        """
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        if not self.running:
+            self.start()
+        try:
+            while self.running:
+                for key, events in self.selector.select(timeout=0.2):
+                    if key.data is None:
+                        waiting = self.lobby.waiting
+                        self.lobby.serve_waiting()
+                        self._watch_lobby(waiting)
+                    elif self.channels.get(key.data) is key.fileobj:
+                        self._on_channel(key.data, events)
+                self._reap()
+        finally:
+            self.shutdown()
+
+    def start(self) -> None:
+        """
+        Start the workers, returning once all of them are listening.
+        """
+        self.running = True
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def stop(self) -> None:
+        self.running = False
+
+    def shutdown(self) -> None:
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.pids):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.pids.clear()
+        for channel in self.channels.values():
+            channel.close()
+        self.channels.clear()
+        self.reservation.close()
+
+
+def _load_share(args: tuple) -> dict:
+    return asyncio.run(load(*args))
+
+
+def scaling(workers: List[int], clients: int=2000, games: int=1, think: float=0.0, loaders: int=None,
+            pin: bool=False) -> List[dict]:
+    """
+    Measure a local cluster at each worker count, with the load spread over several processes.
+
+    Args:
+        workers (list[int]): Worker counts to measure.
+        clients (int, optional): Simulated players in all. Defaults to 2000.
+        games (int, optional): Games per player. Defaults to 1.
+        think (float, optional): Seconds players think per move. Defaults to 0.
+        loaders (int, optional): Load generator processes. Defaults to the CPU count.
+        pin (bool, optional): Pin the workers to CPUs. Defaults to False.
+
+    Returns:
+        list[dict]: Per worker count: connections and moves per second, games, and errors.
+    """
+    loaders = loaders or os.cpu_count() or 1
+    rows = []
+    for count in workers:
+        command = [sys.executable, "-m", "src.cluster", "serve", "--host", "127.0.0.1", "--port", "0",
+                   "--workers", str(count)] + (["--pin"] if pin else [])
+        server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline().rsplit(":", 1)[1])
+            shares = [(clients // loaders + (i < clients % loaders), games, think, "127.0.0.1", port, i)
+                      for i in range(loaders)]
+            with ProcessPoolExecutor(loaders) as pool:
+                reports = list(pool.map(_load_share, shares))
+        finally:
+            server.terminate()
+            server.wait()
+        duration = max(report["duration_s"] for report in reports)
+        connections = sum(report["connections"] for report in reports)
+        moves = sum(report["moves"] for report in reports)
+        rows.append({"workers": count, "duration_s": duration,
+                     "connections_per_sec": round(connections / duration, 1),
+                     "moves_per_sec": round(moves / duration, 1),
+                     "games": sum(report["games"] for report in reports),
+                     "errors": sum(sum(report["errors"].values()) for report in reports)})
+    return rows
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Match server on several worker processes.")
+    parser.add_argument("command", choices=["serve", "scale"])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--workers", default=str(os.cpu_count() or 1),
+                        help="worker processes; scale: a comma-separated list of counts")
+    parser.add_argument("--pin", action="store_true", help="pin each worker to a CPU")
+    parser.add_argument("--clients", type=int, default=2000, help="scale: simulated players")
+    parser.add_argument("--games", type=int, default=1, help="scale: games per player")
+    parser.add_argument("--think", type=float, default=0.0, help="scale: seconds each player thinks per move")
+    parser.add_argument("--loaders", type=int, help="scale: load generator processes (default: CPU count)")
+    parser.add_argument("--out", help="scale: write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        supervisor = Supervisor(int(args.workers), args.host, args.port, args.pin)
+        supervisor.start()
+        print(f"listening on {args.host}:{supervisor.port}", flush=True)
+        supervisor.run()
+        return
+    rows = scaling([int(count) for count in args.workers.split(",")], args.clients, args.games, args.think,
+                   args.loaders, args.pin)
+    print(f"{'workers':>8}{'conn/s':>10}{'moves/s':>10}{'games':>8}{'errors':>8}")
+    for row in rows:
+        print(f"{row['workers']:>8}{row['connections_per_sec']:>10,.0f}{row['moves_per_sec']:>10,.0f}"
+              f"{row['games']:>8}{row['errors']:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(dumps(rows, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
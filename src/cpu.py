@@ -0,0 +1,103 @@
+import random
+from random import Random
+from types import ModuleType
+from typing import Union
+
+from src.board import Board
+
+
+def winning_move(board: Board, player: str) -> Union[tuple, None]:
+    """
+    Find a move that wins the game on the spot for the given player. The board is left unchanged.
+
+    Args:
+        board (Board): The game board.
+        player (str): The symbol representing the player.
+
+    Returns:
+        tuple | None: The row and column indices of a winning move, or None if there is none.
+    """
+    for row, col in board.get_empty_cells():
+        board.update_board(player, row, col)
+        winner = board.get_winner()
+        # Reset the move, it was only a probe
+        board.clear_cell(row, col)
+        if winner == player:
+            return row, col
+    return None
+
+
+def try_to_win(board: Board, player: str) -> bool:
+    """
+    Attempt to make a winning move for the given player.
+
+    Args:
+        board (Board): The game board.
+        player (str): The symbol representing the player.
+
+    Returns:
+        bool: True if a winning move was made, False otherwise.
+    """
+    move = winning_move(board, player)
+    if move is None:
+        return False
+    board.update_board(player, *move)
+    return True
+
+
+def try_to_block(board: Board, player: str, opponent: str) -> bool:
+    """
+    Attempt to block the opponent from winning.
+
+    Args:
+        board (Board): The game board.
+        player (str): The symbol representing the blocking player.
+        opponent (str): The symbol representing the opponent.
+
+    Returns:
+        bool: True if a blocking move was made, False otherwise.
+    """
+    move = winning_move(board, opponent)
+    if move is None:
+        return False
+    board.update_board(player, *move)
+    return True
+
+
+def choose_move(board: Board, player: str, opponent: str,
+                rng: Union[Random, ModuleType]=random) -> Union[tuple, None]:
+    """
+    Choose the CPU's move without playing it: win if possible, otherwise block, otherwise a random
+    empty cell.
+
+    Args:
+        board (Board): The game board.
+        player (str): The symbol representing the computer player.
+        opponent (str): The symbol representing the other player.
+        rng (Random, optional): The random generator picking among the empty cells. Defaults to the
+            random module.
+
+    Returns:
+        tuple | None: The row and column indices of the move, or None if the board is full.
+    """
+    move = winning_move(board, player)
+    if move is None:
+        move = winning_move(board, opponent)
+    if move is None:
+        empty_cells = board.get_empty_cells()
+        if empty_cells:
+            move = rng.choice(empty_cells)
+    return move
+
+
+def computer_move(board: Board, player: str, opponent: str) -> Union[tuple, None]:
+    """
+    Choose the CPU's move with choose_move and play it.
+
+    Returns:
+        tuple | None: The row and column indices of the move, or None if the board is full.
+    """
+    move = choose_move(board, player, opponent)
+    if move is not None:
+        board.update_board(player, *move)
+    return move
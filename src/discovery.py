@@ -0,0 +1,384 @@
+"""
+Finding and reaching hosts on the local network.
+
+A hosting player's `Announcer` broadcasts a datagram every second to DISCOVERY_PORT:
+
+    {"game": "tic-tac-toe", "version": 1, "id": "<random>", "name": "<hostname>", "port": 12345,
+     "addresses": ["192.168.1.20", "fe80::1%eth0", ...]}
+
+A joining player's `Browser` listens for them and keeps a live list of hosts, forgetting any not heard from
+for a few seconds. The address a datagram came from is tried first, then the addresses the host listed.
+
+`connect_any` reaches a host by racing its addresses, happy-eyeballs style (RFC 8305): IPv6 and IPv4
+addresses are interleaved, a new attempt starts every `delay` seconds or as soon as the previous one fails,
+and the first connection made wins. `HostCache` remembers the hosts joined recently, so they are listed,
+and reconnected to with a single Enter, before any announcement arrives.
+
+Usage:
+    python -m src.discovery browse
+    python -m src.discovery announce --port 12345
+"""
+import argparse
+import json
+import os
+import secrets
+import socket
+import threading
+from queue import Empty, SimpleQueue
+from time import monotonic, sleep, time
+from typing import Callable, Dict, List, Union
+
+from src.net import decode, encode
+
+
+DISCOVERY_PORT: int = 12346
+GAME_PORT: int = 12345
+ANNOUNCE_INTERVAL: float = 1.0
+HOST_EXPIRY: float = 3.5
+ATTEMPT_DELAY: float = 0.25
+CONNECT_TIMEOUT: float = 5.0
+RECENT_HOSTS: int = 8
+
+DEFAULT_CACHE: str = os.path.join(os.path.expanduser("~"), ".tic-tac-toe", "hosts.json")
+
+
+def local_addresses() -> List[str]:
+    """
+    Get this machine's addresses other joiners might reach it on, IPv6 included.
+    """
+    try:
+        infos = socket.getaddrinfo(socket.gethostname(), None, type=socket.SOCK_STREAM)
+    except OSError:
+        return []
+    addresses = []
+    for family, _, _, _, sockaddr in infos:
+        address = sockaddr[0]
+        if address not in addresses and not address.startswith("127.") and address != "::1":
+            addresses.append(address)
+    return addresses
+
+
+class Announcer:
+    """
+    Broadcast that a game is waiting for a player, from a background thread, until stopped.
+
+    Args:
+        port (int): The port the game is listening on.
+        name (str, optional): The name joiners see. Defaults to the host name.
+        targets (list, optional): Where to send announcements. Defaults to the IPv4 broadcast address on
+            DISCOVERY_PORT.
+        interval (float, optional): Seconds between announcements. Defaults to ANNOUNCE_INTERVAL.
+    """
+    def __init__(self, port: int, name: Union[str, None]=None, targets: Union[List[tuple], None]=None,
+                 interval: float=ANNOUNCE_INTERVAL) -> None:
+        self.message: dict = {"game": "tic-tac-toe", "version": 1, "id": secrets.token_hex(8),
+                              "name": name or socket.gethostname(), "port": port, "addresses": local_addresses()}
+        self.targets: List[tuple] = targets or [("255.255.255.255", DISCOVERY_PORT)]
+        self.interval: float = interval
+        self.sent: int = 0
+        self._stop: threading.Event = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+
+    def start(self) -> "Announcer":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            data = encode(self.message)
+            while True:
+                for target in self.targets:
+                    try:
+                        s.sendto(data, target)
+                        self.sent += 1
+                    except OSError:
+                        # No network, or no route to broadcast on; keep trying quietly
+                        pass
+                if self._stop.wait(self.interval):
+                    return
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "Announcer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class Host:
+    """
+    A host heard from, or remembered.
+
+    Attributes:
+        addresses (list[str]): The addresses to try, best first.
+        recent (float): When the host was last joined, or 0 if never.
+    """
+    def __init__(self, name: str, addresses: List[str], port: int, seen: float=0.0, recent: float=0.0) -> None:
+        self.name: str = name
+        self.addresses: List[str] = addresses
+        self.port: int = port
+        self.seen: float = seen
+        self.recent: float = recent
+
+    def candidates(self) -> List[tuple]:
+        return [(address, self.port) for address in self.addresses]
+
+    def __repr__(self) -> str:
+        return f"Host({self.name!r}, {self.addresses}, {self.port})"
+
+
+class Browser:
+    """
+    Listen for announcements without blocking, for a join screen to poll while it waits for input.
+
+    Args:
+        port (int, optional): The port to listen on; 0 picks a free one. Defaults to DISCOVERY_PORT.
+        expiry (float, optional): Seconds without an announcement before a host is dropped. Defaults to
+            HOST_EXPIRY.
+        clock (callable, optional): The time source. Defaults to `time.monotonic`.
+    """
+    def __init__(self, port: int=DISCOVERY_PORT, expiry: float=HOST_EXPIRY,
+                 clock: Callable[[], float]=monotonic) -> None:
+        self.expiry: float = expiry
+        self.clock: Callable[[], float] = clock
+        self.hosts: Dict[str, Host] = {}
+        self.socket: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Several joiners on one machine can all listen
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            self.socket.bind(("", port))
+        except OSError:
+            self.socket.close()
+            raise
+        self.socket.setblocking(False)
+        self.port: int = self.socket.getsockname()[1]
+
+    def poll(self) -> List[Host]:
+        """
+        Take in the announcements that arrived and drop hosts gone quiet.
+
+        Returns:
+            list[Host]: The hosts currently announcing, by name.
+        """
+        now = self.clock()
+        while True:
+            try:
+                data, (source, _) = self.socket.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            try:
+                message = decode(data)
+                if message.get("game") != "tic-tac-toe":
+                    continue
+                key, name, port = str(message["id"]), str(message["name"]), int(message["port"])
+                listed = [str(address) for address in message.get("addresses", [])]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            # The address the announcement came from is known to be reachable from here
+            addresses = [source] + [address for address in listed if address != source]
+            self.hosts[key] = Host(name, addresses, port, seen=now)
+        for key in [key for key, host in self.hosts.items() if now - host.seen > self.expiry]:
+            del self.hosts[key]
+        return sorted(self.hosts.values(), key=lambda host: host.name)
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+class HostCache:
+    """
+    The hosts joined most recently, kept in a JSON file.
+
+    Args:
+        path (str): The cache file.
+        size (int, optional): How many hosts to keep. Defaults to RECENT_HOSTS.
+    """
+    def __init__(self, path: str, size: int=RECENT_HOSTS) -> None:
+        self.path: str = path
+        self.size: int = size
+
+    def hosts(self) -> List[Host]:
+        """
+        Get the remembered hosts, most recent first; an unreadable file counts as empty.
+        """
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            return [Host(str(entry["name"]), [str(entry["address"])], int(entry["port"]), recent=float(entry["used"]))
+                    for entry in entries]
+        except (OSError, ValueError, KeyError, TypeError):
+            return []
+
+    def remember(self, name: str, address: str, port: int) -> None:
+        """
+        Put a host at the front of the cache, with the address that just worked.
+        """
+        entries = [{"name": name, "address": address, "port": port, "used": time()}]
+        for host in self.hosts():
+            if host.name != name and (host.addresses[0], host.port) != (address, port):
+                entries.append({"name": host.name, "address": host.addresses[0], "port": host.port,
+                                "used": host.recent})
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first, so a crash never leaves half a cache
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(entries[:self.size], f)
+        os.replace(temporary, self.path)
+
+
+def default_cache() -> Union[HostCache, None]:
+    """
+    Get the cache at `$TICTACTOE_HOSTS`, or ~/.tic-tac-toe/hosts.json; None if the variable is empty.
+    """
+    path = os.environ.get("TICTACTOE_HOSTS", DEFAULT_CACHE)
+    return HostCache(path) if path else None
+
+
+def merge_hosts(recent: List[Host], found: List[Host]) -> List[Host]:
+    """
+    List remembered hosts first, then the rest of those announcing. A remembered host that is announcing
+    keeps its last working address first and gains the announced ones.
+    """
+    merged = []
+    found_by_name = {host.name: host for host in found}
+    for host in recent:
+        live = found_by_name.pop(host.name, None)
+        if live is not None:
+            addresses = host.addresses + [address for address in live.addresses if address not in host.addresses]
+            host = Host(host.name, addresses, live.port, seen=live.seen, recent=host.recent)
+        merged.append(host)
+    return merged + [host for host in found if host.name in found_by_name]
+
+
+def resolve(candidates: List[tuple]) -> List[tuple]:
+    """
+    Resolve (host, port) pairs to (family, sockaddr) pairs, ordered for racing: IPv6 and IPv4 alternate,
+    IPv6 first, each family keeping the order of the candidates.
+
+    Raises:
+        OSError: If no candidate resolves.
+    """
+    by_family: Dict[int, List[tuple]] = {socket.AF_INET6: [], socket.AF_INET: []}
+    error: Union[OSError, None] = None
+    for host, port in candidates:
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            error = e
+            continue
+        for family, _, _, _, sockaddr in infos:
+            if family in by_family and (family, sockaddr) not in by_family[family]:
+                by_family[family].append((family, sockaddr))
+    six, four = by_family[socket.AF_INET6], by_family[socket.AF_INET]
+    ordered = [address for pair in zip(six, four) for address in pair]
+    ordered += six[len(four):] + four[len(six):]
+    if not ordered:
+        raise error or OSError("No addresses to connect to")
+    return ordered
+
+
+def connect_any(addresses: List[tuple], sockets: Callable[..., socket.socket]=socket.socket,
+                delay: float=ATTEMPT_DELAY, timeout: float=CONNECT_TIMEOUT) -> tuple:
+    """
+    Connect to the first of several addresses to answer, starting a new attempt every `delay` seconds or
+    as soon as one fails. Connections that lose the race are closed.
+
+    Args:
+        addresses (list): (family, sockaddr) pairs in the order to try them, as from `resolve`.
+        sockets (callable, optional): Creates the sockets. Defaults to `socket.socket`.
+        delay (float, optional): Seconds before starting the next attempt. Defaults to ATTEMPT_DELAY.
+        timeout (float, optional): Seconds each attempt may take. Defaults to CONNECT_TIMEOUT.
+
+    Returns:
+        tuple: The connected socket, in blocking mode, and the sockaddr it reached.
+
+    Raises:
+        OSError: The last attempt's error if every attempt failed, e.g. TimeoutError.
+    """
+    results: SimpleQueue = SimpleQueue()
+
+    def attempt(family: int, sockaddr: tuple) -> None:
+        # Always post a result, even if the socket can't be created, or the race waits forever
+        s = None
+        try:
+            s = sockets(family, socket.SOCK_STREAM)
+            s.settimeout(timeout)
+            s.connect(sockaddr)
+        except Exception as e:
+            if s is not None:
+                s.close()
+            results.put((None, sockaddr, e))
+        else:
+            results.put((s, sockaddr, None))
+
+    started = pending = 0
+    error: Union[Exception, None] = None
+    while True:
+        if started < len(addresses):
+            threading.Thread(target=attempt, args=addresses[started], daemon=True).start()
+            started += 1
+            pending += 1
+        try:
+            # Wait for a result, or until it's time to start the next attempt
+            s, sockaddr, e = results.get(timeout=delay if started < len(addresses) else None)
+        except Empty:
+            continue
+        pending -= 1
+        if s is not None:
+            break
+        error = e
+        if not pending and started == len(addresses):
+            raise error
+
+    def close_losers(count: int) -> None:
+        for _ in range(count):
+            loser, _, _ = results.get()
+            if loser is not None:
+                loser.close()
+
+    if pending:
+        threading.Thread(target=close_losers, args=(pending,), daemon=True).start()
+    s.settimeout(None)
+    return s, sockaddr
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Announce or look for games on the local network.")
+    parser.add_argument("command", choices=["browse", "announce"])
+    parser.add_argument("--port", type=int, default=GAME_PORT, help="the game port to announce")
+    parser.add_argument("--name", help="the name to announce (default: the host name)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "announce":
+            with Announcer(args.port, args.name):
+                print(f"announcing port {args.port} on UDP {DISCOVERY_PORT}; Ctrl-C to stop")
+                while True:
+                    sleep(1)
+        browser = Browser()
+        print(f"listening on UDP {DISCOVERY_PORT}; Ctrl-C to stop")
+        shown = None
+        while True:
+            hosts = [(host.name, tuple(host.addresses), host.port) for host in browser.poll()]
+            if hosts != shown:
+                print(", ".join(f"{name} {addresses[0]}:{port}" for name, addresses, port in hosts) or "(none)")
+                shown = hosts
+            sleep(0.25)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,74 @@
 import curses
-from time import sleep
-from typing import List, Union
+from time import monotonic_ns
+from typing import Callable, List, Union
 import socket
-from json import loads, dumps
-from random import choice, randint
+from random import Random, choice, randint
 import sys
 from platform import system
 
+from src.analysis import AnalysisOverlay
 from src.board import Board
 from src.button import Button
+from src.ultimate import UltimateBoard, mcts
+from src.qubic import QubicBoard, search
 import src.utils as utils
+import src.profiling as profiling
+import src.flight as flight
+from src.cpu import computer_move
+from src.protocol import ExternalEngine, ProtocolError
+from src.record import GameRecorder
+from src.opening_book import OpeningBook
+from src.value_table import ValueTable
+from src.screen import Screen
+from src.net import HEARTBEAT_INTERVAL, PEER_TIMEOUT, BadMessage, Heartbeat, PeerTimeout, encode, parse_move
+from src.discovery import GAME_PORT, Announcer, Browser, Host, connect_any, default_cache, merge_hosts, resolve
+from src.variants import OWN, SYMBOLS, Rules, load_rules
+from src.puzzles import PuzzleBook, load_puzzles
+
+
+# How long input waits before an online game services its connection
+IDLE_MS: int = 250
+
+
+def play_game(stdscr: Screen, engine: Union[ExternalEngine, None]=None,
+              book: Union[OpeningBook, None]=None,
+              sockets: Callable[..., socket.socket]=socket.socket, heartbeat: float=HEARTBEAT_INTERVAL,
+              peer_timeout: float=PEER_TIMEOUT, analysis: bool=False, variant: str="standard",
+              values: Union[ValueTable, None]=None, discovery: bool=True,
+              puzzles: Union[PuzzleBook, None]=None) -> None:
+    """
+    Run the game until the player quits.
 
+    Args:
+        engine (ExternalEngine, optional): An external engine to play the CPU's moves. Defaults to None,
+            which uses the built-in win/block/random strategy.
+        book (OpeningBook, optional): An opening book the CPU plays from before thinking. Defaults to None.
+        sockets (callable, optional): Creates the sockets of online games. Defaults to `socket.socket`.
+        heartbeat (float, optional): Seconds between pings in online games; 0 turns pings off. Defaults to
+            HEARTBEAT_INTERVAL.
+        peer_timeout (float, optional): Seconds without hearing from the opponent before an online game
+            ends. Defaults to PEER_TIMEOUT.
+        analysis (bool, optional): Colour the empty cells of local, CPU and ultimate games by their value
+            to the side to move. Defaults to False.
+        variant (str, optional): The rules of local and CPU games, one of src.variants.VARIANTS. Defaults
+            to "standard".
+        values (ValueTable, optional): A learned value table the CPU plays from when there is no book move
+            or external engine. Defaults to None.
+        discovery (bool, optional): Announce hosted games on the local network, list announcing and
+            recently joined hosts when joining, and remember the hosts joined. Defaults to True.
+        puzzles (PuzzleBook, optional): The puzzles of the puzzle mode. Defaults to None, which loads
+            them with `src.puzzles.load_puzzles` when the mode is first chosen.
+    """
+    rules = load_rules(variant) if variant != "standard" else None
 
-def play_game(stdscr: curses.window) -> None:
     # Check if OS is mac bc curses is gay
     is_mac = False
     if system() == "Darwin":
         is_mac = True
 
-    # Set up curses
-    curses.mousemask(curses.BUTTON1_CLICKED)  # Enable mouse events
-    print('\033[?1003h')
-    curses.curs_set(0)  # Hide cursor
+    # Set up the screen
+    stdscr.mousemask(curses.BUTTON1_CLICKED)  # Enable mouse events
+    stdscr.curs_set(0)  # Hide cursor
     stdscr.keypad(1)
 
     Banner.draw(stdscr)
@@ -30,21 +77,36 @@ def play_game(stdscr: curses.window) -> None:
 
     try:
         while True:
+            flight.recorder.state("menu")
             game_mode = choose_game_mode(stdscr, is_mac)
+            flight.recorder.state(game_mode)
 
             if game_mode == "host":
-                host_game(stdscr, is_mac)
+                host_game(stdscr, is_mac, sockets=sockets, heartbeat=heartbeat, peer_timeout=peer_timeout,
+                          discovery=discovery)
             elif game_mode == "join":
-                join_game(stdscr, is_mac)
+                join_game(stdscr, is_mac, sockets=sockets, heartbeat=heartbeat, peer_timeout=peer_timeout,
+                          discovery=discovery)
             elif game_mode == "local":
-                local_game(stdscr, is_mac)
+                local_game(stdscr, is_mac, analysis=analysis, rules=rules)
+            elif game_mode == "ultimate":
+                ultimate_game(stdscr, is_mac, analysis=analysis)
+            elif game_mode == "qubic":
+                qubic_game(stdscr, is_mac)
+            elif game_mode == "puzzle":
+                if puzzles is None:
+                    puzzles = load_puzzles()
+                puzzle_game(stdscr, is_mac, puzzles)
             else:
-                cpu_game(stdscr, is_mac)
+                cpu_game(stdscr, is_mac, engine, book, analysis=analysis, rules=rules, values=values)
 
+            flight.recorder.state("game over")
             if not play_again(stdscr):
+                flight.recorder.state("quit")
                 end_game()
                 break
             else:
+                flight.recorder.state("play again")
                 stdscr.clear()
 
     except KeyboardInterrupt:
@@ -65,7 +127,7 @@ class Banner:
     height: int = len(lines)
 
     @staticmethod
-    def draw(stdscr: curses.window) -> None:
+    def draw(stdscr: Screen) -> None:
         """
         Draw the banner on the screen.
         """
@@ -74,51 +136,72 @@ class Banner:
         stdscr.refresh()
 
 
-def player_turn(stdscr: curses.window, player: Union[str, chr], board: Board) -> tuple:
+def player_turn(stdscr: Screen, player: Union[str, chr], board: Board,
+                idle: Union[Callable[[], None], None]=None, symbols: Union[str, None]=None) -> tuple:
     """
     Allow the specified player to take their turn on the game board.
 
     Args:
         player (str): The symbol representing the current player.
         board (Board): The game board on which the player is taking their turn.
+        idle (callable, optional): Called every IDLE_MS milliseconds without input, e.g. to keep a
+            connection alive. Defaults to None.
+        symbols (str, optional): The symbols the player may place, switched with Tab. Defaults to None,
+            which places `player`.
 
     Returns:
         tuple: A tuple containing the row and column indices of the cell where the player made their move.
     """
-    prev_click = [None, None]
-    while True:
-        y = Board.get_board_height() + board.y + 2
-        utils.clear_y(stdscr, y)
-        str = "It's Player {}'s turn.".format(player)
-        stdscr.addstr(y, utils.center(stdscr, len(str)), str)
-        stdscr.refresh()
+    symbols = symbols or player
+    symbol = symbols[0]
+    if idle is not None:
+        stdscr.timeout(IDLE_MS)
+    try:
+        prev_click = [None, None]
+        while True:
+            if len(symbols) > 1:
+                str = "It's Player {}'s turn, placing {} (Tab switches).".format(player, symbol)
+            else:
+                str = "It's Player {}'s turn.".format(player)
+            board.show_status(str)
+            stdscr.refresh()
 
-        event = stdscr.getch()
-        mx, my = utils.get_mouse_xy()
+            event = stdscr.getch()
+            if event == -1 and idle is not None:
+                idle()
+                continue
+            mx, my = utils.get_mouse_xy(stdscr)
 
 
-        if event == ord('q'):
-            end_game()
+            if event == ord('q'):
+                end_game()
+            if event == ord('\t'):
+                symbol = symbols[(symbols.index(symbol) + 1) % len(symbols)]
+                continue
 
-        if board.in_bounds(mx, my):
-            row, col = board.get_cell(mx, my)
-            if board.is_empty(row, col):
-                board.highlight_cell(row, col)
-                if prev_click == [row, col]:
-                    board.highlight_cell(row, col, undo=True)
-                    board.update_board(player, row, col)
-                    return row, col
-            if prev_click[0] is not None:
-                board.highlight_cell(prev_click[0], prev_click[1], undo=True)
-            prev_click = [row, col]
-
-            # Prevent double click by long press
-            sleep(0.5)
-        else:
-            prev_click = [None, None]
+            if board.in_bounds(mx, my):
+                row, col = board.get_cell(mx, my)
+                if board.is_playable(row, col):
+                    board.highlight_cell(row, col)
+                    if prev_click == [row, col]:
+                        board.highlight_cell(row, col, undo=True)
+                        board.update_board(symbol, row, col)
+                        flight.record(flight.MOVE, ord(symbol), row, col)
+                        return row, col
+                if prev_click[0] is not None:
+                    board.highlight_cell(prev_click[0], prev_click[1], undo=True)
+                prev_click = [row, col]
+
+                # Prevent double click by long press
+                stdscr.nap(0.5)
+            else:
+                prev_click = [None, None]
+    finally:
+        if idle is not None:
+            stdscr.timeout(-1)
 
 
-def footer(stdscr: curses.window) -> None:
+def footer(stdscr: Screen) -> None:
     """
     Display the footer at the bottom of the screen.
 
@@ -128,77 +211,156 @@ def footer(stdscr: curses.window) -> None:
         KeyboardInterrupt: If the user quits the game by pressing 'q'.
     """
     max_y, _ = stdscr.getmaxyx()
-    stdscr.addstr(max_y - 1, 0, chr(0x00a9) + " flatiger 2024  |  Press 'q' at any time to quit")
+    stdscr.addstr(max_y - 1, 0, utils.FOOTER)
     stdscr.refresh()
 
 
-def display_connection(stdscr: curses.window, conn: str):
+def display_connection(stdscr: Screen, conn: str):
     clear_draw_ui(stdscr)
     str = f"Connected to {conn}."
     stdscr.addstr(Banner.height + 2, utils.center(stdscr, len(str)), str)
     stdscr.refresh()
-    sleep(0.5)
+    stdscr.nap(0.5)
 
 
-def clear_draw_ui(stdscr: curses.window) -> None:
+def clear_draw_ui(stdscr: Screen) -> None:
     stdscr.clear()
     Banner.draw(stdscr)
     footer(stdscr)
 
 
-def online_game(stdscr: curses.window, conn: socket.socket, player: str) -> None:
+def lost_peer(stdscr: Screen, y: int, error: ConnectionError) -> None:
+    """
+    Tell the player the opponent is gone, leave a flight dump, and wait for a key.
+
+    Args:
+        y (int): The row of the message.
+        error (ConnectionError): Why: a PeerTimeout, a BadMessage, or a lost connection.
+    """
+    if isinstance(error, PeerTimeout):
+        string = "Your opponent stopped responding. Press any key."
+    elif isinstance(error, BadMessage):
+        string = "Your opponent sent an invalid message. Press any key."
+    else:
+        string = "The connection was lost. Press any key."
+    utils.clear_y(stdscr, y)
+    stdscr.addstr(y, utils.center(stdscr, len(string)), string)
+    stdscr.refresh()
+    flight.recorder.state("connection lost")
+    flight.recorder.dump(type(error).__name__)
+    stdscr.getch()
+
+
+def online_game(stdscr: Screen, conn: socket.socket, player: str, link: Union[Heartbeat, None]=None,
+                heartbeat: float=HEARTBEAT_INTERVAL, peer_timeout: float=PEER_TIMEOUT) -> None:
+    """
+    Play a game against a connected peer, exchanging moves as newline-framed messages.
+
+    Both sides ping each other while the game runs; the smoothed round trip and jitter are shown at the
+    right of the footer, and the game ends if the opponent stops answering.
+
+    Args:
+        conn (socket.socket): The connection to the peer.
+        player (str): This side's symbol.
+        link (Heartbeat, optional): The heartbeat already running on `conn`, which may hold messages that
+            arrived before the game. Defaults to a new one.
+        heartbeat (float, optional): Seconds between pings; 0 turns them off. Defaults to HEARTBEAT_INTERVAL.
+        peer_timeout (float, optional): Seconds of silence before the opponent counts as gone. Defaults to
+            PEER_TIMEOUT.
+    """
+    if link is None:
+        link = Heartbeat(conn, interval=heartbeat, timeout=peer_timeout)
     players = ['X', 'O']
     turn = 0
-    board = Board(y=Banner.height + 2)
+    board = Board(stdscr, y=Banner.height + 2)
+    peer = str(conn.getpeername()[0])
+    recorder = GameRecorder("you" if player == 'X' else peer, peer if player == 'X' else "you")
+
+    def show_link() -> None:
+        if link.srtt is None:
+            return
+        string = f"RTT {link.srtt * 1000:.0f} ms ± {link.jitter * 1000:.0f} ms"
+        y, x, width = utils.footer_slot(stdscr, "link")
+        if len(string) <= width:
+            stdscr.addstr(y, x, string.rjust(width))
+            stdscr.refresh()
+
+    def idle() -> None:
+        link.pump()
+        show_link()
 
     clear_draw_ui(stdscr)
     board.draw_board()
     text_y = Board.get_board_height() + board.y + 2
-    while True:
-        if player == players[turn]:
-            string = f"Your turn! ({player})"
-            utils.clear_y(stdscr, text_y)
-            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-            row, col = player_turn(stdscr, player, board)
-            conn.send(dumps((row, col)).encode())
-
-        else:
-            string = "Waiting for opponent..."
-            utils.clear_y(stdscr, text_y)
-            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-
-            opp_choice = conn.recv(1024).decode()
-            if not opp_choice:
-                string = "Connection failed! Exiting game..."
+    try:
+        while True:
+            if player == players[turn]:
+                string = f"Your turn! ({player})"
                 utils.clear_y(stdscr, text_y)
                 stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-                sleep(1)
-                end_game()
+                row, col = player_turn(stdscr, player, board, idle)
+                with profiling.span("send"):
+                    sent = link.send((row, col))
+                flight.record(flight.SEND, 0, sent)
+                recorder.move(player, row, col)
 
-            opp_choice = loads(opp_choice)
-            board.update_board(players[turn], opp_choice[0], opp_choice[1])
-
-        board.draw_values()
-        winner = board.get_winner()
+            else:
+                string = "Waiting for opponent..."
+                utils.clear_y(stdscr, text_y)
+                stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
 
-        if winner is not None:
-            utils.clear_y(stdscr, text_y)
+                with profiling.span("recv"):
+                    while True:
+                        try:
+                            opp_choice = link.read(IDLE_MS / 1000)
+                            break
+                        except TimeoutError:
+                            show_link()
+                flight.record(flight.RECV, 0, 0 if opp_choice is None else link.reader.last_size)
+                if opp_choice is None:
+                    string = "Connection failed! Exiting game..."
+                    utils.clear_y(stdscr, text_y)
+                    stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+                    stdscr.nap(1)
+                    flight.recorder.state("connection lost")
+                    flight.recorder.dump("connection lost")
+                    end_game()
+
+                row, col = parse_move(opp_choice)
+                if not board.is_empty(row, col):
+                    raise BadMessage(f"Move to a taken cell: {row}, {col}")
+                board.update_board(players[turn], row, col)
+                flight.record(flight.MOVE, ord(players[turn]), row, col)
+                recorder.move(players[turn], row, col)
+
+            board.draw_values()
+            with profiling.span("get_winner"):
+                winner = board.get_winner()
+
+            if winner is not None:
+                recorder.finish(winner)
+                utils.clear_y(stdscr, text_y)
 
-            if winner == player:
-                string = "YOU WIN!!!"
-            elif winner == 'tie':
-                string = "IT'S A TIE"
-            else:
-                string = "lmao YOU LOSE"
-            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-            stdscr.getch()
-            break
+                if winner == player:
+                    string = "YOU WIN!!!"
+                elif winner == 'tie':
+                    string = "IT'S A TIE"
+                else:
+                    string = "lmao YOU LOSE"
+                stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+                stdscr.getch()
+                break
 
-        stdscr.refresh()
-        turn = (turn + 1) % 2
+            show_link()
+            stdscr.refresh()
+            turn = (turn + 1) % 2
+    except ConnectionError as e:
+        # A silent, reset or misbehaving connection ends the game, and play_game offers another
+        lost_peer(stdscr, text_y, e)
 
 
-def host_game(stdscr: curses.window, is_mac, port: int=12345):
+def host_game(stdscr: Screen, is_mac, port: int=GAME_PORT, sockets: Callable[..., socket.socket]=socket.socket,
+              heartbeat: float=HEARTBEAT_INTERVAL, peer_timeout: float=PEER_TIMEOUT, discovery: bool=True):
     def display_ip():
         clear_draw_ui(stdscr)
 
@@ -206,9 +368,12 @@ def host_game(stdscr: curses.window, is_mac, port: int=12345):
         stdscr.addstr(Banner.height + 2, utils.center(stdscr, len(string)), string)
         string = f"Listening on port {port}."
         stdscr.addstr(Banner.height + 3, utils.center(stdscr, len(string)), string)
+        if announcer is not None:
+            string = f"Announcing \"{announcer.message['name'][:24]}\" on the local network."
+            stdscr.addstr(Banner.height + 4, utils.center(stdscr, len(string)), string)
         stdscr.refresh()
 
-    def choose_character() -> str:
+    def choose_character(idle: Callable[[], None]) -> str:
         clear_draw_ui(stdscr)
         string = f"Choose your character:"
         stdscr.addstr(Banner.height + 2, utils.center(stdscr, len(string)), string)
@@ -226,12 +391,15 @@ def host_game(stdscr: curses.window, is_mac, port: int=12345):
 
         while True:
             event = stdscr.getch()
+            if event == -1:
+                idle()
+                continue
             if event == ord('q'):
                 end_game()
             elif event != curses.KEY_MOUSE:
                 continue
 
-            mx, my = utils.get_mouse_xy()
+            mx, my = utils.get_mouse_xy(stdscr)
 
 
             for button in buttons:
@@ -242,10 +410,14 @@ def host_game(stdscr: curses.window, is_mac, port: int=12345):
                     else:
                         return choice(players)
 
-    host = "0.0.0.0"
     players = ['X', 'O']
+    # Listen on IPv6 and IPv4 at once where the system allows it
+    family = socket.AF_INET6 if socket.has_dualstack_ipv6() else socket.AF_INET
+    host = "::" if family == socket.AF_INET6 else "0.0.0.0"
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with sockets(family, socket.SOCK_STREAM) as s:
+        if family == socket.AF_INET6:
+            s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
         s.bind((host, port))
 
         # Set curses and socket to non-blocking to allow for 'q' buttonpress
@@ -253,90 +425,244 @@ def host_game(stdscr: curses.window, is_mac, port: int=12345):
         s.setblocking(False)
 
         s.listen()
-        display_ip()
-        while True:
-            ch = stdscr.getch()
-            if ch and ch == ord('q'):
-                end_game()
-
-            try:
-                conn, addr = s.accept()
-                if conn:
-                    break
-            except BlockingIOError:
-                continue
+        announcer = Announcer(port).start() if discovery else None
+        try:
+            display_ip()
+            while True:
+                ch = stdscr.getch()
+                if ch and ch == ord('q'):
+                    end_game()
+
+                try:
+                    conn, addr = s.accept()
+                    if conn:
+                        break
+                except BlockingIOError:
+                    continue
+        finally:
+            if announcer is not None:
+                announcer.stop()
 
         # Re-enable blocking
         stdscr.nodelay(0)
         s.setblocking(True)
         with conn:
+            flight.recorder.state("connected")
             display_connection(stdscr, conn)
-            player = choose_character()
+            # Answer the joining player's pings while choosing, so they don't give up on us
+            link = Heartbeat(conn, interval=heartbeat, timeout=peer_timeout)
+            stdscr.timeout(IDLE_MS)
+            try:
+                player = choose_character(link.pump)
+            except ConnectionError as e:
+                lost_peer(stdscr, Banner.height + 2, e)
+                return
+            finally:
+                stdscr.timeout(-1)
 
             if player == players[0]:
                 opp = players[1]
             else:
                 opp = players[0]
 
-            conn.send(str(opp).encode())
-            online_game(stdscr, conn, player)
+            conn.send(encode(opp))
+            online_game(stdscr, conn, player, link)
+
 
+def choose_host(stdscr: Screen, y: int, browser: Union[Browser, None]=None,
+                recent: Union[List[Host], None]=None) -> tuple:
+    """
+    Let the player type a host's address, or pick one of the hosts listed below the prompt.
+
+    Typing works as in `utils.get_input`. Up and Down move the highlight over the listed hosts, and Enter
+    with nothing typed, or a click, picks one. The list starts with the recently joined hosts and is
+    refreshed from `browser` every IDLE_MS milliseconds.
+
+    Args:
+        y (int): The row of the prompt; the input goes below it and the hosts below that.
+        browser (Browser, optional): Listens for announcing hosts. Defaults to None, which lists only
+            `recent`.
+        recent (list[Host], optional): The hosts joined recently. Defaults to none.
 
-def join_game(stdscr: curses.window, is_mac):
+    Returns:
+        tuple: The name of the host and the (address, port) pairs to try.
+    """
+    recent = recent or []
+    string = "Enter the host's IP address, or pick a host below: "
+    x = utils.center(stdscr, len(string))
+    max_y, _ = stdscr.getmaxyx()
+    rows = max(0, min(6, max_y - y - 5))
+    hosts = merge_hosts(recent, [])
+    shown: Union[List[tuple], None] = None
+    selected = 0
+    text = ""
+
+    def draw_hosts() -> None:
+        nonlocal shown
+        lines = [(host.name, host.addresses[0], host.port, bool(host.recent), i == selected)
+                 for i, host in enumerate(hosts[:rows])]
+        if lines == shown:
+            return
+        for i in range(max(len(lines), len(shown or []))):
+            utils.clear_y(stdscr, y + 3 + i)
+        for i, (name, address, port, recently, highlighted) in enumerate(lines):
+            line = f" {name[:24]}  {address[:40]}:{port}{'  (recent)' if recently else ''} "
+            stdscr.addstr(y + 3 + i, utils.center(stdscr, len(line)), line, curses.A_REVERSE if highlighted else 0)
+        shown = lines
+
+    utils.clear_y(stdscr, y)
+    utils.clear_y(stdscr, y + 1)
+    stdscr.addstr(y, x, string)
+    stdscr.curs_set(1)
+    if browser is not None:
+        stdscr.timeout(IDLE_MS)
+    try:
+        while True:
+            draw_hosts()
+            stdscr.move(y + 1, x + len(text))
+            stdscr.refresh()
+
+            char = stdscr.getch()
+            if char == -1:
+                if browser is not None:
+                    hosts = merge_hosts(recent, browser.poll())
+                    selected = min(selected, max(0, len(hosts[:rows]) - 1))
+                continue
+
+            if char == curses.KEY_MOUSE:
+                try:
+                    _, my = utils.get_mouse_xy(stdscr)
+                except curses.error:
+                    continue
+                if 0 <= my - y - 3 < len(shown or []):
+                    host = hosts[my - y - 3]
+                    return host.name, host.candidates()
+                continue
+
+            if char in (curses.KEY_UP, curses.KEY_DOWN) and shown:
+                selected = (selected + (1 if char == curses.KEY_DOWN else -1)) % len(shown)
+                continue
+
+            if char == 10:  # Enter key
+                if text.strip():
+                    return text.strip(), [(text.strip(), GAME_PORT)]
+                if shown:
+                    host = hosts[selected]
+                    return host.name, host.candidates()
+                continue
+
+            # Backspace key
+            if char in (127, 8, curses.KEY_BACKSPACE):
+                if text:
+                    text = text[:-1]
+                    stdscr.addstr(y + 1, x + len(text), " ")
+                continue
+
+            if 32 <= char < 127:
+                stdscr.addstr(y + 1, x + len(text), chr(char))
+                text += chr(char)
+    finally:
+        stdscr.curs_set(0)
+        if browser is not None:
+            stdscr.timeout(-1)
+
+
+def join_game(stdscr: Screen, is_mac, sockets: Callable[..., socket.socket]=socket.socket,
+              heartbeat: float=HEARTBEAT_INTERVAL, peer_timeout: float=PEER_TIMEOUT, discovery: bool=True):
     clear_draw_ui(stdscr)
 
-    string = "Enter the host's IP address: "
     text_y = Banner.height + 2
-    while True:
+    cache = default_cache() if discovery else None
+    browser = None
+    if discovery:
+        try:
+            browser = Browser()
+        except OSError:
+            # Another program holds the discovery port; typed addresses and recent hosts still work
+            pass
+    try:
         while True:
+            host, candidates = choose_host(stdscr, text_y, browser, cache.hosts() if cache is not None else [])
+
+            string = f"Connecting to {host}..."
             utils.clear_y(stdscr, text_y)
             stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
             stdscr.refresh()
-            host = utils.get_input(stdscr, text_y + 1, utils.center(stdscr, len(string)))
-            if utils.is_valid_ip(host):
-                break
-
-        port = 12345
-        string = f"Connecting to {host}..."
-        stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-        stdscr.refresh()
 
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(5)  # Set a timeout for the connection attempt
             try:
-                s.connect((host, port))
+                # Race the host's addresses rather than waiting out each one in turn
+                s, address = connect_any(resolve(candidates), sockets)
             except TimeoutError:
                 string = f"Couldn't connect to {host}: Connection timed out."
-                stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+                stdscr.addstr(text_y + 2, utils.center(stdscr, len(string)), string)
                 stdscr.refresh()
                 continue
             except Exception as e:
                 string = f"An error occurred while connecting to {host}: {e}"
-                stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+                stdscr.addstr(text_y + 2, utils.center(stdscr, len(string)), string)
                 stdscr.refresh()
                 continue
 
-            string = f"Connected! The host is choosing their character."
-            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-            stdscr.refresh()
+            with s:
+                if cache is not None:
+                    try:
+                        cache.remember(host, address[0], address[1])
+                    except OSError:
+                        pass
+                flight.recorder.state("connected")
+                clear_draw_ui(stdscr)
+                string = f"Connected! The host is choosing their character."
+                stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+                stdscr.refresh()
 
-            player = s.recv(1024).decode()
-            string = f"You are player {player}. Click anywhere to continue."
-            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
-            stdscr.refresh()
-            stdscr.getch()
+                # Wait for the host with the game's heartbeat, so a vanished host times out and 'q' quits
+                link = Heartbeat(s, interval=heartbeat, timeout=peer_timeout)
+                stdscr.timeout(IDLE_MS)
+                try:
+                    while True:
+                        try:
+                            player = link.read(IDLE_MS / 1000)
+                            break
+                        except TimeoutError:
+                            pass
+                        if stdscr.getch() == ord('q'):
+                            end_game()
+                except ConnectionError as e:
+                    lost_peer(stdscr, text_y + 2, e)
+                    break
+                finally:
+                    stdscr.timeout(-1)
+                if player not in ('X', 'O'):
+                    string = f"{host} closed the connection."
+                    stdscr.addstr(text_y + 2, utils.center(stdscr, len(string)), string)
+                    stdscr.refresh()
+                    continue
+
+                string = f"You are player {player}. Click anywhere to continue."
+                utils.clear_y(stdscr, text_y)
+                stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+                stdscr.refresh()
+                stdscr.getch()
 
-            online_game(stdscr, s, player)
-            break
+                online_game(stdscr, s, player, link)
+                break
+    finally:
+        if browser is not None:
+            browser.close()
 
 
-def local_game(stdscr: curses.window, is_mac) -> None:
+def local_game(stdscr: Screen, is_mac, analysis: bool=False, rules: Union[Rules, None]=None) -> None:
     """
     Conducts a local game of Tic Tac Toe between two players.
 
     This function initializes the game, draws the game board, and handles player turns until there is a winner
     or a tie.
 
+    Args:
+        analysis (bool, optional): Colour the empty cells by their value to the side to move. Defaults to False.
+        rules (Rules, optional): The compiled tables of a rule variant. Defaults to None, which plays standard
+            tic-tac-toe. Variant games are not archived.
+
     Raises:
         KeyboardInterrupt: If the user quits the game by pressing 'q'.
     """
@@ -371,20 +697,30 @@ def local_game(stdscr: curses.window, is_mac) -> None:
         stdscr.addstr(y, utils.center(stdscr, len(string)), string)
         stdscr.getch()
 
-    players = ['X', 'O']
+    players = list(rules.players) if rules is not None else ['X', 'O']
     turn = 0
-    board = Board(stdscr, y=Banner.height + 2)
+    board = Board(stdscr, y=Banner.height + 2, rules=rules)
+    recorder = GameRecorder("local", "local") if rules is None else None
+    overlay = AnalysisOverlay(stdscr, board) if analysis else None
 
     clear_draw_ui(stdscr)
     board.draw_board()
     while True:
+        if overlay is not None:
+            overlay.update(players[turn])
         utils.clear_y(stdscr, Board.get_board_height() + board.y + 2)
         string = "It's Player {}'s turn.".format(players[turn])
         stdscr.addstr(Board.get_board_height() + board.y + 2, utils.center(stdscr, len(string)), string)
         stdscr.refresh()
-        player_turn(stdscr, players[turn], board)
+        symbols = None if rules is None else "".join(SYMBOLS[i] for i in rules.symbols_for(players[turn]))
+        row, col = player_turn(stdscr, players[turn], board, symbols=symbols)
+        if recorder is not None:
+            recorder.move(players[turn], row, col)
         board.draw_values()
-        winner = board.get_winner()
+        with profiling.span("get_winner"):
+            winner = board.get_winner()
+        if winner and recorder is not None:
+            recorder.finish(winner)
 
         if winner and winner != "tie":
             display_winner(winner, Board.get_board_height() + board.y + 2)
@@ -398,13 +734,25 @@ def local_game(stdscr: curses.window, is_mac) -> None:
         turn = (turn + 1) % 2
 
 
-def cpu_game(stdscr: curses.window, is_mac) -> None:
+def cpu_game(stdscr: Screen, is_mac, engine: Union[ExternalEngine, None]=None,
+             book: Union[OpeningBook, None]=None, analysis: bool=False, rules: Union[Rules, None]=None,
+             values: Union[ValueTable, None]=None) -> None:
     """
     Conducts a game of Tic Tac Toe against the computer.
 
     This function initializes the game, draws the game board, and handles player and computer turns until
     there is a winner or a tie.
 
+    Args:
+        engine (ExternalEngine, optional): An external engine to choose the computer's moves. Defaults to None.
+        book (OpeningBook, optional): An opening book consulted before the engine. Defaults to None.
+        analysis (bool, optional): Colour the empty cells by their value to the side to move. Defaults to False.
+        rules (Rules, optional): The compiled tables of a rule variant, which the computer plays perfectly
+            instead of consulting the book or engine. Defaults to None, which plays standard tic-tac-toe.
+            Variant games are not archived.
+        values (ValueTable, optional): A learned value table (src.value_table) played from when the book and
+            engine have no move, instead of the win/block/random heuristic. Defaults to None.
+
     Raises:
         KeyboardInterrupt: If the user quits the game by pressing 'q'.
     """
@@ -442,7 +790,7 @@ def cpu_game(stdscr: curses.window, is_mac) -> None:
         stdscr.addstr(y, utils.center(stdscr, len(string)), string)
         stdscr.getch()
 
-    def computer_turn(board: Board, player: str, opponent: str) -> None:
+    def computer_turn(board: Board, player: str, opponent: str) -> tuple:
         """
         Simulate the computer's turn in the game.
 
@@ -450,6 +798,9 @@ def cpu_game(stdscr: curses.window, is_mac) -> None:
             board (Board): The game board.
             player (str): The symbol representing the computer player.
             opponent (str): The symbol representing the human player.
+
+        Returns:
+            tuple: The row and column indices of the cell the computer played.
         """
         y = Board.get_board_height() + board.y + 2
         utils.clear_y(stdscr, y)
@@ -458,75 +809,49 @@ def cpu_game(stdscr: curses.window, is_mac) -> None:
         stdscr.refresh()
 
         # Introduce a slight delay to mimic CPU's processing time
-        sleep(0.5)
-
-        # Try to win if possible
-        if try_to_win(board, player):
-            return
-
-        # Block opponent from winning
-        if try_to_block(board, opponent):
-            return
-
-        # If no winning or blocking moves available, choose a random empty cell
-        empty_cells = [(row, col) for row in range(3) for col in range(3) if board.is_empty(row, col)]
-        if empty_cells:
-            row, col = choice(empty_cells)
-            board.update_board(player, row, col)
-
-    def try_to_win(board: Board, player: str) -> bool:
-        """
-        Attempt to make a winning move for the given player.
-
-        Args:
-            board (Board): The game board.
-            player (str): The symbol representing the player.
-
-        Returns:
-            bool: True if a winning move was made, False otherwise.
-        """
-        # Check if the player can win in the next move and make that move
-        for row in range(3):
-            for col in range(3):
-                if board.is_empty(row, col):
-                    board.update_board(player, row, col)
-                    if board.get_winner() == player:
-                        return True
-                    else:
-                        # Reset the move if it doesn't result in a win
-                        board.clear_cell(row, col)
-        return False
-
-    def try_to_block(board: Board, opponent: str) -> bool:
-        """
-        Attempt to block the opponent from winning.
-
-        Args:
-            board (Board): The game board.
-            opponent (str): The symbol representing the opponent.
-
-        Returns:
-            bool: True if a blocking move was made, False otherwise.
-        """
-        # Check if the opponent can win in the next move and block that move
-        for row in range(3):
-            for col in range(3):
-                if board.is_empty(row, col):
-                    board.update_board(opponent, row, col)
-                    if board.get_winner() == opponent:
-                        # If the opponent can win, block their move
-                        board.clear_cell(row, col)
-                        board.update_board(opponent, row, col)
-                        return True
-                    else:
-                        # Reset the move if it doesn't result in a win for the opponent
-                        board.clear_cell(row, col)
-        return False
+        stdscr.nap(0.5)
+
+        with profiling.span("think"):
+            start = monotonic_ns()
+            if rules is not None:
+                row, col, symbol = rules.best_move(*rules.encode(board._board), rules.symbols_for(player))
+                board.update_board(symbol, row, col)
+                flight.record(flight.TIMING, 0, (monotonic_ns() - start) // 1000)
+                flight.record(flight.MOVE, ord(symbol), row, col)
+                return row, col
+            move = book.choose(board, player) if book is not None else None
+            if move is None and engine is not None:
+                try:
+                    move = engine.best_move(board, movetime=500)
+                except (ProtocolError, OSError):
+                    # A silent or dead engine forfeits the move to the built-in strategy
+                    move = None
+                if move is not None and not board.is_empty(*move):
+                    move = None
+            if move is None and values is not None:
+                move = values.choose(board, player)
+            if move is None:
+                # Win if possible, otherwise block, otherwise play a random empty cell
+                move = computer_move(board, player, opponent)
+            else:
+                board.update_board(player, *move)
+        flight.record(flight.TIMING, 0, (monotonic_ns() - start) // 1000)
+        flight.record(flight.MOVE, ord(player), *move)
+        return move
 
     player = 'X'
     cpu = 'O'
     turn = 0
-    board = Board(y=Banner.height + 2)
+    if engine is not None and rules is None:
+        try:
+            engine.new_game()
+        except (ProtocolError, OSError):
+            # A silent or dead engine sits the game out and the built-in strategy plays instead
+            engine = None
+    board = Board(stdscr, y=Banner.height + 2, rules=rules)
+    name = engine.name if engine is not None else "values" if values is not None else "cpu"
+    recorder = GameRecorder("local", name) if rules is None else None
+    overlay = AnalysisOverlay(stdscr, board) if analysis else None
 
     clear_draw_ui(stdscr)
     board.draw_board()
@@ -535,18 +860,33 @@ def cpu_game(stdscr: curses.window, is_mac) -> None:
     first_turn = randint(0, 1)
     if first_turn == 1:
         turn += 1
+    symbols = None
+    if rules is not None:
+        if rules.variant.placement != OWN:
+            # The players share symbols, so they go by the order they move in
+            player, cpu = rules.players if first_turn == 0 else rules.players[::-1]
+        symbols = "".join(SYMBOLS[i] for i in rules.symbols_for(player))
 
     while True:
+        if overlay is not None:
+            overlay.update(player if turn % 2 == 0 else cpu)
         if turn % 2 == 0:
             string = "It's Player {}'s turn.".format(player)
             stdscr.addstr(Board.get_board_height() + board.y + 2, utils.center(stdscr, len(string)), string)
             stdscr.refresh()
-            player_turn(player, board)
+            row, col = player_turn(stdscr, player, board, symbols=symbols)
+            if recorder is not None:
+                recorder.move(player, row, col)
         else:
-            computer_turn(board, cpu, player)
+            row, col = computer_turn(board, cpu, player)
+            if recorder is not None:
+                recorder.move(cpu, row, col)
 
         board.draw_values()
-        winner = board.get_winner()
+        with profiling.span("get_winner"):
+            winner = board.get_winner()
+        if winner and recorder is not None:
+            recorder.finish(winner)
 
         if winner and winner != "tie":
             display_winner(winner, Board.get_board_height() + board.y + 2)
@@ -560,7 +900,184 @@ def cpu_game(stdscr: curses.window, is_mac) -> None:
         turn += 1
 
 
-def play_again(stdscr: curses.window) -> bool:
+def ultimate_game(stdscr: Screen, is_mac, think_time: float=1.0, analysis: bool=False) -> None:
+    """
+    Conducts a game of ultimate Tic Tac Toe against the computer.
+
+    Each move sends the opponent to the local board matching the cell just played. Winning three local
+    boards in a row wins the game. The computer chooses its moves with Monte Carlo tree search.
+
+    Args:
+        think_time (float, optional): Seconds the computer spends searching each move. Defaults to 1.0.
+        analysis (bool, optional): Colour the empty cells by their estimated value on the player's turns,
+            refining the estimates in the background while the player thinks. Defaults to False.
+
+    Raises:
+        KeyboardInterrupt: If the user quits the game by pressing 'q'.
+    """
+    player = 'X'
+    cpu = 'O'
+    board = UltimateBoard(stdscr, y=Banner.height + 1)
+    overlay = AnalysisOverlay(stdscr, board) if analysis else None
+
+    clear_draw_ui(stdscr)
+    board.draw_board()
+    board.draw_values()
+
+    while True:
+        if board.state.turn == 0:
+            if overlay is not None:
+                overlay.update(player)
+                player_turn(stdscr, player, board, idle=lambda: overlay.update(player))
+            else:
+                player_turn(stdscr, player, board)
+        else:
+            if overlay is not None:
+                # Don't let the estimates compete with the computer's search
+                overlay.clear()
+            board.show_status("CPU's turn.")
+            stdscr.refresh()
+            with profiling.span("think"):
+                row, col = board.to_cell(mcts(board.state, think_time=think_time))
+            board.update_board(cpu, row, col)
+            flight.record(flight.MOVE, ord(cpu), row, col)
+
+        board.draw_values()
+        with profiling.span("get_winner"):
+            winner = board.get_winner()
+
+        if winner is not None:
+            if winner == "tie":
+                string = "It's a tie! Click anywhere to continue..."
+            elif winner == cpu:
+                string = "CPU wins! Click anywhere to continue..."
+            else:
+                string = "Player {} wins! Click anywhere to continue...".format(winner)
+            board.show_status(string)
+            stdscr.getch()
+            break
+
+
+def qubic_game(stdscr: Screen, is_mac, think_time: float=1.0) -> None:
+    """
+    Conducts a game of 3D Tic Tac Toe (Qubic) against the computer.
+
+    The 4x4x4 cube is drawn as four layers side by side. Four in a row along any of the 76 lines, including
+    those running through the layers, wins.
+
+    Args:
+        think_time (float, optional): Seconds the computer spends searching each move. Defaults to 1.0.
+
+    Raises:
+        KeyboardInterrupt: If the user quits the game by pressing 'q'.
+    """
+    player = 'X'
+    cpu = 'O'
+    board = QubicBoard(stdscr, y=Banner.height + 2)
+    text_y = board.get_board_height() + board.y + 2
+
+    clear_draw_ui(stdscr)
+    board.draw_board()
+
+    while True:
+        if board.state.turn == 0:
+            player_turn(stdscr, player, board)
+        else:
+            utils.clear_y(stdscr, text_y)
+            string = "CPU's turn."
+            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+            stdscr.refresh()
+            with profiling.span("think"):
+                cell, _ = search(board.state, think_time=think_time)
+            row, col = board.to_cell(cell)
+            board.update_board(cpu, row, col)
+            flight.record(flight.MOVE, ord(cpu), row, col)
+
+        board.draw_values()
+        with profiling.span("get_winner"):
+            winner = board.get_winner()
+
+        if winner is not None:
+            utils.clear_y(stdscr, text_y)
+            if winner == "tie":
+                string = "It's a tie! Click anywhere to continue..."
+            elif winner == cpu:
+                string = "CPU wins! Click anywhere to continue..."
+            else:
+                string = "Player {} wins! Click anywhere to continue...".format(winner)
+            stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+            stdscr.getch()
+            break
+
+
+def puzzle_game(stdscr: Screen, is_mac, puzzles: PuzzleBook, rng: Union[Random, None]=None) -> None:
+    """
+    Present a random puzzle: the player moves for the side to move and must keep a forced win, with the
+    computer defending as long as it can.
+
+    Args:
+        puzzles (PuzzleBook): The puzzles to choose from. Puzzles for boards other than 3x3 are not
+            shown, since the board is drawn 3x3.
+        rng (Random, optional): Chooses the puzzle. Defaults to a new generator.
+
+    Raises:
+        KeyboardInterrupt: If the user quits the game by pressing 'q'.
+    """
+    variant = puzzles.variant
+    if (variant.rows, variant.cols) != (Board._size, Board._size):
+        clear_draw_ui(stdscr)
+        string = f"These puzzles are for a {variant.rows}x{variant.cols} board; puzzles are played on 3x3."
+        stdscr.addstr(Banner.height + 2, utils.center(stdscr, len(string)), string)
+        string = "Click anywhere to continue..."
+        stdscr.addstr(Banner.height + 4, utils.center(stdscr, len(string)), string)
+        stdscr.refresh()
+        stdscr.getch()
+        return
+    rules = load_rules(variant)
+    number, puzzle = puzzles.random(rng)
+    board = Board(stdscr, y=Banner.height + 2, cells=puzzle.cells(rules.cols, rules.cells), rules=rules)
+    text_y = board.get_board_height() + board.y + 2
+    player, opponent = rules.players[puzzle.player], rules.players[1 - puzzle.player]
+    symbols = "".join(SYMBOLS[i] for i in rules.symbols_for(player))
+
+    clear_draw_ui(stdscr)
+    board.draw_board()
+    board.draw_values()
+    moves = "one move" if puzzle.moves == 1 else f"{puzzle.moves} moves"
+    string = f"Puzzle {number + 1} of {len(puzzles)}: Player {player} to play and win in {moves}."
+    stdscr.addstr(board.y - 1, utils.center(stdscr, len(string)), string)
+
+    played = 0
+    while True:
+        row, col = player_turn(stdscr, player, board, symbols=symbols)
+        played += 1
+        board.draw_values()
+        x, o = rules.encode(board._board)
+        result = rules.outcome(x, o)
+        if result == puzzle.player:
+            string = f"Solved in {played} {'move' if played == 1 else 'moves'}! Click anywhere to continue..."
+            break
+        if result is not None or rules.solve(x, o, rules.symbols_for(opponent))[0] >= 0:
+            row, col = divmod(puzzle.cell, rules.cols)
+            string = f"Not quite: {SYMBOLS[puzzle.symbol]} at row {row + 1}, column {col + 1} wins. Click anywhere..."
+            break
+
+        with profiling.span("think"):
+            row, col, symbol = rules.best_move(x, o, rules.symbols_for(opponent))
+        board.update_board(symbol, row, col)
+        flight.record(flight.MOVE, ord(symbol), row, col)
+        board.draw_values()
+        # Where completing a line loses, the defender's forced reply can end the game
+        if rules.outcome(*rules.encode(board._board)) == puzzle.player:
+            string = f"Solved in {played} {'move' if played == 1 else 'moves'}! Click anywhere to continue..."
+            break
+
+    utils.clear_y(stdscr, text_y)
+    stdscr.addstr(text_y, utils.center(stdscr, len(string)), string)
+    stdscr.getch()
+
+
+def play_again(stdscr: Screen) -> bool:
     """
     Display a prompt asking the player if they want to play again.
 
@@ -596,7 +1113,7 @@ def play_again(stdscr: curses.window) -> bool:
         elif event != curses.KEY_MOUSE:
             continue
 
-        mx, my = utils.get_mouse_xy()
+        mx, my = utils.get_mouse_xy(stdscr)
         for button in buttons:
             if button.in_bounds(mx, my):
                 button.click()
@@ -606,7 +1123,7 @@ def play_again(stdscr: curses.window) -> bool:
                     return False
 
 
-def choose_game_mode(stdscr: curses.window, is_mac: bool=False) -> str:
+def choose_game_mode(stdscr: Screen, is_mac: bool=False) -> str:
     """
     Display the game mode selection screen and wait for the player to choose a mode.
 
@@ -634,6 +1151,19 @@ def choose_game_mode(stdscr: curses.window, is_mac: bool=False) -> str:
     cpu_button = Button(stdscr=stdscr, parameter="cpu", label=cpu_str, x=utils.center(stdscr, len(cpu_str) + 4), y=3 * len(buttons) + Banner.height + 1)
     buttons.append(cpu_button)
 
+    ultimate_str = "Ultimate"
+    ultimate_button = Button(stdscr=stdscr, parameter="ultimate", label=ultimate_str, x=utils.center(stdscr, len(ultimate_str) + 4), y=3 * len(buttons) + Banner.height + 1)
+    buttons.append(ultimate_button)
+
+    qubic_str = "3D Qubic"
+    qubic_button = Button(stdscr=stdscr, parameter="qubic", label=qubic_str, x=utils.center(stdscr, len(qubic_str) + 4), y=3 * len(buttons) + Banner.height + 1)
+    buttons.append(qubic_button)
+
+    # There's no room for another row on a 24-line terminal, so puzzles sit beside the CPU
+    puzzle_str = "Puzzle"
+    puzzle_button = Button(stdscr=stdscr, parameter="puzzle", label=puzzle_str, x=cpu_button.x + len(cpu_str) + 6, y=cpu_button.y)
+    buttons.append(puzzle_button)
+
     selected_button = 0
     if is_mac:
         buttons[selected_button].select()
@@ -652,7 +1182,7 @@ def choose_game_mode(stdscr: curses.window, is_mac: bool=False) -> str:
             if event != curses.KEY_MOUSE:
                 continue
 
-            mx, my = utils.get_mouse_xy()
+            mx, my = utils.get_mouse_xy(stdscr)
 
             for button in buttons:
                 if button.in_bounds(mx, my):
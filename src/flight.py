@@ -0,0 +1,172 @@
+"""
+Flight recorder: the last few thousand game events, kept in a preallocated ring buffer.
+
+Events are packed into fixed-size slots, so recording one allocates nothing and costs a few hundred
+nanoseconds. The buffer only reaches the disk when something goes wrong: an uncaught exception, a lost
+connection, SIGTERM, or on demand with SIGUSR1 or `dump()`.
+
+    dump  := magic "TTFR" | version u32 | capacity u32 | recorded u64 | reason char[32] | slot * capacity
+    slot  := time_ns u64 | kind u16 | a i16 | b i32 | c i32
+
+Usage:
+    python -m src.flight decode ~/.tic-tac-toe/flight-1234-1718000000.ttfr
+"""
+import argparse
+import os
+import signal
+import struct
+import sys
+from time import monotonic_ns, time
+from typing import Iterator, List, Union
+
+
+HEADER: struct.Struct = struct.Struct("<4sIIQ32s")
+EVENT: struct.Struct = struct.Struct("<QHhii")
+MAGIC: bytes = b"TTFR"
+VERSION: int = 1
+
+DEFAULT_DIRECTORY: str = os.path.join(os.path.expanduser("~"), ".tic-tac-toe")
+
+# Event kinds and what a, b and c hold
+MOVE: int = 1     # player symbol code, row, col
+SEND: int = 2     # 0, bytes, 0
+RECV: int = 3     # 0, bytes, 0
+STATE: int = 4    # index into STATES, 0, 0
+TIMING: int = 5   # index into TIMINGS, microseconds, 0
+KINDS: List[str] = ["", "MOVE", "SEND", "RECV", "STATE", "TIMING"]
+
+STATES: List[str] = ["menu", "host", "join", "local", "cpu", "ultimate", "qubic", "connected", "game over",
+                     "play again", "connection lost", "quit", "puzzle"]
+TIMINGS: List[str] = ["think"]
+
+
+class FlightRecorder:
+    """
+    A ring buffer of the most recent events.
+
+    Args:
+        capacity (int, optional): Events kept. Defaults to 4096.
+    """
+    def __init__(self, capacity: int=4096) -> None:
+        self.capacity: int = capacity
+        self.buffer: bytearray = bytearray(EVENT.size * capacity)
+        self.recorded: int = 0
+        self._pack = EVENT.pack_into
+
+    def record(self, kind: int, a: int=0, b: int=0, c: int=0) -> None:
+        i = self.recorded
+        self._pack(self.buffer, i % self.capacity * EVENT.size, monotonic_ns(), kind, a, b, c)
+        self.recorded = i + 1
+
+    def state(self, name: str) -> None:
+        self.record(STATE, STATES.index(name))
+
+    def dump(self, reason: str, path: Union[str, None]=None) -> Union[str, None]:
+        """
+        Write the buffer to disk.
+
+        Args:
+            reason (str): Why, e.g. 'SIGUSR1' or an exception name. Truncated to 32 bytes.
+            path (str, optional): The file to write. Defaults to a new file in `$TICTACTOE_FLIGHT`, or
+                ~/.tic-tac-toe. Setting the variable to an empty string turns automatic dumps off.
+
+        Returns:
+            str | None: The path written, or None if dumps are off or it couldn't be written.
+        """
+        if path is None:
+            directory = os.environ.get("TICTACTOE_FLIGHT", DEFAULT_DIRECTORY)
+            if not directory:
+                return None
+            path = os.path.join(directory, f"flight-{os.getpid()}-{int(time())}.ttfr")
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.capacity, self.recorded, reason.encode()[:32]))
+                f.write(self.buffer)
+        except OSError:
+            return None
+        return path
+
+
+# The process-wide recorder, always on
+recorder: FlightRecorder = FlightRecorder()
+record = recorder.record
+
+
+def install() -> None:
+    """
+    Dump the process-wide recorder on an uncaught exception, on SIGTERM, and on SIGUSR1 without stopping.
+    """
+    previous_hook = sys.excepthook
+
+    def excepthook(kind, value, traceback) -> None:
+        recorder.dump(kind.__name__)
+        previous_hook(kind, value, traceback)
+
+    def on_signal(number, frame) -> None:
+        recorder.dump(signal.Signals(number).name)
+        if number == signal.SIGTERM:
+            sys.exit(128 + number)
+
+    sys.excepthook = excepthook
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, on_signal)
+
+
+def read_dump(path: str) -> tuple:
+    """
+    Read a dump.
+
+    Returns:
+        tuple: The reason and the surviving events, oldest first, as (time_ns, kind, a, b, c).
+
+    Raises:
+        ValueError: If the file is not a flight recorder dump.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, capacity, recorded, reason = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a flight recorder dump")
+    first = max(0, recorded - capacity)
+    events = [EVENT.unpack_from(data, HEADER.size + i % capacity * EVENT.size) for i in range(first, recorded)]
+    return reason.rstrip(b"\0").decode(errors="replace"), events
+
+
+def describe(events: List[tuple]) -> Iterator[str]:
+    """
+    Format events as lines, timed relative to the last one.
+    """
+    end = events[-1][0] if events else 0
+    for t, kind, a, b, c in events:
+        if kind == MOVE:
+            detail = f"{chr(a)} ({b}, {c})"
+        elif kind in (SEND, RECV):
+            detail = f"{b} bytes"
+        elif kind == STATE:
+            detail = STATES[a] if 0 <= a < len(STATES) else str(a)
+        elif kind == TIMING:
+            detail = f"{TIMINGS[a] if 0 <= a < len(TIMINGS) else a} {b} us"
+        else:
+            detail = f"{a} {b} {c}"
+        name = KINDS[kind] if 0 <= kind < len(KINDS) else str(kind)
+        yield f"{(t - end) / 1e6:>12.3f} ms  {name:<7}{detail}"
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Decode flight recorder dumps.")
+    parser.add_argument("command", choices=["decode"])
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    reason, events = read_dump(args.path)
+    print(f"reason: {reason}, {len(events)} events")
+    for line in describe(events):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Asyncio server that pairs incoming players into online matches, and a load generator for it.
+
+Players speak the protocol of the online mode (src.net): once paired, each receives its symbol, then
+the server checks every move, relays it to the opponent and answers pings itself. It takes the place of `host_game` when many
+games run at once; two players using "Join" can play each other through it.
+
+Usage:
+    python -m src.match_server serve --port 12345
+    python -m src.match_server load --clients 2000 --games 3 --think 0.01 --out report.json
+"""
+import argparse
+import asyncio
+from collections import Counter
+from json import dumps
+from random import Random
+from time import perf_counter
+from typing import List, Union
+
+from src.arena import ArenaFull, GameArena
+from src.batch import NO_RESULT
+from src.board import Board
+from src.net import decode, encode
+from src.server import percentiles
+
+
+class MatchServer:
+    """
+    Pairs connections in arrival order and referees their games.
+
+    Args:
+        move_timeout (float, optional): Seconds a player may take over a move before the match is
+            abandoned, or stay silent, without even a ping, while waiting for an opponent. Defaults to 60.
+        seed (int, optional): Seed for choosing who plays X. Defaults to None.
+        max_matches (int, optional): Matches in play at once; pairs beyond that are turned away.
+            Defaults to 65536.
+    """
+    def __init__(self, move_timeout: float=60.0, seed: Union[int, None]=None, max_matches: int=65536) -> None:
+        self.move_timeout: float = move_timeout
+        self.rng: Random = Random(seed)
+        self.arena: GameArena = GameArena(max_matches)
+        self.waiting: Union[tuple, None] = None
+        self.connections: int = 0
+        self.matches: int = 0
+        self.finished: int = 0
+        self.abandoned: int = 0
+        self.illegal: int = 0
+        self.rejected: int = 0
+        self.moves: int = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one player: wait for an opponent, or play the match against the one already waiting.
+        """
+        self.connections += 1
+        if self.waiting is not None and self.waiting[0].at_eof():
+            # The waiting player hung up, and their watcher hasn't noticed yet
+            self.waiting[3].cancel()
+            self._drop_waiting()
+        if self.waiting is None:
+            done = asyncio.Event()
+            self.waiting = (reader, writer, done, asyncio.ensure_future(self._watch(reader, writer)))
+            # The match runs in the opponent's handler; the watcher ends the wait if the player leaves
+            await done.wait()
+            return
+        opponent_reader, opponent_writer, done, watcher = self.waiting
+        self.waiting = None
+        # Stop reading the waiting player before the match does
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        try:
+            await self.play_match([(opponent_reader, opponent_writer), (reader, writer)])
+        finally:
+            done.set()
+
+    async def _watch(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Answer a waiting player's pings, and free their place if they leave or say nothing for a move's time
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.move_timeout)
+                if not line:
+                    break
+                message = decode(line)
+                if isinstance(message, dict) and "ping" in message:
+                    writer.write(encode({"pong": message["ping"]}))
+                    await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        if self.waiting is not None and self.waiting[0] is reader:
+            self._drop_waiting()
+
+    def _drop_waiting(self) -> None:
+        _, writer, done, _ = self.waiting
+        self.waiting = None
+        self.abandoned += 1
+        writer.close()
+        done.set()
+
+    async def play_match(self, players: List[tuple]) -> None:
+        """
+        Referee one game between two connected players, then close both connections.
+        """
+        try:
+            game = self.arena.allocate()
+        except ArenaFull:
+            self.rejected += 1
+            for _, writer in players:
+                writer.close()
+            return
+        self.matches += 1
+        if self.rng.random() < 0.5:
+            players.reverse()
+        # Both players are read all the time, so pings are answered while the other side thinks
+        messages: asyncio.Queue = asyncio.Queue()
+        listeners = [asyncio.ensure_future(self._listen(index, reader, writer, messages))
+                     for index, (reader, writer) in enumerate(players)]
+        turn = 0
+        try:
+            for (_, writer), symbol in zip(players, "XO"):
+                writer.write(encode(symbol))
+                await writer.drain()
+            while True:
+                index, message = await asyncio.wait_for(messages.get(), self.move_timeout)
+                if message is None:
+                    self.abandoned += 1
+                    return
+                if isinstance(message, Exception):
+                    raise message
+                if index != turn:
+                    raise ValueError("Move out of turn")
+                row, col = message
+                status = self.arena.play(game, row, col)
+                self.moves += 1
+                _, opponent = players[1 - turn]
+                opponent.write(encode((row, col)))
+                await opponent.drain()
+                if status != NO_RESULT:
+                    self.finished += 1
+                    return
+                turn = 1 - turn
+        except (asyncio.TimeoutError, ConnectionError):
+            self.abandoned += 1
+        except (ValueError, TypeError):
+            self.illegal += 1
+        finally:
+            for listener in listeners:
+                listener.cancel()
+            self.arena.release(game)
+            for _, writer in players:
+                writer.close()
+
+    @staticmethod
+    async def _listen(index: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                      messages: asyncio.Queue) -> None:
+        # Queue a player's moves, then None when they leave; answer their pings directly
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = decode(line)
+                if isinstance(message, dict):
+                    if "ping" in message:
+                        writer.write(encode({"pong": message["ping"]}))
+                    continue
+                messages.put_nowait((index, message))
+        except (ValueError, ConnectionError) as e:
+            messages.put_nowait((index, e))
+            return
+        messages.put_nowait((index, None))
+
+    def stats(self) -> dict:
+        return {"connections": self.connections, "matches": self.matches, "finished": self.finished,
+                "abandoned": self.abandoned, "illegal": self.illegal, "rejected": self.rejected, "moves": self.moves,
+                "in_play": self.arena.live}
+
+
+async def start_server(server: MatchServer, host: str="127.0.0.1", port: int=12345, **options) -> asyncio.Server:
+    # A deep backlog, so a burst of thousands of connects isn't dropped and retried
+    return await asyncio.start_server(server.handle, host, port, backlog=4096, **options)
+
+
+async def serve(host: str="0.0.0.0", port: int=12345) -> None:
+    """
+    Run a match server until cancelled.
+    """
+    server = await start_server(MatchServer(), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+class LoadStats:
+    """
+    What the simulated players measured.
+    """
+    def __init__(self) -> None:
+        self.connect: List[float] = []
+        self.round_trips: List[float] = []
+        self.games: int = 0
+        self.moves: int = 0
+        self.errors: Counter = Counter()
+
+
+async def simulated_player(host: str, port: int, think: float, rng: Random, stats: LoadStats,
+                           timeout: float=30.0) -> None:
+    """
+    Connect, play one game with random moves, and record the connect time and move round trips.
+
+    A round trip runs from sending a move until the opponent's move arrives, less the opponent's think time.
+    """
+    start = perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        stats.errors["connect"] += 1
+        return
+    stats.connect.append(perf_counter() - start)
+    try:
+        symbol = decode(await asyncio.wait_for(reader.readline(), timeout))
+        board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        turn = 'X'
+        sent = None
+        while True:
+            if turn == symbol:
+                if think:
+                    await asyncio.sleep(think)
+                row, col = rng.choice(board.get_empty_cells())
+                writer.write(encode((row, col)))
+                await writer.drain()
+                sent = perf_counter()
+                stats.moves += 1
+            else:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                if not line:
+                    stats.errors["closed"] += 1
+                    return
+                if sent is not None:
+                    stats.round_trips.append(max(0.0, perf_counter() - sent - think))
+                row, col = decode(line)
+            board.update_board(turn, row, col)
+            if board.get_winner() is not None:
+                if symbol == 'X':
+                    stats.games += 1
+                return
+            turn = 'O' if turn == 'X' else 'X'
+    except asyncio.TimeoutError:
+        stats.errors["timeout"] += 1
+    except ConnectionError:
+        stats.errors["connection"] += 1
+    except (ValueError, TypeError):
+        stats.errors["protocol"] += 1
+    finally:
+        writer.close()
+
+
+def _raise_file_limit() -> None:
+    # Every simulated player holds a socket, and an in-process server one more
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def load(clients: int=1000, games: int=1, think: float=0.0, host: Union[str, None]=None,
+               port: int=12345, seed: int=0, timeout: float=30.0) -> dict:
+    """
+    Play games between simulated players and measure the server.
+
+    Args:
+        clients (int, optional): Concurrent simulated players. Defaults to 1000.
+        games (int, optional): Games each player plays, one after another. Defaults to 1.
+        think (float, optional): Seconds each player waits before moving. Defaults to 0.
+        host (str, optional): A running server to test. Defaults to None, which starts one in-process on
+            loopback.
+        port (int, optional): The running server's port. Defaults to 12345.
+        seed (int, optional): Seed for the players' moves. Defaults to 0.
+        timeout (float, optional): Seconds to wait for a connection, an opponent or a move. Defaults to 30.
+
+    Returns:
+        dict: The report: throughput, connect and round-trip percentiles in milliseconds, and error counts.
+    """
+    _raise_file_limit()
+    server = None
+    if host is None:
+        match_server = MatchServer(seed=seed)
+        server = await start_server(match_server, "127.0.0.1", 0)
+        host, port = "127.0.0.1", server.sockets[0].getsockname()[1]
+    stats = LoadStats()
+    rng = Random(seed)
+
+    async def player() -> None:
+        for _ in range(games):
+            await simulated_player(host, port, think, Random(rng.random()), stats, timeout)
+
+    start = perf_counter()
+    try:
+        await asyncio.gather(*(player() for _ in range(clients)))
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    elapsed = perf_counter() - start
+
+    attempts = clients * games
+    report = {
+        "clients": clients,
+        "games_per_client": games,
+        "think_ms": think * 1000,
+        "duration_s": round(elapsed, 3),
+        "games": stats.games,
+        "connections": len(stats.connect),
+        "moves": stats.moves,
+        "games_per_sec": round(stats.games / elapsed, 1),
+        "connections_per_sec": round(len(stats.connect) / elapsed, 1),
+        "moves_per_sec": round(stats.moves / elapsed, 1),
+        "connect_ms": {**percentiles(stats.connect, (50, 90, 99)),
+                       "max": round(max(stats.connect, default=0.0) * 1000, 3)},
+        "move_rtt_ms": {**percentiles(stats.round_trips, (50, 90, 99)),
+                        "max": round(max(stats.round_trips, default=0.0) * 1000, 3)},
+        "errors": dict(stats.errors),
+        "error_rate": round(sum(stats.errors.values()) / attempts, 5) if attempts else 0.0,
+    }
+    if server is not None:
+        report["server"] = match_server.stats()
+    return report
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Online match server and load generator.")
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--host", help="serve: address to listen on (default 0.0.0.0); "
+                                       "load: a running server (default: start one on loopback)")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--clients", type=int, default=1000, help="load: concurrent simulated players")
+    parser.add_argument("--games", type=int, default=1, help="load: games per player")
+    parser.add_argument("--think", type=float, default=0.0, help="load: seconds each player thinks per move")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="load: write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host or "0.0.0.0", args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+    report = asyncio.run(load(args.clients, args.games, args.think, args.host, args.port, args.seed))
+    text = dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
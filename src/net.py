@@ -0,0 +1,209 @@
+"""
+Wire format of online games: one JSON value per line.
+
+The joining player first receives their symbol ("X" or "O"), then both sides send moves as [row, col].
+During the game either side may also send {"ping": t}, which the other answers with {"pong": t}.
+"""
+import socket
+from collections import deque
+from json import dumps, loads
+from time import monotonic
+from typing import Callable, Deque, Union
+
+
+HEARTBEAT_INTERVAL: float = 1.0
+PEER_TIMEOUT: float = 10.0
+
+
+def encode(message: object) -> bytes:
+    return (dumps(message) + "\n").encode()
+
+
+def decode(line: bytes) -> object:
+    """
+    Raises:
+        ValueError: If the line is not valid JSON.
+    """
+    return loads(line)
+
+
+class MessageReader:
+    """
+    Split the byte stream of a socket into messages, holding on to any partial line.
+
+    Args:
+        sock (socket.socket): The connection to read from.
+    """
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock: socket.socket = sock
+        self.last_size: int = 0
+        self._buffer: bytes = b""
+
+    def read(self) -> Union[object, None]:
+        """
+        Read the next message, blocking until a whole line has arrived.
+
+        Returns:
+            object | None: The message, or None if the peer closed the connection.
+
+        Raises:
+            ValueError: If the line is not valid JSON.
+        """
+        while b"\n" not in self._buffer:
+            chunk = self.sock.recv(1024)
+            if not chunk:
+                return None
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        self.last_size = len(line) + 1
+        return decode(line)
+
+
+class PeerTimeout(ConnectionError):
+    """
+    Raised when the peer has sent nothing, not even a pong, for longer than the peer timeout.
+    """
+
+
+class BadMessage(ConnectionError):
+    """
+    Raised when the peer sends something that isn't part of the protocol: a line that isn't JSON, a ping
+    or pong without a time, or a move off the board.
+    """
+
+
+def is_number(value: object) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_move(message: object, size: int=3) -> tuple:
+    """
+    Check a move message.
+
+    Args:
+        message (object): The decoded message.
+        size (int, optional): The board's rows and columns. Defaults to 3.
+
+    Returns:
+        tuple: The row and column indices of the move.
+
+    Raises:
+        BadMessage: If the message is not a [row, col] pair on the board.
+    """
+    if not isinstance(message, list) or len(message) != 2 or \
+            not all(isinstance(i, int) and not isinstance(i, bool) and 0 <= i < size for i in message):
+        raise BadMessage(f"Not a move: {message!r:.40}")
+    return message[0], message[1]
+
+
+class Heartbeat:
+    """
+    Exchange messages with a peer while pinging it, measuring the round trip and noticing if it goes silent.
+
+    A half-open TCP connection can look healthy for minutes; pings make a silent peer show up within
+    `timeout` seconds. Round trips are smoothed as TCP does (RFC 6298): `srtt` moves 1/8 and `jitter`
+    (the mean deviation) 1/4 of the way towards each new sample.
+
+    Args:
+        conn (socket.socket): The connection to the peer.
+        reader (MessageReader, optional): The reader already used on `conn`. Defaults to a new one.
+        interval (float, optional): Seconds between pings. Defaults to HEARTBEAT_INTERVAL; 0 sends no pings
+            and never times out, while still answering the peer's.
+        timeout (float, optional): Seconds of silence before the peer counts as gone. Defaults to PEER_TIMEOUT.
+        clock (callable, optional): The time source. Defaults to `time.monotonic`.
+    """
+    def __init__(self, conn: socket.socket, reader: Union[MessageReader, None]=None,
+                 interval: float=HEARTBEAT_INTERVAL, timeout: float=PEER_TIMEOUT,
+                 clock: Callable[[], float]=monotonic) -> None:
+        self.conn: socket.socket = conn
+        self.reader: MessageReader = MessageReader(conn) if reader is None else reader
+        self.interval: float = interval
+        self.timeout: float = timeout
+        self.clock: Callable[[], float] = clock
+        self.srtt: Union[float, None] = None
+        self.jitter: float = 0.0
+        self.last_heard: float = clock()
+        self._next_ping: float = self.last_heard + interval
+        # Moves that arrived while pumping, for `read` to return
+        self._pending: Deque[object] = deque()
+
+    def send(self, message: object) -> int:
+        """
+        Returns:
+            int: The number of bytes sent.
+        """
+        return self.conn.send(encode(message))
+
+    def read(self, wait: Union[float, None]=None) -> object:
+        """
+        Wait for the peer's next game message, answering and sending pings meanwhile.
+
+        Args:
+            wait (float, optional): The most seconds to wait. Defaults to None, which waits until a message
+                arrives or the peer times out.
+
+        Returns:
+            object | None: The message, or None if the peer closed the connection.
+
+        Raises:
+            TimeoutError: If `wait` passed without a message.
+            PeerTimeout: If the peer has been silent for too long.
+            BadMessage: If the peer sent a line that isn't JSON, or a ping or pong without a time.
+        """
+        if self._pending:
+            return self._pending.popleft()
+        return self._receive(None if wait is None else self.clock() + wait)
+
+    def pump(self) -> None:
+        """
+        Handle whatever has arrived and send a ping if one is due, without waiting.
+
+        Raises:
+            PeerTimeout: If the peer has been silent for too long.
+            BadMessage: If the peer sent something that isn't part of the protocol.
+        """
+        while not self._pending or self._pending[-1] is not None:
+            try:
+                self._pending.append(self._receive(self.clock()))
+            except TimeoutError:
+                return
+
+    def _receive(self, deadline: Union[float, None]) -> object:
+        while True:
+            now = self.clock()
+            until = deadline
+            if self.interval:
+                if now >= self._next_ping:
+                    self.send({"ping": now})
+                    self._next_ping = now + self.interval
+                if now - self.last_heard > self.timeout:
+                    raise PeerTimeout(f"No reply from the peer for {now - self.last_heard:.1f}s")
+                wake = min(self._next_ping, self.last_heard + self.timeout)
+                until = wake if until is None else min(until, wake)
+            self.conn.settimeout(None if until is None else max(until - now, 0.0))
+            try:
+                message = self.reader.read()
+            except (socket.timeout, BlockingIOError):
+                if deadline is not None and self.clock() >= deadline:
+                    raise TimeoutError("No message from the peer") from None
+                continue
+            except ValueError:
+                raise BadMessage("The peer sent a line that isn't JSON") from None
+            self.last_heard = self.clock()
+            if not isinstance(message, dict):
+                return message
+            if "ping" in message:
+                if not is_number(message["ping"]):
+                    raise BadMessage(f"Not a ping: {message!r:.40}")
+                self.send({"pong": message["ping"]})
+            elif "pong" in message:
+                if not is_number(message["pong"]):
+                    raise BadMessage(f"Not a pong: {message!r:.40}")
+                self._sample(self.last_heard - message["pong"])
+
+    def _sample(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt, self.jitter = rtt, rtt / 2
+        else:
+            self.jitter += (abs(rtt - self.srtt) - self.jitter) / 4
+            self.srtt += (rtt - self.srtt) / 8
@@ -0,0 +1,258 @@
+"""
+Opening book of weighted moves for the first plies of a game.
+
+Positions are stored once per symmetry class, keyed by their canonical code, with a weight for every cell
+in the canonical frame:
+
+    header := magic "TTOB" | version u32 | entry_count u32 | max_ply u32
+    entry  := key u32 | weight u16 * 9
+
+Books are compiled from the solver (every optimal move, equal weights) or from a position index (moves
+weighted by how often they were played, restricted to moves that don't lose).
+
+Usage:
+    python -m src.opening_book compile ~/.tic-tac-toe/book.ttob --plies 4
+    python -m src.opening_book compile book.ttob --plies 6 --index positions.idx
+    python -m src.opening_book bench ~/.tic-tac-toe/book.ttob
+"""
+import argparse
+import mmap
+import os
+import struct
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Union
+
+from src.board import Board
+from src.cpu import choose_move
+from src.position_index import PositionIndex, canonical, canonical_cell
+from src.solver import SYMBOLS, decode, solved_table
+
+
+HEADER: struct.Struct = struct.Struct("<4sIII")
+ENTRY: struct.Struct = struct.Struct("<I9H")
+MAGIC: bytes = b"TTOB"
+VERSION: int = 1
+
+DEFAULT_BOOK: str = os.path.join(os.path.expanduser("~"), ".tic-tac-toe", "book.ttob")
+
+
+def _cells(board: Board, player: Union[str, None]=None) -> List[int]:
+    cells = [SYMBOLS.index(cell) for row in board._board for cell in row]
+    if player is None:
+        return cells
+    # The book assumes X moved first, so swap the symbols of games O started
+    mine = SYMBOLS.index(player)
+    first = mine if cells.count(mine) == cells.count(3 - mine) else 3 - mine
+    return [(3 - cell) % 3 for cell in cells] if first == 2 else cells
+
+
+def _book_positions(max_ply: int) -> Dict[int, List[int]]:
+    # Every reachable, unfinished position with fewer than max_ply stones, one per symmetry class
+    table = solved_table()
+    positions = {}
+    frontier = {0}
+    for ply in range(max_ply):
+        following = set()
+        for code in frontier:
+            cells = [code // 3 ** cell % 3 for cell in range(9)]
+            key, _ = canonical(cells)
+            if key in positions or table[key].best < 0:
+                continue
+            positions[key] = [key // 3 ** cell % 3 for cell in range(9)]
+            value = 1 if ply % 2 == 0 else 2
+            following.update(key + value * 3 ** cell for cell in range(9) if positions[key][cell] == 0)
+        frontier = following
+    return positions
+
+
+def compile_book(path: str, max_ply: int=4, index_path: Union[str, None]=None) -> int:
+    """
+    Compile a book covering every position with fewer than `max_ply` stones.
+
+    Args:
+        path (str): The book file to write.
+        max_ply (int, optional): The number of plies covered. Defaults to 4.
+        index_path (str, optional): A position index to take move weights from. Positions without games
+            fall back to the solver. Defaults to None, which uses the solver only.
+
+    Returns:
+        int: The number of positions in the book.
+    """
+    table = solved_table()
+    index = PositionIndex(index_path) if index_path else None
+    entries = []
+    try:
+        for key, cells in sorted(_book_positions(max_ply).items()):
+            solution = table[key]
+            # Key is the canonical code, so the frame of `cells` is already canonical
+            weights = [1 if solution.optimal >> cell & 1 else 0 for cell in range(9)]
+            if index is not None:
+                played = index.lookup(decode(key)).next_moves
+                # Keep the statistics, but only for moves that keep the game-theoretic value
+                counted = [count if weight else 0 for count, weight in zip(played, weights)]
+                if any(counted):
+                    scale = max(1, max(counted) // 65535 + 1)
+                    weights = [(count + scale - 1) // scale for count in counted]
+            # Equivalent cells share the weight of their canonical representative
+            _, symmetries = canonical(cells)
+            weights = [weights[cell] if canonical_cell(cell, symmetries) == cell else 0 for cell in range(9)]
+            entries.append((key, weights))
+    finally:
+        if index is not None:
+            index.close()
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), max_ply))
+        for key, weights in entries:
+            f.write(ENTRY.pack(key, *weights))
+    return len(entries)
+
+
+class OpeningBook:
+    """
+    A book file, memory-mapped on the first probe.
+
+    Args:
+        path (str): The book file.
+        max_ply (int, optional): Only use the book while fewer than this many stones are on the board.
+            Defaults to None, which uses the depth the book was compiled for.
+        seed (int, optional): Seed for the weighted random choice. Defaults to None.
+    """
+    def __init__(self, path: str, max_ply: Union[int, None]=None, seed: Union[int, None]=None) -> None:
+        self.path: str = path
+        self.max_ply: Union[int, None] = max_ply
+        self.rng: Random = Random(seed)
+        self._map: Union[mmap.mmap, None] = None
+        self.count: int = 0
+
+    def _open(self) -> None:
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, compiled_ply = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not an opening book")
+        if self.max_ply is None:
+            self.max_ply = compiled_ply
+
+    def weights(self, board: Board, player: Union[str, None]=None) -> Union[List[float], None]:
+        """
+        Get the book weights of every cell in the board's orientation.
+
+        Args:
+            board (Board): The game board.
+            player (str, optional): The symbol of the player to move. Defaults to None, which assumes X
+                moved first.
+
+        Returns:
+            list[float] | None: The weights, or None if the position is not in the book or is too deep.
+        """
+        if self._map is None:
+            self._open()
+        cells = _cells(board, player)
+        if sum(1 for value in cells if value) >= self.max_ply:
+            return None
+        key, symmetries = canonical(cells)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_key = struct.unpack_from("<I", self._map, HEADER.size + middle * ENTRY.size)[0]
+            if entry_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count:
+            return None
+        entry = ENTRY.unpack_from(self._map, HEADER.size + low * ENTRY.size)
+        if entry[0] != key:
+            return None
+        representatives = [canonical_cell(cell, symmetries) for cell in range(9)]
+        # Spread the weight of each class of equivalent cells evenly over its members
+        return [entry[1 + representatives[cell]] / representatives.count(representatives[cell])
+                if cells[cell] == 0 else 0 for cell in range(9)]
+
+    def choose(self, board: Board, player: Union[str, None]=None) -> Union[tuple, None]:
+        """
+        Pick a book move at random, by weight.
+
+        Args:
+            board (Board): The game board.
+            player (str, optional): The symbol of the player to move. Defaults to None, which assumes X
+                moved first.
+
+        Returns:
+            tuple | None: The row and column indices of the move, or None if the book has no move.
+        """
+        weights = self.weights(board, player)
+        if not weights or not any(weights):
+            return None
+        cell = self.rng.choices(range(9), weights=weights)[0]
+        return divmod(cell, 3)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def default_book() -> Union[OpeningBook, None]:
+    """
+    Get the book at `$TICTACTOE_BOOK`, or ~/.tic-tac-toe/book.ttob, if it exists.
+    """
+    path = os.environ.get("TICTACTOE_BOOK", DEFAULT_BOOK)
+    if not path or not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def bench(path: str, plies: int=4, games: int=20000) -> tuple:
+    """
+    Measure the average CPU move latency over the first plies, with and without the book.
+
+    Returns:
+        tuple: Microseconds per move without and with the book.
+    """
+    book = OpeningBook(path, seed=0)
+    book.weights(Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)]))
+    rng = Random(0)
+    timings = [0.0, 0.0]
+    moves = 0
+    for _ in range(games):
+        board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        for ply in range(plies):
+            player, opponent = ('X', 'O') if ply % 2 == 0 else ('O', 'X')
+            start = perf_counter()
+            choose_move(board, player, opponent)
+            middle = perf_counter()
+            move = book.choose(board, player) or choose_move(board, player, opponent)
+            timings[0] += middle - start
+            timings[1] += perf_counter() - middle
+            moves += 1
+            board.update_board(player, *rng.choice(board.get_empty_cells()) if rng.random() < 0.5 else move)
+            if board.get_winner() is not None:
+                break
+    book.close()
+    return timings[0] / moves * 1e6, timings[1] / moves * 1e6
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Compile and measure opening books.")
+    parser.add_argument("command", choices=["compile", "bench"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_BOOK)
+    parser.add_argument("--plies", type=int, default=4, help="plies the book covers")
+    parser.add_argument("--index", help="compile: position index to weight moves by")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        print(f"{compile_book(args.path, args.plies, args.index)} positions written to {args.path}")
+    else:
+        without, with_book = bench(args.path, args.plies)
+        print(f"without book  {without:.1f} us/move")
+        print(f"with book     {with_book:.1f} us/move")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Game-tree enumeration ("perft") for the 3x3 board.
+
+Counts every legal move sequence to a given depth, together with how the finished games ended. The tree
+is walked with the same `Board` move generation and `get_winner` checks the game itself uses, so the
+counts double as a correctness check for rule changes and as a throughput benchmark.
+
+Usage:
+    python -m src.perft 9
+    python -m src.perft 4 --position "X...O...." --workers 4 --hash
+"""
+import argparse
+from multiprocessing import Pool
+from time import perf_counter
+from typing import Dict, List, Union
+
+from src.board import Board
+
+
+class PerftResult:
+    """
+    Counts collected while walking a game tree.
+
+    Attributes:
+        nodes (int): Positions visited below the root, one per move played.
+        leaves (int): Sequences that reached the depth limit without the game ending.
+        games (dict): Completed games keyed by result: 'X', 'O' or 'tie'.
+    """
+    def __init__(self) -> None:
+        self.nodes: int = 0
+        self.leaves: int = 0
+        self.games: Dict[str, int] = {'X': 0, 'O': 0, 'tie': 0}
+
+    def add(self, other: "PerftResult") -> None:
+        """
+        Add the counts of another result to this one.
+        """
+        self.nodes += other.nodes
+        self.leaves += other.leaves
+        for result, count in other.games.items():
+            self.games[result] += count
+
+    def total_games(self) -> int:
+        return sum(self.games.values())
+
+    def __repr__(self) -> str:
+        return f"PerftResult(nodes={self.nodes}, leaves={self.leaves}, games={self.games})"
+
+
+def parse_position(position: str) -> List[List[str]]:
+    """
+    Parse a position string of 9 characters, row by row, using 'X', 'O' and '.' for empty cells.
+
+    Args:
+        position (str): The position string.
+
+    Returns:
+        list[list[str]]: The cells in the layout `Board` uses.
+
+    Raises:
+        ValueError: If the string is not a valid position.
+    """
+    if len(position) != 9 or any(ch not in "XO. " for ch in position.upper()):
+        raise ValueError(f"Invalid position: {position!r}")
+    cells = [' ' if ch in ". " else ch for ch in position.upper()]
+    if not 0 <= cells.count('X') - cells.count('O') <= 1:
+        raise ValueError(f"Invalid move counts in position: {position!r}")
+    return [cells[i:i + 3] for i in range(0, 9, 3)]
+
+
+def side_to_move(board: Board) -> str:
+    """
+    Get the symbol of the player to move. X always moves first.
+    """
+    cells = [cell for row in board._board for cell in row]
+    return 'X' if cells.count('X') == cells.count('O') else 'O'
+
+
+def _walk(board: Board, depth: int, player: str, table: Union[dict, None]) -> PerftResult:
+    if table is not None:
+        key = (tuple(cell for row in board._board for cell in row), depth)
+        cached = table.get(key)
+        if cached is not None:
+            return cached
+
+    result = PerftResult()
+    opponent = 'O' if player == 'X' else 'X'
+    for row, col in board.get_empty_cells():
+        board.update_board(player, row, col)
+        result.nodes += 1
+        winner = board.get_winner()
+        if winner is not None:
+            result.games[winner] += 1
+        elif depth == 1:
+            result.leaves += 1
+        else:
+            result.add(_walk(board, depth - 1, opponent, table))
+        board.clear_cell(row, col)
+
+    if table is not None:
+        table[key] = result
+    return result
+
+
+def perft(cells: List[List[str]], depth: int, use_hash: bool=False) -> PerftResult:
+    """
+    Walk the game tree below a position in a single process.
+
+    Args:
+        cells (list[list[str]]): The starting position.
+        depth (int): The number of plies to enumerate.
+        use_hash (bool, optional): If True, cache subtree counts by position so transpositions are only
+            walked once. The counts are identical either way. Defaults to False.
+
+    Returns:
+        PerftResult: The counts below the starting position.
+    """
+    board = Board(None, x=0, y=0, cells=cells)
+    if depth <= 0 or board.get_winner() is not None:
+        return PerftResult()
+    return _walk(board, depth, side_to_move(board), {} if use_hash else None)
+
+
+def _perft_subtree(args: tuple) -> PerftResult:
+    cells, row, col, depth, use_hash = args
+    board = Board(None, x=0, y=0, cells=cells)
+    result = PerftResult()
+    board.update_board(side_to_move(board), row, col)
+    result.nodes += 1
+    winner = board.get_winner()
+    if winner is not None:
+        result.games[winner] += 1
+    elif depth == 1:
+        result.leaves += 1
+    else:
+        result.add(perft(board._board, depth - 1, use_hash))
+    return result
+
+
+def parallel_perft(cells: List[List[str]], depth: int, workers: int=None, use_hash: bool=False) -> PerftResult:
+    """
+    Walk the game tree below a position, one root move per task on a process pool.
+
+    Args:
+        cells (list[list[str]]): The starting position.
+        depth (int): The number of plies to enumerate.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        use_hash (bool, optional): If True, each worker caches subtree counts by position. Defaults to False.
+
+    Returns:
+        PerftResult: The counts below the starting position.
+    """
+    board = Board(None, x=0, y=0, cells=cells)
+    result = PerftResult()
+    if depth <= 0 or board.get_winner() is not None:
+        return result
+    tasks = [(board._board, row, col, depth, use_hash) for row, col in board.get_empty_cells()]
+    with Pool(workers) as pool:
+        for subtree in pool.imap_unordered(_perft_subtree, tasks):
+            result.add(subtree)
+    return result
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Count all game sequences to a given depth.")
+    parser.add_argument("depth", type=int, help="number of plies to enumerate")
+    parser.add_argument("--position", default=".........", help="starting position, e.g. 'X...O....'")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 for one per CPU)")
+    parser.add_argument("--hash", action="store_true", help="cache subtree counts by position")
+    args = parser.parse_args(argv)
+
+    cells = parse_position(args.position)
+    start = perf_counter()
+    if args.workers == 1:
+        result = perft(cells, args.depth, args.hash)
+    else:
+        result = parallel_perft(cells, args.depth, args.workers or None, args.hash)
+    elapsed = perf_counter() - start
+
+    print(f"depth      {args.depth}")
+    print(f"nodes      {result.nodes}")
+    print(f"leaves     {result.leaves}")
+    print(f"games      {result.total_games()} (X {result.games['X']}, O {result.games['O']}, "
+          f"tie {result.games['tie']})")
+    print(f"time       {elapsed:.3f}s")
+    print(f"nodes/sec  {result.nodes / elapsed if elapsed else 0:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+On-disk index from positions to game statistics, built from game archives.
+
+Every position of every finished 3x3 game is reduced to its canonical form under the 8 symmetries of the
+board, and counted with the game's result and the move played from it. The index file is a header
+followed by fixed-size entries sorted by key:
+
+    header := magic "TTPI" | version u32 | entry_count u64
+    entry  := key u64 | x_wins u32 | o_wins u32 | draws u32 | next_move_count u32 * 9
+
+It is built with an external sort (sorted runs spilled to disk, then merged), queried by binary search
+over a memory map, and can be merged with new archives incrementally.
+
+Usage:
+    python -m src.position_index build ~/.tic-tac-toe/games.tttg positions.idx
+    python -m src.position_index merge positions.idx new_games.tttg
+    python -m src.position_index query positions.idx "X...O...."
+"""
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Union
+
+from src.perft import parse_position
+from src.record import GameRecord, read_records
+from src.solver import POWERS, SYMBOLS
+
+
+HEADER: struct.Struct = struct.Struct("<4sIQ")
+ENTRY: struct.Struct = struct.Struct("<Q12I")
+MAGIC: bytes = b"TTPI"
+VERSION: int = 1
+
+
+def _transform(rotate: int, flip: bool) -> tuple:
+    cells = []
+    for cell in range(9):
+        row, col = divmod(cell, 3)
+        if flip:
+            col = 2 - col
+        for _ in range(rotate):
+            row, col = col, 2 - row
+        cells.append(row * 3 + col)
+    return tuple(cells)
+
+
+# Each symmetry maps a cell index to where that cell goes
+SYMMETRIES: List[tuple] = [_transform(rotate, flip) for flip in (False, True) for rotate in range(4)]
+_SYMMETRY_POWERS: List[tuple] = [tuple(POWERS[symmetry[cell]] for cell in range(9)) for symmetry in SYMMETRIES]
+
+
+def canonical(cells: List[int]) -> tuple:
+    """
+    Find the canonical form of a position: the smallest base-3 code under any symmetry.
+
+    Args:
+        cells (list[int]): Nine cell values, 0 for empty, 1 for X, 2 for O.
+
+    Returns:
+        tuple: The canonical code and every symmetry that produces it. A symmetric position has several.
+    """
+    codes = [sum(value * powers[cell] for cell, value in enumerate(cells)) for powers in _SYMMETRY_POWERS]
+    key = min(codes)
+    return key, [symmetry for symmetry, code in zip(SYMMETRIES, codes) if code == key]
+
+
+def canonical_cell(cell: int, symmetries: List[tuple]) -> int:
+    """
+    Map a cell to the canonical frame. Cells that a symmetry of the position makes equivalent, such as the
+    four corners of the empty board, all map to the same cell.
+    """
+    return min(symmetry[cell] for symmetry in symmetries)
+
+
+class PositionStats:
+    """
+    How the games through a position went.
+
+    Attributes:
+        x_wins (int), o_wins (int), draws (int): Results of the games that reached the position.
+        next_moves (list[int]): How often each cell was played next, in the queried orientation. Cells that
+            are equivalent under a symmetry of the position share one count.
+    """
+    __slots__ = ("x_wins", "o_wins", "draws", "next_moves")
+
+    def __init__(self, x_wins: int=0, o_wins: int=0, draws: int=0, next_moves: List[int]=None) -> None:
+        self.x_wins: int = x_wins
+        self.o_wins: int = o_wins
+        self.draws: int = draws
+        self.next_moves: List[int] = [0] * 9 if next_moves is None else next_moves
+
+    def games(self) -> int:
+        return self.x_wins + self.o_wins + self.draws
+
+    def __repr__(self) -> str:
+        return f"PositionStats(x_wins={self.x_wins}, o_wins={self.o_wins}, draws={self.draws}, " \
+               f"next_moves={self.next_moves})"
+
+
+def positions(record: GameRecord) -> Iterator[tuple]:
+    """
+    Walk a finished 3x3 game and yield one index row per position reached.
+
+    Yields:
+        tuple: (key, result column 0-2, canonical next cell or -1 for the final position)
+    """
+    column = {'X': 0, 'O': 1, 'tie': 2}[record.result]
+    # The code of the position under every symmetry, updated move by move instead of recomputed
+    codes = [0] * len(SYMMETRIES)
+    value = SYMBOLS.index(record.first)
+    for cell in record.moves:
+        key = min(codes)
+        yield key, column, min(symmetry[cell] for symmetry, code in zip(SYMMETRIES, codes) if code == key)
+        for i, powers in enumerate(_SYMMETRY_POWERS):
+            codes[i] += value * powers[cell]
+        value = 3 - value
+    yield min(codes), column, -1
+
+
+def _aggregate(rows: Iterable[tuple], run_size: int, directory: str) -> List[str]:
+    # Count rows in memory and spill a sorted run whenever `run_size` distinct keys are held
+    runs = []
+    counts: Dict[int, List[int]] = {}
+
+    def spill() -> None:
+        path = os.path.join(directory, f"run{len(runs)}")
+        with open(path, "wb") as f:
+            for key in sorted(counts):
+                f.write(ENTRY.pack(key, *counts[key]))
+        runs.append(path)
+        counts.clear()
+
+    for key, column, move in rows:
+        entry = counts.get(key)
+        if entry is None:
+            if len(counts) >= run_size:
+                spill()
+            entry = counts[key] = [0] * 12
+        entry[column] += 1
+        if move >= 0:
+            entry[3 + move] += 1
+    if counts:
+        spill()
+    return runs
+
+
+def _read_run(path: str, skip_header: bool=False) -> Iterator[tuple]:
+    with open(path, "rb") as f:
+        if skip_header:
+            f.seek(HEADER.size)
+        while True:
+            chunk = f.read(ENTRY.size * 4096)
+            if not chunk:
+                return
+            yield from ENTRY.iter_unpack(chunk)
+
+
+def _write_merged(runs: List[Iterator[tuple]], path: str) -> int:
+    # Merge sorted runs, summing the counts of equal keys, into a new index file
+    count = 0
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0))
+        current = None
+        for entry in heapq.merge(*runs):
+            if current is not None and entry[0] == current[0]:
+                current = [a + b for a, b in zip(current, entry)]
+                current[0] = entry[0]
+                continue
+            if current is not None:
+                f.write(ENTRY.pack(*current))
+                count += 1
+            current = list(entry)
+        if current is not None:
+            f.write(ENTRY.pack(*current))
+            count += 1
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, count))
+    os.replace(tmp, path)
+    return count
+
+
+def _rows(archives: List[str]) -> Iterator[tuple]:
+    for archive in archives:
+        for record in read_records(archive):
+            if record.result is not None and (record.rows, record.cols, record.k) == (3, 3, 3):
+                yield from positions(record)
+
+
+def build(archives: List[str], path: str, run_size: int=1_000_000, merge_with: Union[str, None]=None) -> int:
+    """
+    Build an index from game archives.
+
+    Args:
+        archives (list[str]): The archives to read.
+        path (str): The index file to write.
+        run_size (int, optional): Distinct keys held in memory before a sorted run is spilled. Defaults to 1M.
+        merge_with (str, optional): An existing index whose counts are added. Defaults to None.
+
+    Returns:
+        int: The number of entries written.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+        runs = [_read_run(run) for run in _aggregate(_rows(archives), run_size, directory)]
+        if merge_with is not None:
+            runs.append(_read_run(merge_with, skip_header=True))
+        return _write_merged(runs, path)
+
+
+def merge(path: str, archives: List[str], run_size: int=1_000_000) -> int:
+    """
+    Add the games of new archives to an existing index.
+
+    Returns:
+        int: The number of entries in the updated index.
+    """
+    return build(archives, path, run_size, merge_with=path)
+
+
+class PositionIndex:
+    """
+    Read-only access to an index file through a memory map.
+
+    Args:
+        path (str): The index file.
+
+    Raises:
+        ValueError: If the file is not a position index.
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a position index")
+
+    def _entry(self, i: int) -> tuple:
+        return ENTRY.unpack_from(self._map, HEADER.size + i * ENTRY.size)
+
+    def _key(self, i: int) -> int:
+        return struct.unpack_from("<Q", self._map, HEADER.size + i * ENTRY.size)[0]
+
+    def lookup(self, cells: List[List[str]]) -> PositionStats:
+        """
+        Get the statistics of a position, in any orientation.
+
+        Args:
+            cells (list[list[str]]): The position, laid out as `Board` stores it.
+
+        Returns:
+            PositionStats: The counts, all zero if no game reached the position.
+        """
+        key, symmetries = canonical([SYMBOLS.index(cell) for row in cells for cell in row])
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self._key(low) != key:
+            return PositionStats()
+        entry = self._entry(low)
+        return PositionStats(entry[1], entry[2], entry[3],
+                             [entry[4 + canonical_cell(cell, symmetries)] for cell in range(9)])
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "PositionIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Build and query a position index over game archives.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("archives", nargs="+")
+    build_parser.add_argument("index")
+    merge_parser = subparsers.add_parser("merge")
+    merge_parser.add_argument("index")
+    merge_parser.add_argument("archives", nargs="+")
+    query_parser = subparsers.add_parser("query")
+    query_parser.add_argument("index")
+    query_parser.add_argument("position", help="e.g. 'X...O....'")
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    if args.command == "build":
+        *archives, index = args.archives + [args.index]
+        print(f"{build(archives, index)} positions in {perf_counter() - start:.2f}s")
+    elif args.command == "merge":
+        print(f"{merge(args.index, args.archives)} positions in {perf_counter() - start:.2f}s")
+    else:
+        with PositionIndex(args.index) as index:
+            stats = index.lookup(parse_position(args.position))
+        elapsed = (perf_counter() - start) * 1000
+        games = stats.games()
+        print(f"games      {games}")
+        if games:
+            print(f"X wins     {stats.x_wins} ({stats.x_wins / games:.1%})")
+            print(f"O wins     {stats.o_wins} ({stats.o_wins / games:.1%})")
+            print(f"draws      {stats.draws} ({stats.draws / games:.1%})")
+            print(f"next moves {stats.next_moves}")
+        print(f"query      {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Timing spans for the game loop, kept in HDR-style histograms.
+
+Profiling is off unless `enable` is called (`python main.py --profile`, or `TICTACTOE_PROFILE=1`). While
+it is off, `span` returns a shared no-op context manager, so instrumented code pays one function call.
+
+    with profiling.span("think"):
+        move = choose_move(board, player, opponent)
+
+Spans recorded by the game: input (waiting in getch), refresh, think, get_winner, send and recv.
+"""
+import atexit
+import sys
+from time import perf_counter_ns
+from typing import Dict, List, TextIO, Union
+
+from src.screen import ForwardingScreen, Screen
+from src.utils import footer_slot
+from src.utils import footer_slot
+
+
+# Values below 2**SUB_BITS ns are exact; above that, buckets are 1/2**(SUB_BITS-1) of their magnitude wide
+SUB_BITS: int = 8
+SUB_COUNT: int = 1 << SUB_BITS
+HALF_COUNT: int = SUB_COUNT // 2
+MAX_SHIFT: int = 40
+
+
+class Histogram:
+    """
+    Counts of nanosecond durations in log-linear buckets, with under 1% relative error.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (SUB_COUNT + MAX_SHIFT * HALF_COUNT)
+        self.count: int = 0
+        self.total: int = 0
+        self.max: int = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < SUB_COUNT:
+            return value
+        shift = min(value.bit_length() - SUB_BITS, MAX_SHIFT)
+        return SUB_COUNT + (shift - 1) * HALF_COUNT + min(value >> shift, SUB_COUNT - 1) - HALF_COUNT
+
+    @staticmethod
+    def _highest(index: int) -> int:
+        # The largest value that falls in a bucket
+        if index < SUB_COUNT:
+            return index
+        shift = (index - SUB_COUNT) // HALF_COUNT + 1
+        top = (index - SUB_COUNT) % HALF_COUNT + HALF_COUNT
+        return ((top + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> int:
+        """
+        Get the value at or below which a fraction `q` of the recorded values fall.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest(index), self.max)
+        return self.max
+
+
+class Profiler:
+    """
+    A histogram per span name.
+    """
+    def __init__(self) -> None:
+        self.histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def summary(self) -> str:
+        lines = [f"{'span':<12}{'count':>8}{'p50':>11}{'p99':>11}{'max':>11}{'total':>11}"]
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            lines.append(f"{name:<12}{histogram.count:>8}{_duration(histogram.percentile(0.5)):>11}"
+                         f"{_duration(histogram.percentile(0.99)):>11}{_duration(histogram.max):>11}"
+                         f"{_duration(histogram.total):>11}")
+        return "\n".join(lines)
+
+    def overlay(self) -> str:
+        """
+        Get a one-line summary for the live overlay.
+        """
+        parts = []
+        for name in ("think", "refresh", "get_winner", "recv"):
+            histogram = self.histograms.get(name)
+            if histogram is not None and histogram.count:
+                parts.append(f"{name} p99 {_duration(histogram.percentile(0.99))}")
+        return "  ".join(parts)
+
+
+def _duration(ns: int) -> str:
+    if ns < 1_000:
+        return f"{ns}ns"
+    if ns < 1_000_000:
+        return f"{ns / 1e3:.1f}us"
+    if ns < 1_000_000_000:
+        return f"{ns / 1e6:.1f}ms"
+    return f"{ns / 1e9:.2f}s"
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram: Histogram = histogram
+
+    def __enter__(self) -> "_Span":
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.record(perf_counter_ns() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_SPAN: _NullSpan = _NullSpan()
+_profiler: Union[Profiler, None] = None
+
+
+def span(name: str) -> Union[_Span, _NullSpan]:
+    """
+    Time a block under a name, if profiling is on.
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return _Span(_profiler.histogram(name))
+
+
+def enable(out: Union[TextIO, None]=sys.stderr) -> Profiler:
+    """
+    Turn profiling on for the rest of the process.
+
+    Args:
+        out (TextIO, optional): Where the summary is printed at exit. Defaults to stderr; None prints nothing.
+
+    Returns:
+        Profiler: The process-wide profiler.
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+        if out is not None:
+            atexit.register(lambda: print("\n" + _profiler.summary(), file=out))
+    return _profiler
+
+
+def disable() -> None:
+    global _profiler
+    _profiler = None
+
+
+class ProfilingScreen(ForwardingScreen):
+    """
+    Forward everything to another screen, timing input waits and refreshes.
+
+    Args:
+        screen (Screen): The screen to forward to.
+        profiler (Profiler): Where to record.
+        overlay (bool, optional): Show live span statistics on the footer line, left of where an
+            online game shows its round trip. Defaults to False.
+    """
+    def __init__(self, screen: Screen, profiler: Profiler, overlay: bool=False) -> None:
+        super().__init__(screen)
+        self.profiler: Profiler = profiler
+        self.overlay: bool = overlay
+        self._input: Histogram = profiler.histogram("input")
+        self._refresh: Histogram = profiler.histogram("refresh")
+
+    def refresh(self) -> None:
+        if self.overlay:
+            self._draw_overlay()
+        start = perf_counter_ns()
+        self.screen.refresh()
+        self._refresh.record(perf_counter_ns() - start)
+
+    def _draw_overlay(self) -> None:
+        y, x, width = footer_slot(self.screen, "profile")
+        text = self.profiler.overlay()[:width]
+        if width > 0 and text:
+            self.screen.addstr(y, x, text.rjust(width))
+
+    def getch(self) -> int:
+        start = perf_counter_ns()
+        key = self.screen.getch()
+        if key != -1:
+            self._input.record(perf_counter_ns() - start)
+        return key
+
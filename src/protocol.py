@@ -0,0 +1,297 @@
+"""
+Line-based engine protocol over stdin/stdout, modelled on UCI.
+
+Cells are numbered row * 3 + col. A session looks like:
+
+    > ttt
+    < id name tic-tac-toe
+    < tttok
+    > setoption name Strategy value perfect
+    > isready
+    < readyok
+    > newgame
+    > position startpos moves 4 0
+    > go movetime 100
+    < bestmove 8
+
+`position cells X...O....` sets the cells directly. `go infinite` keeps the answer until `stop`.
+
+Usage:
+    python -m src.protocol                      # run our engine on stdin/stdout
+    python -m src.protocol bench "python -m src.protocol"
+"""
+import argparse
+import os
+import selectors
+import shlex
+import subprocess
+import sys
+from time import perf_counter
+from typing import List, TextIO, Union
+
+from src.board import Board
+from src.cpu import choose_move
+from src.solver import best_move
+
+
+STRATEGIES: List[str] = ["heuristic", "perfect"]
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class EngineSession:
+    """
+    The engine side of the protocol: keeps the current position and answers commands.
+
+    Args:
+        output (TextIO): Where replies are written.
+    """
+    def __init__(self, output: TextIO) -> None:
+        self.output: TextIO = output
+        self.strategy: str = "heuristic"
+        self.board: Board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        self.pending: Union[int, None] = None
+
+    def send(self, line: str) -> None:
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    def think(self) -> int:
+        """
+        Choose a move for the side to move with the configured strategy.
+
+        Returns:
+            int: The cell index, or -1 if the game is over.
+        """
+        if self.board.get_winner() is not None:
+            return -1
+        cells = [cell for row in self.board._board for cell in row]
+        player = 'X' if cells.count('X') == cells.count('O') else 'O'
+        if self.strategy == "perfect":
+            move = best_move(self.board)
+        else:
+            move = choose_move(self.board, player, 'O' if player == 'X' else 'X')
+        return -1 if move is None else move[0] * 3 + move[1]
+
+    def handle(self, line: str) -> bool:
+        """
+        Handle one command line.
+
+        Returns:
+            bool: False once the session should end.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "ttt":
+            self.send("id name tic-tac-toe")
+            self.send(f"option name Strategy type combo default heuristic {' '.join('var ' + s for s in STRATEGIES)}")
+            self.send("tttok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption" and len(args) >= 4 and args[1].lower() == "strategy" and args[3] in STRATEGIES:
+            self.strategy = args[3]
+        elif command == "newgame":
+            self.board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+            self.pending = None
+        elif command == "position":
+            self.board = Board(None, x=0, y=0, cells=self._parse_position(args))
+        elif command == "go":
+            move = self.think()
+            if args[:1] == ["infinite"]:
+                self.pending = move
+            else:
+                self.send(f"bestmove {move if move >= 0 else '(none)'}")
+        elif command == "stop":
+            if self.pending is not None:
+                self.send(f"bestmove {self.pending if self.pending >= 0 else '(none)'}")
+                self.pending = None
+        elif command == "quit":
+            return False
+        else:
+            self.send(f"info string unknown command: {line.strip()}")
+        return True
+
+    @staticmethod
+    def _parse_position(args: List[str]) -> List[List[str]]:
+        if args[:1] == ["cells"] and len(args) >= 2:
+            cells = [' ' if ch == '.' else ch for ch in args[1].upper()]
+            return [cells[i:i + 3] for i in range(0, 9, 3)]
+        if args[:1] == ["startpos"]:
+            cells = [' '] * 9
+            moves = args[2:] if args[1:2] == ["moves"] else []
+            for i, move in enumerate(moves):
+                cells[int(move)] = 'X' if i % 2 == 0 else 'O'
+            return [cells[i:i + 3] for i in range(0, 9, 3)]
+        raise ProtocolError(f"bad position: {' '.join(args)}")
+
+
+def run_engine(input: TextIO=sys.stdin, output: TextIO=sys.stdout) -> None:
+    """
+    Run our engine until `quit` or end of input.
+    """
+    session = EngineSession(output)
+    for line in input:
+        try:
+            if not session.handle(line):
+                break
+        except (ProtocolError, ValueError, IndexError) as e:
+            session.send(f"info string error: {e}")
+
+
+class ExternalEngine:
+    """
+    Drive an engine speaking the protocol as a long-lived subprocess.
+
+    Replies are read through a non-blocking pipe, so a silent engine can't hang the game.
+
+    Args:
+        command (str | list): The command line that starts the engine.
+        timeout (float, optional): Seconds to wait for any expected reply. Defaults to 5.0.
+    """
+    def __init__(self, command: Union[str, List[str]], timeout: float=5.0) -> None:
+        self.command: List[str] = shlex.split(command) if isinstance(command, str) else command
+        self.timeout: float = timeout
+        self.name: str = self.command[0]
+        self._process: Union[subprocess.Popen, None] = None
+        self._buffer: bytes = b""
+        self._selector: selectors.DefaultSelector = selectors.DefaultSelector()
+
+    def start(self) -> None:
+        """
+        Start the engine and complete the handshake.
+
+        Raises:
+            ProtocolError: If the engine doesn't answer the handshake in time.
+        """
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        os.set_blocking(self._process.stdout.fileno(), False)
+        self._selector.register(self._process.stdout, selectors.EVENT_READ)
+        self.send("ttt")
+        for line in self.read_until("tttok"):
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+
+    def send(self, line: str) -> None:
+        self._process.stdin.write((line + "\n").encode())
+
+    def read_line(self, timeout: float) -> Union[str, None]:
+        """
+        Read one reply line.
+
+        Returns:
+            str | None: The line, or None if nothing arrived in time.
+
+        Raises:
+            ProtocolError: If the engine exited.
+        """
+        deadline = perf_counter() + timeout
+        while b"\n" not in self._buffer:
+            remaining = deadline - perf_counter()
+            if remaining <= 0 or not self._selector.select(remaining):
+                return None
+            chunk = self._process.stdout.read(65536)
+            if not chunk:
+                raise ProtocolError(f"engine {self.name} exited")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode().strip()
+
+    def read_until(self, prefix: str) -> List[str]:
+        """
+        Read reply lines up to and including the first one starting with `prefix`.
+
+        Raises:
+            ProtocolError: If no such line arrives within the timeout.
+        """
+        lines = []
+        deadline = perf_counter() + self.timeout
+        while True:
+            line = self.read_line(deadline - perf_counter())
+            if line is None:
+                raise ProtocolError(f"engine {self.name} did not answer {prefix!r} in time")
+            lines.append(line)
+            if line.startswith(prefix):
+                return lines
+
+    def new_game(self) -> None:
+        self.send("newgame")
+        self.send("isready")
+        self.read_until("readyok")
+
+    def best_move(self, board: Board, movetime: int=1000) -> Union[tuple, None]:
+        """
+        Ask the engine for a move in the board's position.
+
+        Args:
+            board (Board): The game board.
+            movetime (int, optional): Milliseconds the engine may think. Defaults to 1000.
+
+        Returns:
+            tuple | None: The row and column indices of the move, or None if the engine has none or names a
+                cell that doesn't exist.
+
+        Raises:
+            ProtocolError: If the engine doesn't answer in time or has exited.
+        """
+        cells = "".join('.' if cell == ' ' else cell for row in board._board for cell in row)
+        self.send(f"position cells {cells}")
+        # The answer to a search that timed out may still come; it arrives before readyok and is dropped
+        self.send("isready")
+        self.read_until("readyok")
+        self.send(f"go movetime {movetime}")
+        answer = self.read_until("bestmove")[-1].split()
+        if len(answer) < 2 or not answer[1].isdigit() or int(answer[1]) > 8:
+            return None
+        return divmod(int(answer[1]), 3)
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        try:
+            self.send("quit")
+            self._process.stdin.close()
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._selector.close()
+        self._process = None
+
+
+def bench(command: str, moves: int=2000) -> float:
+    """
+    Measure the round trip of `position` + `go` against a running engine.
+
+    Returns:
+        float: Microseconds per move after startup.
+    """
+    engine = ExternalEngine(command)
+    engine.start()
+    engine.new_game()
+    board = Board(None, x=0, y=0, cells=[['X', ' ', ' '], [' ', 'O', ' '], [' ', ' ', ' ']])
+    start = perf_counter()
+    for _ in range(moves):
+        engine.best_move(board, movetime=10)
+    elapsed = perf_counter() - start
+    engine.close()
+    return elapsed / moves * 1e6
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Tic-tac-toe engine protocol.")
+    parser.add_argument("command", nargs="?", choices=["engine", "bench"], default="engine")
+    parser.add_argument("engine_command", nargs="?", default=f"{sys.executable} -m src.protocol",
+                        help="bench: the engine to measure")
+    args = parser.parse_args(argv)
+
+    if args.command == "engine":
+        run_engine()
+    else:
+        print(f"{bench(args.engine_command):.1f} us per move")
+
+
+if __name__ == "__main__":
+    main()
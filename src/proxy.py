@@ -0,0 +1,159 @@
+"""
+A TCP proxy that makes the network worse on purpose: it delays traffic, adds jitter, can stall a
+connection so it goes silent without closing, like a half-open TCP connection, and can inject bytes the
+target never sent.
+
+Usage:
+    python -m src.proxy --target 192.168.1.20:12345 --delay 0.05 --jitter 0.01
+    # then join 127.0.0.1 instead of the host's address
+"""
+import argparse
+import heapq
+import socket
+import threading
+from random import Random
+from time import monotonic
+from typing import List, Union
+
+
+class ImpairedLink:
+    """
+    Carry one direction of a proxied connection, delivering each chunk `delay` (plus up to `jitter`)
+    seconds after it arrived, in order.
+    """
+    def __init__(self, source: socket.socket, destination: socket.socket, proxy: "Proxy") -> None:
+        self.source: socket.socket = source
+        self.destination: socket.socket = destination
+        self.proxy: Proxy = proxy
+        self.queue: List[tuple] = []
+        self.ready: threading.Condition = threading.Condition()
+        self._sequence: int = 0
+        self._last_due: float = 0.0
+
+    def receive(self) -> None:
+        while True:
+            try:
+                chunk = self.source.recv(65536)
+            except OSError:
+                chunk = b""
+            if chunk and self.proxy.stalled:
+                continue
+            self.push(chunk)
+            if not chunk:
+                return
+
+    def push(self, chunk: bytes) -> None:
+        """
+        Queue a chunk for delivery behind those already on their way; an empty one closes the direction.
+        """
+        with self.ready:
+            delay = self.proxy.delay + self.proxy.rng.uniform(0, self.proxy.jitter)
+            # TCP keeps order, so a chunk never overtakes the one before it
+            self._last_due = max(self._last_due, monotonic() + delay)
+            heapq.heappush(self.queue, (self._last_due, self._sequence, chunk))
+            self._sequence += 1
+            self.ready.notify()
+
+    def deliver(self) -> None:
+        while True:
+            with self.ready:
+                while not self.queue:
+                    self.ready.wait()
+                due, _, chunk = self.queue[0]
+                wait = due - monotonic()
+                if wait > 0:
+                    self.ready.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+            try:
+                if not chunk:
+                    self.destination.shutdown(socket.SHUT_WR)
+                    return
+                self.destination.sendall(chunk)
+            except OSError:
+                return
+
+
+class Proxy:
+    """
+    Forward connections on a local port to a target, impairing the traffic both ways.
+
+    Args:
+        target (tuple): The (host, port) to forward to.
+        port (int, optional): The local port to listen on; 0 picks a free one. Defaults to 0.
+        delay (float, optional): Seconds added to every chunk, each way. Defaults to 0.
+        jitter (float, optional): Up to this many more seconds, at random. Defaults to 0.
+        seed (int, optional): Seed for the jitter. Defaults to None.
+
+    Attributes:
+        stalled (bool): While set, traffic both ways is dropped and the connections stay open.
+    """
+    def __init__(self, target: tuple, port: int=0, delay: float=0.0, jitter: float=0.0,
+                 seed: Union[int, None]=None) -> None:
+        self.target: tuple = target
+        self.delay: float = delay
+        self.jitter: float = jitter
+        self.rng: Random = Random(seed)
+        self.stalled: bool = False
+        self.listener: socket.socket = socket.create_server(("127.0.0.1", port))
+        self.port: int = self.listener.getsockname()[1]
+        self.connections: List[socket.socket] = []
+        # The directions carrying the target's traffic back to each client
+        self.downstream: List[ImpairedLink] = []
+
+    def start(self) -> "Proxy":
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            server = socket.create_connection(self.target)
+            self.connections += [client, server]
+            for source, destination in ((client, server), (server, client)):
+                link = ImpairedLink(source, destination, self)
+                if source is server:
+                    self.downstream.append(link)
+                threading.Thread(target=link.receive, daemon=True).start()
+                threading.Thread(target=link.deliver, daemon=True).start()
+
+    def inject(self, data: bytes) -> None:
+        """
+        Send bytes to every client as if the target had sent them, in order with its own traffic.
+        """
+        for link in self.downstream:
+            link.push(data)
+
+    def close(self) -> None:
+        self.listener.close()
+        for connection in self.connections:
+            connection.close()
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="TCP proxy that delays traffic and can stall it.")
+    parser.add_argument("--listen", type=int, default=12345, help="local port")
+    parser.add_argument("--target", default="127.0.0.1:12345", help="host:port to forward to")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds added each way")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    args = parser.parse_args(argv)
+
+    host, port = args.target.rsplit(":", 1)
+    proxy = Proxy((host, int(port)), args.listen, args.delay, args.jitter).start()
+    print(f"127.0.0.1:{proxy.port} -> {args.target}; press Enter to stall or resume the traffic")
+    try:
+        while True:
+            input()
+            proxy.stalled = not proxy.stalled
+            print("stalled" if proxy.stalled else "flowing")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        proxy.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Puzzles: positions where the side to move has exactly one winning move, or a forced win in a few moves.
+
+Puzzles are generated by streaming positions through a pipeline of generators:
+
+    walk      every unfinished position reachable from the roots, each once
+    solve     the value of every move there, from the variant's solver (src.variants)
+    tactical  positions with a winning move, unique if asked, winning in `min_moves` to `max_moves`
+    distinct  one position per symmetry class
+
+The tree is split at `split` plies: the positions above the split are walked in this process and the
+subtrees below it are sharded over a process pool, each shard running the same pipeline. Puzzles are
+written to a file indexed by how many moves they take, so a random one, of any or a given length, is a
+single seek:
+
+    header  := magic "TTPZ" | version u32 | count u32 | levels u32 | description_length u32
+    variant := description (JSON)
+    index   := start u32 * (levels + 1)    puzzles winning in n moves are start[n - 1] to start[n]
+    puzzle  := x u32 | o u32 | cell u8 | symbol u8 | player u8 | moves u8
+
+Usage:
+    python -m src.puzzles generate
+    python -m src.puzzles generate wild --max-moves 4 --all-wins
+    python -m src.puzzles generate --path puzzles-3x4.ttpz --rows 3 --cols 4 --max-moves 4 --workers 0
+    python -m src.puzzles show
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+from itertools import chain
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from src.variants import OWN, SYMBOLS, VARIANTS, Rules, Variant, compile_variant
+
+
+HEADER: struct.Struct = struct.Struct("<4sIIII")
+START: struct.Struct = struct.Struct("<I")
+ENTRY: struct.Struct = struct.Struct("<IIBBBB")
+MAGIC: bytes = b"TTPZ"
+VERSION: int = 1
+MAX_CELLS: int = 32
+
+DEFAULT_PUZZLES: str = os.path.join(os.path.expanduser("~"), ".tic-tac-toe", "puzzles.ttpz")
+
+
+class Puzzle:
+    """
+    A position and the move that wins it.
+
+    Attributes:
+        x (int): Mask of the cells holding X (numbered row * cols + col).
+        o (int): Mask of the cells holding O.
+        player (int): The player to move, 0 for whoever moved first.
+        cell (int): The winning move's cell; the quickest win if there are several.
+        symbol (int): The symbol to place there, 0 for X and 1 for O.
+        moves (int): The moves the player to move needs to win, their first included.
+    """
+    __slots__ = ("x", "o", "player", "cell", "symbol", "moves")
+
+    def __init__(self, x: int, o: int, player: int, cell: int, symbol: int, moves: int) -> None:
+        self.x: int = x
+        self.o: int = o
+        self.player: int = player
+        self.cell: int = cell
+        self.symbol: int = symbol
+        self.moves: int = moves
+
+    def cells(self, cols: int, cells: int) -> List[List[str]]:
+        """
+        Get the position laid out as `Board` stores it.
+        """
+        flat = ['X' if self.x >> cell & 1 else 'O' if self.o >> cell & 1 else ' ' for cell in range(cells)]
+        return [flat[i:i + cols] for i in range(0, cells, cols)]
+
+    def astuple(self) -> tuple:
+        return self.x, self.o, self.player, self.cell, self.symbol, self.moves
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Puzzle) and self.astuple() == other.astuple()
+
+    def __repr__(self) -> str:
+        return (f"Puzzle(x={self.x:#x}, o={self.o:#x}, player={self.player}, cell={self.cell}, "
+                f"symbol={SYMBOLS[self.symbol]!r}, moves={self.moves})")
+
+
+def mover(rules: Rules, x: int, o: int) -> int:
+    """
+    Get the player to move (0 for whoever moved first) in a position.
+    """
+    if rules.variant.placement == OWN:
+        return 0 if bin(x).count("1") == bin(o).count("1") else 1
+    return bin(x | o).count("1") % 2
+
+
+def symmetries(rows: int, cols: int) -> List[Tuple[int, ...]]:
+    """
+    Get the symmetries of a board as cell permutations: where each cell goes. Rectangles have the
+    reflections and the half turn, squares the quarter turns and diagonal reflections as well.
+    """
+    maps = [lambda r, c: (r, c), lambda r, c: (r, cols - 1 - c), lambda r, c: (rows - 1 - r, c),
+            lambda r, c: (rows - 1 - r, cols - 1 - c)]
+    if rows == cols:
+        # Transposing after each of the four gives the other four
+        maps += [lambda r, c, m=m: m(r, c)[::-1] for m in maps]
+    return [tuple(row * cols + col for row, col in (m(cell // cols, cell % cols) for cell in range(rows * cols)))
+            for m in maps]
+
+
+def _permute(mask: int, permutation: Tuple[int, ...]) -> int:
+    moved = 0
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        moved |= 1 << permutation[bit.bit_length() - 1]
+    return moved
+
+
+def canonical(x: int, o: int, permutations: List[Tuple[int, ...]]) -> tuple:
+    """
+    Get the key shared by a position and all its images under `permutations`.
+    """
+    return min((_permute(x, permutation), _permute(o, permutation)) for permutation in permutations)
+
+
+def _children(rules: Rules, x: int, o: int) -> Iterator[tuple]:
+    for cell, symbol in rules.moves(x, o, rules.symbols_for(rules.players[mover(rules, x, o)])):
+        bit = 1 << cell
+        yield (x | bit, o) if symbol == 0 else (x, o | bit)
+
+
+def walk(rules: Rules, roots: Iterable[tuple], depth: Union[int, None]=None) -> Iterator[tuple]:
+    """
+    Stream every unfinished position reachable from the roots, each once, depth first.
+
+    Args:
+        roots (iterable): (x, o) positions to start from.
+        depth (int, optional): Don't go more than this many moves below a root. Defaults to None, which
+            walks to the end of every game.
+
+    Yields:
+        tuple: x, o and the player to move.
+    """
+    seen = set()
+    stack = [(x, o, 0) for x, o in roots]
+    while stack:
+        x, o, ply = stack.pop()
+        if (x, o) in seen:
+            continue
+        seen.add((x, o))
+        if rules.outcome(x, o) is not None:
+            continue
+        yield x, o, mover(rules, x, o)
+        if depth is None or ply < depth:
+            stack.extend((child_x, child_o, ply + 1) for child_x, child_o in _children(rules, x, o))
+
+
+def solve(rules: Rules, positions: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    Add the value of every move to each position, as `Rules.evaluate` gives it.
+    """
+    for x, o, player in positions:
+        yield x, o, player, rules.evaluate(x, o, rules.symbols_for(rules.players[player]))
+
+
+def tactical(solved: Iterable[tuple], min_moves: int=1, max_moves: int=3, unique: bool=True) -> Iterator[Puzzle]:
+    """
+    Keep the positions the player to move wins in `min_moves` to `max_moves` moves.
+
+    Args:
+        unique (bool, optional): Also require that every other move throws the win away. Defaults to True.
+    """
+    for x, o, player, evaluations in solved:
+        wins = [(distance, cell, symbol) for cell, (value, distance, symbol) in evaluations.items() if value > 0]
+        if not wins or unique and len(wins) > 1:
+            continue
+        distance, cell, symbol = min(wins)
+        moves = (distance + 1) // 2
+        if min_moves <= moves <= max_moves:
+            yield Puzzle(x, o, player, cell, symbol, moves)
+
+
+def distinct(rules: Rules, puzzles: Iterable[Puzzle]) -> Iterator[Puzzle]:
+    """
+    Drop puzzles that are rotations or reflections of ones already streamed.
+    """
+    permutations = symmetries(rules.rows, rules.cols)
+    seen = set()
+    for puzzle in puzzles:
+        key = canonical(puzzle.x, puzzle.o, permutations)
+        if key not in seen:
+            seen.add(key)
+            yield puzzle
+
+
+def pipeline(rules: Rules, positions: Iterable[tuple], min_moves: int=1, max_moves: int=3,
+             unique: bool=True) -> Iterator[Puzzle]:
+    return distinct(rules, tactical(solve(rules, positions), min_moves, max_moves, unique))
+
+
+def frontier(rules: Rules, plies: int) -> List[tuple]:
+    """
+    Get the unfinished positions `plies` moves into the game, one per symmetry class.
+    """
+    permutations = symmetries(rules.rows, rules.cols)
+    level = {(0, 0)}
+    for _ in range(plies):
+        following = {}
+        for x, o in level:
+            if rules.outcome(x, o) is not None:
+                continue
+            for child in _children(rules, x, o):
+                following.setdefault(canonical(*child, permutations), child)
+        level = set(following.values())
+    return sorted((x, o) for x, o in level if rules.outcome(x, o) is None)
+
+
+def _shard(task: tuple) -> List[tuple]:
+    variant, roots, options = task
+    rules = compile_variant(variant)
+    return [puzzle.astuple() for puzzle in pipeline(rules, walk(rules, roots), *options)]
+
+
+def generate(variant: Union[Variant, str], min_moves: int=1, max_moves: int=3, unique: bool=True,
+             workers: Union[int, None]=1, split: int=2) -> Iterator[Puzzle]:
+    """
+    Stream a variant's puzzles, one per symmetry class.
+
+    Args:
+        variant (Variant | str): The rules, or the name of a variant in VARIANTS.
+        min_moves (int, optional): The fewest moves a puzzle may take. Defaults to 1.
+        max_moves (int, optional): The most moves a puzzle may take. Defaults to 3.
+        unique (bool, optional): Only positions with a single winning move. Defaults to True.
+        workers (int, optional): Worker processes for the subtrees below the split; 1 walks them in this
+            process, None uses one per CPU. Defaults to 1.
+        split (int, optional): The ply the tree is sharded at. Defaults to 2.
+
+    Yields:
+        Puzzle: The puzzles, those above the split first.
+    """
+    if isinstance(variant, str):
+        variant = VARIANTS[variant]
+    rules = compile_variant(variant)
+    options = (min_moves, max_moves, unique)
+    above = pipeline(rules, walk(rules, [(0, 0)], depth=split - 1), *options)
+    roots = frontier(rules, split)
+    # Several shards per worker, so one deep subtree doesn't hold up the rest
+    shards = max(1, min(len(roots), 4 * (workers or os.cpu_count() or 1)))
+    tasks = [(variant, roots[i::shards], options) for i in range(shards) if roots[i::shards]]
+    if workers == 1:
+        below = (Puzzle(*puzzle) for shard in map(_shard, tasks) for puzzle in shard)
+        yield from distinct(rules, chain(above, below))
+        return
+    with Pool(workers) as pool:
+        below = (Puzzle(*puzzle) for shard in pool.imap_unordered(_shard, tasks) for puzzle in shard)
+        yield from distinct(rules, chain(above, below))
+
+
+def encode_puzzles(variant: Variant, puzzles: Iterable[Puzzle]) -> bytes:
+    """
+    Build a puzzle file, shortest puzzles first.
+
+    Raises:
+        ValueError: If the board has more than MAX_CELLS cells.
+    """
+    if variant.rows * variant.cols > MAX_CELLS:
+        raise ValueError(f"Puzzle files hold boards of at most {MAX_CELLS} cells")
+    ordered = sorted(puzzles, key=lambda puzzle: (puzzle.moves, puzzle.x, puzzle.o))
+    levels = max((puzzle.moves for puzzle in ordered), default=0)
+    starts = [0] * (levels + 1)
+    for puzzle in ordered:
+        starts[puzzle.moves] += 1
+    for level in range(1, levels + 1):
+        starts[level] += starts[level - 1]
+    description = json.dumps({"name": variant.name, **variant.description()}, sort_keys=True).encode()
+    parts = [HEADER.pack(MAGIC, VERSION, len(ordered), levels, len(description)), description]
+    parts += [START.pack(start) for start in starts]
+    parts += [ENTRY.pack(puzzle.x, puzzle.o, puzzle.cell, puzzle.symbol, puzzle.player, puzzle.moves)
+              for puzzle in ordered]
+    return b"".join(parts)
+
+
+def _save(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first, so a reader never sees half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def write_puzzles(path: str, variant: Variant, puzzles: Iterable[Puzzle]) -> int:
+    """
+    Write a puzzle file.
+
+    Returns:
+        int: The number of puzzles written.
+    """
+    data = encode_puzzles(variant, puzzles)
+    _save(path, data)
+    return HEADER.unpack_from(data)[2]
+
+
+class PuzzleBook:
+    """
+    A puzzle file, memory-mapped, or built in memory.
+
+    Args:
+        source (str | bytes): The file, or its contents.
+
+    Raises:
+        ValueError: If the file is not a puzzle file.
+    """
+    def __init__(self, source: Union[str, bytes]) -> None:
+        self.path: Union[str, None] = source if isinstance(source, str) else None
+        self._map: Union[mmap.mmap, None] = None
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            data = self._map
+        else:
+            data = source
+        self._data: Union[mmap.mmap, bytes] = data
+        name = self.path or "puzzle data"
+        try:
+            magic, version, self.count, self.levels, length = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{name} is not a version {VERSION} puzzle file")
+            description = json.loads(bytes(data[HEADER.size:HEADER.size + length]))
+            self.variant: Variant = Variant(**description)
+        except (struct.error, TypeError, json.JSONDecodeError) as e:
+            self.close()
+            raise ValueError(f"{name} is truncated or corrupt") from e
+        offset = HEADER.size + length
+        self.starts: List[int] = [START.unpack_from(data, offset + i * START.size)[0] for i in range(self.levels + 1)]
+        self._entries: int = offset + (self.levels + 1) * START.size
+        if len(data) != self._entries + self.count * ENTRY.size:
+            self.close()
+            raise ValueError(f"{name} is truncated")
+
+    def puzzle(self, index: int) -> Puzzle:
+        """
+        Get a puzzle by its position in the file.
+
+        Raises:
+            IndexError: If there is no such puzzle.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(f"No puzzle {index}")
+        x, o, cell, symbol, player, moves = ENTRY.unpack_from(self._data, self._entries + index * ENTRY.size)
+        return Puzzle(x, o, player, cell, symbol, moves)
+
+    def levels_available(self) -> Dict[int, int]:
+        """
+        Get how many puzzles win in each number of moves.
+        """
+        return {moves: self.starts[moves] - self.starts[moves - 1] for moves in range(1, self.levels + 1)
+                if self.starts[moves] > self.starts[moves - 1]}
+
+    def random(self, rng: Union[Random, None]=None, moves: Union[int, None]=None) -> tuple:
+        """
+        Pick a puzzle at random.
+
+        Args:
+            rng (Random, optional): The random generator. Defaults to a new one.
+            moves (int, optional): Only puzzles winning in this many moves. Defaults to None, which picks
+                from all of them.
+
+        Returns:
+            tuple: The puzzle's index and the puzzle.
+
+        Raises:
+            IndexError: If there are no such puzzles.
+        """
+        rng = rng or Random()
+        if moves is None:
+            low, high = 0, self.count
+        elif 1 <= moves <= self.levels:
+            low, high = self.starts[moves - 1], self.starts[moves]
+        else:
+            low = high = 0
+        if low == high:
+            raise IndexError("No puzzles to choose from")
+        index = rng.randrange(low, high)
+        return index, self.puzzle(index)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def load_puzzles(path: Union[str, None]=None) -> PuzzleBook:
+    """
+    Open the puzzle file at `path`, `$TICTACTOE_PUZZLES` or ~/.tic-tac-toe/puzzles.ttpz, generating the
+    standard variant's puzzles there first if it doesn't exist. An empty path keeps them in memory.
+    """
+    if path is None:
+        path = os.environ.get("TICTACTOE_PUZZLES", DEFAULT_PUZZLES)
+    if path:
+        try:
+            return PuzzleBook(path)
+        except (OSError, ValueError):
+            pass
+    variant = VARIANTS["standard"]
+    data = encode_puzzles(variant, generate(variant))
+    if path:
+        try:
+            _save(path, data)
+            return PuzzleBook(path)
+        except OSError:
+            pass
+    return PuzzleBook(data)
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate and inspect puzzle files.")
+    parser.add_argument("command", choices=["generate", "show"])
+    parser.add_argument("variant", nargs="?", choices=sorted(VARIANTS), help="a named variant (default: standard)")
+    parser.add_argument("--path", default=DEFAULT_PUZZLES, help=f"the puzzle file (default {DEFAULT_PUZZLES})")
+    parser.add_argument("--rows", type=int, help="generate: a custom board height")
+    parser.add_argument("--cols", type=int, help="generate: a custom board width")
+    parser.add_argument("--k", type=int, default=3, help="generate: custom line length")
+    parser.add_argument("--min-moves", type=int, default=1)
+    parser.add_argument("--max-moves", type=int, default=3)
+    parser.add_argument("--all-wins", action="store_true", help="keep positions with several winning moves too")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 for one per CPU)")
+    parser.add_argument("--split", type=int, default=2, help="the ply the tree is sharded at")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        book = PuzzleBook(args.path)
+        print(f"{book.variant}: {book.count:,} puzzles")
+        for moves, count in book.levels_available().items():
+            print(f"  win in {moves}: {count:,}")
+        book.close()
+        return
+    if args.rows or args.cols:
+        variant = Variant("custom", args.rows or 3, args.cols or 3, args.k)
+    else:
+        variant = VARIANTS[args.variant or "standard"]
+    start = perf_counter()
+    count = write_puzzles(args.path, variant, generate(variant, args.min_moves, args.max_moves, not args.all_wins,
+                                                       args.workers or None, args.split))
+    print(f"{count:,} puzzles for {variant} written to {args.path} in {perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+from time import perf_counter
+from typing import Dict, List, Union
+
+from src.board import Board
+from src.screen import Screen
+
+
+SIZE: int = 4
+CELLS: int = SIZE ** 3
+
+
+def _generate_lines() -> List[int]:
+    """
+    Generate the winning lines of a 4x4x4 cube.
+
+    Cells are indexed `layer * 16 + row * 4 + col`.
+
+    Returns:
+        list[int]: One 64-bit mask per line.
+    """
+    # Only directions whose first non-zero component is positive, so every line is produced once
+    directions = [(dz, dy, dx) for dz in (-1, 0, 1) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                  if (dz, dy, dx) > (0, 0, 0)]
+    lines = []
+    for z in range(SIZE):
+        for y in range(SIZE):
+            for x in range(SIZE):
+                for dz, dy, dx in directions:
+                    cells = [(z + dz * i, y + dy * i, x + dx * i) for i in range(SIZE)]
+                    if all(0 <= c < SIZE for cell in cells for c in cell):
+                        lines.append(sum(1 << (cz * 16 + cy * 4 + cx) for cz, cy, cx in cells))
+    return lines
+
+
+LINES: List[int] = _generate_lines()
+
+# LINES_THROUGH[cell] holds the indices into LINES of the 4 or 7 lines passing through the cell
+LINES_THROUGH: List[tuple] = [tuple(i for i, line in enumerate(LINES) if line >> cell & 1) for cell in range(CELLS)]
+
+# Cells ordered by how many lines pass through them, which is a good first guess for move ordering
+MOVE_ORDER: List[int] = sorted(range(CELLS), key=lambda cell: -len(LINES_THROUGH[cell]))
+
+# Heuristic value of a line holding n stones of one player and none of the other
+_LINE_WEIGHT: List[int] = [0, 1, 8, 64, 0]
+# LINE_VALUE[x_count][o_count] from X's point of view
+LINE_VALUE: List[List[int]] = [[_LINE_WEIGHT[xc] if oc == 0 else -_LINE_WEIGHT[oc] if xc == 0 else 0
+                                for oc in range(SIZE + 1)] for xc in range(SIZE + 1)]
+
+WIN_SCORE: int = 1_000_000
+
+
+class QubicState:
+    """
+    Bitboard state of a 4x4x4 game: one 64-bit integer per player.
+
+    Per-line stone counts, the open threes of each side and a heuristic score (from X's point of view)
+    are updated from the lines through each placed cell, so evaluation doesn't have to rescan the cube.
+    A win is a line mask fully covered by the mover's bitboard, checked on the lines through the cell.
+    """
+    __slots__ = ("bits", "turn", "winner", "score", "counts", "open_threes", "_history")
+
+    def __init__(self) -> None:
+        self.bits: List[int] = [0, 0]
+        self.turn: int = 0
+        # None while the game is running, then 0 (X), 1 (O) or 2 (tie)
+        self.winner: Union[int, None] = None
+        self.score: int = 0
+        # counts[side][line] is the number of stones the side has on the line
+        self.counts: List[List[int]] = [[0] * len(LINES), [0] * len(LINES)]
+        # open_threes[side] maps a line index to the empty cell that completes it
+        self.open_threes: List[Dict[int, int]] = [{}, {}]
+        self._history: List[tuple] = []
+
+    def legal_moves(self) -> List[int]:
+        """
+        Get the empty cells, best candidates first.
+        """
+        if self.winner is not None:
+            return []
+        occupied = self.bits[0] | self.bits[1]
+        return [cell for cell in MOVE_ORDER if not occupied >> cell & 1]
+
+    def _refresh_threat(self, index: int) -> None:
+        xc, oc = self.counts[0][index], self.counts[1][index]
+        for side, mine, theirs in ((0, xc, oc), (1, oc, xc)):
+            if mine == SIZE - 1 and theirs == 0:
+                self.open_threes[side][index] = (LINES[index] & ~self.bits[side]).bit_length() - 1
+            else:
+                self.open_threes[side].pop(index, None)
+
+    def play(self, cell: int) -> None:
+        """
+        Place the stone of the side to move.
+
+        Args:
+            cell (int): The cell index, `layer * 16 + row * 4 + col`.
+        """
+        self._history.append((cell, self.score, self.winner))
+        turn = self.turn
+        mine, xs, os = self.counts[turn], self.counts[0], self.counts[1]
+        self.bits[turn] |= 1 << cell
+        bits = self.bits[turn]
+        delta = 0
+        for index in LINES_THROUGH[cell]:
+            delta -= LINE_VALUE[xs[index]][os[index]]
+            mine[index] += 1
+            delta += LINE_VALUE[xs[index]][os[index]]
+            line = LINES[index]
+            if bits & line == line:
+                self.winner = turn
+            self._refresh_threat(index)
+        if self.winner is None and len(self._history) == CELLS:
+            self.winner = 2
+        self.score += delta
+        self.turn = 1 - turn
+
+    def undo(self) -> None:
+        """
+        Take back the last move.
+        """
+        cell, self.score, self.winner = self._history.pop()
+        self.turn = 1 - self.turn
+        self.bits[self.turn] &= ~(1 << cell)
+        mine = self.counts[self.turn]
+        for index in LINES_THROUGH[cell]:
+            mine[index] -= 1
+            self._refresh_threat(index)
+
+    def threats(self, side: int) -> List[int]:
+        """
+        Get the empty cells that would complete a line for the given side.
+        """
+        return list(set(self.open_threes[side].values()))
+
+    def move_gain(self, cell: int) -> int:
+        """
+        Estimate a move for the side to move as the change of line values it causes, counting both the
+        lines it builds and the opponent lines it spoils.
+        """
+        xs, os = self.counts
+        gain = 0
+        for index in LINES_THROUGH[cell]:
+            xc, oc = xs[index], os[index]
+            before = LINE_VALUE[xc][oc]
+            after = LINE_VALUE[xc + 1][oc] if self.turn == 0 else LINE_VALUE[xc][oc + 1]
+            gain += after - before
+        return gain if self.turn == 0 else -gain
+
+
+def search(state: QubicState, max_depth: int=64, think_time: float=1.0, width: int=10) -> tuple:
+    """
+    Choose a move with iterative-deepening negamax, alpha-beta pruning and a transposition table.
+
+    Forced moves are resolved before searching: a side with an open three wins at once, and a side
+    facing one opponent three must block it. Below the root only the `width` most promising moves by
+    move_gain are searched, which is what lets the search reach depth 6 and beyond in Python.
+
+    Args:
+        state (QubicState): The position to search. It is restored before returning.
+        max_depth (int, optional): The deepest iteration to run. Defaults to 64.
+        think_time (float, optional): Seconds to search before returning the last completed iteration.
+            Defaults to 1.0.
+        width (int, optional): The number of moves searched at interior nodes. Defaults to 10.
+
+    Returns:
+        tuple: The chosen cell and the depth of the last completed iteration.
+    """
+    table: Dict[tuple, tuple] = {}
+    deadline = perf_counter() + think_time
+    nodes = [0]
+
+    class _Timeout(Exception):
+        pass
+
+    def negamax(depth: int, alpha: int, beta: int, ply: int) -> int:
+        nodes[0] += 1
+        if nodes[0] & 1023 == 0 and perf_counter() > deadline:
+            raise _Timeout
+        side = state.turn
+        if state.winner is not None:
+            return 0 if state.winner == 2 else -WIN_SCORE + ply
+        if state.open_threes[side]:
+            return WIN_SCORE - ply - 1
+        blocks = state.threats(1 - side)
+        if len(blocks) > 1:
+            return -WIN_SCORE + ply + 2
+        if depth == 0:
+            return state.score if side == 0 else -state.score
+
+        key = (state.bits[0], state.bits[1])
+        entry = table.get(key)
+        best_move = -1
+        if entry is not None:
+            entry_depth, value, flag, best_move = entry
+            if entry_depth >= depth:
+                if flag == 0 or (flag < 0 and value <= alpha) or (flag > 0 and value >= beta):
+                    return value
+
+        if blocks:
+            moves = blocks
+        else:
+            moves = sorted(state.legal_moves(), key=state.move_gain, reverse=True)
+            if ply > 0:
+                moves = moves[:width]
+        if best_move in moves:
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+        # A forced block does not cost a ply, which keeps forcing sequences visible at low depth
+        child_depth = depth if blocks else depth - 1
+        original_alpha = alpha
+        best = -WIN_SCORE - 1
+        for move in moves:
+            state.play(move)
+            try:
+                value = -negamax(child_depth, -beta, -alpha, ply + 1)
+            finally:
+                state.undo()
+            if value > best:
+                best, best_move = value, move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        flag = -1 if best <= original_alpha else 1 if best >= beta else 0
+        table[key] = (depth, best, flag, best_move)
+        return best
+
+    moves = state.legal_moves()
+    if not moves:
+        raise ValueError("The game is already over")
+    wins = state.threats(state.turn)
+    if wins:
+        return wins[0], 0
+    blocks = state.threats(1 - state.turn)
+    if blocks:
+        return blocks[0], 0
+
+    best_move, completed = moves[0], 0
+    for depth in range(1, max_depth + 1):
+        try:
+            negamax(depth, -WIN_SCORE - 1, WIN_SCORE + 1, 0)
+        except _Timeout:
+            break
+        best_move, completed = table[(state.bits[0], state.bits[1])][3], depth
+        if perf_counter() > deadline or depth >= CELLS - len(state._history):
+            break
+    return best_move, completed
+
+
+class QubicBoard(Board):
+    """
+    A 4x4x4 board drawn as four 4x4 layers side by side, backed by a QubicState.
+    """
+    _size: int = 4
+    _block: int = 4
+    _cell_width: int = 4
+    _cell_height: int = 2
+    _layer_width: int = 15
+    _layer_gap: int = 3
+    _board_width: int = 4 * 15 + 3 * 3
+    _board_height: int = 7
+    _symbols: List[str] = ['X', 'O']
+
+    def __init__(self, stdscr: Screen, x: int=None, y: int=None) -> None:
+        """
+        Initialize a QubicBoard object.
+
+        The cells are kept as 4 rows of 16 columns, column `layer * 4 + col`.
+
+        Args:
+            x (int, optional): The x-coordinate of the top-left corner of the board. Defaults to None.
+            y (int, optional): The y-coordinate of the top-left corner of the board. Defaults to None.
+        """
+        super().__init__(stdscr, x, y, cells=[[' '] * 16 for _ in range(4)])
+        self.state: QubicState = QubicState()
+
+    def _generate_board(self) -> list:
+        """
+        Generate the Unicode representation of the four layers, left to right from the bottom layer.
+
+        Returns:
+            list: The lines representing the game board.
+        """
+        layer = super()._generate_board()
+        gap = " " * self._layer_gap
+        return [gap.join([line.ljust(self._layer_width)] * SIZE) for line in layer]
+
+    def _cell_origin(self, row: int, col: int) -> tuple:
+        layer, col = divmod(col, SIZE)
+        y, x = super()._cell_origin(row, col)
+        return y, x + layer * (self._layer_width + self._layer_gap)
+
+    def _split_x(self, x: int) -> tuple:
+        """
+        Split a screen x-coordinate into a layer index and an x-coordinate relative to the board.
+        """
+        layer, local_x = divmod(x - self.x, self._layer_width + self._layer_gap)
+        return layer, local_x + self.x
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        """
+        Check if the given coordinates are inside a cell of one of the layers.
+        """
+        layer, local_x = self._split_x(x)
+        if not 0 <= layer < SIZE or local_x - self.x >= self._layer_width or y - self.y >= self._board_height:
+            return False
+        return super().in_bounds(local_x, y)
+
+    def get_cell(self, x: int, y: int) -> tuple:
+        """
+        Get the row and column indices of the cell corresponding to the given coordinates.
+
+        Returns:
+            tuple: The row index and the column index `layer * 4 + col`.
+        """
+        layer, local_x = self._split_x(x)
+        row, col = super().get_cell(local_x, y)
+        return row, layer * SIZE + col
+
+    @staticmethod
+    def to_index(row: int, col: int) -> int:
+        """
+        Convert a row and column of the board to a cell index of the cube.
+        """
+        layer, col = divmod(col, SIZE)
+        return layer * 16 + row * SIZE + col
+
+    @staticmethod
+    def to_cell(index: int) -> tuple:
+        """
+        Convert a cell index of the cube to a row and column of the board.
+        """
+        layer, rest = divmod(index, 16)
+        row, col = divmod(rest, SIZE)
+        return row, layer * SIZE + col
+
+    def update_board(self, player: Union[str, chr], row: int, col: int) -> None:
+        """
+        Place the stone of the side to move at the given cell.
+        """
+        self.state.play(self.to_index(row, col))
+        self._board[row][col] = player
+
+    def get_winner(self) -> Union[str, None]:
+        """
+        Check if there is a winner in the cube.
+
+        Returns:
+            str | None: The symbol of the winning player or 'tie' if there's a tie, or None if no winner.
+        """
+        if self.state.winner is None:
+            return None
+        return (self._symbols + ["tie"])[self.state.winner]
@@ -0,0 +1,354 @@
+"""
+Compact binary game records.
+
+An archive is an append-only file of zlib-compressed blocks:
+
+    block  := magic "TTTG" | raw_size u32 | compressed_size u32 | record_count u32 | zlib(records)
+    record := varint rows | varint cols | varint k | varint start_ms | varint duration_ms | flags u8 |
+              string x_player | string o_player | varint move_count | varint cell...
+    flags  := result (0 none, 1 X, 2 O, 3 tie) | 4 if O moved first
+    string := varint length | utf-8 bytes
+
+Cells are numbered row * cols + col. A sidecar `<archive>.idx` holds one (offset u64, record_count u32)
+entry per block, so readers can seek to a record without scanning.
+
+Usage:
+    python -m src.record stats ~/.tic-tac-toe/games.tttg
+    python -m src.record bench --games 1000000
+"""
+import argparse
+import atexit
+import os
+import struct
+import zlib
+from random import Random
+from time import perf_counter, time
+from typing import BinaryIO, Iterator, List, Union
+
+from src.board import Board
+
+
+BLOCK_HEADER: struct.Struct = struct.Struct("<4sIII")
+INDEX_ENTRY: struct.Struct = struct.Struct("<QI")
+MAGIC: bytes = b"TTTG"
+RESULTS: List[Union[str, None]] = [None, 'X', 'O', 'tie']
+
+DEFAULT_ARCHIVE: str = os.path.join(os.path.expanduser("~"), ".tic-tac-toe", "games.tttg")
+
+
+class GameRecord:
+    """
+    One played game.
+
+    Attributes:
+        rows (int), cols (int), k (int): The board dimensions and the line length that wins.
+        x_player (str), o_player (str): Who played each side, e.g. 'local', 'cpu' or a peer address.
+        start (float): Unix time the game started.
+        duration (float): Seconds the game took.
+        result (str | None): 'X', 'O', 'tie', or None if the game was abandoned.
+        first (str): The symbol that moved first.
+        moves (list[int]): The cells played, in order.
+    """
+    __slots__ = ("rows", "cols", "k", "x_player", "o_player", "start", "duration", "result", "first", "moves")
+
+    def __init__(self, x_player: str, o_player: str, rows: int=3, cols: int=3, k: int=3, start: float=None,
+                 duration: float=0.0, result: Union[str, None]=None, moves: List[int]=None,
+                 first: str='X') -> None:
+        self.rows: int = rows
+        self.cols: int = cols
+        self.k: int = k
+        self.x_player: str = x_player
+        self.o_player: str = o_player
+        self.start: float = time() if start is None else start
+        self.duration: float = duration
+        self.result: Union[str, None] = result
+        self.first: str = first
+        self.moves: List[int] = [] if moves is None else moves
+
+    def _key(self) -> tuple:
+        # Times are stored with millisecond precision
+        return (self.rows, self.cols, self.k, self.x_player, self.o_player, int(self.start * 1000),
+                int(self.duration * 1000), self.result, self.first, self.moves)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, GameRecord) and self._key() == other._key()
+
+    def __repr__(self) -> str:
+        return f"GameRecord({self.x_player!r} vs {self.o_player!r}, result={self.result!r}, moves={self.moves})"
+
+
+def _varint(value: int, out: bytearray) -> None:
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _string(value: str, out: bytearray) -> None:
+    data = value.encode()
+    _varint(len(data), out)
+    out += data
+
+
+def encode_record(record: GameRecord, out: bytearray) -> None:
+    """
+    Append the binary form of a record to a buffer.
+    """
+    for value in (record.rows, record.cols, record.k, int(record.start * 1000), int(record.duration * 1000)):
+        _varint(value, out)
+    out.append(RESULTS.index(record.result) | (4 if record.first == 'O' else 0))
+    _string(record.x_player, out)
+    _string(record.o_player, out)
+    _varint(len(record.moves), out)
+    for cell in record.moves:
+        _varint(cell, out)
+
+
+def decode_records(data: bytes, count: int) -> Iterator[GameRecord]:
+    """
+    Decode `count` consecutive records from a decompressed block.
+    """
+    pos = 0
+
+    def varint() -> int:
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def string() -> str:
+        nonlocal pos
+        length = varint()
+        pos += length
+        return data[pos - length:pos].decode()
+
+    for _ in range(count):
+        rows, cols, k, start, duration = varint(), varint(), varint(), varint(), varint()
+        flags = data[pos]
+        pos += 1
+        x_player, o_player = string(), string()
+        moves = [varint() for _ in range(varint())]
+        yield GameRecord(x_player, o_player, rows, cols, k, start / 1000, duration / 1000, RESULTS[flags & 3], moves,
+                         'O' if flags & 4 else 'X')
+
+
+class RecordWriter:
+    """
+    Append records to an archive, compressing them a block at a time.
+
+    Args:
+        path (str): The archive file. It and its directory are created if needed.
+        block_size (int, optional): Uncompressed bytes collected before a block is written. Defaults to 64 KiB.
+    """
+    def __init__(self, path: str, block_size: int=65536) -> None:
+        self.path: str = path
+        self.block_size: int = block_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file: BinaryIO = open(path, "ab")
+        self._index: BinaryIO = open(path + ".idx", "ab")
+        self._buffer: bytearray = bytearray()
+        self._count: int = 0
+
+    def write(self, record: GameRecord) -> None:
+        encode_record(record, self._buffer)
+        self._count += 1
+        if len(self._buffer) >= self.block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the pending records as one block.
+        """
+        if not self._count:
+            return
+        compressed = zlib.compress(bytes(self._buffer), 6)
+        offset = self._file.tell()
+        self._file.write(BLOCK_HEADER.pack(MAGIC, len(self._buffer), len(compressed), self._count))
+        self._file.write(compressed)
+        self._file.flush()
+        self._index.write(INDEX_ENTRY.pack(offset, self._count))
+        self._index.flush()
+        self._buffer.clear()
+        self._count = 0
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_records(path: str, start_block: int=0) -> Iterator[GameRecord]:
+    """
+    Stream the records of an archive, holding one block in memory at a time.
+
+    Args:
+        path (str): The archive file.
+        start_block (int, optional): The first block to read, looked up in the index. Defaults to 0.
+
+    Raises:
+        ValueError: If the file is not an archive or is corrupt.
+    """
+    with open(path, "rb") as f:
+        if start_block:
+            f.seek(read_index(path)[start_block][0])
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if not header:
+                return
+            if len(header) < BLOCK_HEADER.size:
+                raise ValueError(f"Truncated block header in {path}")
+            magic, raw_size, compressed_size, count = BLOCK_HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"Bad block magic in {path}")
+            data = zlib.decompress(f.read(compressed_size))
+            if len(data) != raw_size:
+                raise ValueError(f"Corrupt block in {path}")
+            yield from decode_records(data, count)
+
+
+def read_index(path: str) -> List[tuple]:
+    """
+    Read the block index of an archive.
+
+    Returns:
+        list[tuple]: (offset, record_count) per block.
+    """
+    with open(path + ".idx", "rb") as f:
+        return list(INDEX_ENTRY.iter_unpack(f.read()))
+
+
+def read_record(path: str, number: int) -> GameRecord:
+    """
+    Read the record with the given position in the archive, decompressing only its block.
+
+    Raises:
+        IndexError: If the archive has fewer records.
+    """
+    for block, (_, count) in enumerate(read_index(path)):
+        if number < count:
+            records = read_records(path, block)
+            for _ in range(number):
+                next(records)
+            return next(records)
+        number -= count
+    raise IndexError("record number out of range")
+
+
+_session_writer: Union[RecordWriter, None] = None
+
+
+def session_writer() -> Union[RecordWriter, None]:
+    """
+    Get the archive writer shared by the games of this session.
+
+    The archive is `$TICTACTOE_ARCHIVE`, or ~/.tic-tac-toe/games.tttg by default. Setting the variable to
+    an empty string turns recording off. Pending records are written when the program exits.
+
+    Returns:
+        RecordWriter | None: The writer, or None if recording is off or the archive can't be opened.
+    """
+    global _session_writer
+    if _session_writer is None:
+        path = os.environ.get("TICTACTOE_ARCHIVE", DEFAULT_ARCHIVE)
+        if not path:
+            return None
+        try:
+            _session_writer = RecordWriter(path)
+        except OSError:
+            return None
+        atexit.register(_session_writer.close)
+    return _session_writer
+
+
+class GameRecorder:
+    """
+    Records a game as it is played and archives it when it ends.
+
+    Args:
+        x_player (str): Who plays X.
+        o_player (str): Who plays O.
+        writer (RecordWriter, optional): Where to archive the game. Defaults to the session writer.
+    """
+    def __init__(self, x_player: str, o_player: str, writer: Union[RecordWriter, None]=None) -> None:
+        self.writer: Union[RecordWriter, None] = session_writer() if writer is None else writer
+        self.record: GameRecord = GameRecord(x_player, o_player, Board._size, Board._size, 3)
+
+    def move(self, player: str, row: int, col: int) -> None:
+        if not self.record.moves:
+            self.record.first = player
+        self.record.moves.append(row * self.record.cols + col)
+
+    def finish(self, result: str) -> None:
+        """
+        Archive the game with its result.
+        """
+        self.record.result = result
+        self.record.duration = time() - self.record.start
+        if self.writer is not None:
+            self.writer.write(self.record)
+
+
+def _random_records(count: int, seed: int=0) -> Iterator[GameRecord]:
+    rng = Random(seed)
+    start = time()
+    for i in range(count):
+        board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        record = GameRecord("random", "random", start=start + i)
+        player = 'X'
+        while board.get_winner() is None:
+            row, col = rng.choice(board.get_empty_cells())
+            board.update_board(player, row, col)
+            record.moves.append(row * 3 + col)
+            player = 'O' if player == 'X' else 'X'
+        record.result = board.get_winner()
+        yield record
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect and benchmark game archives.")
+    parser.add_argument("command", choices=["stats", "bench"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_ARCHIVE)
+    parser.add_argument("--games", type=int, default=200000, help="bench: games to write and read")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        args.path = args.path if args.path != DEFAULT_ARCHIVE else "bench.tttg"
+        for suffix in ("", ".idx"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+        records = list(_random_records(args.games))
+        start = perf_counter()
+        with RecordWriter(args.path) as writer:
+            for record in records:
+                writer.write(record)
+        print(f"write      {args.games / (perf_counter() - start):,.0f} games/sec")
+
+    start = perf_counter()
+    games = moves = 0
+    for record in read_records(args.path):
+        games += 1
+        moves += len(record.moves)
+    elapsed = perf_counter() - start
+    size = os.path.getsize(args.path)
+    print(f"games      {games:,} ({moves:,} moves, {len(read_index(args.path))} blocks)")
+    print(f"size       {size:,} bytes ({size / games if games else 0:.2f} bytes/game)")
+    print(f"read       {games / elapsed if elapsed else 0:,.0f} games/sec")
+
+
+if __name__ == "__main__":
+    main()
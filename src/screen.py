@@ -0,0 +1,496 @@
+"""
+Screen backends for the UI.
+
+The game draws through a small subset of the curses window API. `CursesScreen` forwards it to a real
+terminal, and `VirtualScreen` keeps the cells in memory, replays scripted input and never sleeps, so the
+whole game loop can run without a TTY at full speed.
+
+Usage:
+    python -m src.screen bench --games 200     # headless local games, with render statistics
+"""
+import argparse
+import curses
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from random import Random
+from time import perf_counter, sleep
+from typing import Callable, Deque, Dict, List, Union
+
+
+class Screen(ABC):
+    """
+    The drawing and input operations the game uses. Coordinates are (y, x), as in curses.
+    """
+    @abstractmethod
+    def addstr(self, y: int, x: int, text: str, attr: int=0) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def clrtoeol(self) -> None:
+        ...
+
+    @abstractmethod
+    def move(self, y: int, x: int) -> None:
+        ...
+
+    @abstractmethod
+    def refresh(self) -> None:
+        ...
+
+    @abstractmethod
+    def getch(self) -> int:
+        ...
+
+    @abstractmethod
+    def getmouse(self) -> tuple:
+        ...
+
+    @abstractmethod
+    def getmaxyx(self) -> tuple:
+        ...
+
+    def keypad(self, flag: bool) -> None:
+        pass
+
+    def nodelay(self, flag: bool) -> None:
+        pass
+
+    def timeout(self, delay: int) -> None:
+        """
+        Make `getch` give up with -1 after `delay` milliseconds; a negative delay waits for input.
+        """
+
+    def curs_set(self, visibility: int) -> None:
+        pass
+
+    def color(self, foreground: int, background: int) -> int:
+        """
+        Get the attribute of a colour pair.
+
+        Returns:
+            int: The attribute, or 0 if the screen has no colours.
+        """
+        return 0
+
+    def mousemask(self, mask: int) -> None:
+        pass
+
+    def nap(self, seconds: float) -> None:
+        """
+        Pause for an animation or to debounce input.
+        """
+        sleep(seconds)
+
+
+class ForwardingScreen(Screen):
+    """
+    A screen that forwards everything to another one. Wrappers override the operations they watch.
+
+    Args:
+        screen (Screen): The screen to forward to.
+    """
+    def __init__(self, screen: Screen) -> None:
+        self.screen: Screen = screen
+
+    def addstr(self, y: int, x: int, text: str, attr: int=0) -> None:
+        self.screen.addstr(y, x, text, attr)
+
+    def clear(self) -> None:
+        self.screen.clear()
+
+    def clrtoeol(self) -> None:
+        self.screen.clrtoeol()
+
+    def move(self, y: int, x: int) -> None:
+        self.screen.move(y, x)
+
+    def refresh(self) -> None:
+        self.screen.refresh()
+
+    def getch(self) -> int:
+        return self.screen.getch()
+
+    def getmouse(self) -> tuple:
+        return self.screen.getmouse()
+
+    def getmaxyx(self) -> tuple:
+        return self.screen.getmaxyx()
+
+    def keypad(self, flag: bool) -> None:
+        self.screen.keypad(flag)
+
+    def nodelay(self, flag: bool) -> None:
+        self.screen.nodelay(flag)
+
+    def timeout(self, delay: int) -> None:
+        self.screen.timeout(delay)
+
+    def curs_set(self, visibility: int) -> None:
+        self.screen.curs_set(visibility)
+
+    def color(self, foreground: int, background: int) -> int:
+        return self.screen.color(foreground, background)
+
+    def mousemask(self, mask: int) -> None:
+        self.screen.mousemask(mask)
+
+    def nap(self, seconds: float) -> None:
+        self.screen.nap(seconds)
+
+
+class CursesScreen(Screen):
+    """
+    A real terminal.
+
+    Args:
+        window (curses.window): The window to draw on, usually the one `curses.wrapper` passes in.
+    """
+    def __init__(self, window: curses.window) -> None:
+        self.window: curses.window = window
+        # Colour pair numbers by (foreground, background)
+        self._pairs: Dict[tuple, int] = {}
+
+    def addstr(self, y: int, x: int, text: str, attr: int=0) -> None:
+        self.window.addstr(y, x, text, attr)
+
+    def clear(self) -> None:
+        self.window.clear()
+
+    def clrtoeol(self) -> None:
+        self.window.clrtoeol()
+
+    def move(self, y: int, x: int) -> None:
+        self.window.move(y, x)
+
+    def refresh(self) -> None:
+        self.window.refresh()
+
+    def getch(self) -> int:
+        return self.window.getch()
+
+    def getmouse(self) -> tuple:
+        return curses.getmouse()
+
+    def getmaxyx(self) -> tuple:
+        return self.window.getmaxyx()
+
+    def keypad(self, flag: bool) -> None:
+        self.window.keypad(flag)
+
+    def nodelay(self, flag: bool) -> None:
+        self.window.nodelay(flag)
+
+    def timeout(self, delay: int) -> None:
+        self.window.timeout(delay)
+
+    def curs_set(self, visibility: int) -> None:
+        curses.curs_set(visibility)
+
+    def color(self, foreground: int, background: int) -> int:
+        if not curses.has_colors():
+            return 0
+        pair = self._pairs.get((foreground, background))
+        if pair is None:
+            if not self._pairs:
+                curses.start_color()
+            pair = len(self._pairs) + 1
+            if pair >= curses.COLOR_PAIRS:
+                return 0
+            curses.init_pair(pair, foreground, background)
+            self._pairs[foreground, background] = pair
+        return curses.color_pair(pair)
+
+    def mousemask(self, mask: int) -> None:
+        curses.mousemask(mask)
+        # Report mouse motion too, which some terminals need before they send clicks
+        print('\033[?1003h')
+
+
+class ScriptExhausted(Exception):
+    """
+    Raised when a virtual screen waits for input that its script doesn't have.
+    """
+    pass
+
+
+class VirtualScreen(Screen):
+    """
+    An in-memory terminal with scripted input.
+
+    Input is a queue of key codes. `click` queues a `KEY_MOUSE` event together with the mouse state
+    `getmouse` returns for it. When the queue runs dry, the optional driver is called with the screen so it
+    can queue more input based on what is displayed. With a `timeout` set, an empty queue makes `getch`
+    return -1 as if the delay had passed, so the game's idle work runs; after `idle_limit` of those in a
+    row the script counts as exhausted.
+
+    Refreshes are diffed against what the previous refresh showed, and the bytes a terminal would receive
+    (cursor moves, attribute changes and UTF-8 text) are counted.
+
+    Args:
+        rows (int, optional): Screen height. Defaults to 24.
+        cols (int, optional): Screen width. Defaults to 80.
+        driver (callable, optional): Called with the screen when input runs out. Defaults to None.
+        idle_limit (int, optional): Timed-out `getch` calls in a row before giving up. Defaults to 100.
+
+    Attributes:
+        clock (float): Seconds the game would have slept or waited for input, since neither `nap` nor a
+            timed-out `getch` really waits.
+        refresh_bytes (list[int]): Bytes sent by each refresh.
+    """
+    def __init__(self, rows: int=24, cols: int=80,
+                 driver: Union[Callable[["VirtualScreen"], None], None]=None, idle_limit: int=100) -> None:
+        self.rows: int = rows
+        self.cols: int = cols
+        self.driver: Union[Callable[["VirtualScreen"], None], None] = driver
+        self.cells: List[List[str]] = [[' '] * cols for _ in range(rows)]
+        self.attrs: List[List[int]] = [[0] * cols for _ in range(rows)]
+        # What the terminal showed after the last refresh
+        self._shown: List[List[tuple]] = [[(' ', 0)] * cols for _ in range(rows)]
+        self._cleared: bool = True
+        self._attr: int = 0
+        # Rows written since the last refresh; only these are diffed
+        self._dirty: set = set()
+        self.cursor: tuple = (0, 0)
+        self.events: Deque[int] = deque()
+        self.mouse_events: Deque[tuple] = deque()
+        # Milliseconds getch waits for input, as set by `timeout`; negative waits forever
+        self.delay: int = -1
+        self.idle_limit: int = idle_limit
+        self._idle: int = 0
+        self.clock: float = 0.0
+        self.refresh_bytes: List[int] = []
+
+    def addstr(self, y: int, x: int, text: str, attr: int=0) -> None:
+        """
+        Write text at a position, wrapping onto the next line like curses.
+
+        Raises:
+            curses.error: If the text starts or runs off the screen.
+        """
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            raise curses.error(f"addstr() at ({y}, {x}) is off the screen")
+        self._dirty.add(y)
+        for ch in text:
+            if y >= self.rows:
+                raise curses.error("addstr() ran off the screen")
+            if x == 0:
+                self._dirty.add(y)
+            self.cells[y][x] = ch
+            self.attrs[y][x] = attr
+            x += 1
+            if x == self.cols:
+                y, x = y + 1, 0
+        self.cursor = (min(y, self.rows - 1), x)
+
+    def clear(self) -> None:
+        for y in range(self.rows):
+            self.cells[y] = [' '] * self.cols
+            self.attrs[y] = [0] * self.cols
+        # Like curses, the next refresh repaints the whole screen
+        self._cleared = True
+        self.cursor = (0, 0)
+
+    def clrtoeol(self) -> None:
+        y, x = self.cursor
+        self._dirty.add(y)
+        self.cells[y][x:] = [' '] * (self.cols - x)
+        self.attrs[y][x:] = [0] * (self.cols - x)
+
+    def move(self, y: int, x: int) -> None:
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            raise curses.error(f"move() to ({y}, {x}) is off the screen")
+        self.cursor = (y, x)
+
+    def refresh(self) -> None:
+        sent = 0
+        if self._cleared:
+            sent += len("\033[H\033[2J")
+            self._shown = [[(' ', 0)] * self.cols for _ in range(self.rows)]
+            self._cleared = False
+            self._dirty.update(range(self.rows))
+        for y in sorted(self._dirty):
+            shown = self._shown[y]
+            cells, attrs = self.cells[y], self.attrs[y]
+            x = 0
+            while x < self.cols:
+                if shown[x] == (cells[x], attrs[x]):
+                    x += 1
+                    continue
+                # One cursor move per run of changed cells, one attribute switch per change of attribute
+                sent += len(f"\033[{y + 1};{x + 1}H")
+                while x < self.cols and shown[x] != (cells[x], attrs[x]):
+                    if attrs[x] != self._attr:
+                        self._attr = attrs[x]
+                        sent += len("\033[7m") if self._attr else len("\033[0m")
+                    sent += len(cells[x].encode())
+                    shown[x] = (cells[x], attrs[x])
+                    x += 1
+        self._dirty.clear()
+        self.refresh_bytes.append(sent)
+
+    def getch(self) -> int:
+        """
+        Take the next scripted key.
+
+        Returns:
+            int: The key code, or -1 in no-delay or timeout mode when nothing is queued.
+
+        Raises:
+            ScriptExhausted: If input is needed and neither the queue nor the driver has any, or after
+                `idle_limit` timeouts in a row.
+        """
+        if not self.events and self.driver is not None:
+            self.driver(self)
+        if self.events:
+            self._idle = 0
+            return self.events.popleft()
+        if self.delay == 0:
+            return -1
+        if self.delay > 0 and self._idle < self.idle_limit:
+            self._idle += 1
+            self.clock += self.delay / 1000
+            return -1
+        raise ScriptExhausted("getch() with no scripted input left")
+
+    def getmouse(self) -> tuple:
+        """
+        Get the mouse state of the last `KEY_MOUSE` event.
+
+        Raises:
+            curses.error: If no mouse event is pending, as curses does.
+        """
+        if not self.mouse_events:
+            raise curses.error("getmouse() returned ERR")
+        return self.mouse_events.popleft()
+
+    def getmaxyx(self) -> tuple:
+        return self.rows, self.cols
+
+    def nodelay(self, flag: bool) -> None:
+        self.delay = 0 if flag else -1
+
+    def timeout(self, delay: int) -> None:
+        self.delay = delay
+
+    def nap(self, seconds: float) -> None:
+        self.clock += seconds
+
+    def key(self, *keys: Union[int, str]) -> None:
+        """
+        Queue key presses, given as codes or characters.
+        """
+        self.events.extend(ord(key) if isinstance(key, str) else key for key in keys)
+
+    def click(self, x: int, y: int) -> None:
+        """
+        Queue a left click at a screen position.
+        """
+        self.events.append(curses.KEY_MOUSE)
+        self.mouse_events.append((0, x, y, 0, curses.BUTTON1_CLICKED))
+
+    def line(self, y: int) -> str:
+        return "".join(self.cells[y])
+
+    def text(self) -> str:
+        """
+        Get the whole screen as text, with trailing spaces stripped from each line.
+        """
+        return "\n".join(self.line(y).rstrip() for y in range(self.rows))
+
+    def find(self, text: str) -> Union[tuple, None]:
+        """
+        Find text on the screen.
+
+        Returns:
+            tuple | None: The (y, x) of the first occurrence, or None.
+        """
+        for y in range(self.rows):
+            x = self.line(y).find(text)
+            if x >= 0:
+                return y, x
+        return None
+
+
+def local_game_driver(games: int, seed: int=0) -> Callable[[VirtualScreen], None]:
+    """
+    Make a driver that plays `games` local games with random moves, then declines to play again.
+    """
+    from src.board import Board
+    from src.engine import Banner
+
+    rng = Random(seed)
+    remaining = games
+
+    def drive(screen: VirtualScreen) -> None:
+        nonlocal remaining
+        if screen.find("Click anywhere") is not None:
+            screen.key(' ')
+        elif screen.find("┃ Local ┃") is not None:
+            y, x = screen.find("┃ Local ┃")
+            screen.click(x + 2, y)
+        elif screen.find("┃ No  ┃") is not None:
+            remaining -= 1
+            y, x = screen.find("┃ Yes ┃" if remaining > 0 else "┃ No  ┃")
+            screen.click(x + 2, y)
+        elif screen.find("It's Player") is not None:
+            board_x = (screen.cols - Board.get_board_width()) // 2
+            board_y = Banner.height + 2
+            empty = [(board_x + col * 8 + 3, board_y + row * 4 + 1) for row in range(3) for col in range(3)
+                     if screen.cells[board_y + row * 4 + 1][board_x + col * 8 + 3] == ' ']
+            x, y = rng.choice(empty)
+            # The first click selects the cell, the second plays it
+            screen.click(x, y)
+            screen.click(x, y)
+
+    return drive
+
+
+def bench(games: int=100, seed: int=0) -> dict:
+    """
+    Play local games headlessly and measure the game loop and its rendering.
+
+    Returns:
+        dict: Games per second, refreshes per game, and mean and peak bytes per refresh.
+    """
+    from src.engine import play_game
+
+    screen = VirtualScreen(driver=local_game_driver(games, seed))
+    start = perf_counter()
+    try:
+        play_game(screen)
+    except SystemExit:
+        pass
+    elapsed = perf_counter() - start
+    refreshes = len(screen.refresh_bytes)
+    return {
+        "games_per_sec": games / elapsed,
+        "refreshes_per_game": refreshes / games,
+        "bytes_per_refresh": sum(screen.refresh_bytes) / refreshes,
+        "max_bytes_per_refresh": max(screen.refresh_bytes),
+        "slept": screen.clock,
+    }
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the game on a virtual terminal.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # Keep benchmark games out of the session archive
+    os.environ["TICTACTOE_ARCHIVE"] = ""
+    stats = bench(args.games, args.seed)
+    print(f"games             {stats['games_per_sec']:,.0f}/sec")
+    print(f"refreshes         {stats['refreshes_per_game']:.1f} per game")
+    print(f"bytes/refresh     {stats['bytes_per_refresh']:.1f} mean, {stats['max_bytes_per_refresh']} max")
+    print(f"sleep skipped     {stats['slept']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Self-play training of the value table behind the learned CPU (src.value_table).
+
+The table is learned by TD(0) on afterstates. Thousands of games run side by side as rows of numpy arrays;
+each side picks the move whose afterstate the table rates best for it (or, with probability epsilon, a
+random move), and the value of the previous afterstate is moved toward the value of the new one, which is
+the result itself once the game is over. Positions that are rotations or reflections of each other share
+one entry, so every move trains all eight images of the position it reached. Checkpoints are written and
+played against the win/block/random heuristic every `--checkpoint` games.
+
+Usage:
+    python -m src.selfplay train --games 500000 --envs 4096
+    python -m src.selfplay eval ~/.tic-tac-toe/values.ttvt --games 20000
+"""
+import argparse
+import os
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Union
+
+import numpy as np
+
+from src.batch import NO_RESULT, O_WINS, X_WINS, winners
+from src.board import Board
+from src.position_index import SYMMETRIES
+from src.solver import CODES, POWERS, solved_table
+from src.value_table import DEFAULT_VALUES, HEADER, MAGIC, SCALE, VERSION, ValueTable
+
+
+class Trainer:
+    """
+    TD(0) self-play over a batch of games stepped together.
+
+    Args:
+        envs (int, optional): Games played side by side. Defaults to 4096.
+        alpha (float, optional): Learning rate. Defaults to 0.2.
+        epsilon (float, optional): Chance of a random move instead of the best one. Defaults to 0.1.
+        seed (int, optional): Seed for move choices. Defaults to None.
+    """
+    def __init__(self, envs: int=4096, alpha: float=0.2, epsilon: float=0.1, seed: Union[int, None]=None) -> None:
+        self.envs: int = envs
+        self.alpha: float = alpha
+        self.epsilon: float = epsilon
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.powers: np.ndarray = np.array(POWERS, dtype=np.int32)
+        every = (np.arange(CODES, dtype=np.int32)[:, None] // self.powers % 3).astype(np.int8)
+        # The code of every position's canonical form, so symmetric positions share their value
+        images = [every @ np.array([POWERS[symmetry[cell]] for cell in range(9)], dtype=np.int32)
+                  for symmetry in SYMMETRIES]
+        self.canonical: np.ndarray = np.minimum.reduce(images).astype(np.int32)
+        self.outcome: np.ndarray = winners(every)
+        # Finished positions are worth their result and never change
+        self.values: np.ndarray = np.zeros(CODES, dtype=np.float32)
+        self.values[self.canonical[self.outcome == X_WINS]] = 1.0
+        self.values[self.canonical[self.outcome == O_WINS]] = -1.0
+        self.games: int = 0
+        self.cells: np.ndarray = np.zeros((envs, 9), dtype=np.int8)
+        self.codes: np.ndarray = np.zeros(envs, dtype=np.int32)
+        self.turn: np.ndarray = np.ones(envs, dtype=np.int32)         # 1 for X, 2 for O
+        self.previous: np.ndarray = np.full(envs, -1, dtype=np.int32)  # canonical code of the last afterstate
+
+    def _greedy(self, codes: np.ndarray, turn: np.ndarray, cells: np.ndarray, noise: float=1e-3) -> np.ndarray:
+        # Occupied cells would give codes past the table; they are masked out below anyway
+        after = np.where(cells == 0, codes[:, None] + turn[:, None] * self.powers[None, :], 0)
+        # X looks for the highest value and O for the lowest; the noise breaks ties at random
+        scores = self.values[self.canonical[after]] * np.where(turn == 1, 1, -1)[:, None]
+        scores = scores + self.rng.random(scores.shape, dtype=np.float32) * noise
+        scores[cells != 0] = -np.inf
+        return scores.argmax(axis=1)
+
+    def _random(self, cells: np.ndarray) -> np.ndarray:
+        scores = self.rng.random(cells.shape, dtype=np.float32)
+        scores[cells != 0] = -1.0
+        return scores.argmax(axis=1)
+
+    def _heuristic(self, codes: np.ndarray, turn: np.ndarray, cells: np.ndarray) -> np.ndarray:
+        # choose_move in bulk: win if possible, otherwise block, otherwise a random empty cell
+        empty = cells == 0
+        after = np.where(empty, codes[:, None] + turn[:, None] * self.powers[None, :], 0)
+        blocked = np.where(empty, codes[:, None] + (3 - turn)[:, None] * self.powers[None, :], 0)
+        wins = self.outcome[after] == turn[:, None]
+        blocks = self.outcome[blocked] == (3 - turn)[:, None]
+        scores = self.rng.random(cells.shape, dtype=np.float32) + 2 * blocks + 4 * wins
+        scores[~empty] = -1.0
+        return scores.argmax(axis=1)
+
+    def step(self) -> int:
+        """
+        Play one move in every game, learn from it, and restart the games that ended.
+
+        Returns:
+            int: The number of games that ended.
+        """
+        rows = np.arange(self.envs)
+        explore = self.rng.random(self.envs) < self.epsilon
+        moves = np.where(explore, self._random(self.cells), self._greedy(self.codes, self.turn, self.cells))
+        codes = self.codes + self.turn * self.powers[moves]
+        after = self.canonical[codes]
+
+        # Move the previous afterstate toward this one, averaging games that share a position. A random
+        # move says nothing about the policy's value, so it teaches nothing.
+        learn = (self.previous >= 0) & ~explore
+        index = self.previous[learn]
+        delta = self.values[after[learn]] - self.values[index]
+        sums = np.bincount(index, weights=delta, minlength=CODES)
+        counts = np.bincount(index, minlength=CODES)
+        seen = counts > 0
+        self.values[seen] += (self.alpha * sums[seen] / counts[seen]).astype(np.float32)
+
+        self.cells[rows, moves] = self.turn
+        self.codes = codes
+        self.previous = after
+        self.turn = 3 - self.turn
+        over = self.outcome[codes] != NO_RESULT
+        ended = int(over.sum())
+        if ended:
+            self.cells[over] = 0
+            self.codes[over] = 0
+            self.turn[over] = 1
+            self.previous[over] = -1
+            self.games += ended
+        return ended
+
+    def evaluate(self, games: int=10000) -> Dict[str, float]:
+        """
+        Play the table greedily against the win/block/random heuristic, as X in half the games and O in the
+        other half.
+
+        Returns:
+            dict: The table's win, draw and loss rates.
+        """
+        cells = np.zeros((games, 9), dtype=np.int8)
+        codes = np.zeros(games, dtype=np.int32)
+        side = np.where(np.arange(games) < games // 2, 1, 2)
+        turn = np.ones(games, dtype=np.int32)
+        result = np.full(games, NO_RESULT, dtype=np.int8)
+        for _ in range(9):
+            active = np.flatnonzero(result == NO_RESULT)
+            if not len(active):
+                break
+            table = side[active] == turn[active]
+            moves = np.where(table, self._greedy(codes[active], turn[active], cells[active], noise=1e-6),
+                             self._heuristic(codes[active], turn[active], cells[active]))
+            cells[active, moves] = turn[active]
+            codes[active] += turn[active] * self.powers[moves]
+            result[active] = self.outcome[codes[active]]
+            turn[active] = 3 - turn[active]
+        won = ((result == X_WINS) & (side == 1)) | ((result == O_WINS) & (side == 2))
+        lost = ((result == X_WINS) & (side == 2)) | ((result == O_WINS) & (side == 1))
+        return {"win": float(won.mean()), "draw": float(1 - won.mean() - lost.mean()), "loss": float(lost.mean())}
+
+    def save(self, path: str) -> int:
+        """
+        Write a checkpoint of every reachable position's value.
+
+        Returns:
+            int: The number of entries written.
+        """
+        reachable = np.fromiter(solved_table().keys(), dtype=np.int32)
+        keys = np.unique(self.canonical[reachable])
+        values = np.clip(np.rint(self.values[keys] * SCALE), -SCALE, SCALE).astype(np.int16)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first, so a game starting meanwhile never reads half a table
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(keys), self.games))
+            entries = np.empty(len(keys), dtype=[("key", "<u2"), ("value", "<i2")])
+            entries["key"], entries["value"] = keys, values
+            f.write(entries.tobytes())
+        os.replace(temporary, path)
+        return len(keys)
+
+
+def train(path: str, games: int=500_000, envs: int=4096, checkpoint: int=100_000, eval_games: int=10000,
+          seed: Union[int, None]=None, **options) -> Dict[str, float]:
+    """
+    Train a table by self-play, checkpointing and evaluating it against the heuristic every `checkpoint`
+    games.
+
+    Args:
+        path (str): The checkpoint file.
+        games (int, optional): Games to play. Defaults to 500,000.
+        envs (int, optional): Games played side by side. Defaults to 4096.
+        checkpoint (int, optional): Games between checkpoints. Defaults to 100,000.
+        eval_games (int, optional): Evaluation games per checkpoint. Defaults to 10,000.
+        seed (int, optional): Seed for move choices. Defaults to None.
+        **options: `alpha` and `epsilon` for the Trainer.
+
+    Returns:
+        dict: Games played, games per second of training, and the last evaluation's rates.
+    """
+    trainer = Trainer(envs, seed=seed, **options)
+    elapsed = 0.0
+    next_checkpoint = checkpoint
+    while True:
+        start = perf_counter()
+        while trainer.games < min(next_checkpoint, games):
+            trainer.step()
+        elapsed += perf_counter() - start
+        trainer.save(path)
+        rates = trainer.evaluate(eval_games)
+        print(f"{trainer.games:>10,} games  {trainer.games / elapsed:>9,.0f} games/sec  vs heuristic: "
+              f"win {rates['win']:.1%} draw {rates['draw']:.1%} loss {rates['loss']:.1%}")
+        if trainer.games >= games:
+            return {"games": trainer.games, "games_per_sec": trainer.games / elapsed, **rates}
+        next_checkpoint += checkpoint
+
+
+def evaluate_file(path: str, games: int=10000, seed: int=0) -> Dict[str, float]:
+    """
+    Play a checkpoint, as loaded by cpu_game, against the heuristic.
+
+    Returns:
+        dict: The table's win, draw and loss rates.
+    """
+    from src.tournament import heuristic
+
+    table = ValueTable(path)
+    rng = Random(seed)
+    counts = {"win": 0, "draw": 0, "loss": 0}
+    for game in range(games):
+        board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        table_plays = 'X' if game % 2 == 0 else 'O'
+        player = 'X'
+        while True:
+            if player == table_plays:
+                move = table.choose(board, player, rng)
+            else:
+                move = heuristic(board, player, rng)
+            board.update_board(player, *move)
+            winner = board.get_winner()
+            if winner is not None:
+                break
+            player = 'O' if player == 'X' else 'X'
+        counts["draw" if winner == "tie" else "win" if winner == table_plays else "loss"] += 1
+    return {outcome: count / games for outcome, count in counts.items()}
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Train the value-table CPU by self-play.")
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_VALUES, help="the table file")
+    parser.add_argument("--games", type=int, help="games to train or evaluate (default 500,000 / 10,000)")
+    parser.add_argument("--envs", type=int, default=4096, help="games played side by side")
+    parser.add_argument("--checkpoint", type=int, default=100_000, help="games between checkpoints")
+    parser.add_argument("--alpha", type=float, default=0.2)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        result = train(args.path, args.games or 500_000, args.envs, args.checkpoint, seed=args.seed,
+                       alpha=args.alpha, epsilon=args.epsilon)
+        print(f"wrote {args.path}: {result['games']:,} games at {result['games_per_sec']:,.0f} games/sec")
+    else:
+        start = perf_counter()
+        ValueTable(args.path)
+        load = perf_counter() - start
+        rates = evaluate_file(args.path, args.games or 10000, seed=args.seed or 0)
+        print(f"loaded in {load * 1e3:.2f} ms; vs heuristic: win {rates['win']:.1%} draw {rates['draw']:.1%} "
+              f"loss {rates['loss']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Local HTTP/JSON engine service.
+
+Endpoints (positions are 9-character strings, row by row, 'X', 'O' and '.' for empty):
+    POST /best-move    {"position": "X...O....", "engine": "perfect" | "heuristic"}
+    POST /evaluate     {"position": "X...O...."}
+    POST /legal-moves  {"position": "X...O...."}
+    GET  /stats
+
+Usage:
+    python -m src.server serve --port 8080
+    python -m src.server load --port 8080 --concurrency 64 --requests 20000
+"""
+import argparse
+import asyncio
+from collections import OrderedDict, deque
+from http import HTTPStatus
+from json import dumps, loads
+from random import choice
+from time import perf_counter
+from typing import Dict, List, Union
+
+import numpy as np
+
+from src.batch import best_moves, evaluate, random_positions
+from src.board import Board
+from src.cpu import choose_move
+from src.perft import parse_position, side_to_move
+from src.solver import encode, POWERS
+
+
+class LRUCache:
+    """
+    A bounded mapping that evicts the least recently used entry.
+    """
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self._entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def percentiles(samples, points=(50, 90, 99)) -> Dict[str, float]:
+    """
+    Get percentiles of a sequence of latencies, in milliseconds.
+    """
+    if not samples:
+        return {f"p{point}": 0.0 for point in points}
+    ordered = sorted(samples)
+    return {f"p{point}": round(ordered[min(len(ordered) - 1, len(ordered) * point // 100)] * 1000, 3)
+            for point in points}
+
+
+class EngineService:
+    """
+    Answers engine queries, batching concurrent best-move and evaluate requests into one call of the
+    vectorized API in src.batch.
+
+    Args:
+        max_batch (int, optional): The most queries answered by one engine call. Defaults to 1024.
+        max_delay (float, optional): Seconds the first query of a batch waits for company. Defaults to 0.002.
+        cache_size (int, optional): The number of recent answers kept. Defaults to 4096.
+    """
+    def __init__(self, max_batch: int=1024, max_delay: float=0.002, cache_size: int=4096) -> None:
+        self.max_batch: int = max_batch
+        self.max_delay: float = max_delay
+        self.cache: LRUCache = LRUCache(cache_size)
+        self.queue: Union[asyncio.Queue, None] = None
+        self.latencies: deque = deque(maxlen=10000)
+        self.requests: int = 0
+        self.errors: int = 0
+        self.batches: int = 0
+        self.batched_queries: int = 0
+        self.max_queue_depth: int = 0
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            while len(pending) < self.max_batch and not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            self._answer(pending)
+
+    def _answer(self, pending: list) -> None:
+        codes = np.array([code for _, code, _ in pending], dtype=np.int32)
+        positions = (codes[:, None] // np.array(POWERS, dtype=np.int32) % 3).astype(np.int8)
+        values, distances = evaluate(positions)
+        moves = best_moves(positions)
+        self.batches += 1
+        self.batched_queries += len(pending)
+        for i, (kind, code, future) in enumerate(pending):
+            if future.done():
+                continue
+            if values[i] < -1:
+                # Not a result, so it is refused without taking a cache slot
+                future.set_exception(ValueError("position cannot arise in a legal game"))
+                continue
+            if kind == "evaluate":
+                answer = {"value": int(values[i]), "distance": int(distances[i])}
+            else:
+                answer = {"move": None if moves[i] < 0 else list(divmod(int(moves[i]), 3)),
+                          "value": int(values[i])}
+            self.cache.put((kind, code), answer)
+            future.set_result(answer)
+
+    async def query(self, kind: str, body: dict) -> dict:
+        """
+        Answer one query.
+
+        Args:
+            kind (str): 'best-move', 'evaluate' or 'legal-moves'.
+            body (dict): The decoded JSON request body.
+
+        Returns:
+            dict: The JSON-serialisable answer.
+
+        Raises:
+            ValueError: If the request is malformed or its position cannot arise in a legal game.
+        """
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        cells = parse_position(str(body.get("position", "")))
+        board = Board(None, x=0, y=0, cells=cells)
+        if kind == "legal-moves":
+            moves = [] if board.get_winner() is not None else board.get_empty_cells()
+            return {"moves": [list(move) for move in moves], "turn": side_to_move(board)}
+        if kind == "best-move" and body.get("engine") == "heuristic":
+            # The same win/block/random choice cpu_game makes, so it is not cached
+            player = side_to_move(board)
+            move = None if board.get_winner() is not None else \
+                choose_move(board, player, 'O' if player == 'X' else 'X')
+            return {"move": None if move is None else list(move)}
+        if kind not in ("best-move", "evaluate"):
+            raise ValueError(f"Unknown query: {kind}")
+
+        code = encode(cells)
+        cached = self.cache.get((kind, code))
+        if cached is not None:
+            return cached
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((kind, code, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+            "cache": {"size": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses},
+            "latency_ms": percentiles(self.latencies),
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one HTTP/1.1 connection, with keep-alive.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = perf_counter()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                self.requests += 1
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(f"Negative Content-Length: {length}")
+                except ValueError as e:
+                    # Where the next request starts is unknown, so the connection ends here
+                    self.errors += 1
+                    await self._reply(writer, 400, {"error": f"Malformed request: {e}"}, close=True)
+                    break
+                body = await reader.readexactly(length)
+
+                status = 200
+                try:
+                    if method == "GET" and path == "/stats":
+                        answer = self.stats()
+                    elif method == "POST":
+                        answer = await self.query(path.strip("/"), loads(body or b"{}"))
+                    else:
+                        status, answer = 404, {"error": "not found"}
+                except (ValueError, KeyError) as e:
+                    status, answer = 400, {"error": str(e)}
+                if status != 200:
+                    self.errors += 1
+
+                await self._reply(writer, status, answer)
+                self.latencies.append(perf_counter() - start)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _reply(writer: asyncio.StreamWriter, status: int, answer: dict, close: bool=False) -> None:
+        payload = dumps(answer).encode()
+        head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n" \
+               f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        if close:
+            head += "Connection: close\r\n"
+        writer.write((head + "\r\n").encode() + payload)
+        await writer.drain()
+
+
+async def serve(host: str="127.0.0.1", port: int=8080, **options) -> None:
+    """
+    Run the engine service until cancelled.
+    """
+    service = EngineService(**options)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def _post(reader, writer, path: str, body: dict) -> tuple:
+    payload = dumps(body).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                 + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    return status, loads(await reader.readexactly(length))
+
+
+async def load(host: str="127.0.0.1", port: int=8080, concurrency: int=64, requests: int=20000) -> dict:
+    """
+    Send random best-move and evaluate queries over keep-alive connections and measure the service.
+
+    Returns:
+        dict: Client-side throughput and latency percentiles, and the server's /stats answer.
+    """
+    positions = ["".join(".XO"[v] for v in cells) for cells in random_positions(4096, seed=0)]
+    latencies: List[float] = []
+    errors = [0]
+    remaining = [requests]
+
+    async def client() -> None:
+        reader, writer = await asyncio.open_connection(host, port)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = perf_counter()
+            status, _ = await _post(reader, writer, choice(["/best-move", "/evaluate"]),
+                                    {"position": choice(positions)})
+            latencies.append(perf_counter() - start)
+            if status != 200:
+                errors[0] += 1
+        writer.close()
+
+    start = perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"GET /stats HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+    stats = loads((await reader.read()).split(b"\r\n\r\n", 1)[1])
+    writer.close()
+    return {"requests": len(latencies), "errors": errors[0], "requests_per_sec": round(len(latencies) / elapsed),
+            "latency_ms": percentiles(latencies), "server": stats}
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Engine HTTP service and load generator.")
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--concurrency", type=int, default=64, help="load: concurrent connections")
+    parser.add_argument("--requests", type=int, default=20000, help="load: total requests")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(dumps(asyncio.run(load(args.host, args.port, args.concurrency, args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
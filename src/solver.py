@@ -0,0 +1,145 @@
+from functools import lru_cache
+from typing import Dict, List, Union
+
+from src.board import Board, WIN_MASKS
+
+
+FULL: int = 0x1ff
+
+# Cells are numbered row * 3 + col. A position code is sum(value * 3 ** cell) with 0 for an empty
+# cell, 1 for X and 2 for O, so every 3x3 position has a code below 3 ** 9.
+POWERS: List[int] = [3 ** cell for cell in range(9)]
+CODES: int = 3 ** 9
+SYMBOLS: str = " XO"
+
+
+class Solution:
+    """
+    The game-theoretic value of a position for the side to move.
+
+    Attributes:
+        value (int): 1 if the side to move wins, 0 for a draw, -1 if it loses, with best play.
+        distance (int): Plies until the game ends with best play (the winner hurries, the loser stalls).
+        optimal (int): 9-bit mask of every move that achieves `value` in `distance` plies.
+        best (int): The lowest-numbered optimal cell, or -1 if the game is over.
+    """
+    __slots__ = ("value", "distance", "optimal", "best")
+
+    def __init__(self, value: int, distance: int, optimal: int) -> None:
+        self.value: int = value
+        self.distance: int = distance
+        self.optimal: int = optimal
+        self.best: int = (optimal & -optimal).bit_length() - 1
+
+    def __repr__(self) -> str:
+        return f"Solution(value={self.value}, distance={self.distance}, optimal={self.optimal:#05x})"
+
+
+def has_line(mask: int) -> bool:
+    """
+    Check if a 9-bit mask of one player's cells contains one of the lines checked by Board.get_winner.
+    """
+    return any(mask & line == line for line in WIN_MASKS)
+
+
+def encode(cells: List[List[str]]) -> int:
+    """
+    Get the position code of a board laid out as `Board` stores it.
+    """
+    return sum(SYMBOLS.index(cell) * POWERS[row * 3 + col]
+               for row, line in enumerate(cells) for col, cell in enumerate(line))
+
+
+def decode(code: int) -> List[List[str]]:
+    """
+    Get the cells of a position code, laid out as `Board` stores them.
+    """
+    cells = []
+    for _ in range(9):
+        code, value = divmod(code, 3)
+        cells.append(SYMBOLS[value])
+    return [cells[i:i + 3] for i in range(0, 9, 3)]
+
+
+def masks(code: int) -> tuple:
+    """
+    Split a position code into the 9-bit masks of X's and O's cells.
+    """
+    x = o = 0
+    for cell in range(9):
+        code, value = divmod(code, 3)
+        if value == 1:
+            x |= 1 << cell
+        elif value == 2:
+            o |= 1 << cell
+    return x, o
+
+
+@lru_cache(maxsize=None)
+def solved_table() -> Dict[int, Solution]:
+    """
+    Solve every position reachable from the empty board.
+
+    The table is built once per process on first use (5,478 positions).
+
+    Returns:
+        dict[int, Solution]: The solution of each reachable position, keyed by position code.
+    """
+    table: Dict[int, Solution] = {}
+
+    def solve(code: int, mine: int, theirs: int, turn: int) -> Solution:
+        solution = table.get(code)
+        if solution is not None:
+            return solution
+        if has_line(theirs):
+            solution = Solution(-1, 0, 0)
+        elif mine | theirs == FULL:
+            solution = Solution(0, 0, 0)
+        else:
+            best_key, optimal = None, 0
+            free = FULL ^ (mine | theirs)
+            while free:
+                bit = free & -free
+                free ^= bit
+                cell = bit.bit_length() - 1
+                child = solve(code + (turn + 1) * POWERS[cell], theirs, mine | bit, 1 - turn)
+                # Prefer the best value, then the quickest win or the slowest loss
+                key = (-child.value, -child.distance if child.value < 0 else child.distance)
+                if best_key is None or key > best_key:
+                    best_key, optimal = key, bit
+                elif key == best_key:
+                    optimal |= bit
+            value, distance = best_key[0], abs(best_key[1]) + 1
+            solution = Solution(value, distance, optimal)
+        table[code] = solution
+        return solution
+
+    solve(0, 0, 0, 0)
+    return table
+
+
+def solve_board(board: Board) -> Union[Solution, None]:
+    """
+    Look up the solution of a board's current position.
+
+    Args:
+        board (Board): The game board. X is assumed to have moved first.
+
+    Returns:
+        Solution | None: The solution, or None if the position cannot arise in a legal game.
+    """
+    return solved_table().get(encode(board._board))
+
+
+def best_move(board: Board) -> Union[tuple, None]:
+    """
+    Get a perfect move for the side to move.
+
+    Returns:
+        tuple | None: The row and column indices of the move, or None if the game is over or the
+            position is not reachable.
+    """
+    solution = solve_board(board)
+    if solution is None or solution.best < 0:
+        return None
+    return divmod(solution.best, 3)
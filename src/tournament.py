@@ -0,0 +1,229 @@
+"""
+Headless tournaments between CPU strategies.
+
+Usage:
+    python -m src.tournament --games 100000 --workers 4 --out results.csv
+    python -m src.tournament --gauntlet heuristic --engines random perfect
+"""
+import argparse
+from itertools import combinations
+from math import log10, sqrt
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, TextIO, Union
+
+from src.board import Board
+from src.cpu import choose_move
+from src.solver import encode, solved_table
+
+
+# A strategy gets the board, its own symbol and a random generator, and returns (row, col)
+Strategy = Callable[[Board, str, Random], tuple]
+
+ENGINES: Dict[str, Strategy] = {}
+
+
+def register(name: str) -> Callable[[Strategy], Strategy]:
+    """
+    Register a strategy under a name so tournaments can refer to it.
+    """
+    def decorator(strategy: Strategy) -> Strategy:
+        ENGINES[name] = strategy
+        return strategy
+    return decorator
+
+
+@register("heuristic")
+def heuristic(board: Board, player: str, rng: Random) -> tuple:
+    """
+    The win/block/random choice of cpu_game.
+    """
+    return choose_move(board, player, 'O' if player == 'X' else 'X', rng)
+
+
+@register("random")
+def uniform(board: Board, player: str, rng: Random) -> tuple:
+    return rng.choice(board.get_empty_cells())
+
+
+@register("perfect")
+def perfect(board: Board, player: str, rng: Random) -> tuple:
+    """
+    A random choice among the solver's optimal moves.
+    """
+    optimal = solved_table()[encode(board._board)].optimal
+    return divmod(rng.choice([cell for cell in range(9) if optimal >> cell & 1]), 3)
+
+
+def play_match_game(x_engine: str, o_engine: str, rng: Random, opening_plies: int=0) -> str:
+    """
+    Play one game between two registered engines.
+
+    Args:
+        x_engine (str): The engine playing X, which moves first.
+        o_engine (str): The engine playing O.
+        rng (Random): The random generator for the opening and the engines.
+        opening_plies (int, optional): Plies played at random before the engines take over. Defaults to 0.
+
+    Returns:
+        str: 'X', 'O' or 'tie'.
+    """
+    board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+    engines = (ENGINES[x_engine], ENGINES[o_engine])
+    players = ('X', 'O')
+    ply = 0
+    while True:
+        player = players[ply % 2]
+        if ply < opening_plies:
+            row, col = rng.choice(board.get_empty_cells())
+        else:
+            row, col = engines[ply % 2](board, player, rng)
+        board.update_board(player, row, col)
+        winner = board.get_winner()
+        if winner is not None:
+            return winner
+        ply += 1
+
+
+def _play_chunk(task: tuple) -> List[tuple]:
+    x_engine, o_engine, games, seed, opening_plies = task
+    rng = Random(seed)
+    return [(x_engine, o_engine, play_match_game(x_engine, o_engine, rng, opening_plies)) for _ in range(games)]
+
+
+def schedule(engines: List[str], games: int, gauntlet: Union[str, None]=None, chunk: int=500,
+             opening_plies: int=1, seed: int=0) -> List[tuple]:
+    """
+    Split a tournament into tasks of up to `chunk` games, with both colour assignments of every pairing.
+
+    Args:
+        engines (list[str]): The participating engines.
+        games (int): Games per pairing, split evenly between the two colour assignments; with an odd
+            number the first engine of the pairing plays X once more.
+        gauntlet (str, optional): If given, this engine plays every other engine, instead of a round robin.
+        chunk (int, optional): Games per task. Defaults to 500.
+        opening_plies (int, optional): Random plies at the start of each game. Defaults to 1.
+        seed (int, optional): Seeds the generator that draws each task's own seed. Defaults to 0.
+
+    Returns:
+        list[tuple]: Tasks for the process pool.
+    """
+    if gauntlet is not None:
+        pairings = [(gauntlet, engine) for engine in engines if engine != gauntlet]
+    else:
+        pairings = list(combinations(engines, 2))
+    # Drawn rather than counted up from `seed`, so tournaments with nearby seeds share no task seeds
+    seeds = Random(seed)
+    tasks = []
+    for first, second in pairings:
+        for x_engine, o_engine, remaining in ((first, second, games - games // 2), (second, first, games // 2)):
+            while remaining > 0:
+                size = min(chunk, remaining)
+                tasks.append((x_engine, o_engine, size, seeds.getrandbits(64), opening_plies))
+                remaining -= size
+    return tasks
+
+
+class EloTable:
+    """
+    Incremental Elo ratings plus per-pairing scores for confidence intervals.
+
+    Args:
+        k (float, optional): The Elo K-factor. Defaults to 4, which suits long runs.
+    """
+    def __init__(self, engines: List[str], k: float=4.0) -> None:
+        self.k: float = k
+        self.ratings: Dict[str, float] = {engine: 1500.0 for engine in engines}
+        # Per engine: wins, draws, losses
+        self.records: Dict[str, List[int]] = {engine: [0, 0, 0] for engine in engines}
+
+    def update(self, x_engine: str, o_engine: str, result: str) -> None:
+        score = {'X': 1.0, 'O': 0.0, 'tie': 0.5}[result]
+        expected = 1 / (1 + 10 ** ((self.ratings[o_engine] - self.ratings[x_engine]) / 400))
+        self.ratings[x_engine] += self.k * (score - expected)
+        self.ratings[o_engine] -= self.k * (score - expected)
+        for engine, engine_score in ((x_engine, score), (o_engine, 1 - score)):
+            self.records[engine][{1.0: 0, 0.5: 1, 0.0: 2}[engine_score]] += 1
+
+    def performance(self, engine: str) -> tuple:
+        """
+        Get an engine's Elo difference against the field, from its score, with a 95% confidence interval.
+
+        Returns:
+            tuple: The Elo difference and the half-width of the interval. Both are infinite for a perfect
+                or zero score.
+        """
+        wins, draws, losses = self.records[engine]
+        games = wins + draws + losses
+        if games == 0:
+            return 0.0, float("inf")
+        score = (wins + draws / 2) / games
+        deviation = sqrt((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games)
+
+        def elo(s: float) -> float:
+            if s <= 0:
+                return float("-inf")
+            if s >= 1:
+                return float("inf")
+            return -400 * log10(1 / s - 1)
+
+        margin = 1.96 * deviation / sqrt(games)
+        return elo(score), (elo(min(1.0, score + margin)) - elo(max(0.0, score - margin))) / 2
+
+    def report(self) -> str:
+        lines = [f"{'engine':<12}{'elo':>8}{'perf':>9}{'95% ci':>10}{'wins':>9}{'draws':>9}{'losses':>9}"]
+        for engine in sorted(self.ratings, key=self.ratings.get, reverse=True):
+            performance, margin = self.performance(engine)
+            wins, draws, losses = self.records[engine]
+            lines.append(f"{engine:<12}{self.ratings[engine]:>8.0f}{performance:>9.0f}{margin:>10.0f}"
+                         f"{wins:>9}{draws:>9}{losses:>9}")
+        return "\n".join(lines)
+
+
+def run_tournament(tasks: List[tuple], workers: int=None, out: Union[TextIO, None]=None) -> Iterator[List[tuple]]:
+    """
+    Play the tasks on a process pool, writing each result to `out` as it arrives.
+
+    Yields:
+        list[tuple]: The (x_engine, o_engine, result) games of each finished task.
+    """
+    with Pool(workers) as pool:
+        for results in pool.imap_unordered(_play_chunk, tasks):
+            if out is not None:
+                out.writelines(f"{x_engine},{o_engine},{result}\n" for x_engine, o_engine, result in results)
+            yield results
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Play a headless tournament between CPU strategies.")
+    parser.add_argument("--engines", nargs="+", default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument("--gauntlet", choices=sorted(ENGINES), help="play this engine against all others")
+    parser.add_argument("--games", type=int, default=10000, help="games per pairing")
+    parser.add_argument("--opening", type=int, default=1, help="random plies at the start of each game")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--out", help="file to stream results to, one CSV line per game")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    engines = sorted(set(args.engines) | ({args.gauntlet} if args.gauntlet else set()))
+    tasks = schedule(engines, args.games, args.gauntlet, opening_plies=args.opening, seed=args.seed)
+    table = EloTable(engines)
+    out = open(args.out, "w") if args.out else None
+    start = perf_counter()
+    played = 0
+    try:
+        for results in run_tournament(tasks, args.workers, out):
+            for game in results:
+                table.update(*game)
+            played += len(results)
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = perf_counter() - start
+    print(table.report())
+    print(f"\n{played} games in {elapsed:.1f}s ({played / elapsed:.0f} games/sec)")
+
+
+if __name__ == "__main__":
+    main()
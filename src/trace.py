@@ -0,0 +1,380 @@
+"""
+Record sessions as input traces and replay them headlessly.
+
+A trace is a JSON-lines file. The first line is a header with the screen size and the random seed of
+the session. Every other line is one timestamped event:
+
+    {"trace": 1, "rows": 24, "cols": 80, "seed": 1234}
+    {"t": 0.812, "key": 409}
+    {"t": 0.812, "mouse": [0, 37, 13, 0, 4]}
+    {"t": 5.130, "recv": "[1, 1]\n"}
+    {"t": 6.002, "send": "[0, 0]\n"}
+
+Replays run `play_game` on a virtual screen, answer the network with a loopback peer that plays back
+the recorded messages, and report how long the game took to process each input.
+
+Usage:
+    python main.py --trace session.trace
+    python -m src.trace replay session.trace --save-golden session.golden
+    python -m src.trace replay session.trace --golden session.golden [--realtime]
+"""
+import argparse
+import difflib
+import json
+import os
+import random
+import socket
+from collections import deque
+from time import perf_counter, process_time, sleep
+from typing import Deque, List, Union
+
+from src.board import Board
+from src.screen import ForwardingScreen, Screen, ScriptExhausted, VirtualScreen
+
+
+VERSION: int = 1
+
+
+class Trace:
+    """
+    The header and events of a recorded session.
+
+    Args:
+        rows (int): Screen height.
+        cols (int): Screen width.
+        seed (int, optional): The seed of the global random generator. Defaults to a random seed.
+        events (list[dict], optional): The recorded events. Defaults to none.
+    """
+    def __init__(self, rows: int, cols: int, seed: Union[int, None]=None, events: List[dict]=None) -> None:
+        self.rows: int = rows
+        self.cols: int = cols
+        self.seed: int = random.randrange(1 << 32) if seed is None else seed
+        self.events: List[dict] = [] if events is None else events
+        self._start: float = perf_counter()
+
+    def add(self, kind: str, value: object) -> None:
+        self.events.append({"t": round(perf_counter() - self._start, 6), kind: value})
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(json.dumps({"trace": VERSION, "rows": self.rows, "cols": self.cols, "seed": self.seed}) + "\n")
+            for event in self.events:
+                f.write(json.dumps(event) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        """
+        Raises:
+            ValueError: If the file is not a trace.
+        """
+        with open(path) as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("trace") != VERSION:
+                raise ValueError(f"{path} is not a trace")
+            return cls(header["rows"], header["cols"], header["seed"], [json.loads(line) for line in f if line.strip()])
+
+
+class RecordingScreen(ForwardingScreen):
+    """
+    Forward everything to another screen and record the input it returns.
+
+    The global random generator is seeded with the trace's seed, so a replay makes the same random
+    choices. Moves chosen against the clock, as in the ultimate and Qubic modes, can still differ.
+
+    Args:
+        screen (Screen): The screen to forward to.
+        trace (Trace, optional): Where to record. Defaults to a new trace sized like the screen.
+    """
+    def __init__(self, screen: Screen, trace: Union[Trace, None]=None) -> None:
+        super().__init__(screen)
+        self.trace: Trace = Trace(*screen.getmaxyx()) if trace is None else trace
+        random.seed(self.trace.seed)
+
+    def getch(self) -> int:
+        key = self.screen.getch()
+        if key != -1:
+            self.trace.add("key", key)
+        return key
+
+    def getmouse(self) -> tuple:
+        mouse = self.screen.getmouse()
+        self.trace.add("mouse", list(mouse))
+        return mouse
+
+    def socket(self, *args) -> "RecordingSocket":
+        """
+        Create a socket whose traffic is recorded. Pass this to `play_game` as `sockets`.
+        """
+        return RecordingSocket(socket.socket(*args), self.trace)
+
+
+class RecordingSocket:
+    """
+    A socket that records the data it sends and receives, including on the connections it accepts.
+    """
+    def __init__(self, sock: socket.socket, trace: Trace) -> None:
+        self._socket: socket.socket = sock
+        self._trace: Trace = trace
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self._socket, name)
+
+    def accept(self) -> tuple:
+        conn, addr = self._socket.accept()
+        return RecordingSocket(conn, self._trace), addr
+
+    def send(self, data: bytes) -> int:
+        self._trace.add("send", data.decode("latin-1"))
+        return self._socket.send(data)
+
+    def recv(self, size: int) -> bytes:
+        data = self._socket.recv(size)
+        self._trace.add("recv", data.decode("latin-1"))
+        return data
+
+    def __enter__(self) -> "RecordingSocket":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._socket.close()
+
+    def __repr__(self) -> str:
+        return repr(self._socket)
+
+
+class LoopbackPeer:
+    """
+    Stand in for the network during a replay: every connection succeeds at once, receives play back the
+    recorded messages and sends are collected.
+
+    Args:
+        messages (list[tuple]): (time, data) of each recorded receive.
+        clock (callable, optional): If given, receives wait until `clock()` reaches their recorded time.
+    """
+    def __init__(self, messages: List[tuple], clock=None) -> None:
+        self.messages: Deque[tuple] = deque(messages)
+        self.clock = clock
+        self.sent: List[bytes] = []
+
+    def socket(self, *args) -> "LoopbackSocket":
+        return LoopbackSocket(self)
+
+
+class LoopbackSocket:
+    """
+    The socket side of a `LoopbackPeer`, with the methods the online modes use.
+    """
+    def __init__(self, peer: LoopbackPeer) -> None:
+        self.peer: LoopbackPeer = peer
+
+    def bind(self, address: tuple) -> None:
+        pass
+
+    def listen(self, backlog: int=0) -> None:
+        pass
+
+    def setsockopt(self, *args) -> None:
+        pass
+
+    def setblocking(self, flag: bool) -> None:
+        pass
+
+    def settimeout(self, timeout: float) -> None:
+        pass
+
+    def connect(self, address: tuple) -> None:
+        pass
+
+    def accept(self) -> tuple:
+        return LoopbackSocket(self.peer), ("127.0.0.1", 0)
+
+    def getpeername(self) -> tuple:
+        return ("127.0.0.1", 0)
+
+    def send(self, data: bytes) -> int:
+        self.peer.sent.append(data)
+        return len(data)
+
+    def recv(self, size: int) -> bytes:
+        if not self.peer.messages:
+            # The recorded peer hung up
+            return b""
+        at, data = self.peer.messages.popleft()
+        if self.peer.clock is not None:
+            sleep(max(0.0, at - self.peer.clock()))
+        return data
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "LoopbackSocket":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def __repr__(self) -> str:
+        return "loopback"
+
+
+class ReplayScreen(VirtualScreen):
+    """
+    A virtual screen fed from a trace, timing how long the game takes to handle each input.
+
+    Args:
+        trace (Trace): The session to replay.
+        realtime (bool, optional): Deliver input at its recorded time and really sleep in `nap`.
+            Defaults to False, which replays as fast as possible.
+
+    Attributes:
+        latencies (list[float]): Seconds from handing out each input until the game asked for the next.
+    """
+    def __init__(self, trace: Trace, realtime: bool=False) -> None:
+        super().__init__(trace.rows, trace.cols)
+        self.realtime: bool = realtime
+        self.times: Deque[float] = deque()
+        for event in trace.events:
+            if "key" in event:
+                self.events.append(event["key"])
+                self.times.append(event["t"])
+            elif "mouse" in event:
+                self.mouse_events.append(tuple(event["mouse"]))
+        self.latencies: List[float] = []
+        self._handed_out: Union[float, None] = None
+        self._start: float = perf_counter()
+
+    def elapsed(self) -> float:
+        return perf_counter() - self._start
+
+    def getch(self) -> int:
+        now = perf_counter()
+        if self._handed_out is not None:
+            self.latencies.append(now - self._handed_out)
+            self._handed_out = None
+        if self.events and self.realtime:
+            sleep(max(0.0, self.times[0] - self.elapsed()))
+        key = super().getch()
+        if key != -1:
+            self.times.popleft()
+            self._handed_out = perf_counter()
+        return key
+
+    def nap(self, seconds: float) -> None:
+        # Flat out, sleeps are skipped and so don't count as processing time
+        super().nap(seconds)
+        if self.realtime:
+            sleep(seconds)
+
+
+class ReplayReport:
+    """
+    The outcome of a replay.
+
+    Attributes:
+        events (int): Inputs handed to the game.
+        latencies (list[float]): Seconds the game spent on each input.
+        frames (int): Screen refreshes.
+        bytes (int): Bytes the refreshes would have sent to a terminal.
+        cpu (float), wall (float): CPU and wall-clock seconds of the replay.
+        sent (list[bytes]): What the game sent to the peer.
+        screen (str): The final screen.
+        ended (str): How the session ended: 'exit', 'end of trace' or an exception name.
+    """
+    def __init__(self, screen: ReplayScreen, peer: LoopbackPeer, cpu: float, wall: float, ended: str) -> None:
+        self.events: int = len(screen.latencies)
+        self.latencies: List[float] = screen.latencies
+        self.frames: int = len(screen.refresh_bytes)
+        self.bytes: int = sum(screen.refresh_bytes)
+        self.cpu: float = cpu
+        self.wall: float = wall
+        self.sent: List[bytes] = peer.sent
+        self.screen: str = screen.text()
+        self.ended: str = ended
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> str:
+        return "\n".join([
+            f"events     {self.events}",
+            f"latency    p50 {self.percentile(0.5) * 1e3:.3f} ms  p99 {self.percentile(0.99) * 1e3:.3f} ms  "
+            f"max {max(self.latencies, default=0.0) * 1e3:.3f} ms",
+            f"frames     {self.frames} ({self.bytes:,} bytes)",
+            f"time       {self.cpu:.3f}s cpu, {self.wall:.3f}s wall",
+            f"ended      {self.ended}",
+        ])
+
+
+def replay(trace: Trace, realtime: bool=False) -> ReplayReport:
+    """
+    Replay a trace through `play_game` on a virtual screen against a loopback peer.
+
+    Args:
+        trace (Trace): The session to replay.
+        realtime (bool, optional): Keep the recorded timing instead of running flat out. Defaults to False.
+
+    Returns:
+        ReplayReport: Latencies, frame counts, timings and the final screen.
+    """
+    from src.engine import play_game
+
+    screen = ReplayScreen(trace, realtime)
+    messages = [(event["t"], event["recv"].encode("latin-1")) for event in trace.events if "recv" in event]
+    peer = LoopbackPeer(messages, screen.elapsed if realtime else None)
+    random.seed(trace.seed)
+    Board.clear_board()
+    cpu, wall = process_time(), perf_counter()
+    try:
+        # The recorded peer can't answer new pings, and the replay mustn't time it out, announce itself or
+        # touch the host cache
+        play_game(screen, sockets=peer.socket, heartbeat=0, discovery=False)
+        ended = "return"
+    except SystemExit:
+        ended = "exit"
+    except ScriptExhausted:
+        ended = "end of trace"
+    finally:
+        Board.clear_board()
+    return ReplayReport(screen, peer, process_time() - cpu, perf_counter() - wall, ended)
+
+
+def diff_screens(expected: str, actual: str) -> List[str]:
+    """
+    Compare two screens line by line.
+
+    Returns:
+        list[str]: A unified diff, empty if the screens match.
+    """
+    return list(difflib.unified_diff(expected.splitlines(), actual.splitlines(), "golden", "replay", lineterm=""))
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded sessions headlessly.")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("trace")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded timing")
+    parser.add_argument("--golden", help="fail if the final screen differs from this file")
+    parser.add_argument("--save-golden", help="write the final screen to this file")
+    args = parser.parse_args(argv)
+
+    # Keep replayed games out of the session archive
+    os.environ["TICTACTOE_ARCHIVE"] = ""
+    report = replay(Trace.load(args.trace), args.realtime)
+    print(report.summary())
+    if args.save_golden:
+        with open(args.save_golden, "w") as f:
+            f.write(report.screen + "\n")
+    if args.golden:
+        with open(args.golden) as f:
+            diff = diff_screens(f.read().rstrip("\n"), report.screen)
+        if diff:
+            print("\n".join(diff))
+            raise SystemExit(1)
+        print("screen     matches golden")
+
+
+if __name__ == "__main__":
+    main()
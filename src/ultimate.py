@@ -0,0 +1,303 @@
+from math import log, sqrt
+from textwrap import wrap
+from random import choice, random
+from time import perf_counter
+from typing import List, Union
+from curses import A_REVERSE
+
+from src.board import Board, WIN_MASKS
+from src.screen import Screen
+
+
+FULL: int = 0x1ff
+
+# LOCAL_WIN[mask] is True if the 9-bit mask contains one of the lines checked by Board.get_winner
+LOCAL_WIN: List[bool] = [any(mask & line == line for line in WIN_MASKS) for mask in range(1 << 9)]
+
+# LOCAL_CELLS[mask] lists the cell indices whose bit is set in the 9-bit mask
+LOCAL_CELLS: List[tuple] = [tuple(i for i in range(9) if mask >> i & 1) for mask in range(1 << 9)]
+
+
+class UltimateState:
+    """
+    Compact state of an ultimate tic-tac-toe game.
+
+    Each player owns nine 9-bit local boards. The meta-board keeps one 9-bit mask per player for the
+    local boards they have won, plus a mask of local boards that are decided (won or full). Moves are
+    encoded as `local_board * 9 + cell`.
+    """
+    __slots__ = ("boards", "meta", "done", "next_board", "turn", "winner")
+
+    def __init__(self) -> None:
+        self.boards: List[List[int]] = [[0] * 9, [0] * 9]
+        self.meta: List[int] = [0, 0]
+        self.done: int = 0
+        # The local board the next move must be played in, or -1 if any undecided board is allowed
+        self.next_board: int = -1
+        # 0 if X is to move, 1 if O is to move
+        self.turn: int = 0
+        # None while the game is running, then 0 (X), 1 (O) or 2 (tie)
+        self.winner: Union[int, None] = None
+
+    def copy(self) -> "UltimateState":
+        """
+        Return an independent copy of the state.
+        """
+        other = UltimateState.__new__(UltimateState)
+        other.boards = [self.boards[0][:], self.boards[1][:]]
+        other.meta = self.meta[:]
+        other.done = self.done
+        other.next_board = self.next_board
+        other.turn = self.turn
+        other.winner = self.winner
+        return other
+
+    def legal_moves(self) -> List[int]:
+        """
+        Get the legal moves of the side to move.
+
+        Returns:
+            list[int]: The legal moves, encoded as `local_board * 9 + cell`.
+        """
+        if self.winner is not None:
+            return []
+        x, o = self.boards
+        if self.next_board >= 0:
+            b = self.next_board
+            return [b * 9 + c for c in LOCAL_CELLS[FULL ^ (x[b] | o[b])]]
+        moves = []
+        for b in LOCAL_CELLS[FULL ^ self.done]:
+            moves += [b * 9 + c for c in LOCAL_CELLS[FULL ^ (x[b] | o[b])]]
+        return moves
+
+    def play(self, move: int) -> None:
+        """
+        Play a legal move for the side to move.
+
+        Args:
+            move (int): The move, encoded as `local_board * 9 + cell`.
+        """
+        b, c = divmod(move, 9)
+        turn = self.turn
+        local = self.boards[turn][b] | (1 << c)
+        self.boards[turn][b] = local
+        if LOCAL_WIN[local]:
+            self.meta[turn] |= 1 << b
+            self.done |= 1 << b
+            if LOCAL_WIN[self.meta[turn]]:
+                self.winner = turn
+        elif local | self.boards[1 - turn][b] == FULL:
+            self.done |= 1 << b
+        if self.winner is None and self.done == FULL:
+            self.winner = 2
+        self.next_board = -1 if self.done >> c & 1 else c
+        self.turn = 1 - turn
+
+    def playout(self) -> int:
+        """
+        Play uniformly random moves until the game ends. The state is modified in place.
+
+        Returns:
+            int: 0 if X won, 1 if O won, 2 for a tie.
+        """
+        if self.winner is not None:
+            return self.winner
+        # Same rules as play(), inlined into locals because this loop dominates MCTS time
+        boards, meta = self.boards, self.meta
+        done, b, turn = self.done, self.next_board, self.turn
+        local_win, local_cells = LOCAL_WIN, LOCAL_CELLS
+        winner = None
+        while winner is None:
+            if b < 0:
+                b = choice(local_cells[FULL ^ done])
+            mine, theirs = boards[turn], boards[1 - turn]
+            c = choice(local_cells[FULL ^ (mine[b] | theirs[b])])
+            local = mine[b] | (1 << c)
+            mine[b] = local
+            if local_win[local]:
+                meta[turn] |= 1 << b
+                done |= 1 << b
+                if local_win[meta[turn]]:
+                    winner = turn
+            elif local | theirs[b] == FULL:
+                done |= 1 << b
+            if winner is None and done == FULL:
+                winner = 2
+            b = -1 if done >> c & 1 else c
+            turn = 1 - turn
+        self.done, self.next_board, self.turn, self.winner = done, b, turn, winner
+        return winner
+
+
+class _Node:
+    __slots__ = ("move", "parent", "children", "untried", "wins", "visits", "mover")
+
+    def __init__(self, state: UltimateState, move: int=-1, parent: "_Node"=None) -> None:
+        self.move: int = move
+        self.parent: _Node = parent
+        self.children: List[_Node] = []
+        self.untried: List[int] = state.legal_moves()
+        self.wins: float = 0.0
+        self.visits: int = 0
+        # The player who made `move`, whose point of view `wins` is counted from
+        self.mover: int = 1 - state.turn
+
+
+def mcts(state: UltimateState, playouts: int=None, think_time: float=1.0, c: float=1.4) -> int:
+    """
+    Choose a move with Monte Carlo tree search (UCT). A move that wins the game at once is played without
+    searching.
+
+    Args:
+        state (UltimateState): The position to search. It is not modified.
+        playouts (int, optional): Stop after this many playouts. Defaults to None.
+        think_time (float, optional): Stop after this many seconds if `playouts` is None. Defaults to 1.0.
+        c (float, optional): The UCT exploration constant. Defaults to 1.4.
+
+    Returns:
+        int: The chosen move, encoded as `local_board * 9 + cell`.
+    """
+    root = _Node(state)
+    if len(root.untried) == 1:
+        return root.untried[0]
+    for move in root.untried:
+        after = state.copy()
+        after.play(move)
+        if after.winner == state.turn:
+            return move
+    deadline = perf_counter() + think_time
+    done = 0
+    while (done < playouts) if playouts is not None else (done & 63 or perf_counter() < deadline):
+        node = root
+        sim = state.copy()
+        # Selection
+        while not node.untried and node.children:
+            log_visits = log(node.visits)
+            node = max(node.children, key=lambda n: n.wins / n.visits + c * sqrt(log_visits / n.visits))
+            sim.play(node.move)
+        # Expansion
+        if node.untried:
+            move = node.untried.pop(int(random() * len(node.untried)))
+            sim.play(move)
+            child = _Node(sim, move, node)
+            node.children.append(child)
+            node = child
+        # Simulation
+        result = sim.playout()
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if result == node.mover:
+                node.wins += 1.0
+            elif result == 2:
+                node.wins += 0.5
+            node = node.parent
+        done += 1
+    return max(root.children, key=lambda n: n.visits).move
+
+
+class UltimateBoard(Board):
+    """
+    A 9x9 board made of nine local 3x3 boards, backed by an UltimateState.
+    """
+    _size: int = 9
+    _block: int = 3
+    _cell_width: int = 4
+    _cell_height: int = 2
+    _board_width: int = 35
+    _board_height: int = 17
+    _symbols: List[str] = ['X', 'O']
+    # The board and banner fill a 24-line terminal, so status messages go in a panel to the right
+    _panel_width: int = 24
+    _panel_rows: int = 4
+
+    def __init__(self, stdscr: Screen, x: int=None, y: int=None) -> None:
+        """
+        Initialize an UltimateBoard object.
+
+        Args:
+            x (int, optional): The x-coordinate of the top-left corner of the board. Defaults to None.
+            y (int, optional): The y-coordinate of the top-left corner of the board. Defaults to None.
+        """
+        if x is None and stdscr is not None:
+            # Centre the board and the panel together
+            x = max(0, (stdscr.getmaxyx()[1] - self._board_width - 2 - self._panel_width) // 2)
+        super().__init__(stdscr, x, y, cells=[[' '] * 9 for _ in range(9)])
+        self.state: UltimateState = UltimateState()
+
+    def show_status(self, text: str) -> None:
+        """
+        Show a status message in the panel to the right of the board, wrapped to fit.
+        """
+        x = self.x + self._board_width + 2
+        width = max(1, min(self._panel_width, self.stdscr.getmaxyx()[1] - x - 1))
+        for i in range(self._panel_rows):
+            self.stdscr.addstr(self.y + 1 + i, x, " " * width)
+        for i, line in enumerate(wrap(text, width)[:self._panel_rows]):
+            self.stdscr.addstr(self.y + 1 + i, x, line)
+
+    @staticmethod
+    def to_move(row: int, col: int) -> int:
+        """
+        Convert a row and column of the 9x9 grid to an encoded move.
+        """
+        return (row // 3 * 3 + col // 3) * 9 + row % 3 * 3 + col % 3
+
+    @staticmethod
+    def to_cell(move: int) -> tuple:
+        """
+        Convert an encoded move to a row and column of the 9x9 grid.
+        """
+        b, c = divmod(move, 9)
+        return b // 3 * 3 + c // 3, b % 3 * 3 + c % 3
+
+    def is_playable(self, row: int, col: int) -> bool:
+        """
+        Check if a cell is empty and lies in a local board the current player may play in.
+        """
+        return self.to_move(row, col) in self.state.legal_moves()
+
+    def update_board(self, player: Union[str, chr], row: int, col: int) -> None:
+        """
+        Play the move of the side to move at the given cell.
+
+        Args:
+            player (str): The symbol representing the player.
+            row (int): The row index of the cell.
+            col (int): The column index of the cell.
+        """
+        self.state.play(self.to_move(row, col))
+        self._board[row][col] = player
+
+    def draw_values(self) -> None:
+        """
+        Draw the cell values, marking decided local boards and the boards the next move may go to.
+        """
+        super().draw_values()
+        allowed = {move // 9 for move in self.state.legal_moves()}
+        for b in range(9):
+            if self.state.meta[0] >> b & 1 or self.state.meta[1] >> b & 1:
+                symbol = self._symbols[0] if self.state.meta[0] >> b & 1 else self._symbols[1]
+            elif b in allowed:
+                symbol = '.'
+            else:
+                symbol = ' '
+            for c in range(9):
+                row, col = self.to_cell(b * 9 + c)
+                y_offset, x_offset = self._cell_origin(row, col)
+                if self.is_empty(row, col):
+                    self.stdscr.addstr(y_offset, x_offset + (self._cell_width - 1) // 2, symbol)
+                elif symbol in self._symbols:
+                    self.stdscr.addstr(y_offset, x_offset + (self._cell_width - 1) // 2, self._board[row][col], A_REVERSE)
+        self.stdscr.refresh()
+
+    def get_winner(self) -> Union[str, None]:
+        """
+        Check if there is a winner on the meta-board.
+
+        Returns:
+            str | None: The symbol of the winning player or 'tie' if there's a tie, or None if no winner.
+        """
+        if self.state.winner is None:
+            return None
+        return (self._symbols + ["tie"])[self.state.winner]
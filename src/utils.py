@@ -1,9 +1,14 @@
-import curses
 import requests
 from ipaddress import ip_address
 from typing import Union
 
-def center(stdscr: curses.window, num: Union[int, float]) -> int:
+from src.screen import Screen
+
+FOOTER: str = chr(0x00a9) + " flatiger 2024  |  Press 'q' at any time to quit"
+# Columns at the right end of the footer line kept for the round trip to an online peer
+LINK_SLOT: int = 22
+
+def center(stdscr: Screen, num: Union[int, float]) -> int:
     """
     Calculate the center position of a screen given a width.
 
@@ -17,7 +22,40 @@ def center(stdscr: curses.window, num: Union[int, float]) -> int:
     return (max_x - num) // 2
 
 
-def clear_y(stdscr: curses.window, y: int) -> None:
+def middle(stdscr: Screen, num: Union[int, float]) -> int:
+    """
+    Calculate the middle position of a screen given a height.
+
+    Args:
+        num (int): The height to center.
+
+    Returns:
+        int: The y-coordinate of the middle position.
+    """
+    max_y, _ = stdscr.getmaxyx()
+    return (max_y - num) // 2
+
+
+def footer_slot(stdscr: Screen, slot: str) -> tuple:
+    """
+    Find where status text may go on the footer line without covering the footer's own text.
+
+    Args:
+        slot (str): 'link' for the round trip at the right end, or 'profile' for the space between the
+            footer text and the link slot.
+
+    Returns:
+        tuple: The (y, x, width) of the slot. The width is 0 or less if the screen is too narrow.
+    """
+    max_y, max_x = stdscr.getmaxyx()
+    start = len(FOOTER) + 2
+    link_x = max(start, max_x - 1 - LINK_SLOT)
+    if slot == "link":
+        return max_y - 1, link_x, max_x - 1 - link_x
+    return max_y - 1, start, link_x - 1 - start
+
+
+def clear_y(stdscr: Screen, y: int) -> None:
     """
     Clear a line on the screen.
 
@@ -73,7 +111,7 @@ def is_valid_ip(ip: str) -> bool:
         return False
 
 
-def get_mouse_xy() -> tuple:
+def get_mouse_xy(stdscr: Screen) -> tuple:
     """
     Get the x and y coordinates of the mouse cursor.
 
@@ -83,11 +121,11 @@ def get_mouse_xy() -> tuple:
     Raises:
         KeyboardInterrupt: If the user quits the game by pressing 'q'.
     """
-    _, mx, my, _, _ = curses.getmouse()
+    _, mx, my, _, _ = stdscr.getmouse()
     return mx, my
 
 
-def get_input(stdscr: curses.window, x: int, y: int) -> str:
+def get_input(stdscr: Screen, x: int, y: int) -> str:
     """
     Prompt the user for input at the specified screen coordinates.
 
@@ -112,7 +150,7 @@ def get_input(stdscr: curses.window, x: int, y: int) -> str:
         Example usage:
             input_str = get_input(5, 5)
     """
-    curses.curs_set(1)
+    stdscr.curs_set(1)
     user_input = ""
 
     while True:
@@ -137,5 +175,5 @@ def get_input(stdscr: curses.window, x: int, y: int) -> str:
         user_input += chr(char)
         stdscr.addstr(y, x + len(user_input) - 1, chr(char))
 
-    curses.curs_set(0)
+    stdscr.curs_set(0)
     return user_input
\ No newline at end of file
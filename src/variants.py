@@ -0,0 +1,424 @@
+"""
+Rule variants, described declaratively and compiled once into lookup tables.
+
+A `Variant` gives the board's dimensions, the length `k` of a line, whether completing a line wins or
+loses, and which symbols each player may place:
+
+    standard  3x3, three in a row wins, X and O place their own symbol
+    misere    three in a row of your own symbol loses
+    wild      each player places X or O; whoever completes a line of either wins
+    notakto   both players place X; whoever completes a line loses
+
+`compile_variant` turns a description into `Rules`: every line as a bitmask over the cells (numbered
+row * cols + col), the lines through each cell, and for boards of up to TABLE_CELLS cells a table saying
+which occupancy masks contain a line. `Board`, the CPU and the analysis overlay read the tables instead
+of bespoke `get_winner` code. Compiled tables are cached on disk, keyed by a hash of the description:
+
+    file := magic "TTVR" | version u32 | description_length u32 | description (JSON)
+            | line_count u32 | line_mask u64 * line_count | table_length u32 | table u8 * table_length
+
+Usage:
+    python -m src.variants list
+    python -m src.variants solve wild
+    python -m src.variants compile --rows 4 --cols 4 --k 3 --goal lose
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+from array import array
+from time import perf_counter
+from typing import Dict, List, Tuple, Union
+
+
+WIN, LOSE = "win", "lose"
+OWN, EITHER, SHARED = "own", "either", "shared"
+SYMBOLS: str = "XO"
+TIE: int = 2
+TABLE_CELLS: int = 16
+
+HEADER: struct.Struct = struct.Struct("<4sII")
+COUNT: struct.Struct = struct.Struct("<I")
+MAGIC: bytes = b"TTVR"
+VERSION: int = 1
+
+DEFAULT_CACHE: str = os.path.join(os.path.expanduser("~"), ".tic-tac-toe", "variants")
+
+
+class Variant:
+    """
+    The rules of a k-in-a-row game.
+
+    Args:
+        name (str): The variant's name; not part of its rules.
+        rows (int, optional): Board height. Defaults to 3.
+        cols (int, optional): Board width. Defaults to 3.
+        k (int, optional): Length of a line. Defaults to 3.
+        goal (str, optional): WIN if completing a line wins, LOSE if it loses. Defaults to WIN.
+        placement (str, optional): OWN if each player places their own symbol, EITHER if either player
+            may place X or O, SHARED if both place X. Defaults to OWN.
+
+    Raises:
+        ValueError: If a line can't fit on the board or the goal or placement is unknown.
+    """
+    __slots__ = ("name", "rows", "cols", "k", "goal", "placement")
+
+    def __init__(self, name: str, rows: int=3, cols: int=3, k: int=3, goal: str=WIN,
+                 placement: str=OWN) -> None:
+        if not (1 <= k <= max(rows, cols)) or min(rows, cols) < 1:
+            raise ValueError(f"No line of {k} fits on a {rows}x{cols} board")
+        if rows * cols > 64:
+            raise ValueError(f"Boards have at most 64 cells, not {rows * cols}")
+        if goal not in (WIN, LOSE):
+            raise ValueError(f"Unknown goal {goal!r}")
+        if placement not in (OWN, EITHER, SHARED):
+            raise ValueError(f"Unknown placement {placement!r}")
+        self.name: str = name
+        self.rows: int = rows
+        self.cols: int = cols
+        self.k: int = k
+        self.goal: str = goal
+        self.placement: str = placement
+
+    def description(self) -> dict:
+        return {"rows": self.rows, "cols": self.cols, "k": self.k, "goal": self.goal, "placement": self.placement}
+
+    def key(self) -> str:
+        """
+        Get the hash the variant's compiled tables are cached under.
+        """
+        text = json.dumps(self.description(), sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def __repr__(self) -> str:
+        return f"Variant({self.name!r}, {self.rows}x{self.cols}, k={self.k}, {self.goal}, {self.placement})"
+
+
+VARIANTS: Dict[str, Variant] = {
+    "standard": Variant("standard"),
+    "misere": Variant("misere", goal=LOSE),
+    "wild": Variant("wild", placement=EITHER),
+    "notakto": Variant("notakto", goal=LOSE, placement=SHARED),
+}
+
+
+def line_masks(rows: int, cols: int, k: int) -> List[int]:
+    """
+    Get every line of `k` cells in a row, column or diagonal as a bitmask over cells row * cols + col.
+    """
+    masks = []
+    for row in range(rows):
+        for col in range(cols):
+            for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                if 0 <= end_row < rows and 0 <= end_col < cols:
+                    masks.append(sum(1 << (row + d_row * i) * cols + col + d_col * i for i in range(k)))
+    return masks
+
+
+def line_table(cells: int, masks: List[int]) -> bytearray:
+    """
+    Mark every occupancy mask over `cells` cells that contains one of the lines.
+    """
+    table = bytearray(1 << cells)
+    full = (1 << cells) - 1
+    for mask in masks:
+        # Visit every superset of the line by walking the subsets of the other cells
+        rest = full ^ mask
+        subset = rest
+        while True:
+            table[subset | mask] = 1
+            if not subset:
+                break
+            subset = (subset - 1) & rest
+    return table
+
+
+class Rules:
+    """
+    The compiled tables of a variant.
+
+    Positions are a pair of bitmasks (x, o) of the cells holding each symbol. Players are numbered 0 for
+    whoever moves first and 1 for the other; `players` names them for display.
+
+    Args:
+        variant (Variant): The rules the tables were compiled from.
+        lines (list): Every line as a bitmask.
+        table (bytes): 1 for each occupancy mask containing a line, or empty on large boards.
+    """
+    def __init__(self, variant: Variant, lines: List[int], table: Union[bytes, bytearray]=b"") -> None:
+        self.variant: Variant = variant
+        self.rows: int = variant.rows
+        self.cols: int = variant.cols
+        self.cells: int = variant.rows * variant.cols
+        self.full: int = (1 << self.cells) - 1
+        self.lines: List[int] = lines
+        self.table: Union[bytes, bytearray] = table
+        # The lines through each cell, so a move is only checked against those
+        self.cell_lines: List[Tuple[int, ...]] = [tuple(line for line in lines if line >> cell & 1)
+                                                 for cell in range(self.cells)]
+        self.players: Tuple[str, str] = ("X", "O") if variant.placement == OWN else ("1", "2")
+        self.placements: Tuple[int, ...] = (0,) if variant.placement == SHARED else (0, 1)
+        self._solved: Dict[tuple, tuple] = {}
+
+    def symbols_for(self, player: str) -> Tuple[int, ...]:
+        """
+        Get the symbols (0 for X, 1 for O) a player may place.
+        """
+        if self.variant.placement == OWN:
+            return (SYMBOLS.index(player),)
+        return self.placements
+
+    def has_line(self, mask: int) -> bool:
+        if self.table:
+            return bool(self.table[mask])
+        return any(mask & line == line for line in self.lines)
+
+    def encode(self, cells: List[List[str]]) -> tuple:
+        """
+        Get the (x, o) masks of a board laid out as `Board` stores it.
+        """
+        x = o = 0
+        for row, line in enumerate(cells):
+            for col, cell in enumerate(line):
+                if cell == 'X':
+                    x |= 1 << row * self.cols + col
+                elif cell == 'O':
+                    o |= 1 << row * self.cols + col
+        return x, o
+
+    def outcome(self, x: int, o: int) -> Union[int, None]:
+        """
+        Get the result of a position.
+
+        Returns:
+            int | None: The winning player (0 or 1), TIE, or None if the game goes on.
+        """
+        x_line, o_line = self.has_line(x), self.has_line(o)
+        if x_line or o_line:
+            if self.variant.placement == OWN:
+                completer = 0 if x_line else 1
+            else:
+                # Any line may be either player's, so it belongs to whoever moved last
+                completer = (bin(x | o).count("1") - 1) % 2
+            return completer if self.variant.goal == WIN else 1 - completer
+        if x | o == self.full:
+            return TIE
+        return None
+
+    def moves(self, x: int, o: int, symbols: Tuple[int, ...]) -> List[tuple]:
+        """
+        Get every legal (cell, symbol) for a player who may place `symbols`.
+        """
+        free = self.full ^ (x | o)
+        cells = []
+        while free:
+            bit = free & -free
+            free ^= bit
+            cells.append(bit.bit_length() - 1)
+        return [(cell, symbol) for cell in cells for symbol in symbols]
+
+    def _opponent(self, symbols: Tuple[int, ...]) -> Tuple[int, ...]:
+        return (1 - symbols[0],) if self.variant.placement == OWN else symbols
+
+    def _play(self, x: int, o: int, cell: int, symbol: int) -> tuple:
+        """
+        Get the position after a move and the mover's result: 1, -1, 0 for a tie, or None.
+        """
+        bit = 1 << cell
+        x, o = (x | bit, o) if symbol == 0 else (x, o | bit)
+        mine = o if symbol else x
+        if any(mine & line == line for line in self.cell_lines[cell]):
+            return x, o, 1 if self.variant.goal == WIN else -1
+        if x | o == self.full:
+            return x, o, 0
+        return x, o, None
+
+    def solve(self, x: int, o: int, symbols: Tuple[int, ...]) -> tuple:
+        """
+        Solve a position for the player to move, who may place `symbols`. Practical on boards of up to
+        about 12 cells.
+
+        Returns:
+            tuple: The value (1 win, 0 draw, -1 loss) with best play and the plies until the game ends.
+        """
+        key = (x, o, symbols)
+        solution = self._solved.get(key)
+        if solution is not None:
+            return solution
+        best_key = None
+        for cell, symbol in self.moves(x, o, symbols):
+            move_key = _preference(*self._move_value(x, o, cell, symbol, symbols))
+            if best_key is None or move_key > best_key:
+                best_key = move_key
+        solution = (best_key[0], abs(best_key[1]))
+        self._solved[key] = solution
+        return solution
+
+    def _move_value(self, x: int, o: int, cell: int, symbol: int, symbols: Tuple[int, ...]) -> tuple:
+        x, o, result = self._play(x, o, cell, symbol)
+        if result is not None:
+            return result, 1
+        value, distance = self.solve(x, o, self._opponent(symbols))
+        return -value, distance + 1
+
+    def evaluate(self, x: int, o: int, symbols: Tuple[int, ...]) -> Dict[int, tuple]:
+        """
+        Get the value of every empty cell for the player to move, with the best symbol to place there.
+
+        Returns:
+            dict: (value, distance, symbol) per cell; empty if the game is over.
+        """
+        if self.outcome(x, o) is not None:
+            return {}
+        evaluations = {}
+        for cell, symbol in self.moves(x, o, symbols):
+            value, distance = self._move_value(x, o, cell, symbol, symbols)
+            best = evaluations.get(cell)
+            if best is None or _preference(value, distance) > _preference(*best[:2]):
+                evaluations[cell] = (value, distance, symbol)
+        return evaluations
+
+    def best_move(self, x: int, o: int, symbols: Tuple[int, ...]) -> Union[tuple, None]:
+        """
+        Get a perfect move for the player to move.
+
+        Returns:
+            tuple | None: The row, column and symbol ('X' or 'O') of the move, or None if the game is over.
+        """
+        evaluations = self.evaluate(x, o, symbols)
+        if not evaluations:
+            return None
+        cell, (_, _, symbol) = max(evaluations.items(), key=lambda item: _preference(*item[1][:2]))
+        row, col = divmod(cell, self.cols)
+        return row, col, SYMBOLS[symbol]
+
+
+def _preference(value: int, distance: int) -> tuple:
+    # The best value, then the quickest win or the slowest loss
+    return value, -distance if value > 0 else distance
+
+
+def compile_variant(variant: Variant) -> Rules:
+    """
+    Build a variant's tables.
+    """
+    lines = line_masks(variant.rows, variant.cols, variant.k)
+    cells = variant.rows * variant.cols
+    table = line_table(cells, lines) if cells <= TABLE_CELLS else bytearray()
+    return Rules(variant, lines, table)
+
+
+def save_rules(rules: Rules, path: str) -> None:
+    description = json.dumps(rules.variant.description(), sort_keys=True).encode()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first, so a reader never sees half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(description)))
+        f.write(description)
+        f.write(COUNT.pack(len(rules.lines)))
+        f.write(array("Q", rules.lines).tobytes())
+        f.write(COUNT.pack(len(rules.table)))
+        f.write(rules.table)
+    os.replace(temporary, path)
+
+
+def read_rules(path: str, variant: Variant) -> Rules:
+    """
+    Read compiled tables from a file.
+
+    Raises:
+        ValueError: If the file is not a variant cache or holds different rules.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        magic, version, length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} variant cache")
+        offset = HEADER.size
+        if json.loads(data[offset:offset + length]) != variant.description():
+            raise ValueError(f"{path} holds the tables of other rules")
+        offset += length
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        lines = array("Q")
+        lines.frombytes(data[offset:offset + 8 * count])
+        offset += 8 * count
+        size, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        table = data[offset:offset + size]
+    except (struct.error, json.JSONDecodeError) as e:
+        raise ValueError(f"{path} is truncated or corrupt") from e
+    if len(lines) != count or len(table) != size:
+        raise ValueError(f"{path} is truncated")
+    return Rules(variant, list(lines), table)
+
+
+def load_rules(variant: Union[Variant, str], cache: Union[str, None]=None) -> Rules:
+    """
+    Get a variant's compiled tables, from the disk cache if they were compiled before.
+
+    Args:
+        variant (Variant | str): The variant, or the name of one in VARIANTS.
+        cache (str, optional): The cache directory. Defaults to `$TICTACTOE_VARIANTS`, or
+            ~/.tic-tac-toe/variants; an empty string turns the cache off.
+
+    Returns:
+        Rules: The compiled tables.
+    """
+    if isinstance(variant, str):
+        variant = VARIANTS[variant]
+    if cache is None:
+        cache = os.environ.get("TICTACTOE_VARIANTS", DEFAULT_CACHE)
+    if not cache:
+        return compile_variant(variant)
+    path = os.path.join(cache, f"{variant.key()}.ttvr")
+    try:
+        return read_rules(path, variant)
+    except (OSError, ValueError):
+        pass
+    rules = compile_variant(variant)
+    try:
+        save_rules(rules, path)
+    except OSError:
+        pass
+    return rules
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Compile and solve rule variants.")
+    parser.add_argument("command", choices=["list", "compile", "solve"])
+    parser.add_argument("variant", nargs="?", choices=sorted(VARIANTS), help="a named variant")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--goal", choices=[WIN, LOSE], default=WIN)
+    parser.add_argument("--placement", choices=[OWN, EITHER, SHARED], default=OWN)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, variant in VARIANTS.items():
+            print(f"{name:<10} {variant.rows}x{variant.cols} k={variant.k} {variant.goal:<4} "
+                  f"{variant.placement:<6} {variant.key()}")
+        return
+    variant = VARIANTS[args.variant] if args.variant else \
+        Variant("custom", args.rows, args.cols, args.k, args.goal, args.placement)
+    start = perf_counter()
+    rules = load_rules(variant)
+    print(f"{variant}: {len(rules.lines)} lines, {len(rules.table):,} byte table, "
+          f"loaded in {(perf_counter() - start) * 1e3:.1f} ms ({variant.key()})")
+    if args.command == "solve":
+        start = perf_counter()
+        value, distance = rules.solve(0, 0, rules.symbols_for(rules.players[0]))
+        result = {1: "first player wins", 0: "draw", -1: "second player wins"}[value]
+        print(f"{result} in {distance} plies; {len(rules._solved):,} positions solved in "
+              f"{perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
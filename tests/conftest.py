@@ -0,0 +1,10 @@
+import pytest
+from src import record
+
+@pytest.fixture(autouse=True)
+def no_user_files(monkeypatch):
+    # Keep games, flight dumps and caches out of ~/.tic-tac-toe; tests that need a file set their own path
+    for name in ("TICTACTOE_ARCHIVE", "TICTACTOE_FLIGHT", "TICTACTOE_HOSTS", "TICTACTOE_VARIANTS",
+                 "TICTACTOE_PUZZLES", "TICTACTOE_BOOK", "TICTACTOE_VALUES"):
+        monkeypatch.setenv(name, "")
+    monkeypatch.setattr(record, "_session_writer", None)
@@ -0,0 +1,94 @@
+import curses
+from time import monotonic, sleep
+
+import pytest
+from src.analysis import DRAW, LOSS, WIN, AnalysisOverlay, PlayoutAnalysis, TableAnalysis, label
+from src.board import Board
+from src.screen import VirtualScreen
+from src.ultimate import UltimateBoard
+
+
+@pytest.fixture
+def screen():
+    return VirtualScreen(40, 80)
+
+
+def test_table_values(screen):
+    board = Board(screen, cells=[['X', 'X', ' '], ['O', 'O', ' '], [' ', ' ', ' ']])
+    evaluations = TableAnalysis().evaluate(board, 'X')
+    assert evaluations[0, 2] == (WIN, 1)
+    # Anything else lets O complete the middle row
+    assert evaluations[2, 2] == (LOSS, 2)
+    assert set(evaluations) == {(0, 2), (1, 2), (2, 0), (2, 1), (2, 2)}
+
+def test_table_values_when_o_moved_first(screen):
+    board = Board(screen, cells=[['O', 'O', ' '], [' ', 'X', ' '], [' ', ' ', ' ']])
+    evaluations = TableAnalysis().evaluate(board, 'X')
+    assert evaluations[0, 2] == (DRAW, 6)
+    assert evaluations[2, 2] == (LOSS, 2)
+    board.update_board('X', 0, 2)
+    # X now threatens the other diagonal
+    assert TableAnalysis().evaluate(board, 'O')[2, 0][0] == DRAW
+    assert TableAnalysis().evaluate(board, 'O')[2, 2] == (LOSS, 2)
+
+def test_table_values_of_empty_and_finished_boards(screen):
+    empty = Board(screen, cells=[[' '] * 3 for _ in range(3)])
+    assert {value for value, _ in TableAnalysis().evaluate(empty, 'X').values()} == {DRAW}
+    won = Board(screen, cells=[['X', 'X', 'X'], ['O', 'O', ' '], [' ', ' ', ' ']])
+    assert TableAnalysis().evaluate(won, 'O') == {}
+
+def test_label():
+    assert label((WIN, 3)) == "win 3"
+    assert label((DRAW, 9)) == "draw"
+    assert label((LOSS, None)) == "loss"
+
+def test_overlay_repaints_only_changed_cells(screen):
+    board = Board(screen, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+    board.draw_board()
+    overlay = AnalysisOverlay(screen, board)
+    assert overlay.update('X') == 9
+    assert overlay.update('X') == 0
+    board.update_board('X', 1, 1)
+    board.draw_values()
+    # The centre is gone, and after X's centre O loses in the edges but draws in the corners
+    assert overlay.update('O') == 9
+    assert set(overlay.shown) == set(board.get_empty_cells())
+    assert overlay.clear() == 8
+    assert overlay.shown == {}
+
+def test_overlay_paints_around_the_symbol(screen):
+    board = Board(screen, x=0, y=0, cells=[['X', 'X', ' '], ['O', 'O', ' '], [' ', ' ', ' ']])
+    board.draw_board()
+    board.draw_values()
+    overlay = AnalysisOverlay(screen, board)
+    overlay.update('X')
+    y, x = board._cell_origin(0, 2)
+    symbol_y, symbol_x = y + (board._cell_height - 1) // 2, x + (board._cell_width - 1) // 2
+    assert screen.attrs[y][x] == curses.A_REVERSE
+    assert screen.attrs[symbol_y][symbol_x] == 0
+    assert "win 1" in "".join(screen.cells[y + board._cell_height - 2])
+    # Unhighlighting a selected cell puts its colour back
+    board.highlight_cell(0, 2)
+    board.highlight_cell(0, 2, undo=True)
+    assert screen.attrs[y][x] == curses.A_REVERSE
+
+def test_playout_estimates_arrive(screen):
+    board = UltimateBoard(screen, x=0, y=0)
+    analysis = PlayoutAnalysis(batch=1, passes=2)
+    deadline = monotonic() + 10
+    while not analysis.evaluate(board, 'X') and monotonic() < deadline:
+        sleep(0.01)
+    assert len(analysis.estimates) == 81
+
+def test_new_position_cancels_search(screen):
+    board = UltimateBoard(screen, x=0, y=0)
+    analysis = PlayoutAnalysis(batch=1, passes=1000)
+    analysis.evaluate(board, 'X')
+    first = analysis._cancel
+    board.update_board('X', 4, 4)
+    analysis.evaluate(board, 'O')
+    assert first.is_set()
+    # Estimates of the old position that were already on their way are dropped
+    analysis.results.put((analysis._generation - 1, {(0, 0): (WIN, None)}))
+    assert (0, 0) not in analysis.evaluate(board, 'O')
+    analysis.cancel()
@@ -0,0 +1,60 @@
+import pytest
+from src.arena import ArenaFull, GameArena
+from src.batch import NO_RESULT, O_WINS, TIE, X_WINS, winners
+
+def test_play_to_a_win():
+    arena = GameArena(4)
+    game = arena.allocate(now=0.0)
+    for row, col in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        assert arena.play(game, row, col, now=1.0) == NO_RESULT
+    assert arena.play(game, 0, 2) == X_WINS
+    assert arena.cells(game) == [['X', 'X', 'X'], ['O', 'O', ' '], [' ', ' ', ' ']]
+    assert arena.moves[game] == 5
+    with pytest.raises(ValueError):
+        arena.play(game, 2, 2)
+
+def test_results_match_batch_winners():
+    arena = GameArena(2)
+    o_game, tie_game = arena.allocate(), arena.allocate()
+    for row, col in [(0, 0), (1, 1), (0, 1), (0, 2), (2, 2), (2, 0)]:
+        arena.play(o_game, row, col)
+    for row, col in [(0, 0), (1, 1), (2, 2), (0, 1), (2, 1), (2, 0), (0, 2), (1, 2), (1, 0)]:
+        arena.play(tie_game, row, col)
+    assert list(arena.status) == [O_WINS, TIE]
+    assert list(winners(arena.boards)) == [O_WINS, TIE]
+
+def test_illegal_moves():
+    arena = GameArena(1)
+    game = arena.allocate()
+    arena.play(game, 1, 1)
+    with pytest.raises(ValueError):
+        arena.play(game, 1, 1)
+    with pytest.raises(ValueError):
+        arena.play(game, 3, 0)
+    assert arena.to_move[game] == 1
+
+def test_free_list_reuses_slots():
+    arena = GameArena(3)
+    games = [arena.allocate() for _ in range(3)]
+    with pytest.raises(ArenaFull):
+        arena.allocate()
+    arena.release(games[1])
+    with pytest.raises(ValueError):
+        arena.release(games[1])
+    assert arena.allocate() == games[1]
+    assert arena.live == 3
+
+def test_expire_and_count():
+    arena = GameArena(10)
+    games = [arena.allocate(now=float(i)) for i in range(8)]
+    arena.play(games[7], 0, 0, now=20.0)
+    expired = arena.expire(5.0, now=10.0)
+    assert list(expired) == [0, 1, 2, 3, 4]
+    assert arena.count_by_status() == {"free": 7, "playing": 3, "x wins": 0, "o wins": 0, "tie": 0}
+    # The expired slots come back before the never-used ones
+    assert sorted(arena.allocate() for _ in range(7)) == [0, 1, 2, 3, 4, 8, 9]
+    with pytest.raises(ArenaFull):
+        arena.allocate()
+
+def test_bytes_per_game():
+    assert GameArena(1000).nbytes / 1000 < 64
@@ -0,0 +1,27 @@
+import numpy as np
+from src.board import Board
+from src.batch import evaluate, best_moves, winners, pack_bitboards, as_cells, random_positions, UNREACHABLE, TIE
+
+def test_winners_match_board():
+    positions = random_positions(500, seed=1)
+    results = {None: 0, 'X': 1, 'O': 2, 'tie': TIE}
+    for cells, result in zip(positions, winners(positions)):
+        board = Board(None, x=0, y=0, cells=[[' XO'[v] for v in cells[i:i + 3]] for i in (0, 3, 6)])
+        assert results[board.get_winner()] == result
+
+def test_bitboard_roundtrip():
+    positions = random_positions(100, seed=2)
+    assert (as_cells(pack_bitboards(positions)) == positions).all()
+
+def test_evaluate_and_best_moves():
+    positions = np.array([
+        [0] * 9,
+        [1, 1, 0, 2, 2, 0, 0, 0, 0],
+        [2, 2, 0, 0, 0, 0, 0, 0, 0],
+        [0] * 9,
+    ], dtype=np.int8)
+    values, distances = evaluate(positions)
+    assert values.tolist() == [0, 1, UNREACHABLE, 0]
+    assert distances.tolist()[:2] == [9, 1]
+    assert best_moves(positions).tolist() == [0, 2, -1, 0]
+    assert best_moves(pack_bitboards(positions)).tolist() == [0, 2, -1, 0]
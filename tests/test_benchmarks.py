@@ -0,0 +1,34 @@
+from src.benchmarks import BENCHMARKS, compare, main, measure, report
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"a": {"ns_per_op": 100.0}, "b": {"ns_per_op": 100.0}, "c": {"ns_per_op": 100.0}}}
+    results = {"results": {"a": {"ns_per_op": 130.0}, "b": {"ns_per_op": 105.0}, "c": {"ns_per_op": 50.0},
+                           "d": {"ns_per_op": 1.0}}}
+    statuses = {name: status for name, *_, status in compare(results, baseline, threshold=0.2)}
+    assert statuses == {"a": "regression", "b": "ok", "c": "improvement", "d": "new"}
+
+def test_noisy_benchmarks_get_a_wider_threshold():
+    baseline = {"results": {"a": {"ns_per_op": 100.0, "spread": 0.3}, "b": {"ns_per_op": 100.0, "spread": 0.3}}}
+    results = {"results": {"a": {"ns_per_op": 125.0, "spread": 0.05}, "b": {"ns_per_op": 140.0, "spread": 0.05}}}
+    statuses = {name: status for name, *_, status in compare(results, baseline, threshold=0.2)}
+    assert statuses == {"a": "ok", "b": "regression"}
+
+def test_report_keeps_large_values_apart():
+    line = report([("game.headless_local", 5377590.8, 4747496.8, -0.117, "ok")]).splitlines()[1]
+    assert "5,377,590.8 ns   " in line
+
+def test_every_benchmark_runs():
+    for name, setup in BENCHMARKS.items():
+        result = measure(setup, repeat=1, min_time=0)
+        assert result["ns_per_op"] > 0, name
+
+def test_main_exits_on_regression(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text('{"results": {"board.get_winner": {"ns_per_op": 0.001}}}')
+    try:
+        main(["--filter", "get_winner", "--repeat", "1", "--baseline", str(baseline)])
+    except SystemExit as e:
+        assert e.code == 1
+    else:
+        assert False, "expected a regression"
+    assert "regression" in capsys.readouterr().out
@@ -1,34 +1,33 @@
-"""
-THIS ONE ISN'T WORKING AND IDK WHY
-"""
-
 import pytest
-import curses
 from unittest.mock import patch
 from src.board import Board
+from src.screen import VirtualScreen
+
+EMPTY = [[' '] * 3 for _ in range(3)]
 
 @pytest.fixture
 def mock_stdscr():
-    stdscr = curses.initscr()  # Initialize curses
-    mock_win = curses.newwin(20, 40, 0, 0)  # Create a mock window
-    stdscr.refresh()  # Refresh the screen
-    yield mock_win  # Return the mock window
-    curses.endwin()  # Clean up curses after the test
+    yield VirtualScreen(20, 40)  # An in-memory screen, so no terminal is needed
+
+@pytest.fixture
+def board(mock_stdscr):
+    # Its own cells at the top-left corner, so tests don't share the class-wide board
+    return Board(mock_stdscr, x=0, y=0, cells=EMPTY)
 
 def test_board_initialization(mock_stdscr):
     board = Board(mock_stdscr)
     assert board.stdscr == mock_stdscr
-    assert board.x == 8  # Adjust based on your actual center calculation
-    assert board.y == 5  # Adjust based on your actual center calculation
-    assert len(board._lines) == 9
+    # Centred across the width and down the height of the screen
+    assert board.x == (40 - 23) // 2
+    assert board.y == (20 - 11) // 2
+    assert len(board._lines) == 11
 
-def test_is_empty():
-    board = Board(None)
+def test_is_empty(board):
+    board._board[1][1] = 'X'
     assert board.is_empty(0, 0)
     assert not board.is_empty(1, 1)
 
-def test_clear_cell():
-    board = Board(None)
+def test_clear_cell(board):
     board._board[0][0] = 'X'
     board.clear_cell(0, 0)
     assert board.is_empty(0, 0)
@@ -39,24 +38,24 @@ def test_highlight_cell(mock_stdscr):
         board.highlight_cell(0, 0)
         assert mocked_addstr.call_count == 3  # 3 lines drawn for highlighting
 
-def test_in_bounds():
-    board = Board(None)
+def test_in_bounds(board):
     assert board.in_bounds(10, 10)
     assert not board.in_bounds(-1, 0)
     assert not board.in_bounds(10, 30)
+    # The lines between cells are not part of any cell
+    assert not board.in_bounds(7, 0)
 
-def test_get_cell():
-    board = Board(None)
-    assert board.get_cell(10, 10) == (1, 1)
+def test_get_cell(board):
+    assert board.get_cell(10, 6) == (1, 1)
     assert board.get_cell(2, 2) == (0, 0)
+    assert board.get_cell(17, 9) == (2, 2)
 
-def test_update_board():
-    board = Board(None)
+def test_update_board(board):
     board.update_board('X', 1, 1)
     assert board._board[1][1] == 'X'
+    assert Board._board[1][1] == ' '
 
-def test_get_winner():
-    board = Board(None)
+def test_get_winner(board):
     board._board = [['X', 'X', 'X'], [' ', ' ', ' '], [' ', ' ', ' ']]
     assert board.get_winner() == 'X'
 
@@ -68,4 +67,4 @@ def test_get_board_height():
 
 def test_clear_board():
     Board.clear_board()
-    assert all(cell == ' ' for row in Board._board for cell in row)
\ No newline at end of file
+    assert all(cell == ' ' for row in Board._board for cell in row)
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pytest
+from src.cluster import LOBBY, READY, Lobby, _serve_worker
+from src.match_server import load
+from src.net import decode, encode
+
+def test_lobby_pairs_in_arrival_order():
+    lobby = Lobby()
+    pairs = [socket.socketpair() for _ in range(3)]
+    assert lobby.arrive(pairs[0][0]) is None
+    assert lobby.arrive(pairs[1][0]) == (pairs[0][0], pairs[1][0])
+    assert lobby.arrive(pairs[2][0]) is None
+    assert lobby.paired == 1
+
+def test_lobby_drops_players_who_left():
+    lobby = Lobby()
+    first, first_peer = socket.socketpair()
+    second, _ = socket.socketpair()
+    lobby.arrive(first)
+    first_peer.close()
+    assert lobby.arrive(second) is None
+    assert lobby.waiting is second
+
+def test_lobby_answers_pings_and_leaves_the_rest():
+    lobby = Lobby()
+    waiting, peer = socket.socketpair()
+    lobby.arrive(waiting)
+    peer.sendall(encode({"ping": 1.5}) + b"[1, ")
+    lobby.serve_waiting()
+    assert decode(peer.recv(64)) == {"pong": 1.5}
+    assert waiting.recv(64, socket.MSG_DONTWAIT) == b"[1, "
+    peer.sendall(encode({"ping": 2.5}))
+    peer.close()
+    second, _ = socket.socketpair()
+    assert lobby.arrive(second) is None
+    assert lobby.waiting is second
+
+def test_worker_waits_for_a_full_channel_without_blocking():
+    async def run():
+        channel, supervisor = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        channel.setblocking(False)
+        supervisor.setblocking(False)
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        worker = asyncio.create_task(_serve_worker("127.0.0.1", port, channel, {}))
+        while True:
+            try:
+                assert supervisor.recv(64) == READY
+                break
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+        # A supervisor that has stopped reading
+        while True:
+            try:
+                channel.send(b"filler")
+            except BlockingIOError:
+                break
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        start = time.monotonic()
+        await asyncio.sleep(0.2)
+        stalled = time.monotonic() - start
+        messages = []
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                message, fds, _, _ = socket.recv_fds(supervisor, 64, 2)
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+                continue
+            messages.append((message, len(fds)))
+            for fd in fds:
+                os.close(fd)
+            if message == LOBBY:
+                break
+        writer.close()
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        channel.close()
+        supervisor.close()
+        return stalled, messages
+    stalled, messages = asyncio.run(run())
+    assert stalled < 1.0
+    assert messages[-1] == (LOBBY, 1)
+
+def _children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == pid:
+                children.append(int(entry))
+    return children
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs SO_REUSEPORT and /proc")
+def test_supervisor_serves_and_restarts_workers():
+    server = subprocess.Popen([sys.executable, "-m", "src.cluster", "serve", "--host", "127.0.0.1", "--port", "0",
+                               "--workers", "2"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline().rsplit(":", 1)[1])
+        report = asyncio.run(load(clients=40, host="127.0.0.1", port=port, timeout=10))
+        assert report["games"] == 20 and report["errors"] == {}
+        workers = _children(server.pid)
+        assert len(workers) == 2
+        os.kill(workers[0], signal.SIGKILL)
+        assert "worker" in server.stderr.readline()
+        for _ in range(50):
+            if len(_children(server.pid)) == 2:
+                break
+            time.sleep(0.1)
+        report = asyncio.run(load(clients=40, host="127.0.0.1", port=port, timeout=10))
+        assert report["games"] == 20 and report["errors"] == {}
+    finally:
+        server.terminate()
+        server.wait(10)
@@ -0,0 +1,26 @@
+from src.board import Board
+from src.cpu import winning_move, try_to_win, try_to_block, choose_move
+
+def make_board(rows):
+    return Board(None, x=0, y=0, cells=[list(row) for row in rows])
+
+def test_winning_move_leaves_board_unchanged():
+    board = make_board(["XX ", "OO ", "   "])
+    assert winning_move(board, 'X') == (0, 2)
+    assert board.is_empty(0, 2)
+
+def test_try_to_win():
+    board = make_board(["XX ", "OO ", "   "])
+    assert try_to_win(board, 'X')
+    assert board.get_winner() == 'X'
+
+def test_try_to_block_places_own_symbol():
+    board = make_board(["OO ", "X  ", "   "])
+    assert try_to_block(board, 'X', 'O')
+    assert board._board[0][2] == 'X'
+    assert board.get_winner() is None
+
+def test_choose_move_prefers_win_over_block():
+    board = make_board(["XX ", "OO ", "   "])
+    assert choose_move(board, 'O', 'X') == (1, 2)
+    assert choose_move(make_board(["XOX", "XOO", "OX "]), 'X', 'O') == (2, 2)
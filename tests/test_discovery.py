@@ -0,0 +1,189 @@
+import json
+import socket
+import threading
+from time import monotonic, sleep
+
+import pytest
+from src.discovery import (Announcer, Browser, Host, HostCache, connect_any, merge_hosts, resolve)
+from src.engine import join_game
+from src.net import encode
+from src.screen import ScriptExhausted, VirtualScreen
+
+
+def wait_for(condition, seconds: float=5.0):
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        sleep(0.02)
+    return condition()
+
+
+def listener(family: int=socket.AF_INET, address: str="127.0.0.1") -> socket.socket:
+    s = socket.socket(family, socket.SOCK_STREAM)
+    s.bind((address, 0))
+    s.listen()
+    return s
+
+
+def refused_port() -> int:
+    # A port that was just free, so connecting to it is refused
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_announcements_reach_the_browser():
+    browser = Browser(port=0)
+    try:
+        with Announcer(4321, name="den", targets=[("127.0.0.1", browser.port)], interval=0.05):
+            hosts = wait_for(browser.poll)
+        assert [(host.name, host.port) for host in hosts] == [("den", 4321)]
+        assert hosts[0].addresses[0] == "127.0.0.1"
+    finally:
+        browser.close()
+
+def test_silent_hosts_expire():
+    now = [0.0]
+    browser = Browser(port=0, expiry=3.0, clock=lambda: now[0])
+    try:
+        message = {"game": "tic-tac-toe", "version": 1, "id": "a", "name": "den", "port": 1, "addresses": []}
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(encode(message), ("127.0.0.1", browser.port))
+            s.sendto(b"not json\n", ("127.0.0.1", browser.port))
+            s.sendto(encode({"game": "chess"}), ("127.0.0.1", browser.port))
+        assert len(wait_for(browser.poll)) == 1
+        now[0] = 5.0
+        assert browser.poll() == []
+    finally:
+        browser.close()
+
+def test_resolve_interleaves_families():
+    ordered = resolve([("127.0.0.1", 1), ("::1", 1), ("127.0.0.2", 1)])
+    assert [family for family, _ in ordered] == [socket.AF_INET6, socket.AF_INET, socket.AF_INET]
+    with pytest.raises(OSError):
+        resolve([])
+
+def test_connect_any_skips_refused_addresses():
+    with listener() as server:
+        good = server.getsockname()
+        addresses = [(socket.AF_INET, ("127.0.0.1", refused_port())), (socket.AF_INET, good)]
+        s, address = connect_any(addresses, delay=5.0)
+        with s:
+            # The refusal started the next attempt without waiting out the delay
+            assert address == good
+            assert s.gettimeout() is None
+
+def test_connect_any_races_a_stalled_address():
+    stalled = threading.Event()
+
+    class StalledSocket:
+        # Stands in for an address that never answers
+        def settimeout(self, timeout):
+            pass
+
+        def connect(self, address):
+            stalled.wait(5)
+            raise TimeoutError()
+
+        def close(self):
+            pass
+
+    def sockets(family, kind):
+        return StalledSocket() if family == socket.AF_INET6 else socket.socket(family, kind)
+
+    with listener() as server:
+        start = monotonic()
+        s, address = connect_any([(socket.AF_INET6, ("::1", 1, 0, 0)), (socket.AF_INET, server.getsockname())],
+                                 sockets, delay=0.05)
+        s.close()
+        stalled.set()
+        assert address == server.getsockname()
+        assert monotonic() - start < 2
+
+def test_connect_any_raises_the_last_error():
+    with pytest.raises(ConnectionRefusedError):
+        connect_any([(socket.AF_INET, ("127.0.0.1", refused_port()))] * 2, delay=0.01)
+
+def test_connect_any_survives_sockets_that_cant_be_created():
+    def sockets(family, kind):
+        if family == socket.AF_INET6:
+            raise OSError("Address family not supported by protocol")
+        return socket.socket(family, kind)
+
+    with pytest.raises(OSError):
+        connect_any([(socket.AF_INET6, ("::1", 1, 0, 0))], sockets, delay=0.01)
+    with listener() as server:
+        s, address = connect_any([(socket.AF_INET6, ("::1", 1, 0, 0)), (socket.AF_INET, server.getsockname())],
+                                 sockets, delay=5.0)
+        s.close()
+        assert address == server.getsockname()
+
+def test_host_cache(tmp_path):
+    path = tmp_path / "nested" / "hosts.json"
+    cache = HostCache(str(path), size=2)
+    assert cache.hosts() == []
+    cache.remember("den", "10.0.0.2", 12345)
+    cache.remember("attic", "10.0.0.3", 12345)
+    cache.remember("den", "10.0.0.4", 12345)
+    assert [(host.name, host.addresses, host.port) for host in cache.hosts()] == \
+        [("den", ["10.0.0.4"], 12345), ("attic", ["10.0.0.3"], 12345)]
+    cache.remember("kitchen", "10.0.0.5", 1)
+    assert [host.name for host in cache.hosts()] == ["kitchen", "den"]
+    path.write_text("{")
+    assert cache.hosts() == []
+
+def test_merge_hosts_puts_recent_first():
+    recent = [Host("den", ["10.0.0.2"], 12345, recent=1.0)]
+    found = [Host("attic", ["10.0.0.3"], 12345), Host("den", ["10.0.0.9", "10.0.0.2"], 2000)]
+    merged = merge_hosts(recent, found)
+    assert [(host.name, host.addresses, host.port) for host in merged] == \
+        [("den", ["10.0.0.2", "10.0.0.9"], 2000), ("attic", ["10.0.0.3"], 12345)]
+
+def test_join_reconnects_to_a_recent_host(tmp_path, monkeypatch):
+    monkeypatch.setenv("TICTACTOE_HOSTS", str(tmp_path / "hosts.json"))
+    server = listener()
+    port = server.getsockname()[1]
+    HostCache(str(tmp_path / "hosts.json")).remember("den", "127.0.0.1", port)
+    accepted = []
+
+    def host():
+        conn, _ = server.accept()
+        accepted.append(conn)
+        conn.sendall(encode("X"))
+
+    thread = threading.Thread(target=host)
+    thread.start()
+    screen = VirtualScreen(40, 80)
+    screen.key(10)
+    with pytest.raises(ScriptExhausted):
+        join_game(screen, False, heartbeat=0)
+    thread.join()
+    for conn in accepted:
+        conn.close()
+    server.close()
+    assert accepted
+    assert "You are player X." in screen.text()
+    assert json.loads((tmp_path / "hosts.json").read_text())[0]["port"] == port
+
+def test_join_gives_up_on_a_silent_host(tmp_path, monkeypatch):
+    monkeypatch.setenv("TICTACTOE_HOSTS", str(tmp_path / "hosts.json"))
+    with listener() as server:
+        HostCache(str(tmp_path / "hosts.json")).remember("den", "127.0.0.1", server.getsockname()[1])
+        screen = VirtualScreen(40, 80)
+        screen.key(10)
+        for _ in range(10):
+            screen.key(ord('x'))
+        join_game(screen, False, heartbeat=0.05, peer_timeout=0.3)
+        assert "Your opponent stopped responding" in screen.text()
+
+def test_join_can_quit_while_waiting_for_the_host(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("TICTACTOE_HOSTS", str(tmp_path / "hosts.json"))
+    with listener() as server:
+        HostCache(str(tmp_path / "hosts.json")).remember("den", "127.0.0.1", server.getsockname()[1])
+        screen = VirtualScreen(40, 80)
+        screen.key(10)
+        screen.key(ord('q'))
+        with pytest.raises(SystemExit):
+            join_game(screen, False, heartbeat=0.05, peer_timeout=5.0)
@@ -0,0 +1,36 @@
+import curses
+import os
+from src.flight import FlightRecorder, MOVE, RECV, SEND, STATE, STATES, describe, read_dump
+from src.trace import Trace, replay
+
+def test_ring_keeps_latest_events(tmp_path):
+    flight = FlightRecorder(capacity=4)
+    for i in range(10):
+        flight.record(MOVE, ord('X'), i, i + 1)
+    path = flight.dump("test", str(tmp_path / "dump.ttfr"))
+    reason, events = read_dump(path)
+    assert reason == "test"
+    assert [event[3] for event in events] == [6, 7, 8, 9]
+    assert all(events[i][0] <= events[i + 1][0] for i in range(3))
+    assert list(describe(events))[-1].endswith("MOVE   X (9, 10)")
+
+def test_dumps_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv("TICTACTOE_FLIGHT", "")
+    assert FlightRecorder(capacity=2).dump("test") is None
+
+def test_lost_connection_dumps(tmp_path, monkeypatch):
+    monkeypatch.setenv("TICTACTOE_FLIGHT", str(tmp_path))
+    events = [{"t": 0.0, "key": curses.KEY_MOUSE}, {"t": 0.0, "mouse": [0, 37, 10, 0, curses.BUTTON1_CLICKED]}]
+    events += [{"t": 0.0, "key": ord(ch)} for ch in "127.0.0.1\n"]
+    events += [{"t": 0.0, "recv": "\"X\"\n"}, {"t": 0.0, "key": ord(' ')}]
+    for _ in range(2):
+        events += [{"t": 0.0, "key": curses.KEY_MOUSE}, {"t": 0.0, "mouse": [0, 31, 8, 0, curses.BUTTON1_CLICKED]}]
+
+    assert replay(Trace(40, 80, seed=1, events=events)).ended == "exit"
+    dumps = os.listdir(tmp_path)
+    assert len(dumps) == 1
+    reason, recorded = read_dump(str(tmp_path / dumps[0]))
+    assert reason == "connection lost"
+    kinds = [(kind, a, b) for _, kind, a, b, _ in recorded]
+    assert kinds[-4:] == [(MOVE, ord('X'), 0), (SEND, 0, 7), (RECV, 0, 0), (STATE, STATES.index("connection lost"), 0)]
+    assert (STATE, STATES.index("connected"), 0) in kinds
@@ -0,0 +1,101 @@
+import asyncio
+from src.match_server import MatchServer, load, start_server
+from src.net import decode, encode
+
+def test_load_plays_every_game():
+    report = asyncio.run(load(clients=40, games=2, seed=1))
+    assert report["games"] == 40
+    assert report["errors"] == {}
+    assert report["server"]["finished"] == 40
+    assert report["server"]["connections"] == 80
+    assert 5 * 40 <= report["server"]["moves"] <= 9 * 40
+    assert set(report["move_rtt_ms"]) == {"p50", "p90", "p99", "max"}
+
+def test_illegal_move_ends_match():
+    async def run():
+        match_server = MatchServer(seed=0)
+        server = await start_server(match_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        first = await asyncio.open_connection("127.0.0.1", port)
+        second = await asyncio.open_connection("127.0.0.1", port)
+        symbols = [decode(await reader.readline()) for reader, _ in (first, second)]
+        x, o = (first, second) if symbols[0] == 'X' else (second, first)
+        x[1].write(encode((1, 1)))
+        assert decode(await o[0].readline()) == [1, 1]
+        o[1].write(encode((1, 1)))
+        assert await x[0].readline() == b""
+        server.close()
+        await server.wait_closed()
+        return match_server.stats()
+    stats = asyncio.run(run())
+    assert stats["illegal"] == 1 and stats["moves"] == 1
+
+def test_full_arena_turns_pairs_away():
+    async def run():
+        match_server = MatchServer(seed=0, max_matches=0)
+        server = await start_server(match_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        players = [await asyncio.open_connection("127.0.0.1", port) for _ in range(2)]
+        lines = [await reader.readline() for reader, _ in players]
+        server.close()
+        await server.wait_closed()
+        return lines, match_server.stats()
+    lines, stats = asyncio.run(run())
+    assert lines == [b"", b""]
+    assert stats["rejected"] == 1 and stats["matches"] == 0 and stats["in_play"] == 0
+
+def test_pings_are_answered_while_waiting():
+    async def run():
+        match_server = MatchServer(seed=0)
+        server = await start_server(match_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        first = await asyncio.open_connection("127.0.0.1", port)
+        second = await asyncio.open_connection("127.0.0.1", port)
+        symbols = [decode(await reader.readline()) for reader, _ in (first, second)]
+        x, o = (first, second) if symbols[0] == 'X' else (second, first)
+        o[1].write(encode({"ping": 2.5}))
+        assert decode(await o[0].readline()) == {"pong": 2.5}
+        x[1].write(encode((1, 1)))
+        assert decode(await o[0].readline()) == [1, 1]
+        x[1].write(encode((0, 0)))
+        assert await o[0].readline() == b""
+        server.close()
+        await server.wait_closed()
+        return match_server.stats()
+    stats = asyncio.run(run())
+    assert stats["illegal"] == 1 and stats["moves"] == 1
+
+def test_players_who_leave_while_waiting_are_not_paired():
+    async def run():
+        match_server = MatchServer(seed=0)
+        server = await start_server(match_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        _, gone = await asyncio.open_connection("127.0.0.1", port)
+        await asyncio.sleep(0.05)
+        gone.close()
+        await asyncio.sleep(0.05)
+        second = await asyncio.open_connection("127.0.0.1", port)
+        third = await asyncio.open_connection("127.0.0.1", port)
+        symbols = [decode(await asyncio.wait_for(reader.readline(), 2)) for reader, _ in (second, third)]
+        for _, writer in (second, third):
+            writer.close()
+        server.close()
+        await server.wait_closed()
+        return symbols, match_server.stats()
+    symbols, stats = asyncio.run(run())
+    assert sorted(symbols) == ['O', 'X']
+    assert stats["matches"] == 1
+
+def test_silent_waiting_players_are_dropped():
+    async def run():
+        match_server = MatchServer(move_timeout=0.1)
+        server = await start_server(match_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        line = await asyncio.wait_for(reader.readline(), 2)
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return line, match_server.waiting
+    line, waiting = asyncio.run(run())
+    assert line == b"" and waiting is None
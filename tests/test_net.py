@@ -0,0 +1,136 @@
+import socket
+import threading
+import time
+import pytest
+from src.net import BadMessage, Heartbeat, MessageReader, PeerTimeout, decode, encode, parse_move
+from src.proxy import Proxy
+
+def test_messages_are_framed():
+    left, right = socket.socketpair()
+    left.sendall(encode("X") + encode((1, 2))[:3])
+    reader = MessageReader(right)
+    assert reader.read() == "X"
+    left.sendall(encode((1, 2))[3:])
+    assert reader.read() == [1, 2]
+    assert reader.last_size == len(encode((1, 2)))
+    left.close()
+    assert reader.read() is None
+    assert decode(b'"O"') == "O"
+
+def _answer_pings(sock):
+    # The peer's side: answer pings until the connection closes
+    link = Heartbeat(sock, interval=0)
+    try:
+        while link.read() is not None:
+            pass
+    except OSError:
+        pass
+
+def test_heartbeat_measures_round_trip():
+    left, right = socket.socketpair()
+    threading.Thread(target=_answer_pings, args=(right,), daemon=True).start()
+    link = Heartbeat(left, interval=0.02, timeout=1.0)
+    with pytest.raises(TimeoutError):
+        link.read(0.2)
+    assert link.srtt is not None and 0 <= link.srtt < 0.1
+    left.close()
+
+def test_moves_survive_pings():
+    left, right = socket.socketpair()
+    link = Heartbeat(left, interval=0.0)
+    right.sendall(encode({"ping": 1.5}) + encode((0, 1)) + encode({"pong": 0.0}))
+    link.pump()
+    assert MessageReader(right).read() == {"pong": 1.5}
+    assert link.read() == [0, 1]
+    right.close()
+    assert link.read() is None
+
+def test_moves_are_checked():
+    assert parse_move([2, 0]) == (2, 0)
+    for message in ([3, 0], [0], [True, 0], "01", {"move": [0, 0]}, [0.5, 1]):
+        with pytest.raises(BadMessage):
+            parse_move(message)
+
+def test_proxy_delay_shows_in_round_trip():
+    server = socket.create_server(("127.0.0.1", 0))
+    proxy = Proxy(server.getsockname(), delay=0.03, seed=0).start()
+    client = socket.create_connection(("127.0.0.1", proxy.port))
+    peer, _ = server.accept()
+    threading.Thread(target=_answer_pings, args=(peer,), daemon=True).start()
+    link = Heartbeat(client, interval=0.05, timeout=2.0)
+    with pytest.raises(TimeoutError):
+        link.read(0.5)
+    assert 0.05 <= link.srtt < 0.2
+    proxy.close()
+    server.close()
+
+def test_stalled_peer_times_out():
+    server = socket.create_server(("127.0.0.1", 0))
+    proxy = Proxy(server.getsockname()).start()
+    client = socket.create_connection(("127.0.0.1", proxy.port))
+    peer, _ = server.accept()
+    threading.Thread(target=_answer_pings, args=(peer,), daemon=True).start()
+    link = Heartbeat(client, interval=0.05, timeout=0.3)
+    with pytest.raises(TimeoutError):
+        link.read(0.2)
+    proxy.stalled = True
+    start = time.monotonic()
+    with pytest.raises(PeerTimeout):
+        link.read()
+    assert time.monotonic() - start < 1.0
+    proxy.close()
+    server.close()
+
+def test_online_game_ends_when_peer_goes_silent(tmp_path, monkeypatch):
+    from src.engine import online_game
+    from src.screen import VirtualScreen
+    monkeypatch.setenv("TICTACTOE_FLIGHT", str(tmp_path))
+    server = socket.create_server(("127.0.0.1", 0))
+    conn = socket.create_connection(server.getsockname())
+    silent, _ = server.accept()
+    screen = VirtualScreen(40, 80)
+    screen.key(' ')
+    online_game(screen, conn, 'O', heartbeat=0.05, peer_timeout=0.2)
+    assert "Your opponent stopped responding" in screen.text()
+    assert len(list(tmp_path.iterdir())) == 1
+    silent.close()
+    server.close()
+
+def test_online_game_notices_a_silent_peer_during_our_turn(tmp_path, monkeypatch):
+    from src.engine import online_game
+    from src.screen import VirtualScreen
+    monkeypatch.setenv("TICTACTOE_FLIGHT", str(tmp_path))
+    server = socket.create_server(("127.0.0.1", 0))
+    conn = socket.create_connection(server.getsockname())
+    silent, _ = server.accept()
+    # Dismiss the message once the silence is noticed
+    screen = VirtualScreen(40, 80, driver=lambda s: s.find("stopped responding") and s.key(' '))
+    # The heartbeat runs on the screen's clock, which the idle polls of our turn advance
+    link = Heartbeat(conn, interval=0.5, timeout=2.0, clock=lambda: screen.clock)
+    online_game(screen, conn, 'X', link)
+    assert "Your opponent stopped responding" in screen.text()
+    assert 2.0 < screen.clock < 3.0
+    silent.close()
+    server.close()
+
+@pytest.mark.parametrize("garbage", [b"not json\n", b'{"pong": "soon"}\n', b"[5, 9]\n", b'"X"\n'])
+def test_online_game_ends_on_garbage_from_the_peer(tmp_path, monkeypatch, garbage):
+    from src.engine import online_game
+    from src.screen import VirtualScreen
+    monkeypatch.setenv("TICTACTOE_FLIGHT", str(tmp_path))
+    server = socket.create_server(("127.0.0.1", 0))
+    proxy = Proxy(server.getsockname()).start()
+    conn = socket.create_connection(("127.0.0.1", proxy.port))
+    peer, _ = server.accept()
+    while not proxy.downstream:
+        time.sleep(0.01)
+    proxy.inject(garbage)
+    screen = VirtualScreen(40, 80)
+    screen.key(' ')
+    online_game(screen, conn, 'O', heartbeat=0.05, peer_timeout=2.0)
+    assert "Your opponent sent an invalid message" in screen.text()
+    assert len(list(tmp_path.iterdir())) == 1
+    conn.close()
+    peer.close()
+    proxy.close()
+    server.close()
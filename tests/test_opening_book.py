@@ -0,0 +1,57 @@
+from src.board import Board
+from src.opening_book import OpeningBook, compile_book
+from src.position_index import build
+from src.record import GameRecord, RecordWriter
+
+def board(position):
+    return Board(None, x=0, y=0, cells=[[' ' if ch == '.' else ch for ch in position[i:i + 3]] for i in (0, 3, 6)])
+
+def test_solver_book(tmp_path):
+    path = str(tmp_path / "book.ttob")
+    assert compile_book(path, max_ply=2) == 4
+    book = OpeningBook(path, seed=0)
+    # Every first move draws, so every cell is in the book
+    weights = book.weights(board("........."))
+    assert all(weights)
+    # Each class of equivalent cells is as likely as the centre
+    assert sum(weights[cell] for cell in (0, 2, 6, 8)) == weights[4]
+    # Against a corner, only the centre holds the draw
+    corner = book.weights(board("X........"))
+    assert [cell for cell in range(9) if corner[cell]] == [4]
+    assert book.choose(board("........X")) == (1, 1)
+    # Deeper than the book
+    assert book.weights(board("X...O....")) is None
+    book.close()
+
+def test_games_o_started(tmp_path):
+    path = str(tmp_path / "book.ttob")
+    compile_book(path, max_ply=4)
+    book = OpeningBook(path, seed=0)
+    # O opened in the corner and X answered on the edge: O wins by taking the centre or a corner
+    weights = book.weights(board("OX......."), 'O')
+    assert weights == book.weights(board("XO......."), 'X')
+    assert [cell for cell in range(9) if weights[cell]] == [3, 4, 6]
+    # X to move after O's corner opening must take the centre
+    assert book.choose(board("O........"), 'X') == (1, 1)
+    book.close()
+
+def test_depth_limit(tmp_path):
+    path = str(tmp_path / "book.ttob")
+    compile_book(path, max_ply=4)
+    assert OpeningBook(path).weights(board("X...O....")) is not None
+    assert OpeningBook(path, max_ply=1).weights(board("X........")) is None
+
+def test_index_weights(tmp_path):
+    archive = str(tmp_path / "games.tttg")
+    with RecordWriter(archive) as writer:
+        for moves in ([4, 0, 8, 2, 1, 7, 6, 3, 5], [4, 2, 0, 8, 5, 3, 6, 1, 7], [0, 4, 8, 2, 6, 3, 5, 7, 1]):
+            writer.write(GameRecord("a", "b", result='tie', moves=moves))
+    index = str(tmp_path / "positions.idx")
+    build([archive], index)
+    path = str(tmp_path / "book.ttob")
+    compile_book(path, max_ply=2, index_path=index)
+    weights = OpeningBook(path).weights(board("........."))
+    # Two games opened in the centre and one in a corner
+    assert weights[4] == 2
+    assert sum(weights[cell] for cell in (0, 2, 6, 8)) == 1
+    assert weights[1] == 0
@@ -0,0 +1,29 @@
+import pytest
+from src.perft import perft, parallel_perft, parse_position
+
+EMPTY = parse_position(".........")
+
+def test_complete_games():
+    result = perft(EMPTY, 9)
+    assert result.total_games() == 255168
+    assert result.games == {'X': 131184, 'O': 77904, 'tie': 46080}
+    assert result.leaves == 0
+
+def test_shallow_depths():
+    assert perft(EMPTY, 1).leaves == 9
+    assert perft(EMPTY, 2).leaves == 72
+    assert perft(EMPTY, 3).nodes == 9 + 72 + 504
+
+def test_hash_gives_same_counts():
+    for depth in (5, 7, 9):
+        plain, hashed = perft(EMPTY, depth), perft(EMPTY, depth, use_hash=True)
+        assert (plain.nodes, plain.leaves, plain.games) == (hashed.nodes, hashed.leaves, hashed.games)
+
+def test_parallel_gives_same_counts():
+    plain, parallel = perft(EMPTY, 6), parallel_perft(EMPTY, 6, workers=2)
+    assert (plain.nodes, plain.leaves, plain.games) == (parallel.nodes, parallel.leaves, parallel.games)
+
+def test_parse_position():
+    assert parse_position("X...O....")[1][1] == 'O'
+    with pytest.raises(ValueError):
+        parse_position("XX.......")
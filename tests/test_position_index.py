@@ -0,0 +1,42 @@
+from src.position_index import PositionIndex, SYMMETRIES, build, canonical, merge
+from src.record import GameRecord, RecordWriter
+
+def write_archive(path, games):
+    with RecordWriter(str(path)) as writer:
+        for moves, result in games:
+            writer.write(GameRecord("a", "b", result=result, moves=moves))
+
+def cells(position):
+    return [[' ' if ch == '.' else ch for ch in position[i:i + 3]] for i in (0, 3, 6)]
+
+def test_symmetries_are_permutations():
+    assert len(set(SYMMETRIES)) == 8
+    assert all(sorted(symmetry) == list(range(9)) for symmetry in SYMMETRIES)
+    assert canonical([1, 0, 0, 0, 0, 0, 0, 0, 0])[0] == canonical([0, 0, 0, 0, 0, 0, 0, 0, 1])[0]
+
+def test_build_and_query(tmp_path):
+    archive = tmp_path / "games.tttg"
+    # X wins along the top row twice, once mirrored, and one game is drawn
+    write_archive(archive, [([0, 3, 1, 4, 2], 'X'), ([2, 5, 1, 4, 0], 'X'),
+                            ([4, 0, 8, 2, 1, 7, 6, 3, 5], 'tie')])
+    index_path = str(tmp_path / "positions.idx")
+    build([str(archive)], index_path, run_size=4)
+    with PositionIndex(index_path) as index:
+        start = index.lookup(cells("........."))
+        assert (start.x_wins, start.o_wins, start.draws) == (2, 0, 1)
+        # The corners are equivalent on the empty board, so they share a count
+        assert start.next_moves == [2, 0, 2, 0, 1, 0, 2, 0, 2]
+        corner = index.lookup(cells("..X......"))
+        assert corner.games() == 2
+        assert corner.next_moves[5] == 2
+        assert index.lookup(cells("OOO......")).games() == 0
+
+def test_incremental_merge(tmp_path):
+    first, second = tmp_path / "a.tttg", tmp_path / "b.tttg"
+    write_archive(first, [([0, 3, 1, 4, 2], 'X')])
+    write_archive(second, [([4, 0, 8, 2, 1, 7, 6, 3, 5], 'tie')])
+    index_path = str(tmp_path / "positions.idx")
+    build([str(first)], index_path)
+    merge(index_path, [str(second)])
+    with PositionIndex(index_path) as index:
+        assert index.lookup(cells(".........")).games() == 2
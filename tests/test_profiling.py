@@ -0,0 +1,55 @@
+import pytest
+import src.profiling as profiling
+import src.utils as utils
+from src.engine import play_game
+from src.profiling import Histogram, ProfilingScreen
+from src.screen import VirtualScreen, local_game_driver
+
+@pytest.fixture(autouse=True)
+def clean():
+    yield
+    profiling.disable()
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 100001):
+        histogram.record(value * 10)
+    assert histogram.count == 100000
+    assert histogram.max == 1000000
+    assert abs(histogram.percentile(0.5) - 500000) / 500000 < 0.02
+    assert abs(histogram.percentile(0.99) - 990000) / 990000 < 0.02
+    assert histogram.percentile(1.0) == 1000000
+
+def test_buckets_are_within_one_percent():
+    for value in [200, 1000, 12345, 987654, 2 ** 30 + 12345]:
+        histogram = Histogram()
+        histogram.record(value)
+        histogram.record(value * 3)
+        assert 0 <= histogram.percentile(0.5) - value < value / 100
+
+def test_buckets_cover_values():
+    for value in list(range(0, 5000)) + [2 ** 30 + 12345, 2 ** 45]:
+        index = Histogram._index(value)
+        assert Histogram._highest(index) >= value or value >= 2 ** 46
+        if index:
+            assert Histogram._highest(index - 1) < value
+
+def test_span_is_noop_when_disabled():
+    assert profiling.span("think") is profiling.span("other")
+    profiler = profiling.enable(out=None)
+    with profiling.span("think"):
+        pass
+    assert profiler.histograms["think"].count == 1
+
+def test_profiled_session_with_overlay():
+    profiler = profiling.enable(out=None)
+    screen = VirtualScreen(24, 100, driver=local_game_driver(2))
+    with pytest.raises(SystemExit):
+        play_game(ProfilingScreen(screen, profiler, overlay=True))
+    for name in ("input", "refresh", "get_winner"):
+        assert profiler.histograms[name].count > 0
+    assert "refresh p99" in screen.line(23)
+    # The overlay keeps between the footer text and the round-trip slot
+    assert screen.line(23).startswith(utils.FOOTER + "  ")
+    assert screen.line(23)[-1 - utils.LINK_SLOT:] == " " * (utils.LINK_SLOT + 1)
+    assert "get_winner" in profiler.summary()
@@ -0,0 +1,110 @@
+import io
+import sys
+import pytest
+import src.engine as engine_module
+from src.board import Board
+from src.engine import cpu_game
+from src.protocol import EngineSession, ExternalEngine, ProtocolError
+from src.screen import VirtualScreen, local_game_driver
+
+def run_session(*lines):
+    output = io.StringIO()
+    session = EngineSession(output)
+    for line in lines:
+        session.handle(line)
+    return output.getvalue().splitlines()
+
+def test_handshake():
+    assert run_session("ttt", "isready")[-2:] == ["tttok", "readyok"]
+
+def test_go_wins_from_startpos_moves():
+    assert run_session("position startpos moves 0 3 1 4", "go movetime 10") == ["bestmove 2"]
+
+def test_go_infinite_waits_for_stop():
+    assert run_session("setoption name Strategy value perfect", "position cells XX.OO....", "go infinite") == []
+    assert run_session("position cells XX.OO....", "go infinite", "stop") == ["bestmove 2"]
+
+def test_bad_position():
+    with pytest.raises(ProtocolError):
+        run_session("position sideways")
+
+def test_external_engine_subprocess():
+    engine = ExternalEngine([sys.executable, "-m", "src.protocol"])
+    engine.start()
+    try:
+        assert engine.name == "tic-tac-toe"
+        engine.new_game()
+        board = Board(None, x=0, y=0, cells=[['O', 'O', ' '], ['X', 'X', ' '], ['X', ' ', ' ']])
+        assert engine.best_move(board) == (0, 2)
+    finally:
+        engine.close()
+
+FAKE_ENGINE = """
+import sys
+import time
+searches = 0
+for line in sys.stdin:
+    command = line.split()[:1]
+    if command == ["ttt"]:
+        print("id name fake\\ntttok", flush=True)
+    elif command == ["isready"]:
+        print("readyok", flush=True)
+    elif command == ["go"] and sys.argv[1] == "slow":
+        # Answers its first search late, and the rest at once
+        searches += 1
+        if searches == 1:
+            time.sleep(0.8)
+        print("bestmove " + ("0" if searches == 1 else "4"), flush=True)
+    elif command == ["go"] and sys.argv[1] != "silent":
+        print("bestmove " + sys.argv[1], flush=True)
+"""
+
+def fake_engine(tmp_path, answer, timeout=0.2):
+    script = tmp_path / "engine.py"
+    script.write_text(FAKE_ENGINE)
+    engine = ExternalEngine([sys.executable, str(script), answer], timeout=timeout)
+    engine.start()
+    return engine
+
+def test_cells_off_the_board_are_no_move(tmp_path):
+    engine = fake_engine(tmp_path, "42")
+    try:
+        assert engine.best_move(Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])) is None
+    finally:
+        engine.close()
+
+def test_late_answers_are_not_taken_for_the_next_search(tmp_path):
+    engine = fake_engine(tmp_path, "slow", timeout=0.5)
+    board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+    try:
+        with pytest.raises(ProtocolError):
+            engine.best_move(board)
+        assert engine.best_move(board) == (1, 1)
+    finally:
+        engine.close()
+
+@pytest.mark.parametrize("answer", ["42", "silent"])
+def test_cpu_falls_back_when_the_engine_fails(tmp_path, monkeypatch, answer):
+    # The CPU moves first, so the engine is asked at once
+    monkeypatch.setattr(engine_module, "randint", lambda low, high: 1)
+    engine = fake_engine(tmp_path, answer)
+    screen = VirtualScreen(driver=local_game_driver(1))
+    try:
+        cpu_game(screen, False, engine)
+    finally:
+        engine.close()
+        Board.clear_board()
+    assert screen.find("Click anywhere") is not None
+
+def test_cpu_plays_without_an_engine_that_has_exited(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine_module, "randint", lambda low, high: 1)
+    engine = fake_engine(tmp_path, "4")
+    engine._process.kill()
+    engine._process.wait()
+    screen = VirtualScreen(driver=local_game_driver(1))
+    try:
+        cpu_game(screen, False, engine)
+    finally:
+        engine.close()
+        Board.clear_board()
+    assert screen.find("Click anywhere") is not None
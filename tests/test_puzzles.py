@@ -0,0 +1,133 @@
+from random import Random
+
+import pytest
+from src.engine import play_game, puzzle_game
+from src.puzzles import (Puzzle, PuzzleBook, canonical, encode_puzzles, generate, load_puzzles, symmetries,
+                         write_puzzles)
+from src.screen import ScriptExhausted, VirtualScreen
+from src.variants import VARIANTS, Variant, compile_variant
+
+
+@pytest.fixture(scope="module")
+def standard():
+    return list(generate("standard"))
+
+
+def click_cell(screen, row, col):
+    # Cells of a board drawn under the banner on an 80-column screen
+    screen.click(31 + col * 8, 8 + row * 4)
+    screen.click(31 + col * 8, 8 + row * 4)
+
+
+def test_symmetries():
+    assert len(set(symmetries(3, 3))) == 8
+    assert len(set(symmetries(3, 4))) == 4
+    permutations = symmetries(3, 3)
+    # A corner X with an edge O, in every orientation
+    keys = {canonical(1 << permutation[0], 1 << permutation[1], permutations) for permutation in permutations}
+    assert len(keys) == 1
+
+def test_puzzles_have_one_winning_move(standard):
+    rules = compile_variant(VARIANTS["standard"])
+    assert len(standard) > 100
+    for puzzle in standard:
+        evaluations = rules.evaluate(puzzle.x, puzzle.o, rules.symbols_for(rules.players[puzzle.player]))
+        wins = [cell for cell, (value, _, _) in evaluations.items() if value > 0]
+        assert wins == [puzzle.cell]
+        assert (evaluations[puzzle.cell][1] + 1) // 2 == puzzle.moves
+    assert {puzzle.moves for puzzle in standard} == {1, 2, 3}
+
+def test_puzzles_are_symmetry_unique(standard):
+    permutations = symmetries(3, 3)
+    keys = [canonical(puzzle.x, puzzle.o, permutations) for puzzle in standard]
+    assert len(keys) == len(set(keys))
+
+def test_filters():
+    all_wins = list(generate("standard", unique=False))
+    deep = list(generate("standard", min_moves=2, max_moves=2))
+    assert len(all_wins) > len(list(generate("standard")))
+    assert deep and all(puzzle.moves == 2 for puzzle in deep)
+
+def test_sharded_generation_finds_the_same_puzzles():
+    variant = Variant("custom", 2, 5, 3)
+    permutations = symmetries(2, 5)
+    alone = {canonical(puzzle.x, puzzle.o, permutations) for puzzle in generate(variant, max_moves=1)}
+    pooled = {canonical(puzzle.x, puzzle.o, permutations) for puzzle in generate(variant, max_moves=1, workers=2)}
+    assert alone and alone == pooled
+
+def test_file_roundtrip(tmp_path, standard):
+    path = str(tmp_path / "puzzles.ttpz")
+    assert write_puzzles(path, VARIANTS["standard"], standard) == len(standard)
+    book = PuzzleBook(path)
+    try:
+        assert book.variant.description() == VARIANTS["standard"].description()
+        assert sorted(book.puzzle(i).astuple() for i in range(len(book))) == \
+            sorted(puzzle.astuple() for puzzle in standard)
+        levels = book.levels_available()
+        assert sum(levels.values()) == len(standard)
+        rng = Random(0)
+        for moves in levels:
+            assert all(book.random(rng, moves)[1].moves == moves for _ in range(20))
+        with pytest.raises(IndexError):
+            book.random(rng, moves=9)
+    finally:
+        book.close()
+
+def test_bad_files(tmp_path):
+    path = tmp_path / "puzzles.ttpz"
+    data = encode_puzzles(VARIANTS["standard"], [Puzzle(0b11, 0b11000, 0, 2, 0, 1)])
+    path.write_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        PuzzleBook(str(path))
+    with pytest.raises(ValueError):
+        PuzzleBook(b"TTOB" + data[4:])
+    with pytest.raises(ValueError):
+        encode_puzzles(Variant("custom", 6, 6, 4), [])
+
+def test_load_generates_once(tmp_path, monkeypatch):
+    # An empty setting keeps them in memory
+    monkeypatch.setenv("TICTACTOE_PUZZLES", "")
+    assert load_puzzles().path is None
+    path = tmp_path / "puzzles.ttpz"
+    monkeypatch.setenv("TICTACTOE_PUZZLES", str(path))
+    first = load_puzzles()
+    assert path.exists() and len(first) > 0
+    first.close()
+    monkeypatch.setattr("src.puzzles.generate", lambda *args, **kwargs: pytest.fail("generated again"))
+    load_puzzles().close()
+
+def test_solving_a_puzzle():
+    # X to move: only the top-right corner completes a line
+    puzzles = PuzzleBook(encode_puzzles(VARIANTS["standard"], [Puzzle(0b11, 0b11000, 0, 2, 0, 1)]))
+    screen = VirtualScreen(40, 80)
+    click_cell(screen, 0, 2)
+    with pytest.raises(ScriptExhausted):
+        puzzle_game(screen, False, puzzles)
+    assert "Player X to play and win in one move." in screen.text()
+    assert "Solved in 1 move!" in screen.text()
+
+def test_solving_a_puzzle_the_defender_loses():
+    # Misere, O to move: O in the corner leaves X only the last cell, which completes X's line
+    puzzles = PuzzleBook(encode_puzzles(VARIANTS["misere"], [Puzzle(0x12a, 0xd0, 1, 0, 1, 1)]))
+    screen = VirtualScreen(40, 80)
+    click_cell(screen, 0, 0)
+    with pytest.raises(ScriptExhausted):
+        puzzle_game(screen, False, puzzles)
+    assert "Solved in 1 move!" in screen.text()
+
+def test_missing_a_puzzle_shows_the_answer():
+    puzzles = PuzzleBook(encode_puzzles(VARIANTS["standard"], [Puzzle(0b11, 0b11000, 0, 2, 0, 1)]))
+    screen = VirtualScreen(40, 80)
+    screen.click(48, 16)  # Puzzle
+    click_cell(screen, 2, 2)
+    with pytest.raises(ScriptExhausted):
+        play_game(screen, puzzles=puzzles)
+    assert "Not quite: X at row 1, column 3 wins." in screen.text()
+
+def test_puzzles_for_other_boards_are_refused():
+    variant = Variant("custom", 3, 4, 3)
+    puzzles = PuzzleBook(encode_puzzles(variant, [Puzzle(0b11, 0b110000, 0, 2, 0, 1)]))
+    screen = VirtualScreen(40, 80)
+    with pytest.raises(ScriptExhausted):
+        puzzle_game(screen, False, puzzles)
+    assert "These puzzles are for a 3x4 board" in screen.text()
@@ -0,0 +1,60 @@
+import pytest
+from random import Random
+from unittest.mock import Mock
+from src.qubic import QubicState, QubicBoard, LINES, LINES_THROUGH, search
+
+@pytest.fixture
+def mock_stdscr():
+    return Mock()
+
+def test_line_tables():
+    assert len(LINES) == 76
+    assert all(bin(line).count('1') == 4 for line in LINES)
+    assert sorted(set(len(lines) for lines in LINES_THROUGH)) == [4, 7]
+
+def test_play_detects_win_through_layers():
+    state = QubicState()
+    # X plays the vertical column at row 0, col 0, O plays elsewhere
+    for x_cell, o_cell in [(0, 5), (16, 6), (32, 9)]:
+        state.play(x_cell)
+        state.play(o_cell)
+    assert state.threats(0) == [48]
+    state.play(48)
+    assert state.winner == 0
+
+def test_winner_matches_a_scan_of_all_lines():
+    rng = Random(3)
+    for _ in range(50):
+        state = QubicState()
+        while state.winner is None:
+            state.play(rng.choice(state.legal_moves()))
+            won = [any(bits & line == line for line in LINES) for bits in state.bits]
+            assert won == [state.winner == 0, state.winner == 1]
+
+def test_undo_restores_state():
+    state = QubicState()
+    state.play(21)
+    state.play(0)
+    score, counts = state.score, [c[:] for c in state.counts]
+    state.play(42)
+    state.undo()
+    assert state.score == score
+    assert state.counts == counts
+    assert state.turn == 0
+
+def test_search_blocks_and_wins():
+    state = QubicState()
+    for x_cell, o_cell in [(0, 1), (5, 2), (10, 3)]:
+        state.play(x_cell)
+        state.play(o_cell)
+    # X completes the diagonal of layer 0 rather than blocking
+    assert search(state, think_time=0.5)[0] == 15
+
+def test_board_click_mapping(mock_stdscr):
+    board = QubicBoard(mock_stdscr, x=0, y=0)
+    assert len(board._lines) == board.get_board_height()
+    assert board.get_cell(18 + 5, 3) == (1, 5)
+    assert board.to_index(1, 5) == 16 + 4 + 1
+    assert board.to_cell(21) == (1, 5)
+    assert not board.in_bounds(16, 0)
+    assert board.in_bounds(19, 0)
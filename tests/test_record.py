@@ -0,0 +1,43 @@
+import pytest
+from src.record import GameRecord, GameRecorder, RecordWriter, read_records, read_record, read_index
+
+def make_records(count):
+    return [GameRecord("local", f"peer{i}", start=1700000000 + i, duration=12.5, result=['X', 'O', 'tie'][i % 3],
+                       moves=[4, 0, 8, 2, 6][:3 + i % 3], first='O' if i % 2 else 'X') for i in range(count)]
+
+def test_roundtrip(tmp_path):
+    path = str(tmp_path / "games.tttg")
+    records = make_records(1000)
+    with RecordWriter(path, block_size=1024) as writer:
+        for record in records:
+            writer.write(record)
+    assert list(read_records(path)) == records
+    assert len(read_index(path)) > 1
+
+def test_append_and_seek(tmp_path):
+    path = str(tmp_path / "games.tttg")
+    records = make_records(300)
+    for part in (records[:100], records[100:]):
+        with RecordWriter(path, block_size=512) as writer:
+            for record in part:
+                writer.write(record)
+    assert read_record(path, 0) == records[0]
+    assert read_record(path, 250) == records[250]
+    with pytest.raises(IndexError):
+        read_record(path, 300)
+
+def test_corrupt_archive(tmp_path):
+    path = tmp_path / "games.tttg"
+    path.write_bytes(b"nope" * 10)
+    with pytest.raises(ValueError):
+        list(read_records(str(path)))
+
+def test_recorder(tmp_path):
+    path = str(tmp_path / "games.tttg")
+    with RecordWriter(path) as writer:
+        recorder = GameRecorder("local", "cpu", writer)
+        recorder.move('O', 1, 1)
+        recorder.move('X', 0, 0)
+        recorder.finish('tie')
+    record, = read_records(path)
+    assert (record.moves, record.first, record.result) == ([4, 0], 'O', 'tie')
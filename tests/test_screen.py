@@ -0,0 +1,84 @@
+import curses
+import pytest
+from src.engine import play_game
+from src.screen import Screen, ScriptExhausted, VirtualScreen, local_game_driver
+
+def test_addstr_and_text():
+    screen = VirtualScreen(3, 10)
+    screen.addstr(1, 8, "abc", curses.A_REVERSE)
+    assert screen.line(1) == " " * 8 + "ab"
+    assert screen.line(2).startswith("c")
+    assert screen.attrs[1][8] == curses.A_REVERSE
+    assert screen.find("ab") == (1, 8)
+    screen.move(1, 9)
+    screen.clrtoeol()
+    assert screen.text() == "\n        a\nc"
+    with pytest.raises(curses.error):
+        screen.addstr(3, 0, "x")
+
+def test_refresh_counts_changed_bytes():
+    screen = VirtualScreen(3, 10)
+    screen.addstr(0, 0, "ab")
+    screen.refresh()
+    # Clear and home, one cursor move, two characters
+    assert screen.refresh_bytes == [len("\033[H\033[2J") + len("\033[1;1H") + 2]
+    screen.addstr(0, 0, "ab")
+    screen.refresh()
+    assert screen.refresh_bytes[-1] == 0
+    screen.addstr(2, 4, "═")
+    screen.refresh()
+    assert screen.refresh_bytes[-1] == len("\033[3;5H") + 3
+
+def test_scripted_input():
+    screen = VirtualScreen()
+    screen.key('q', curses.KEY_UP)
+    screen.click(5, 7)
+    assert [screen.getch(), screen.getch(), screen.getch()] == [ord('q'), curses.KEY_UP, curses.KEY_MOUSE]
+    assert screen.getmouse()[1:3] == (5, 7)
+    with pytest.raises(curses.error):
+        screen.getmouse()
+    screen.nodelay(1)
+    assert screen.getch() == -1
+    screen.nodelay(0)
+    with pytest.raises(ScriptExhausted):
+        screen.getch()
+
+def test_timeout_lets_idle_work_run():
+    screen = VirtualScreen(idle_limit=3)
+    screen.timeout(250)
+    screen.key('a')
+    assert [screen.getch() for _ in range(4)] == [ord('a'), -1, -1, -1]
+    assert screen.clock == 0.75
+    with pytest.raises(ScriptExhausted):
+        screen.getch()
+    # A key resets the count
+    screen.key('b')
+    assert [screen.getch(), screen.getch()] == [ord('b'), -1]
+    screen.timeout(-1)
+    with pytest.raises(ScriptExhausted):
+        screen.getch()
+
+def test_screens_must_implement_drawing_and_input():
+    with pytest.raises(TypeError):
+        Screen()
+
+def test_headless_local_game():
+    screen = VirtualScreen()
+    screen.click(37, 13)  # Local
+    for row, col in [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2)]:
+        # Select, then confirm
+        screen.click(31 + col * 8, 8 + row * 4)
+        screen.click(31 + col * 8, 8 + row * 4)
+    screen.key(' ')
+    with pytest.raises(ScriptExhausted):
+        play_game(screen)
+    # The script ran out on the play-again screen
+    assert screen.find("┃ Yes ┃") is not None
+    assert screen.clock >= 2.5
+    assert screen.refresh_bytes
+
+def test_driver_plays_until_declined():
+    screen = VirtualScreen(driver=local_game_driver(3))
+    with pytest.raises(SystemExit):
+        play_game(screen)
+    assert screen.find("┃ No  ┃") is not None
@@ -0,0 +1,41 @@
+from src.batch import X_WINS
+from src.position_index import canonical
+from src.selfplay import Trainer, evaluate_file, train
+from src.value_table import ValueTable
+
+
+def test_finished_positions_hold_their_result():
+    trainer = Trainer(envs=8, seed=0)
+    x_win = trainer.canonical[1 + 3 + 9 + 2 * 27 + 2 * 81]   # X on the top row, O on two cells below
+    assert trainer.outcome[1 + 3 + 9 + 2 * 27 + 2 * 81] == X_WINS
+    assert trainer.values[x_win] == 1.0
+
+def test_steps_play_whole_games():
+    trainer = Trainer(envs=64, seed=0)
+    ended = sum(trainer.step() for _ in range(9))
+    # Every game ends within nine moves and restarts on an empty board
+    assert ended >= 64
+    assert trainer.games == ended
+    assert ((trainer.cells != 0).sum(axis=1) < 9).all()
+
+def test_training_beats_the_heuristic():
+    trainer = Trainer(envs=1024, seed=1)
+    before = trainer.evaluate(2000)
+    while trainer.games < 60000:
+        trainer.step()
+    after = trainer.evaluate(2000)
+    assert after["loss"] < 0.01
+    assert after["win"] > before["win"]
+
+def test_checkpoint_matches_the_trainer(tmp_path):
+    path = str(tmp_path / "values.ttvt")
+    result = train(path, games=20000, envs=512, checkpoint=10000, eval_games=200, seed=2)
+    assert result["games"] >= 20000 and result["games_per_sec"] > 0
+    table = ValueTable(path)
+    assert table.games == result["games"]
+    # Every image of a position reads the same entry
+    cells = [1, 2, 0, 0, 1, 0, 0, 0, 0]
+    key, _ = canonical(cells)
+    assert key in table.values
+    assert table.value(cells) == table.value([0, 2, 1, 0, 1, 0, 0, 0, 0])
+    assert evaluate_file(path, games=200)["loss"] < 0.05
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from src.server import EngineService, LRUCache, percentiles, _post
+
+def test_lru_cache_evicts_oldest():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+def test_percentiles():
+    assert percentiles([0.001 * i for i in range(1, 101)])["p50"] == 51.0
+    assert percentiles([]) == {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+
+def test_concurrent_queries_are_batched():
+    async def run():
+        service = EngineService(max_delay=0.05)
+        await service.start()
+        answers = await asyncio.gather(
+            service.query("best-move", {"position": "XX.OO...."}),
+            service.query("evaluate", {"position": "........."}),
+            service.query("best-move", {"position": "XX.OO...."}),
+        )
+        return service, answers
+    service, answers = asyncio.run(run())
+    assert answers[0] == {"move": [0, 2], "value": 1}
+    assert answers[1] == {"value": 0, "distance": 9}
+    assert service.batches == 1
+
+def test_http_round_trip():
+    async def run():
+        service = EngineService()
+        await service.start()
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        legal = await _post(reader, writer, "/legal-moves", {"position": "XOXOXOOX."})
+        bad = await _post(reader, writer, "/evaluate", {"position": "nope"})
+        not_an_object = await _post(reader, writer, "/evaluate", ["XX.OO...."])
+        writer.close()
+        server.close()
+        return legal, bad, not_an_object
+    legal, bad, not_an_object = asyncio.run(run())
+    assert legal == (200, {"moves": [[2, 2]], "turn": "X"})
+    assert bad[0] == 400
+    assert not_an_object[0] == 400
+
+def test_unreachable_positions_are_not_cached():
+    async def run():
+        service = EngineService(max_delay=0.01)
+        await service.start()
+        with pytest.raises(ValueError):
+            await service.query("evaluate", {"position": "XXXOOO..."})
+        return service
+    service = asyncio.run(run())
+    assert len(service.cache) == 0
+
+def test_unreachable_positions_are_refused_over_http():
+    async def run():
+        service = EngineService(max_delay=0.01)
+        await service.start()
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        answer = await _post(reader, writer, "/evaluate", {"position": "XXXOOO..."})
+        writer.close()
+        server.close()
+        return answer
+    status, answer = asyncio.run(run())
+    assert status == 400
+    assert answer == {"error": "position cannot arise in a legal game"}
+
+@pytest.mark.parametrize("request_head", [b"GARBAGE\r\n\r\n",
+                                          b"POST /evaluate HTTP/1.1\r\nContent-Length: lots\r\n\r\n",
+                                          b"POST /evaluate HTTP/1.1\r\nContent-Length: -5\r\n\r\n"])
+def test_malformed_requests_get_bad_request(request_head):
+    async def run():
+        service = EngineService()
+        await service.start()
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(request_head)
+        reply = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        server.close()
+        return reply, service
+    reply, service = asyncio.run(run())
+    assert reply.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert b"Connection: close" in reply
+    assert service.errors == 1
@@ -0,0 +1,36 @@
+from src.board import Board
+from src.solver import solved_table, encode, decode, masks, solve_board, best_move
+
+def test_table_size():
+    table = solved_table()
+    assert len(table) == 5478
+    assert sum(1 for solution in table.values() if solution.best < 0) == 958
+
+def test_empty_board_is_a_draw():
+    solution = solved_table()[0]
+    assert solution.value == 0
+    assert solution.distance == 9
+    assert solution.optimal == 0x1ff
+
+def test_encode_roundtrip():
+    cells = [['X', ' ', 'O'], [' ', 'X', ' '], ['O', ' ', ' ']]
+    assert decode(encode(cells)) == cells
+    assert masks(encode(cells)) == (0b000010001, 0b001000100)
+
+def test_best_move_wins_quickly():
+    board = Board(None, x=0, y=0, cells=[['X', 'X', ' '], ['O', 'O', ' '], [' ', ' ', ' ']])
+    assert best_move(board) == (0, 2)
+    solution = solve_board(board)
+    assert (solution.value, solution.distance) == (1, 1)
+
+def test_unreachable_position():
+    board = Board(None, x=0, y=0, cells=[['O', 'O', ' '], [' ', ' ', ' '], [' ', ' ', ' ']])
+    assert solve_board(board) is None
+
+def test_solver_takes_the_immediate_win():
+    # X wins at once in the top-right corner; its other winning moves take longer
+    board = Board(None, x=0, y=0, cells=[['X', 'X', ' '], [' ', 'O', ' '], [' ', ' ', 'O']])
+    solution = solve_board(board)
+    assert (solution.value, solution.distance) == (1, 1)
+    assert solution.optimal == 1 << 2
+    assert best_move(board) == (0, 2)
@@ -0,0 +1,56 @@
+import io
+import random
+from random import Random
+from src.board import Board
+from src.tournament import ENGINES, EloTable, play_match_game, run_tournament, schedule
+
+def test_registered_engines():
+    assert {"heuristic", "random", "perfect"} <= set(ENGINES)
+
+def test_perfect_never_loses():
+    rng = Random(1)
+    for _ in range(200):
+        assert play_match_game("random", "perfect", rng, opening_plies=1) != 'X'
+        assert play_match_game("perfect", "heuristic", rng, opening_plies=1) != 'O'
+
+def test_schedule_swaps_colours():
+    tasks = schedule(["a", "b", "c"], games=1000, chunk=300)
+    pairs = {(x, o) for x, o, *_ in tasks}
+    assert ("a", "b") in pairs and ("b", "a") in pairs
+    assert sum(task[2] for task in tasks if task[:2] == ("a", "b")) == 500
+    gauntlet = schedule(["a", "b", "c"], games=10, gauntlet="a")
+    assert {(x, o) for x, o, *_ in gauntlet} == {("a", "b"), ("b", "a"), ("a", "c"), ("c", "a")}
+
+def test_schedule_plays_every_game_with_distinct_seeds():
+    tasks = schedule(["a", "b"], games=7, chunk=3)
+    assert sum(task[2] for task in tasks if task[:2] == ("a", "b")) == 4
+    assert sum(task[2] for task in tasks if task[:2] == ("b", "a")) == 3
+    seeds = [task[3] for task in tasks]
+    assert len(set(seeds)) == len(seeds)
+    # Neighbouring base seeds don't hand out the same task seeds
+    assert not set(seeds) & {task[3] for task in schedule(["a", "b"], games=7, chunk=3, seed=1)}
+    assert seeds == [task[3] for task in schedule(["a", "b"], games=7, chunk=3)]
+
+def test_elo_table():
+    table = EloTable(["a", "b"])
+    for _ in range(30):
+        table.update("a", "b", "X")
+        table.update("b", "a", "tie")
+    assert table.ratings["a"] > table.ratings["b"]
+    performance, margin = table.performance("a")
+    assert performance > 0 and margin > 0
+
+def test_run_tournament_streams_results():
+    out = io.StringIO()
+    tasks = schedule(["heuristic", "random"], games=40, chunk=10)
+    played = sum(len(results) for results in run_tournament(tasks, workers=2, out=out))
+    assert played == 40
+    assert len(out.getvalue().splitlines()) == 40
+
+def test_heuristic_uses_the_given_generator():
+    def moves(global_seed):
+        # Reseed the global generator, which the heuristic must not draw from
+        random.seed(global_seed)
+        board = Board(None, x=0, y=0, cells=[[' '] * 3 for _ in range(3)])
+        return [ENGINES["heuristic"](board, 'X', Random(7)) for _ in range(5)]
+    assert moves(1) == moves(2)
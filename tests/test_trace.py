@@ -0,0 +1,52 @@
+import curses
+import pytest
+from src.engine import play_game
+from src.screen import ScriptExhausted, VirtualScreen
+from src.trace import RecordingScreen, Trace, diff_screens, replay
+
+def click(events, x, y):
+    events.append({"t": 0.0, "key": curses.KEY_MOUSE})
+    events.append({"t": 0.0, "mouse": [0, x, y, 0, curses.BUTTON1_CLICKED]})
+
+def play(events, row, col):
+    click(events, 31 + col * 8, 8 + row * 4)
+    click(events, 31 + col * 8, 8 + row * 4)
+
+def test_record_and_replay(tmp_path):
+    screen = VirtualScreen()
+    screen.click(37, 13)  # Local
+    for row, col in [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2)]:
+        screen.click(31 + col * 8, 8 + row * 4)
+        screen.click(31 + col * 8, 8 + row * 4)
+    screen.key(' ')
+    recording = RecordingScreen(screen)
+    with pytest.raises(ScriptExhausted):
+        play_game(recording)
+    path = str(tmp_path / "session.trace")
+    recording.trace.save(path)
+
+    trace = Trace.load(path)
+    assert sum(1 for event in trace.events if "mouse" in event) == 11
+    report = replay(trace)
+    assert report.ended == "end of trace"
+    assert report.events == 12
+    assert report.frames > 0
+    assert diff_screens(screen.text(), report.screen) == []
+    assert diff_screens(screen.text().replace("Yes", "Yay"), report.screen) != []
+
+def test_online_replay_with_loopback_peer():
+    events = []
+    click(events, 37, 10)  # Join
+    events += [{"t": 0.0, "key": ord(ch)} for ch in "127.0.0.1"] + [{"t": 0.0, "key": 10}]
+    events.append({"t": 0.0, "recv": "\"X\"\n"})
+    events.append({"t": 0.0, "key": ord(' ')})
+    for move, answer in [((0, 0), "[1, 0]\n"), ((0, 1), "[1, 1]\n"), ((0, 2), None)]:
+        play(events, *move)
+        if answer:
+            events.append({"t": 0.0, "recv": answer})
+    events.append({"t": 0.0, "key": ord(' ')})
+
+    report = replay(Trace(40, 80, seed=1, events=events))
+    assert report.sent == [b"[0, 0]\n", b"[0, 1]\n", b"[0, 2]\n"]
+    assert report.ended == "end of trace"
+    assert "┃ Yes ┃" in report.screen
@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import Mock
+from src.engine import Banner, ultimate_game
+from src.screen import ScriptExhausted, VirtualScreen
+from src.ultimate import UltimateState, UltimateBoard, LOCAL_WIN, mcts
+
+@pytest.fixture
+def mock_stdscr():
+    return Mock()
+
+def test_local_win_table():
+    assert LOCAL_WIN[0b000000111]
+    assert LOCAL_WIN[0b100010001]
+    assert not LOCAL_WIN[0b000000011]
+    assert sum(LOCAL_WIN) == 282
+
+def test_send_to_constraint():
+    state = UltimateState()
+    assert len(state.legal_moves()) == 81
+    state.play(4 * 9 + 2)
+    assert state.next_board == 2
+    assert state.legal_moves() == [2 * 9 + c for c in range(9)]
+
+def test_won_board_frees_next_move():
+    state = UltimateState()
+    state.boards[0][0] = 0b011
+    state.next_board = 0
+    state.play(2)
+    assert state.meta[0] == 1
+    assert state.next_board == 2
+    # O sends X to the decided board 0, so any undecided board is allowed
+    state.play(2 * 9 + 0)
+    assert state.next_board == -1
+    assert len(state.legal_moves()) == 81 - 9 - 1
+
+def test_playout_ends():
+    state = UltimateState()
+    assert state.copy().playout() in (0, 1, 2)
+    assert state.winner is None
+
+def test_mcts_takes_winning_move():
+    state = UltimateState()
+    # X owns local boards 0 and 1 and needs one cell in board 2
+    state.boards[0][0] = state.boards[0][1] = 0b111
+    state.meta[0] = state.done = 0b11
+    state.boards[0][2] = 0b011
+    state.next_board = 2
+    assert mcts(state, playouts=500) == 2 * 9 + 2
+
+def test_board_cell_mapping(mock_stdscr):
+    board = UltimateBoard(mock_stdscr, x=0, y=0)
+    assert board.to_move(4, 5) == 4 * 9 + 5
+    assert board.to_cell(4 * 9 + 5) == (4, 5)
+    assert board.get_cell(13, 8) == (4, 3)
+    board.update_board('X', 0, 4)
+    assert not board.is_playable(0, 0)
+    assert board.is_playable(0, 3)
+    assert len(board._lines) == 17
+
+def test_game_fits_a_standard_terminal():
+    # The banner, board and status panel all fit on a 24x80 terminal
+    screen = VirtualScreen(24, 80)
+    board = UltimateBoard(screen, y=Banner.height + 1)
+    assert board.y + board.get_board_height() < 24
+    assert board.x + board.get_board_width() + 2 + UltimateBoard._panel_width <= 80
+    y, x = board._cell_origin(4, 4)
+    screen.click(x, y)
+    screen.click(x, y)
+    with pytest.raises(ScriptExhausted):
+        ultimate_game(screen, False, think_time=0.01)
+    assert "It's Player X's" in screen.text()
+    assert screen.line(y)[x + (board._cell_width - 1) // 2] == 'X'
@@ -0,0 +1,57 @@
+import pytest
+from src.board import Board
+from src.position_index import canonical
+from src.value_table import ENTRY, HEADER, MAGIC, SCALE, VERSION, ValueTable, default_values
+
+
+def write_table(path, values):
+    entries = {canonical(cells)[0]: value for cells, value in values}
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), 123))
+        for key, value in sorted(entries.items()):
+            f.write(ENTRY.pack(key, round(value * SCALE)))
+
+def test_load(tmp_path):
+    path = tmp_path / "values.ttvt"
+    write_table(path, [([1, 0, 0, 0, 0, 0, 0, 0, 0], 0.5)])
+    table = ValueTable(str(path))
+    assert table.games == 123
+    # Any corner is the same position
+    assert table.value([0, 0, 1, 0, 0, 0, 0, 0, 0]) == pytest.approx(0.5, abs=1e-4)
+    assert table.value([0, 0, 0, 0, 1, 0, 0, 0, 0]) == 0.0
+
+def test_choose_follows_the_values(tmp_path):
+    path = tmp_path / "values.ttvt"
+    # After X in the corner, O in the centre is good for O
+    write_table(path, [([1, 0, 0, 0, 2, 0, 0, 0, 0], -0.8), ([1, 2, 0, 0, 0, 0, 0, 0, 0], 0.9)])
+    table = ValueTable(str(path))
+    board = Board(None, x=0, y=0, cells=[['X', ' ', ' '], [' ', ' ', ' '], [' ', ' ', ' ']])
+    assert table.choose(board, 'O') == (1, 1)
+    # In a game O started, the symbols swap: X answering O's corner looks up O-in-the-centre
+    board = Board(None, x=0, y=0, cells=[['O', ' ', ' '], [' ', ' ', ' '], [' ', ' ', ' ']])
+    assert table.choose(board, 'X') == (1, 1)
+    full = Board(None, x=0, y=0, cells=[['X', 'O', 'X'], ['X', 'O', 'O'], ['O', 'X', 'X']])
+    assert table.choose(full, 'O') is None
+
+def test_bad_files(tmp_path):
+    path = tmp_path / "values.ttvt"
+    path.write_bytes(b"TTOB" + bytes(16))
+    with pytest.raises(ValueError):
+        ValueTable(str(path))
+    write_table(path, [([1, 0, 0, 0, 0, 0, 0, 0, 0], 0.5)])
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        ValueTable(str(path))
+
+def test_default_values(tmp_path, monkeypatch):
+    monkeypatch.setenv("TICTACTOE_VALUES", str(tmp_path / "missing.ttvt"))
+    assert default_values() is None
+    write_table(tmp_path / "values.ttvt", [])
+    monkeypatch.setenv("TICTACTOE_VALUES", str(tmp_path / "values.ttvt"))
+    assert default_values().values == {}
+    # A corrupt default table is skipped rather than stopping the game from starting
+    (tmp_path / "values.ttvt").write_bytes(b"TTOB" + bytes(16))
+    assert default_values() is None
+    (tmp_path / "dir.ttvt").mkdir()
+    monkeypatch.setenv("TICTACTOE_VALUES", str(tmp_path / "dir.ttvt"))
+    assert default_values() is None
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+import src.variants as variants
+from src.board import WIN_MASKS, Board
+from src.engine import play_game
+from src.screen import VirtualScreen, local_game_driver
+from src.variants import (LOSE, TIE, VARIANTS, Variant, compile_variant, line_masks, load_rules,
+                          read_rules, save_rules)
+
+
+def test_line_masks():
+    assert sorted(line_masks(3, 3, 3)) == sorted(WIN_MASKS)
+    # Rows, columns and both diagonals of every 3x3 window
+    assert len(line_masks(4, 4, 3)) == 24
+    assert len(line_masks(3, 5, 4)) == 6
+
+def test_line_table_matches_lines():
+    rules = compile_variant(Variant("custom", 3, 4, 3))
+    for mask in range(1 << 12):
+        assert rules.table[mask] == any(mask & line == line for line in rules.lines)
+
+def test_invalid_variants():
+    with pytest.raises(ValueError):
+        Variant("custom", 3, 3, 4)
+    with pytest.raises(ValueError):
+        Variant("custom", goal="draw")
+    with pytest.raises(ValueError):
+        Variant("custom", placement="gravity")
+
+def test_outcomes():
+    misere = compile_variant(VARIANTS["misere"])
+    x, o = misere.encode([['X', 'X', 'X'], ['O', 'O', ' '], [' ', ' ', ' ']])
+    assert misere.outcome(x, o) == 1
+    assert compile_variant(VARIANTS["standard"]).outcome(x, o) == 0
+    # In wild, whoever completes a line of either symbol wins: four stones, so the second player
+    wild = compile_variant(VARIANTS["wild"])
+    x, o = wild.encode([['O', 'O', 'O'], ['X', ' ', ' '], [' ', ' ', ' ']])
+    assert wild.outcome(x, o) == 1
+    x, o = wild.encode([['X', 'O', 'X'], ['X', 'O', 'O'], ['O', 'X', 'X']])
+    assert wild.outcome(x, o) == TIE
+    assert wild.outcome(0, 0) is None
+
+def test_solved_values():
+    expected = {"standard": (0, 9), "misere": (0, 9), "wild": (1, 7), "notakto": (1, 6)}
+    for name, result in expected.items():
+        rules = compile_variant(VARIANTS[name])
+        assert rules.solve(0, 0, rules.symbols_for(rules.players[0])) == result
+
+def test_best_move_takes_the_win():
+    wild = compile_variant(VARIANTS["wild"])
+    x, o = wild.encode([['O', ' ', 'O'], ['X', ' ', ' '], [' ', ' ', ' ']])
+    assert wild.best_move(x, o, wild.symbols_for("2")) == (0, 1, 'O')
+    # In notakto the only safe cells are those that complete nothing
+    notakto = compile_variant(VARIANTS["notakto"])
+    x, o = notakto.encode([['X', 'X', ' '], [' ', ' ', ' '], [' ', ' ', ' ']])
+    assert notakto.evaluate(x, o, (0,))[2][0] == -1
+
+def test_board_uses_rules():
+    cells = [['X', 'X', 'X'], ['O', 'O', ' '], [' ', ' ', ' ']]
+    assert Board(None, x=0, y=0, cells=cells).get_winner() == 'X'
+    assert Board(None, x=0, y=0, cells=cells, rules=compile_variant(VARIANTS["misere"])).get_winner() == 'O'
+    notakto = compile_variant(VARIANTS["notakto"])
+    cells = [['X', 'X', 'X'], ['X', ' ', ' '], [' ', ' ', ' ']]
+    assert Board(None, x=0, y=0, cells=cells, rules=notakto).get_winner() == '1'
+    with pytest.raises(ValueError):
+        Board(None, x=0, y=0, rules=compile_variant(Variant("custom", 4, 4, 3)))
+
+def test_rules_are_cached_on_disk(tmp_path, monkeypatch):
+    variant = Variant("custom", 4, 4, 3, goal=LOSE)
+    rules = load_rules(variant, str(tmp_path))
+    path = tmp_path / f"{variant.key()}.ttvr"
+    assert path.exists()
+    monkeypatch.setattr(variants, "compile_variant", lambda variant: pytest.fail("compiled again"))
+    cached = load_rules(variant, str(tmp_path))
+    assert cached.lines == rules.lines and cached.table == rules.table
+    assert cached.cell_lines == rules.cell_lines
+
+def test_cache_key_ignores_the_name():
+    assert Variant("a", goal=LOSE).key() == VARIANTS["misere"].key()
+    assert len({variant.key() for variant in VARIANTS.values()}) == len(VARIANTS)
+
+def test_bad_cache_files_are_replaced(tmp_path):
+    variant = VARIANTS["wild"]
+    path = tmp_path / f"{variant.key()}.ttvr"
+    path.write_bytes(b"TTVR\x01")
+    assert load_rules(variant, str(tmp_path)).lines == compile_variant(variant).lines
+    assert read_rules(str(path), variant).table == compile_variant(variant).table
+    # Tables of other rules under the same name are rejected
+    save_rules(compile_variant(VARIANTS["misere"]), str(path))
+    with pytest.raises(ValueError):
+        read_rules(str(path), variant)
+
+def test_empty_cache_setting_turns_the_cache_off(tmp_path, monkeypatch):
+    monkeypatch.setenv("TICTACTOE_VARIANTS", "")
+    monkeypatch.chdir(tmp_path)
+    load_rules("notakto")
+    assert os.listdir(tmp_path) == []
+
+@pytest.mark.parametrize("variant", ["misere", "wild", "notakto"])
+def test_local_variant_games_run_headless(variant):
+    screen = VirtualScreen(driver=local_game_driver(2, seed=1))
+    with pytest.raises(SystemExit):
+        play_game(screen, variant=variant)